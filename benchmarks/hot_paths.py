@@ -0,0 +1,265 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from contextlib import contextmanager
+import datetime
+import inspect
+import json
+import random
+import telepot.aio
+from randtalkbot.i18n import get_languages_codes, get_translation
+from randtalkbot.message import Message
+from randtalkbot.stats import Stats
+from randtalkbot.stats_service import COUNT_INTERVALS, get_talks_stats
+from randtalkbot.stranger import Stranger
+from randtalkbot.stranger_sender import StrangerSender
+from randtalkbot.stranger_service import StrangerService
+from randtalkbot.talk import Talk
+from randtalkbot.testing import initialize_sqlite_database
+from .runner import benchmark
+
+INSERT_BATCH_SIZE = 50
+LANGUAGES_WEIGHTS = (('en', 8), ('ru', 4), ('es', 2), ('de', 1), ('it', 1), ('fa', 1), ('pt', 1))
+MESSAGES_JSONS = {
+    'audio': {'audio': {'file_id': 'foo', 'duration': 42, 'performer': 'Bar', 'title': 'Baz'}},
+    'command': {'text': '/start eyJpIjogIjEyMzQ1Njc4OTAifQ=='},
+    'document': {'document': {'file_id': 'foo'}},
+    'location': {'location': {'latitude': 1.5, 'longitude': 2.5}},
+    'photo': {'photo': [{'file_id': 'foo'}, {'file_id': 'bar'}], 'caption': 'Baz'},
+    'sticker': {'sticker': {'file_id': 'foo'}},
+    'text': {'text': 'Hello! How are you?'},
+    'video': {'video': {'file_id': 'foo', 'duration': 42}, 'caption': 'Bar'},
+    'voice': {'voice': {'file_id': 'foo', 'duration': 42}},
+    }
+POOLS_SIZES = (1000, 10000, 100000)
+SEXES_WEIGHTS = (('male', 6), ('female', 3), ('not_specified', 1))
+PARTNER_SEXES_WEIGHTS = (('female', 5), ('male', 2), ('not_specified', 3))
+TALKS_COUNT = 10000
+
+class _NullBot:
+    """Accepts any Bot API call doing nothing."""
+
+    def __getattr__(self, name):
+        return self._call
+
+    async def _call(self, *unused_args, **unused_kwargs):
+        pass
+
+class _RecordingBot:
+    """Records Bot API calls with the size of their JSON payloads. Parameters equal to `None`
+    aren't sent by telepot, so they aren't counted.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def __getattr__(self, name):
+        async def call(*args, **kwargs):
+            if name == '_api_request':
+                method_name, params = args[0], args[1]
+            else:
+                method_name = name
+                params = inspect.signature(getattr(telepot.aio.Bot, name)) \
+                    .bind(self, *args, **kwargs) \
+                    .arguments
+                del params['self']
+
+            params = {key: value for key, value in params.items() if value is not None}
+            payload = json.dumps(params, default=str)
+            self.calls.append((method_name, len(payload.encode())))
+
+        return call
+
+    def get_counters(self):
+        return {
+            'calls': len(self.calls),
+            'bytes': sum(size for unused_method_name, size in self.calls),
+            'methods': [method_name for method_name, unused_size in self.calls],
+            }
+
+def _choose(rand, weights):
+    values, values_weights = zip(*weights)
+    return rand.choices(values, values_weights)[0]
+
+def create_strangers_pool(size, rand):
+    """Creates strangers looking for partners with random sexes, languages and bonuses."""
+    now = datetime.datetime.utcnow()
+    rows = []
+
+    for index in range(size):
+        languages = [_choose(rand, LANGUAGES_WEIGHTS)]
+
+        if rand.random() < .3:
+            languages.append(_choose(rand, LANGUAGES_WEIGHTS))
+
+        rows.append({
+            'bonus_count': rand.choice((0, 0, 0, 0, 1, 2, 5)),
+            'invitation': f'{index:010d}',
+            'languages': json.dumps(list(dict.fromkeys(languages))),
+            'looking_for_partner_from': now - datetime.timedelta(seconds=rand.randrange(3600)),
+            'partner_sex': _choose(rand, PARTNER_SEXES_WEIGHTS),
+            'sex': _choose(rand, SEXES_WEIGHTS),
+            'telegram_id': index + 1,
+            })
+
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        Stranger.insert_many(rows[start:start + INSERT_BATCH_SIZE]).execute()
+
+def run_coroutine(coroutine):
+    """Runs coroutine which doesn't really wait for anything without an event loop."""
+    try:
+        coroutine.send(None)
+    except StopIteration as err:
+        return err.value
+
+    raise RuntimeError('Coroutine has awaited for something')
+
+def _register_message_benchmark(content_type, message_json):
+    message_json = dict(
+        message_json,
+        chat={'id': 31416, 'type': 'private'},
+        date=1500000000,
+        message_id=1,
+        )
+    message_json['from'] = {'id': 31416}
+
+    @benchmark(f'Message.__init__[{content_type}]')
+    @contextmanager
+    def init_message(): # pylint: disable=unused-variable
+        yield lambda: Message(message_json)
+
+for content_type_key, message_json_value in MESSAGES_JSONS.items():
+    _register_message_benchmark(content_type_key, message_json_value)
+
+@benchmark('StrangerSender._escape_markdown')
+@contextmanager
+def escape_markdown():
+    # pylint: disable=protected-access
+    yield lambda: StrangerSender._escape_markdown('Some *bold*, _italic_ and [link](foo) `code`')
+
+@benchmark('StrangerSender.send_notification')
+@contextmanager
+def send_notification():
+    sender = StrangerSender(_NullBot(), Stranger(languages='["en"]', telegram_id=31416))
+    yield lambda: run_coroutine(sender.send_notification(
+        'You\'ve received {0} bonuses for inviting a person to the bot. '
+        'Bonuses will help you to find partners quickly. Total bonuses count: {1}. '
+        'Congratulations!\n'
+        'To mute this notifications, use /mute\\_bonuses.',
+        3,
+        '*42*',
+        reply_markup={'keyboard': [['Female', 'Male'], ['Not specified']]},
+        ))
+
+def _register_send_benchmark(content_type, copy_messages):
+    message_json = dict(
+        MESSAGES_JSONS[content_type],
+        chat={'id': 31416, 'type': 'private'},
+        date=1500000000,
+        message_id=1,
+        )
+    message_json['from'] = {'id': 31416}
+    name = f'StrangerSender.send[{content_type}{", copyMessage" if copy_messages else ""}]'
+
+    @benchmark(name)
+    @contextmanager
+    def send(): # pylint: disable=unused-variable
+        stranger = Stranger(languages='["en"]', telegram_id=27183)
+        sender = StrangerSender(_NullBot(), stranger)
+        message = Message(message_json)
+        previous_copy_messages = StrangerSender.copy_messages
+        StrangerSender.configure(copy_messages=copy_messages)
+
+        def run():
+            run_coroutine(sender.send(message))
+
+        def get_counters():
+            """Bot API calls and bytes sent per relayed message."""
+            bot = _RecordingBot()
+            run_coroutine(StrangerSender(bot, stranger).send(message))
+            return bot.get_counters()
+
+        run.get_counters = get_counters
+
+        try:
+            yield run
+        finally:
+            StrangerSender.configure(copy_messages=previous_copy_messages)
+
+for content_type_key in ('photo', 'text'):
+    for copy_messages_value in (False, True):
+        _register_send_benchmark(content_type_key, copy_messages_value)
+
+@benchmark('i18n.get_languages_codes')
+@contextmanager
+def get_languages_codes_benchmark():
+    yield lambda: get_languages_codes('\"English\", Русский, Italian, de, spa')
+
+@benchmark('i18n.get_translation')
+@contextmanager
+def get_translation_benchmark():
+    yield lambda: get_translation(['ru', 'en'])
+
+def _register_match_partner_benchmark(size):
+    @benchmark(f'StrangerService._match_partner[{size}]')
+    @contextmanager
+    def match_partner(): # pylint: disable=unused-variable
+        database = initialize_sqlite_database()
+
+        try:
+            create_strangers_pool(size, random.Random(size))
+            stranger_service = StrangerService()
+            # Looks for a rare language to scan lots of candidates.
+            seeker = Stranger.create(
+                invitation='seeker',
+                languages='["pt", "en"]',
+                partner_sex='male',
+                sex='female',
+                telegram_id=0,
+                )
+
+            def run():
+                # pylint: disable=protected-access
+                stranger_service._match_partner(seeker)
+                stranger_service._locked_strangers_ids.clear()
+
+            yield run
+        finally:
+            database.close()
+
+for pool_size in POOLS_SIZES:
+    _register_match_partner_benchmark(pool_size)
+
+@benchmark(f'stats_service.get_talks_stats[{TALKS_COUNT}]')
+@contextmanager
+def get_talks_stats_benchmark():
+    rand = random.Random(TALKS_COUNT)
+    talks = [
+        Talk(partner1_sent=rand.randrange(100), partner2_sent=rand.randrange(100))
+        for unused_index in range(TALKS_COUNT)
+        ]
+    yield lambda: get_talks_stats(
+        talks,
+        lambda talk_instance: talk_instance.partner1_sent + talk_instance.partner2_sent,
+        COUNT_INTERVALS,
+        )
+
+@benchmark('Stats.get_sex_ratio')
+@contextmanager
+def get_sex_ratio():
+    stats_instance = Stats()
+    stats_instance.set_data({
+        'sex_distribution': {'female': 3000, 'male': 6000, 'not_specified': 1000},
+        })
+    data_json = stats_instance.data_json
+
+    def run():
+        # Parse JSON every time like for just loaded stats.
+        stats_instance.data_json = data_json
+        stats_instance._data_cache = None # pylint: disable=protected-access
+        stats_instance.get_sex_ratio()
+
+    yield run
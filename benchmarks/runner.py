@@ -0,0 +1,178 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""benchmarks.runner: runs the benchmarks and compares their results.
+
+Every benchmark is a context manager function yielding a callable to time. Setup and teardown
+happen outside of the timed region. The callable may have `get_counters()` attribute returning
+dict of what one call costs besides time, e.g. Bot API calls and bytes sent. Counters are
+obtained once, outside of the timed region.
+"""
+
+from collections import OrderedDict
+import datetime
+import json
+import logging
+import platform
+import statistics
+import sys
+import timeit
+from docopt import docopt
+from randtalkbot.utils import __version__
+
+DOC = '''RandTalkBot benchmarks
+
+Usage:
+  benchmarks run [--output=PATH] [--filter=SUBSTRING] [--repeat=COUNT]
+  benchmarks compare BASELINE RESULTS [--threshold=PERCENT]
+  benchmarks -h | --help
+
+Arguments:
+  BASELINE  Path to JSON results of the previous run.
+  RESULTS   Path to JSON results of the run to check.
+
+Options:
+  --output=PATH          Save results to the JSON file.
+  --filter=SUBSTRING     Run only the benchmarks containing the substring in their names.
+  --repeat=COUNT         How many times to repeat every measurement [default: 5].
+  --threshold=PERCENT    Slowdown to consider as a regression [default: 10].
+'''
+BENCHMARKS = OrderedDict()
+LOGGER = logging.getLogger('benchmarks.runner')
+
+def benchmark(name):
+    """Registers context manager function yielding callable to time."""
+    def decorator(setup):
+        BENCHMARKS[name] = setup
+        return setup
+
+    return decorator
+
+def compare(baseline, results):
+    """Compares fastest timings of the benchmarks present in both runs.
+
+    Returns:
+        list: `(name, baseline_time, time, change)` tuples where `change` is the relative
+            difference in percents.
+    """
+    comparison = []
+
+    for name, result in results['results'].items():
+        try:
+            baseline_result = baseline['results'][name]
+        except KeyError:
+            continue
+
+        change = (result['min'] / baseline_result['min'] - 1) * 100
+        comparison.append((name, baseline_result['min'], result['min'], change))
+
+    return comparison
+
+def format_duration(seconds):
+    for unit, multiplier in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * multiplier >= 1:
+            return f'{seconds * multiplier:.3f} {unit}'
+
+    return f'{seconds * 1e9:.1f} ns'
+
+def format_counters(counters):
+    return ''.join(
+        f' {key}={counters[key]}'
+        for key in ('calls', 'bytes')
+        if key in counters
+        )
+
+def measure(run, repeat=5):
+    """Times the callable like `timeit` does: the number of calls in every measurement is chosen
+    to take at least 0.2 s.
+
+    Returns:
+        dict: Fastest and median time of one call in seconds.
+    """
+    timer = timeit.Timer(run)
+    number, unused_time_taken = timer.autorange()
+    timings = [time_taken / number for time_taken in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'min': min(timings),
+        'median': statistics.median(timings),
+        'number': number,
+        'repeat': repeat,
+        }
+
+def run_benchmarks(substring='', repeat=5):
+    """Yields:
+        tuple: Benchmark name and its result.
+    """
+    # Benchmarks are registered on import.
+    from . import hot_paths, startup # pylint: disable=unused-variable
+
+    for name, setup in BENCHMARKS.items():
+        if substring not in name:
+            continue
+
+        with setup() as run:
+            result = measure(run, repeat=repeat)
+            get_counters = getattr(run, 'get_counters', None)
+
+            if get_counters is not None:
+                result['counters'] = get_counters()
+
+            yield name, result
+
+def main():
+    arguments = docopt(DOC)
+    logging.basicConfig(level=logging.WARNING)
+
+    if arguments['run']:
+        results = OrderedDict()
+
+        for name, result in run_benchmarks(
+                substring=arguments['--filter'] or '',
+                repeat=int(arguments['--repeat']),
+            ):
+            results[name] = result
+            print(
+                f'{name:<50} {format_duration(result["min"]):>12}'
+                f' (median {format_duration(result["median"])})'
+                f'{format_counters(result.get("counters", {}))}',
+                )
+
+        if arguments['--output'] is not None:
+            with open(arguments['--output'], 'w') as file_descriptor:
+                json.dump(
+                    {
+                        'created': datetime.datetime.utcnow().isoformat(),
+                        'python': platform.python_version(),
+                        'version': __version__,
+                        'results': results,
+                        },
+                    file_descriptor,
+                    indent=2,
+                    )
+    else:
+        try:
+            with open(arguments['BASELINE']) as file_descriptor:
+                baseline = json.load(file_descriptor)
+
+            with open(arguments['RESULTS']) as file_descriptor:
+                results = json.load(file_descriptor)
+        except (OSError, ValueError) as err:
+            sys.exit(f'Can\'t read results. {err}')
+
+        threshold = float(arguments['--threshold'])
+        regressions_count = 0
+
+        for name, baseline_time, time_taken, change in compare(baseline, results):
+            is_regression = change > threshold
+            regressions_count += is_regression
+            print(
+                f'{name:<50} {format_duration(baseline_time):>12} -> '
+                f'{format_duration(time_taken):>12} {change:+7.1f}%'
+                f'{" REGRESSION" if is_regression else ""}',
+                )
+
+        if regressions_count:
+            sys.exit(f'{regressions_count} regression(s) slower by more than {threshold}%')
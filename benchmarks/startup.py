@@ -0,0 +1,33 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Cold start: importing the bot's modules in a fresh interpreter."""
+
+from contextlib import contextmanager
+import subprocess
+import sys
+from .runner import benchmark
+
+MODULES = ('randtalkbot.i18n', 'randtalkbot.randtalkbot')
+# Import of `None` from `sys.modules` fails, so `randtalkbot.i18n` computes the tables.
+WITHOUT_I18N_TABLES = 'import sys; sys.modules[\'randtalkbot.i18n_tables\'] = None; '
+
+def _register_import_benchmark(module, with_i18n_tables):
+    code = f'import {module}'
+    name = f'startup.import[{module}]'
+
+    if not with_i18n_tables:
+        code = WITHOUT_I18N_TABLES + code
+        name = f'startup.import[{module}, no i18n tables]'
+
+    @benchmark(name)
+    @contextmanager
+    def import_module(): # pylint: disable=unused-variable
+        yield lambda: subprocess.run([sys.executable, '-c', code], check=True)
+
+for module_value in MODULES:
+    for with_i18n_tables_value in (True, False):
+        _register_import_benchmark(module_value, with_i18n_tables_value)
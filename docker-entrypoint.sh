@@ -1,4 +1,5 @@
 #!/usr/bin/env bash
 
 /randtalkbot-runner.py install /configuration/configuration.json
+/randtalkbot-runner.py migrate /configuration/configuration.json
 /randtalkbot-runner.py /configuration/configuration.json
@@ -0,0 +1,9 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Load generator driving the bot through the fake Telegram API of `telepot_testing`."""
+
+from .loadtest import LoadTest, main
@@ -0,0 +1,404 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""loadtest.loadtest: simulates lots of strangers chatting through the bot.
+
+Every virtual user passes the setup wizard and then does several `/begin` -> chat -> `/end`
+cycles. Telegram API is faked by `telepot_testing`, so the measured latencies include the bot's
+processing and DB queries only.
+"""
+
+import asyncio
+from contextlib import suppress
+import json
+import logging
+import math
+import random
+import secrets
+import sys
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+from docopt import docopt
+from randtalkbot.bot import Bot
+from randtalkbot.configuration import Configuration, ConfigurationObtainingError
+from randtalkbot.db import DB
+from randtalkbot.errors import DBError
+from randtalkbot.query_counter import count_queries
+from randtalkbot.stats_service import StatsService
+from randtalkbot.stranger import Stranger
+from randtalkbot.testing import initialize_sqlite_database
+from randtalkbot.waiting_pool import WaitingPool
+import telepot_testing
+from telepot_testing import add_sent_updates_listener, receive_message, \
+    remove_sent_updates_listener
+
+DOC = '''RandTalkBot load test
+
+Usage:
+  loadtest [options]
+  loadtest -h | --help
+
+Options:
+  --users=COUNT                  Virtual users count [default: 1000].
+  --cycles=COUNT                 /begin -> chat -> /end cycles per user [default: 3].
+  --messages=COUNT               Messages sent by every partner during a talk [default: 5].
+  --think-time=SECONDS           Mean pause between user's actions [default: 1].
+  --ramp-up=SECONDS              Period during which the users are started [default: 10].
+  --timeout=SECONDS              How long to wait for the bot's reply [default: 60].
+  --sqlite=PATH                  SQLite database path [default: :memory:].
+  --configuration=CONFIGURATION  Use MariaDB from configuration.json instead of SQLite.
+  --seed=SEED                    Random seed.
+  --json                         Print the report as JSON.
+'''
+FIRST_TELEGRAM_ID = 10 ** 9
+HANDLERS_TIMEOUT = 60
+LOGGER = logging.getLogger('loadtest')
+# Fragments of the bot's (translated) replies.
+LOOKING_FOR_PARTNER = 'Looking for a stranger'
+PARTNER_FOUND = 'Your partner is here'
+PARTNER_LEFT = 'Your partner has left chat'
+POLL_INTERVAL = 1
+SEARCH_STOPPED = 'Looking for partner was stopped'
+TALK_FINISHED = 'Chat was finished'
+
+def get_percentile(values, percent):
+    """Returns:
+        float: Nearest-rank percentile or `None` if there're no values.
+    """
+    if not values:
+        return None
+
+    values = sorted(values)
+    index = max(math.ceil(len(values) * percent / 100) - 1, 0)
+    return values[index]
+
+def get_summary(values):
+    return {
+        'count': len(values),
+        'p50': get_percentile(values, 50),
+        'p99': get_percentile(values, 99),
+        'max': max(values) if values else None,
+        }
+
+class VirtualUser:
+    def __init__(self, load_test, telegram_id):
+        self._load_test = load_test
+        self.telegram_id = telegram_id
+        self._inbox = asyncio.Queue()
+        self._messages_count = 0
+        self._sending_time = None
+
+    def deliver(self, text, delivery_time):
+        if self._sending_time is not None:
+            self._load_test.latencies.append(delivery_time - self._sending_time)
+            self._sending_time = None
+
+        self._inbox.put_nowait(text)
+
+    def _has_received(self, phrase):
+        """Checks the messages received so far without waiting for new ones."""
+        while not self._inbox.empty():
+            if phrase in self._inbox.get_nowait():
+                return True
+
+        return False
+
+    async def run(self):
+        if not await self._setup():
+            return
+
+        for unused_index in range(self._load_test.cycles_count):
+            await self._think()
+
+            if not await self._talk():
+                return
+
+    def _send(self, text):
+        self._sending_time = time.perf_counter()
+        self._load_test.send(self.telegram_id, text)
+
+    def _send_chat_message(self):
+        self._messages_count += 1
+        self._load_test.send_chat_message(
+            self.telegram_id,
+            f'Message #{self._messages_count} from {self.telegram_id}',
+            )
+
+    async def _setup(self):
+        steps = (
+            ('/start', 'Enumerate the languages'),
+            ('English', 'Set up your sex'),
+            ('Not specified', 'Use /begin'),
+            )
+
+        for index, (text, reply) in enumerate(steps):
+            if index:
+                await self._think()
+
+            self._send(text)
+
+            if await self._wait_for(reply) is None:
+                return False
+
+        return True
+
+    async def _talk(self):
+        """Returns:
+            bool: `False` if the user should stop.
+        """
+        begin_time = time.perf_counter()
+        self._send('/begin')
+        reply = await self._wait_for(PARTNER_FOUND, LOOKING_FOR_PARTNER)
+
+        if reply is None:
+            return False
+
+        # The user who has found the partner is the one who ends the talk.
+        is_initiator = PARTNER_FOUND in reply
+
+        if not is_initiator and \
+                await self._wait_for(PARTNER_FOUND, give_up=self._load_test.is_alone) is None:
+            self._send('/end')
+            await self._wait_for(SEARCH_STOPPED)
+            return False
+
+        self._load_test.match_times.append(time.perf_counter() - begin_time)
+
+        for unused_index in range(self._load_test.messages_count):
+            await self._think()
+
+            if not is_initiator and self._has_received(PARTNER_LEFT):
+                return True
+
+            self._send_chat_message()
+
+        if is_initiator:
+            await self._think()
+            self._send('/end')
+            return await self._wait_for(TALK_FINISHED) is not None
+
+        return await self._wait_for(PARTNER_LEFT) is not None
+
+    async def _think(self):
+        await asyncio.sleep(self._load_test.get_think_time())
+
+    async def _wait_for(self, *phrases, give_up=None):
+        """Skips the messages which contain none of the phrases.
+
+        Args:
+            give_up (callable): Is polled during waiting. Waiting stops when it returns `True`.
+
+        Returns:
+            str: Text of the awaited message or `None` if it wasn't received.
+        """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self._load_test.timeout
+
+        while True:
+            if give_up is not None and give_up():
+                return None
+
+            timeout = deadline - loop.time()
+
+            if timeout <= 0:
+                LOGGER.warning('User %d has waited for %s in vain', self.telegram_id, phrases)
+                self._load_test.timeouts_count += 1
+                return None
+
+            try:
+                text = await asyncio.wait_for(
+                    self._inbox.get(),
+                    timeout=min(timeout, POLL_INTERVAL),
+                    )
+            except asyncio.TimeoutError:
+                continue
+
+            if any(phrase in text for phrase in phrases):
+                return text
+
+class LoadTest:
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+    def __init__(
+            self,
+            users_count,
+            cycles_count=1,
+            messages_count=5,
+            think_time=1,
+            ramp_up=0,
+            timeout=60,
+            seed=None,
+        ):
+        self.users_count = users_count
+        self.cycles_count = cycles_count
+        self.messages_count = messages_count
+        self.think_time = think_time
+        self.ramp_up = ramp_up
+        self.timeout = timeout
+        self._random = random.Random(seed)
+        self.latencies = []
+        self.match_times = []
+        self.timeouts_count = 0
+        self.updates_count = 0
+        self.sent_updates_count = 0
+        self._chat_messages_sending_times = {}
+        self._users = {}
+        self._running_users_count = 0
+
+    def get_think_time(self):
+        return self._random.expovariate(1 / self.think_time) if self.think_time else 0
+
+    def is_alone(self):
+        return self._running_users_count <= 1
+
+    def _on_sent_update(self, update):
+        delivery_time = time.perf_counter()
+        self.sent_updates_count += 1
+        text = update.get('text', '')
+
+        try:
+            sending_time = self._chat_messages_sending_times.pop(text)
+        except KeyError:
+            user = self._users.get(update['chat']['id'])
+
+            if user is not None:
+                user.deliver(text, delivery_time)
+        else:
+            self.latencies.append(delivery_time - sending_time)
+
+    async def run(self):
+        """Runs the bot against virtual users. DB should be initialized already.
+
+        Returns:
+            dict: Report.
+        """
+        with patch('randtalkbot.bot.create_open', telepot_testing.aio.create_open), \
+                patch('randtalkbot.bot.telepot', telepot_testing):
+            bot = Bot(SimpleNamespace(admins_telegram_ids=[], token=None))
+
+        WaitingPool()
+        StatsService()
+        users = [VirtualUser(self, FIRST_TELEGRAM_ID + index) for index in range(self.users_count)]
+        self._users = {user.telegram_id: user for user in users}
+        self._running_users_count = len(users)
+        updates_timeout = telepot_testing.helpers.UPDATES_TIMEOUT
+        telepot_testing.helpers.UPDATES_TIMEOUT = HANDLERS_TIMEOUT
+        add_sent_updates_listener(self._on_sent_update)
+        bot_task = asyncio.get_event_loop().create_task(bot.run())
+        start_time = time.perf_counter()
+
+        try:
+            with count_queries(everywhere=True) as queries_counter:
+                await asyncio.gather(*[
+                    self._run_user(user, self._random.uniform(0, self.ramp_up))
+                    for user in users
+                    ])
+        finally:
+            duration = time.perf_counter() - start_time
+            bot_task.cancel()
+
+            with suppress(asyncio.CancelledError):
+                await bot_task
+
+            remove_sent_updates_listener(self._on_sent_update)
+            telepot_testing.helpers.UPDATES_TIMEOUT = updates_timeout
+
+        return {
+            'users': self.users_count,
+            'duration': duration,
+            'updates': self.updates_count,
+            'sent_updates': self.sent_updates_count,
+            'throughput': self.updates_count / duration if duration else None,
+            'latency': get_summary(self.latencies),
+            'match_time': get_summary(self.match_times),
+            'timeouts': self.timeouts_count,
+            'undelivered_messages': len(self._chat_messages_sending_times),
+            'queries': {
+                'reads': queries_counter.reads,
+                'writes': queries_counter.writes,
+                'others': queries_counter.others,
+                'per_update': queries_counter.count / self.updates_count
+                              if self.updates_count else None,
+                'duration': queries_counter.duration,
+                },
+            }
+
+    async def _run_user(self, user, delay):
+        await asyncio.sleep(delay)
+
+        try:
+            await user.run()
+        finally:
+            self._running_users_count -= 1
+
+    def send(self, telegram_id, text):
+        self.updates_count += 1
+        receive_message(telegram_id, text)
+
+    def send_chat_message(self, telegram_id, text):
+        self._chat_messages_sending_times[text] = time.perf_counter()
+        self.send(telegram_id, text)
+
+def format_report(report):
+    def format_duration(seconds):
+        return 'n/a' if seconds is None else f'{seconds * 1000:.1f} ms'
+
+    def format_summary(summary):
+        return f'p50 {format_duration(summary["p50"])}, p99 {format_duration(summary["p99"])},' \
+            f' max {format_duration(summary["max"])} ({summary["count"]} samples)'
+
+    queries = report['queries']
+    per_update = 'n/a' if queries['per_update'] is None else f'{queries["per_update"]:.2f}'
+    throughput = 'n/a' if report['throughput'] is None else f'{report["throughput"]:.1f}'
+    return '\n'.join((
+        f'Users: {report["users"]}. Duration: {report["duration"]:.1f} s.',
+        f'Updates: {report["updates"]} received, {report["sent_updates"]} sent.'
+        f' Throughput: {throughput} updates/s.',
+        f'Update-to-send latency: {format_summary(report["latency"])}.',
+        f'Match time: {format_summary(report["match_time"])}.',
+        f'Timeouts: {report["timeouts"]}.'
+        f' Undelivered messages: {report["undelivered_messages"]}.',
+        f'DB queries: {queries["reads"]} reads, {queries["writes"]} writes,'
+        f' {queries["others"]} others, {per_update} per update,'
+        f' {format_duration(queries["duration"])} total.',
+        ))
+
+def main():
+    arguments = docopt(DOC)
+    logging.basicConfig(level=logging.WARNING)
+
+    if arguments['--configuration'] is None:
+        initialize_sqlite_database(arguments['--sqlite'])
+        Stranger.configure_invitations(secrets.token_hex())
+    else:
+        try:
+            configuration = Configuration(arguments['--configuration'])
+        except ConfigurationObtainingError as err:
+            sys.exit(f'Can\'t obtain configuration. {err}')
+
+        try:
+            DB(configuration)
+        except DBError as err:
+            sys.exit(f'Can\'t construct DB. {err}')
+
+        Stranger.configure_invitations(configuration.token)
+
+    seed = arguments['--seed']
+    load_test = LoadTest(
+        int(arguments['--users']),
+        cycles_count=int(arguments['--cycles']),
+        messages_count=int(arguments['--messages']),
+        think_time=float(arguments['--think-time']),
+        ramp_up=float(arguments['--ramp-up']),
+        timeout=float(arguments['--timeout']),
+        seed=None if seed is None else int(seed),
+        )
+    report = asyncio.get_event_loop().run_until_complete(load_test.run())
+
+    if arguments['--json']:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
@@ -0,0 +1,315 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""queryplans.queryplans: checks that the hot DB queries are served by the indexes.
+
+Every hot query is built by the same code the bot uses and is explained with `EXPLAIN` on
+MariaDB/MySQL or `EXPLAIN QUERY PLAN` on SQLite. The check fails if the plan contains a full
+table scan, sorts the rows where the index order is expected or doesn't use any of the indexes
+expected for the query. Empty DB is seeded with random strangers and talks first.
+"""
+
+from collections import namedtuple, OrderedDict
+import datetime
+import logging
+import random
+import re
+import sys
+from docopt import docopt
+from peewee import MySQLDatabase
+from randtalkbot import stranger as stranger_module
+from randtalkbot.configuration import Configuration, ConfigurationObtainingError
+from randtalkbot.db import DB
+from randtalkbot.errors import DBError
+from randtalkbot.stats import Stats
+from randtalkbot.stranger import INVITATION_LENGTH, Stranger
+from randtalkbot.stranger_service import StrangerService
+from randtalkbot.talk import Talk
+from randtalkbot.testing import initialize_sqlite_database
+
+DOC = '''RandTalkBot query plans check
+
+Usage:
+  queryplans [options]
+  queryplans -h | --help
+
+Options:
+  --strangers=COUNT              Strangers to seed empty DB with [default: 10000].
+  --talks=COUNT                  Talks to seed empty DB with [default: 30000].
+  --sqlite=PATH                  SQLite database path [default: :memory:].
+  --configuration=CONFIGURATION  Use MariaDB from configuration.json instead of SQLite.
+  --filter=SUBSTRING             Check only the queries containing the substring in their names.
+  --seed=SEED                    Random seed [default: 0].
+'''
+HOT_QUERIES = OrderedDict()
+LOGGER = logging.getLogger('queryplans')
+SEED_CHUNK_SIZE = 50
+SEX_CHOICES = ('female', 'male', 'not_specified')
+SQLITE_STEP_RE = re.compile(
+    r'^(?P<operation>SCAN|SEARCH)(?: TABLE)? (?P<table>\S+)(?: AS \S+)?'
+    r'(?: USING (?:COVERING )?INDEX (?P<index>\S+))?',
+    )
+STRANGER_LOOKING_FOR_PARTNER_INDEX = 'stranger_looking_for_partner_from'
+STRANGER_PARTNER_SEX_INDEX = 'stranger_partner_sex_bonus_count_looking_for_partner_from'
+STRANGER_SEX_INDEX = 'stranger_sex_partner_sex_bonus_count_looking_for_partner_from'
+TALK_PARTNERS_INDEXES = ('talk_partner1_id', 'talk_partner2_id')
+# Matching orders by `bonus_count DESC, looking_for_partner_from ASC`. Ascending indexes can't
+# serve mixed directions, so the waiting strangers found through the index are sorted.
+MATCHING_FILESORT_ALLOWED = True
+
+HotQuery = namedtuple('HotQuery', ('name', 'get_query', 'indexes', 'filesort_allowed'))
+PlanStep = namedtuple('PlanStep', ('table', 'index', 'full_scan', 'filesort', 'detail'))
+
+def hot_query(name, indexes, filesort_allowed=False):
+    """Registers function building the query for the sample stranger.
+
+    Args:
+        name (str): Name of the query in the report.
+        indexes (tuple): Names of the indexes at least one of which should be used.
+        filesort_allowed (bool): Whether the rows found may be sorted without an index.
+
+    Returns:
+        callable: Decorator registering the function.
+    """
+    def decorator(get_query):
+        HOT_QUERIES[name] = HotQuery(name, get_query, frozenset(indexes), filesort_allowed)
+        return get_query
+
+    return decorator
+
+@hot_query(
+    'match_partner[sex=not_specified]',
+    (STRANGER_PARTNER_SEX_INDEX, STRANGER_LOOKING_FOR_PARTNER_INDEX),
+    filesort_allowed=MATCHING_FILESORT_ALLOWED,
+    )
+def get_any_sex_match_query(stranger):
+    return StrangerService.get_possible_partners(
+        Stranger(id=stranger.id, sex='not_specified', partner_sex='not_specified'),
+        )
+
+@hot_query(
+    'match_partner[sex=male]',
+    (STRANGER_PARTNER_SEX_INDEX, STRANGER_SEX_INDEX, STRANGER_LOOKING_FOR_PARTNER_INDEX),
+    filesort_allowed=MATCHING_FILESORT_ALLOWED,
+    )
+def get_male_match_query(stranger):
+    return StrangerService.get_possible_partners(
+        Stranger(id=stranger.id, sex='male', partner_sex='not_specified'),
+        )
+
+@hot_query(
+    'match_partner[sex=male,partner_sex=female]',
+    (STRANGER_SEX_INDEX, STRANGER_LOOKING_FOR_PARTNER_INDEX),
+    filesort_allowed=MATCHING_FILESORT_ALLOWED,
+    )
+def get_male_to_female_match_query(stranger):
+    return StrangerService.get_possible_partners(
+        Stranger(id=stranger.id, sex='male', partner_sex='female'),
+        )
+
+@hot_query('stranger_service.get_stranger', ('stranger_telegram_id', ))
+def get_stranger_query(stranger):
+    return Stranger.select().where(Stranger.telegram_id == stranger.telegram_id)
+
+# Not ended talks are the running ones only, so `talk_end` index is selective too.
+@hot_query('talk.get_talk', TALK_PARTNERS_INDEXES + ('talk_end', ))
+def get_talk_query(stranger):
+    # pylint: disable=singleton-comparison
+    return Talk.get_stranger_talks(stranger).where(Talk.end == None).limit(1)
+
+@hot_query('talk.get_last_partners_ids', TALK_PARTNERS_INDEXES)
+def get_last_partners_ids_query(stranger):
+    return Talk.get_stranger_talks(stranger)
+
+@hot_query('stats_service.last_stats', ('stats_created', ))
+def get_last_stats_query(unused_stranger):
+    return Stats.select().order_by(Stats.created.desc()).limit(1)
+
+@hot_query('stats_service.not_ended_talks', ('talk_end', ))
+def get_not_ended_talks_query(unused_stranger):
+    return Talk.get_not_ended_talks(after=datetime.datetime.utcnow())
+
+@hot_query('stats_service.ended_talks', ('talk_end', ))
+def get_ended_talks_query(unused_stranger):
+    return Talk.get_ended_talks(after=datetime.datetime.utcnow())
+
+def check(query, steps):
+    """Returns:
+        list: Descriptions of the plan's problems.
+    """
+    problems = []
+    used_indexes = set()
+
+    for step in steps:
+        if step.full_scan:
+            problems.append(f'Full scan of {step.table}')
+
+        if step.filesort and not query.filesort_allowed:
+            problems.append('Rows are sorted without an index')
+
+        if step.index:
+            # MariaDB reports indexes merged by `index_merge` comma-separated.
+            used_indexes.update(step.index.split(','))
+
+    if query.indexes and not query.indexes & used_indexes:
+        problems.append(f'None of the indexes is used: {", ".join(sorted(query.indexes))}')
+
+    return problems
+
+def explain(database, query):
+    """Returns:
+        list: `PlanStep` for every step of the query plan.
+    """
+    sql, params = query.sql()
+
+    if isinstance(database, MySQLDatabase):
+        cursor = database.execute_sql(f'EXPLAIN {sql}', params)
+        columns = [description[0] for description in cursor.description]
+        steps = []
+
+        for row in cursor.fetchall():
+            row = dict(zip(columns, row))
+            extra = row.get('Extra') or ''
+            steps.append(PlanStep(
+                table=row['table'],
+                index=row['key'],
+                full_scan=row['type'] == 'ALL',
+                filesort='Using filesort' in extra,
+                detail=f'{row["table"]}: type={row["type"]} key={row["key"]} {extra}'.strip(),
+                ))
+
+        return steps
+
+    cursor = database.execute_sql(f'EXPLAIN QUERY PLAN {sql}', params)
+    steps = []
+
+    for row in cursor.fetchall():
+        detail = row[-1]
+        match = SQLITE_STEP_RE.match(detail)
+
+        if match is None:
+            table, index, full_scan = None, None, False
+        else:
+            table, index = match.group('table', 'index')
+            full_scan = match.group('operation') == 'SCAN' and index is None and \
+                'PRIMARY KEY' not in detail
+
+        steps.append(PlanStep(
+            table=table,
+            index=index,
+            full_scan=full_scan,
+            filesort=detail.startswith('USE TEMP B-TREE FOR') and 'ORDER BY' in detail,
+            detail=detail,
+            ))
+
+    return steps
+
+def format_report(results):
+    lines = []
+
+    for name, steps, problems in results:
+        lines.append(f'{name:<50} {"FAIL" if problems else "OK"}')
+
+        for step in steps:
+            lines.append(f'    {step.detail}')
+
+        for problem in problems:
+            lines.append(f'  ! {problem}')
+
+    return '\n'.join(lines)
+
+def run(database, substring=''):
+    """Explains and checks the hot queries. DB should contain at least one stranger.
+
+    Returns:
+        list: `(name, steps, problems)` tuples.
+    """
+    stranger = Stranger.select().order_by(Stranger.id).get()
+    results = []
+
+    for name, query in HOT_QUERIES.items():
+        if substring not in name:
+            continue
+
+        steps = explain(database, query.get_query(stranger))
+        results.append((name, steps, check(query, steps)))
+
+    return results
+
+def seed(database, strangers_count, talks_count, random_instance):
+    """Fills empty DB with random strangers and talks shaped like the production ones: few
+    strangers are looking for partner and few talks aren't ended.
+    """
+    now = datetime.datetime.utcnow()
+
+    def get_datetime():
+        return now - datetime.timedelta(seconds=random_instance.randrange(30 * 24 * 60 * 60))
+
+    strangers = (
+        {
+            'bonus_count': random_instance.choice((0, 0, 0, 1, 2, 5)),
+            'invitation': f'{index:0{INVITATION_LENGTH}}',
+            'languages': '["en"]',
+            'looking_for_partner_from': get_datetime() if random_instance.random() < .05 else None,
+            'partner_sex': random_instance.choice(SEX_CHOICES),
+            'sex': random_instance.choice(SEX_CHOICES),
+            'telegram_id': index + 1,
+            }
+        for index in range(strangers_count)
+        )
+    talks = (
+        {
+            'begin': begin,
+            'end': None if random_instance.random() < .02 else begin,
+            'partner1': random_instance.randrange(strangers_count) + 1,
+            'partner2': random_instance.randrange(strangers_count) + 1,
+            'searched_since': begin,
+            }
+        for begin in (get_datetime() for unused_index in range(talks_count))
+        )
+
+    with database.atomic():
+        for model, rows in ((Stranger, strangers), (Talk, talks)):
+            rows = list(rows)
+
+            for index in range(0, len(rows), SEED_CHUNK_SIZE):
+                model.insert_many(rows[index:index + SEED_CHUNK_SIZE]).execute()
+
+        Stats.create(data_json='{}', created=now)
+
+def main():
+    arguments = docopt(DOC)
+    logging.basicConfig(level=logging.WARNING)
+
+    if arguments['--configuration'] is None:
+        database = initialize_sqlite_database(arguments['--sqlite'])
+    else:
+        try:
+            configuration = Configuration(arguments['--configuration'])
+        except ConfigurationObtainingError as err:
+            sys.exit(f'Can\'t obtain configuration. {err}')
+
+        try:
+            DB(configuration)
+        except DBError as err:
+            sys.exit(f'Can\'t construct DB. {err}')
+
+        database = stranger_module.DATABASE_PROXY.obj
+
+    if not Stranger.select().exists():
+        seed(
+            database,
+            int(arguments['--strangers']),
+            int(arguments['--talks']),
+            random.Random(int(arguments['--seed'])),
+            )
+
+    results = run(database, substring=arguments['--filter'] or '')
+    print(format_report(results))
+    problems_count = sum(len(problems) for unused_name, unused_steps, problems in results)
+
+    if problems_count:
+        sys.exit(f'{problems_count} query plan problem(s)')
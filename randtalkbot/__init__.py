@@ -3,3 +3,8 @@
 #
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import time
+
+# `randtalkbot --profile-startup` reports the time spent on modules import since this moment.
+IMPORT_TIME = time.perf_counter()
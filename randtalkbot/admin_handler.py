@@ -8,9 +8,31 @@ import logging
 import re
 from .errors import StrangerServiceError
 from .stranger_handler import StrangerHandler
+from .stranger_sender import StrangerSender
 from .stranger_service import StrangerService
+from .tracing import format_trace, TRACER
 
 LOGGER = logging.getLogger('randtalkbot.admin_handler')
+TRACES_DEFAULT_COUNT = 5
+TRACES_MAX_COUNT = 20
+# Telegram's limit is 4096 chars. Some space is left for the notification's prefix.
+TRACES_MESSAGE_MAX_LENGTH = 4000
+TRACES_TRUNCATION_MARK = '\n...'
+
+def truncate_traces(text):
+    """Cuts formatted traces by lines, so they fit the message after Markdown escaping."""
+    # pylint: disable=protected-access
+    max_length = TRACES_MESSAGE_MAX_LENGTH - len(TRACES_TRUNCATION_MARK)
+    excess = len(StrangerSender._escape_markdown(text)) - TRACES_MESSAGE_MAX_LENGTH
+
+    if excess <= 0:
+        return text
+
+    while excess > 0:
+        text = text[:len(text) - excess]
+        excess = len(StrangerSender._escape_markdown(text)) - max_length
+
+    return text.rpartition('\n')[0] + TRACES_TRUNCATION_MARK
 
 class AdminHandler(StrangerHandler):
     async def _handle_command_clear(self, message):
@@ -64,3 +86,24 @@ class AdminHandler(StrangerHandler):
         await stranger.pay(delta, match.group('gratitude'))
         await self._sender.send_notification('Success.')
         LOGGER.debug('Pay: %d -(%d)-> %d', self._stranger.id, delta, telegram_id)
+
+    async def _handle_command_traces(self, message):
+        if not TRACER.enabled:
+            await self._sender.send_notification('Tracing is disabled.')
+            return
+
+        try:
+            count = int(message.command_args)
+        except (ValueError, TypeError):
+            count = TRACES_DEFAULT_COUNT
+
+        traces = TRACER.get_slowest_traces(max(1, min(count, TRACES_MAX_COUNT)))
+
+        if not traces:
+            await self._sender.send_notification('No traces were collected yet.')
+            return
+
+        await self._sender.send_notification(
+            'Slowest traces:\n{0}',
+            truncate_traces('\n\n'.join(format_trace(trace) for trace in traces)),
+            )
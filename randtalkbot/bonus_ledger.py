@@ -0,0 +1,140 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Ledger of bonuses changes.
+
+`Stranger.bonus_count` is changed with atomic `UPDATE ... SET bonus_count = bonus_count + ?`
+statements, and every change is recorded to the ledger. Entries are buffered in memory and are
+inserted in batches: when the batch is full, periodically and on shutdown. Entries buffered by
+a crashed process are lost, so the ledger is an audit trail and `bonus_count` stays the source
+of truth. After a failed insertion the next attempts are delayed exponentially, and entries
+exceeding `MAX_SIZE` are dropped while the DB doesn't accept them.
+"""
+
+import asyncio
+import datetime
+import logging
+import time
+from peewee import CharField, DatabaseError, DateTimeField, ForeignKeyField, IntegerField, Model, \
+    Proxy
+from .metrics import REGISTRY
+from .stranger import Stranger
+
+LOGGER = logging.getLogger('randtalkbot.bonus_ledger')
+BATCH_SIZE = 100
+DATABASE_PROXY = Proxy()
+FLUSH_INTERVAL = 10
+MAX_RETRY_DELAY = 300
+MAX_SIZE = 10000
+REASON_CHOICES = (
+    ('invitation', 'Invitation'),
+    ('payment', 'Payment'),
+    ('talk', 'Talk'),
+    )
+LEDGER_ENTRIES_COUNTER = REGISTRY.counter(
+    'randtalkbot_bonus_ledger_entries_total',
+    'Bonus ledger entries by the result of their writing.',
+    ('result', ),
+    )
+
+
+class BonusLedgerEntry(Model):
+    stranger = ForeignKeyField(Stranger, related_name='bonus_ledger_entries')
+    delta = IntegerField()
+    reason = CharField(choices=REASON_CHOICES, max_length=20)
+    created = DateTimeField(default=datetime.datetime.utcnow)
+
+    class Meta:
+        database = DATABASE_PROXY
+        db_table = 'bonus_ledger'
+
+
+class BonusLedger:
+    def __init__(self, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, max_size=MAX_SIZE):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self._dropped_count = 0
+        self._entries = []
+        self._retry_at = None
+        self._retry_delay = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        self._dropped_count = 0
+        self._entries.clear()
+        self._retry_at = None
+        self._retry_delay = 0
+
+    def flush(self):
+        """Inserts buffered entries. Entries failed to be inserted are kept for the next flush,
+        which is delayed for `record()` and `run()` twice longer after every failure.
+
+        Returns:
+            int: Count of the inserted entries.
+        """
+        inserted_count = 0
+
+        while self._entries:
+            batch = self._entries[:self.batch_size]
+
+            try:
+                BonusLedgerEntry.insert_many(batch).execute()
+            except DatabaseError as err:
+                LOGGER.warning('Can\'t write %d bonus ledger entries. %s', len(batch), err)
+                LEDGER_ENTRIES_COUNTER.inc('error', amount=len(batch))
+                self._retry_delay = min(
+                    max(self._retry_delay * 2, self.flush_interval),
+                    MAX_RETRY_DELAY,
+                    )
+                self._retry_at = time.monotonic() + self._retry_delay
+                return inserted_count
+
+            del self._entries[:len(batch)]
+            inserted_count += len(batch)
+            LEDGER_ENTRIES_COUNTER.inc('written', amount=len(batch))
+
+        if self._dropped_count:
+            LOGGER.warning('%d bonus ledger entries were dropped', self._dropped_count)
+            self._dropped_count = 0
+
+        self._retry_at = None
+        self._retry_delay = 0
+        return inserted_count
+
+    def record(self, stranger, delta, reason):
+        if len(self._entries) >= self.max_size:
+            if not self._dropped_count:
+                LOGGER.warning('Bonus ledger is full. Dropping its new entries')
+
+            self._dropped_count += 1
+            LEDGER_ENTRIES_COUNTER.inc('dropped')
+            return
+
+        self._entries.append({
+            'created': datetime.datetime.utcnow(),
+            'delta': delta,
+            'reason': reason,
+            'stranger': stranger.id,
+            })
+
+        if len(self._entries) >= self.batch_size and self._is_flush_due():
+            self.flush()
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+
+            if self._is_flush_due():
+                self.flush()
+
+    def _is_flush_due(self):
+        return self._retry_at is None or self._retry_at <= time.monotonic()
+
+
+BONUS_LEDGER = BonusLedger()
@@ -4,14 +4,28 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import logging
 import telepot
 from telepot.delegate import per_from_id_in, per_from_id_except
 from telepot.aio.delegate import create_open, pave_event_space
 from .admin_handler import AdminHandler
+from .dispatcher import DISPATCHER
+from .errors import StateStoreError
+from .sharding import SHARDING
 from .stranger_handler import StrangerHandler
 
 LOGGER = logging.getLogger('randtalkbot.bot')
+GETTING_UPDATES_RETRY_INTERVAL = 1
+GETTING_UPDATES_TIMEOUT = 20
+# Keys of the updates' objects the bot handles.
+UPDATES_KEYS = (
+    'message',
+    'edited_message',
+    'callback_query',
+    'inline_query',
+    'chosen_inline_result',
+    )
 
 
 class Bot:
@@ -39,6 +53,52 @@ class Bot:
                 ],
             )
 
+    async def handle_update(self, update):
+        for key in UPDATES_KEYS:
+            try:
+                message = update[key]
+            except KeyError:
+                continue
+
+            break
+        else:
+            LOGGER.debug('Update %d of unsupported type was skipped', update['update_id'])
+            return
+
+        user_id = message.get('from', {}).get('id')
+
+        if user_id is not None and not SHARDING.owns(user_id):
+            try:
+                await SHARDING.route_update(user_id, update)
+            except StateStoreError as err:
+                LOGGER.warning('Update %d was lost. %s', update['update_id'], err)
+
+            return
+
+        # Waits here while too many updates are pending, so the next updates aren't fetched.
+        if user_id is None or await DISPATCHER.put(user_id, message):
+            self._delegator_bot.handle(message)
+
     async def run(self):
+        """Fetches updates itself instead of `message_loop()` to stop fetching them when the
+        dispatcher is full.
+        """
         LOGGER.info('Listening')
-        await self._delegator_bot.message_loop()
+        offset = None
+
+        while True:
+            try:
+                updates = await self._delegator_bot.getUpdates(
+                    offset=offset,
+                    timeout=GETTING_UPDATES_TIMEOUT,
+                    )
+            except asyncio.CancelledError:
+                raise
+            except Exception as err: # pylint: disable=broad-except
+                LOGGER.warning('Can\'t get updates. %s', err)
+                await asyncio.sleep(GETTING_UPDATES_RETRY_INTERVAL)
+                continue
+
+            for update in updates:
+                offset = update['update_id'] + 1
+                await self.handle_update(update)
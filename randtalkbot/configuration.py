@@ -57,13 +57,79 @@ class Configuration:
             if self.database_password is None:
                 self.database_password = configuration_json['database']['password']
 
+            self.database_connect_timeout = \
+                configuration_json['database'].get('connect_timeout', 20)
+
+            replica_json = configuration_json['database'].get('replica')
+            self.database_replica_host = (replica_json or {}).get('host')
+            self.database_replica_name = (replica_json or {}).get('name', self.database_name)
+            self.database_replica_user = (replica_json or {}).get('user', self.database_user)
+            self.database_replica_password = \
+                (replica_json or {}).get('password', self.database_password)
+            self.database_replica_max_lag = (replica_json or {}).get('max_lag', 60)
+
             self.logging = configuration_json['logging']
 
             if self.token is None:
                 self.token = configuration_json['token']
+
+            dispatcher_json = configuration_json.get('dispatcher', {})
+            self.dispatcher_workers_count = dispatcher_json.get('workers', 32)
+            self.dispatcher_queue_size = dispatcher_json.get('queue_size', 10000)
+            self.dispatcher_user_queue_size = dispatcher_json.get('user_queue_size', 20)
+            self.dispatcher_flood_policy = dispatcher_json.get('flood_policy', 'merge')
+
+            metrics_json = configuration_json.get('metrics', {})
+            self.metrics_host = metrics_json.get('host', '127.0.0.1')
+            self.metrics_port = metrics_json.get('port')
+
+            query_budget_json = configuration_json.get('query_budget')
+            self.query_budget_enabled = query_budget_json is not None
+            self.query_budget_reads = (query_budget_json or {}).get('reads')
+            self.query_budget_writes = (query_budget_json or {}).get('writes')
+
+            relay_json = configuration_json.get('relay', {})
+            self.relay_copy_messages = relay_json.get('copy_messages', False)
+            self.relay_chat_interval = relay_json.get('chat_interval', 0)
+            self.relay_coalesce_texts = relay_json.get('coalesce_texts', False)
+
+            sharding_json = configuration_json.get('sharding', {})
+            self.sharding_shards_count = sharding_json.get('shards', 1)
+            self.sharding_store = sharding_json.get('store', 'memory://')
+
+            self.state_backend = configuration_json.get('state_backend', 'database')
+
+            tracing_json = configuration_json.get('tracing')
+            self.tracing_enabled = tracing_json is not None
+            self.tracing_buffer_size = (tracing_json or {}).get('buffer_size', 1000)
+            self.tracing_path = (tracing_json or {}).get('path')
+
+            watchdog_json = configuration_json.get('watchdog', {})
+            self.watchdog_threshold = watchdog_json.get('threshold')
+            self.watchdog_report_interval = watchdog_json.get('report_interval', 60)
         except (KeyError, TypeError) as err:
             reason = 'Troubles with obtaining parameters'
             LOGGER.exception(reason)
             raise ConfigurationObtainingError(reason) from err
 
+        if self.dispatcher_flood_policy not in ('drop', 'merge'):
+            reason = f'Unknown flood policy: \"{self.dispatcher_flood_policy}\"'
+            LOGGER.error(reason)
+            raise ConfigurationObtainingError(reason)
+
+        if self.state_backend not in ('database', 'in_process', 'store'):
+            reason = f'Unknown state backend: \"{self.state_backend}\"'
+            LOGGER.error(reason)
+            raise ConfigurationObtainingError(reason)
+
+        if self.sharding_shards_count > 1 and self.state_backend == 'in_process':
+            reason = 'Shards can\'t use in-process state backend'
+            LOGGER.error(reason)
+            raise ConfigurationObtainingError(reason)
+
+        if self.sharding_shards_count > 1 and self.sharding_store.startswith('memory:'):
+            reason = 'Shards can\'t share in-memory state store'
+            LOGGER.error(reason)
+            raise ConfigurationObtainingError(reason)
+
         self.admins_telegram_ids = configuration_json.get('admins', [])
@@ -4,27 +4,95 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import logging
+import random
+import re
 import time
 from peewee import DatabaseError, MySQLDatabase
 from playhouse.shortcuts import RetryOperationalError
-from randtalkbot import stats, stranger, talk
-from .errors import DBError
+from randtalkbot import bonus_ledger, migrations, stats, stranger, talk
+from .bonus_ledger import BonusLedgerEntry
+from .errors import DBError, DBUnavailableError
+from .metrics import REGISTRY
+from .migrations import Migrator
+from .query_counter import is_counting, record_query
+from .replica import REPLICA
 from .stats import Stats
 from .stranger import Stranger
 from .talk import Talk
 
 LOGGER = logging.getLogger('randtalkbot.db')
+CONNECTION_INITIAL_DELAY = .1
+CONNECTION_MAX_DELAY = 2
+# MySQL errors meaning that retrying the connection is useless: access denied for user, access
+# denied to the database, unknown database.
+FATAL_CONNECTION_ERRORS_CODES = frozenset((1044, 1045, 1049, 1698))
+QUERY_HISTOGRAM = REGISTRY.histogram(
+    'randtalkbot_db_query_seconds',
+    'DB queries latency.',
+    ('operation', 'table'),
+    )
+QUERY_RE = re.compile(
+    r'^\s*(?P<operation>\w+)\s+(?:.*?\b(?:FROM|INTO)\s+)?[`"]?(?P<table>\w+)',
+    re.IGNORECASE | re.DOTALL,
+    )
 
-class RetryingDB(RetryOperationalError, MySQLDatabase):
+def get_query_labels(sql):
+    """Returns:
+        tuple: Operation and table name of the SQL query.
+    """
+    match = QUERY_RE.match(sql)
+
+    if match is None:
+        return sql.split(None, 1)[0].upper() if sql.strip() else '', ''
+
+    return match.group('operation').upper(), match.group('table')
+
+def get_error_code(err):
+    """Returns:
+        int: MySQL error code of the exception or `None`. peewee keeps driver exception's args.
+    """
+    try:
+        error_code = err.args[0]
+    except IndexError:
+        return None
+
+    return error_code if isinstance(error_code, int) else None
+
+class InstrumentedDatabaseMixin:
+    """Measures latency of every query executed through the database and reports queries to the
+    active query counters.
+    """
+
+    def execute_sql(self, sql, params=None, require_commit=True):
+        if not REGISTRY.enabled and not is_counting():
+            return super(InstrumentedDatabaseMixin, self).execute_sql(sql, params, require_commit)
+
+        operation, table = get_query_labels(sql)
+        start_time = time.perf_counter()
+
+        try:
+            return super(InstrumentedDatabaseMixin, self).execute_sql(sql, params, require_commit)
+        finally:
+            duration = time.perf_counter() - start_time
+            QUERY_HISTOGRAM.observe(duration, operation, table)
+            record_query(sql, operation, duration)
+
+class RetryingDB(InstrumentedDatabaseMixin, RetryOperationalError, MySQLDatabase):
     """Automatically reconnecting database class.
     @see http://docs.peewee-orm.com/en/latest/peewee/database.html#automatic-reconnect
     """
     pass
 
 class DB:
-    def __init__(self, configuration):
-        """Raises:
+    def __init__(self, configuration, check_connection=True):
+        """Args:
+            configuration (Configuration): Database connection settings.
+            check_connection (bool): Whether to wait for the DB blocking the thread. Pass `False`
+                to await `assert_configuration_ok_async()` instead.
+
+        Raises:
             DBError: If there're some troubles during connection to the DB.
 
         """
@@ -34,7 +102,25 @@ class DB:
             user=configuration.database_user,
             password=configuration.database_password,
             )
-        self._assert_configuration_ok()
+        self._connect_timeout = configuration.database_connect_timeout
+
+        if check_connection:
+            self._assert_configuration_ok()
+
+        # Replica's availability isn't checked: analytic queries fall back to the primary.
+        if configuration.database_replica_host is not None:
+            REPLICA.configure(
+                RetryingDB(
+                    configuration.database_replica_name,
+                    host=configuration.database_replica_host,
+                    user=configuration.database_replica_user,
+                    password=configuration.database_replica_password,
+                    ),
+                max_lag=configuration.database_replica_max_lag,
+                )
+
+        bonus_ledger.DATABASE_PROXY.initialize(self._db)
+        migrations.DATABASE_PROXY.initialize(self._db)
         stats.DATABASE_PROXY.initialize(self._db)
         stranger.DATABASE_PROXY.initialize(self._db)
         talk.DATABASE_PROXY.initialize(self._db)
@@ -46,27 +132,67 @@ class DB:
             DBError: If there're some troubles during connection to the DB.
 
         """
-        attempts_count = 10
+        for delay in self._get_connection_delays():
+            time.sleep(delay)
+
+    async def assert_configuration_ok_async(self):
+        """The same as `_assert_configuration_ok()` but doesn't block the event loop between the
+        attempts.
+
+        Raises:
+            DBError: If there're some troubles during connection to the DB.
+
+        """
+        for delay in self._get_connection_delays():
+            await asyncio.sleep(delay)
+
+    def _get_connection_delays(self):
+        """Tries to connect to the DB until success, fatal error or `connect_timeout` expiration.
+
+        Yields:
+            float: Delay to wait before the next attempt. Delays grow exponentially with "full
+                jitter", so restarted processes don't hammer the DB simultaneously.
+
+        Raises:
+            DBError: If the DB has rejected the configuration.
+            DBUnavailableError: If the DB hasn't become available before the deadline.
+
+        """
+        deadline = time.monotonic() + self._connect_timeout
         attempt_index = 0
 
         while True:
             try:
                 self._db.connect()
             except DatabaseError as err:
-                if attempt_index < attempts_count:
-                    delay = 2
-                    LOGGER.debug(
-                        'Attempt #%d to connect to DB was unsuccessful. Will sleep %f sec. %s',
-                        attempt_index,
-                        delay,
-                        err,
-                        )
-                    time.sleep(delay)
-                else:
-                    raise DBError('DatabaseError during connecting to database') from err
+                error_code = get_error_code(err)
+
+                if error_code in FATAL_CONNECTION_ERRORS_CODES:
+                    raise DBError(f'DB has rejected the configuration: {err}') from err
+
+                remaining_time = deadline - time.monotonic()
+
+                if remaining_time <= 0:
+                    raise DBUnavailableError(
+                        f'DB is unavailable after {attempt_index + 1} attempts: {err}',
+                        ) from err
+
+                max_delay = min(
+                    CONNECTION_MAX_DELAY,
+                    CONNECTION_INITIAL_DELAY * 2 ** attempt_index,
+                    remaining_time,
+                    )
+                delay = random.uniform(0, max_delay)
+                LOGGER.debug(
+                    'Attempt #%d to connect to DB was unsuccessful. Will sleep %f sec. %s',
+                    attempt_index,
+                    delay,
+                    err,
+                    )
+                yield delay
             else:
                 self._db.close()
-                break
+                return
 
             attempt_index += 1
 
@@ -76,6 +202,25 @@ class DB:
 
         """
         try:
-            self._db.create_tables([Stats, Stranger, Talk])
+            self._db.create_tables([Stats, Stranger, Talk, BonusLedgerEntry])
+            Migrator(self._db).stamp()
         except DatabaseError as err:
             raise DBError('DatabaseError during creating tables') from err
+
+    def migrate(self, dry_run=False):
+        """Applies pending schema migrations.
+
+        Args:
+            dry_run (bool): Don't change the DB, just report what would be done.
+
+        Returns:
+            list: Pairs of applied migration and its SQL statements.
+
+        Raises:
+            DBError: If there're some troubles during migrating.
+
+        """
+        try:
+            return Migrator(self._db).migrate(dry_run=dry_run)
+        except DatabaseError as err:
+            raise DBError('DatabaseError during migrating') from err
@@ -0,0 +1,197 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Admission control of updates passed to the per-user handlers.
+
+Every user's handler processes its updates one by one in the order of arrival, so every user
+has FIFO queue of pending updates. `Dispatcher` keeps track of these queues:
+
+* Not more than `workers_count` handlers process updates simultaneously.
+* When the total count of pending updates reaches `queue_size`, `Dispatcher.put()` waits until
+  some update gets processed, so the bot stops fetching new updates from Telegram.
+* When some user's queue reaches `user_queue_size`, the flood policy is applied to the new
+  update: `drop` discards it, `merge` discards it only if the same text or inline query is
+  pending already (so it will be answered anyway) and accepts it otherwise.
+"""
+
+import asyncio
+from collections import deque
+import logging
+from .metrics import REGISTRY
+
+LOGGER = logging.getLogger('randtalkbot.dispatcher')
+FLOOD_POLICIES = ('drop', 'merge')
+BUSY_WORKERS_GAUGE = REGISTRY.gauge(
+    'randtalkbot_dispatcher_busy_workers',
+    'Handlers processing updates at the moment.',
+    )
+FLOOD_UPDATES_COUNTER = REGISTRY.counter(
+    'randtalkbot_dispatcher_flood_updates_total',
+    'Updates discarded because of the users\' queues overflow.',
+    ('action', ),
+    )
+MAX_USER_QUEUE_DEPTH_GAUGE = REGISTRY.gauge(
+    'randtalkbot_dispatcher_max_user_queue_depth',
+    'Pending updates count of the most loaded user.',
+    )
+PENDING_UPDATES_GAUGE = REGISTRY.gauge(
+    'randtalkbot_dispatcher_pending_updates',
+    'Updates accepted but not processed yet.',
+    )
+QUEUE_FULL_COUNTER = REGISTRY.counter(
+    'randtalkbot_dispatcher_queue_full_total',
+    'Times the bot has stopped fetching updates because of too many pending ones.',
+    )
+
+
+def get_merge_key(update):
+    """Returns:
+        tuple: Updates with equal keys are answered equally. `None` for the updates which can't
+            be merged.
+    """
+    if 'query' in update and 'offset' in update:
+        return ('inline_query', )
+
+    text = update.get('text')
+    return None if text is None else ('text', text)
+
+
+class Dispatcher:
+    WORKERS_COUNT = 32
+    QUEUE_SIZE = 10000
+    USER_QUEUE_SIZE = 20
+
+    def __init__(self):
+        self.workers_count = None
+        self.queue_size = None
+        self.user_queue_size = None
+        self.flood_policy = None
+        self._workers = None
+        self._busy_workers_count = 0
+        self._pending_count = 0
+        self._has_room = None
+        # User ID -> deque of pending updates' merge keys.
+        self._queues = {}
+        self.configure()
+
+    def configure(
+            self,
+            workers_count=WORKERS_COUNT,
+            queue_size=QUEUE_SIZE,
+            user_queue_size=USER_QUEUE_SIZE,
+            flood_policy='merge',
+        ):
+        if flood_policy not in FLOOD_POLICIES:
+            raise ValueError(f'Unknown flood policy: {flood_policy}')
+
+        self.workers_count = workers_count
+        self.queue_size = queue_size
+        self.user_queue_size = user_queue_size
+        self.flood_policy = flood_policy
+        # Is created lazily to be bound to the running event loop.
+        self._workers = None
+
+    def clear(self):
+        self._queues.clear()
+        self._pending_count = 0
+        self._busy_workers_count = 0
+        self._workers = None
+        self._has_room = None
+
+    def forget(self, user_id):
+        """Is called when user's handler is closed: its pending updates won't be processed."""
+        try:
+            queue = self._queues.pop(user_id)
+        except KeyError:
+            return
+
+        self._pending_count -= len(queue)
+        self._notify_room()
+
+    def get_busy_workers_count(self):
+        return self._busy_workers_count
+
+    def get_max_user_queue_depth(self):
+        return max((len(queue) for queue in self._queues.values()), default=0)
+
+    def get_pending_count(self):
+        return self._pending_count
+
+    def _notify_room(self):
+        if self._has_room is not None and self._pending_count < self.queue_size:
+            self._has_room.set()
+
+    async def put(self, user_id, update):
+        """Registers the update in the user's queue, waiting while the total queue is full.
+
+        Returns:
+            bool: `False` if the update was discarded by the flood policy.
+        """
+        queue = self._queues.get(user_id)
+
+        if queue is not None and len(queue) >= self.user_queue_size:
+            if self.flood_policy == 'drop':
+                FLOOD_UPDATES_COUNTER.inc('dropped')
+                LOGGER.info('Update from %d was dropped: too many pending updates', user_id)
+                return False
+
+            merge_key = get_merge_key(update)
+
+            if merge_key is not None and merge_key in queue:
+                FLOOD_UPDATES_COUNTER.inc('merged')
+                LOGGER.debug('Update from %d was merged with the pending one', user_id)
+                return False
+
+        if self._pending_count >= self.queue_size:
+            QUEUE_FULL_COUNTER.inc()
+            LOGGER.warning('%d updates are pending. Waiting for them', self._pending_count)
+
+            if self._has_room is None:
+                self._has_room = asyncio.Event()
+
+            while self._pending_count >= self.queue_size:
+                self._has_room.clear()
+                await self._has_room.wait()
+
+        # The user's queue could be forgotten while we were waiting.
+        self._queues.setdefault(user_id, deque()).append(get_merge_key(update))
+        self._pending_count += 1
+        return True
+
+    def _task_done(self, user_id):
+        queue = self._queues.get(user_id)
+
+        if not queue:
+            return
+
+        queue.popleft()
+        self._pending_count -= 1
+
+        if not queue:
+            del self._queues[user_id]
+
+        self._notify_room()
+
+    async def process(self, user_id, coroutine):
+        """Runs the coroutine processing user's oldest pending update when some worker is
+        available.
+        """
+        if self._workers is None:
+            self._workers = asyncio.Semaphore(self.workers_count)
+
+        try:
+            async with self._workers:
+                self._busy_workers_count += 1
+
+                try:
+                    return await coroutine
+                finally:
+                    self._busy_workers_count -= 1
+        finally:
+            self._task_done(user_id)
+
+
+DISPATCHER = Dispatcher()
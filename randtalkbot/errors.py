@@ -7,6 +7,9 @@
 class DBError(Exception):
     pass
 
+class DBUnavailableError(DBError):
+    pass
+
 class EmptyLanguagesError(Exception):
     pass
 
@@ -26,6 +29,9 @@ class SexError(Exception):
             )
         self.name = sex
 
+class StateStoreError(Exception):
+    pass
+
 class StrangerError(Exception):
     pass
 
@@ -8,7 +8,7 @@ from collections import OrderedDict
 import gettext
 import logging
 import os
-import pycountry
+import pprint
 from .utils import LOCALE_DIR
 
 LOGGER = logging.getLogger('randtalkbot.i18n')
@@ -99,9 +99,94 @@ def get_translation(languages):
     return translation_instance.gettext
 
 def get_translations():
-    for filename in os.listdir(LOCALE_DIR):
-        if os.path.isdir(os.path.join(LOCALE_DIR, filename)):
-            yield get_translation([filename])
+    for locale in _get_locales():
+        yield get_translation([locale])
+
+def get_all_translations(message):
+    """Looks up precomputed tables first. The messages are remembered to be precomputed by
+    `get_tables_source()`.
+
+    Returns:
+        tuple<str>: Lowercased translations of the message to every bot's language.
+    """
+    TRANSLATED_MESSAGES.add(message)
+
+    try:
+        return _TRANSLATIONS[message]
+    except KeyError:
+        translations = _translate_everywhere(message)
+        _TRANSLATIONS[message] = translations
+        return translations
+
+def get_tables_source():
+    """Computes the lookup tables from scratch. Is used at build time by `setup.py i18n_tables`.
+
+    Returns:
+        str: Source of `randtalkbot.i18n_tables` module.
+    """
+    names_to_codes, codes_to_names = _get_languages_tables()
+    translations = {message: _translate_everywhere(message) for message in TRANSLATED_MESSAGES}
+    return TABLES_TEMPLATE.format(
+        locales=pprint.pformat(tuple(_get_locales()), width=100),
+        codes_to_names=pprint.pformat(codes_to_names, width=100),
+        names_to_codes=pprint.pformat(names_to_codes, width=100),
+        translations=pprint.pformat(translations, width=100),
+        )
+
+def _get_languages_tables():
+    """Is slow: loads the whole ISO 639 database.
+
+    Returns:
+        tuple: Languages' names to codes and codes to names dicts.
+    """
+    import pycountry
+
+    names_to_codes = {name.lower(): code for code, name in SUPPORTED_LANGUAGES_NAMES_CHOICES}
+    codes_to_names = {code.lower(): name for code, name in SUPPORTED_LANGUAGES_NAMES_CHOICES}
+
+    for language in pycountry.languages:
+        try:
+            names_to_codes[language.name.lower()] = language.iso639_1_code
+            names_to_codes[language.iso639_1_code] = language.iso639_1_code
+            # Not override previosly specified native name.
+            if language.iso639_1_code not in codes_to_names:
+                codes_to_names[language.iso639_1_code] = language.name
+        # If it has'n even simplest fields, that's not the languages we are interested in.
+        except AttributeError:
+            continue
+        try:
+            names_to_codes[language.iso639_2T_code] = language.iso639_1_code
+        except AttributeError:
+            pass
+
+    return names_to_codes, codes_to_names
+
+def _get_locales():
+    return sorted(
+        filename
+        for filename in os.listdir(LOCALE_DIR)
+        if os.path.isdir(os.path.join(LOCALE_DIR, filename))
+        )
+
+def _load_tables():
+    """Returns:
+        module: `randtalkbot.i18n_tables` or `None` if the tables weren't generated or are
+            outdated.
+    """
+    try:
+        from . import i18n_tables
+    except ImportError:
+        LOGGER.info('i18n tables weren\'t generated. Run `setup.py i18n_tables`')
+        return None
+
+    if list(i18n_tables.LOCALES) != _get_locales():
+        LOGGER.warning('i18n tables are outdated. Run `setup.py i18n_tables`')
+        return None
+
+    return i18n_tables
+
+def _translate_everywhere(message):
+    return tuple(sorted({translation(message).lower() for translation in get_translations()}))
 
 SUPPORTED_LANGUAGES_NAMES_CHOICES = (
     ('en', 'English'),
@@ -113,27 +198,33 @@ SUPPORTED_LANGUAGES_NAMES_CHOICES = (
     ('es', 'Español'),
     ('pt', 'Português'),
     )
-LANGUAGES_CODES_TO_NAMES = \
-    {item[0].lower(): item[1] for item in SUPPORTED_LANGUAGES_NAMES_CHOICES}
 SUPPORTED_LANGUAGES_NAMES = list(zip(*SUPPORTED_LANGUAGES_NAMES_CHOICES))[1]
-LANGUAGES_NAMES_TO_CODES = \
-    {item[1].lower(): item[0] for item in SUPPORTED_LANGUAGES_NAMES_CHOICES}
-SAME_LANGUAGE_NAMES = []
-for translation in get_translations():
-    SAME_LANGUAGE_NAMES.append(translation('Leave the language unchanged').lower())
-    SAME_LANGUAGE_NAMES.append(translation('Leave the languages unchanged').lower())
-
-for language in pycountry.languages:
-    try:
-        LANGUAGES_NAMES_TO_CODES[language.name.lower()] = language.iso639_1_code
-        LANGUAGES_NAMES_TO_CODES[language.iso639_1_code] = language.iso639_1_code
-        # Not override previosly specified native name.
-        if language.iso639_1_code not in LANGUAGES_CODES_TO_NAMES:
-            LANGUAGES_CODES_TO_NAMES[language.iso639_1_code] = language.name
-    # If it has'n even simplest fields, that's not the languages we are interested in.
-    except AttributeError:
-        continue
-    try:
-        LANGUAGES_NAMES_TO_CODES[language.iso639_2T_code] = language.iso639_1_code
-    except AttributeError:
-        pass
+TABLES_TEMPLATE = \
+'''# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Lookup tables of `randtalkbot.i18n`. Generated by `setup.py i18n_tables`, don't edit."""
+
+# pylint: skip-file
+
+LOCALES = {locales}
+LANGUAGES_CODES_TO_NAMES = {codes_to_names}
+LANGUAGES_NAMES_TO_CODES = {names_to_codes}
+TRANSLATIONS = {translations}
+'''
+TRANSLATED_MESSAGES = set()
+_TABLES = _load_tables()
+
+if _TABLES is None:
+    LANGUAGES_NAMES_TO_CODES, LANGUAGES_CODES_TO_NAMES = _get_languages_tables()
+    _TRANSLATIONS = {}
+else:
+    LANGUAGES_NAMES_TO_CODES = _TABLES.LANGUAGES_NAMES_TO_CODES
+    LANGUAGES_CODES_TO_NAMES = _TABLES.LANGUAGES_CODES_TO_NAMES
+    _TRANSLATIONS = dict(_TABLES.TRANSLATIONS)
+
+SAME_LANGUAGE_NAMES = get_all_translations('Leave the language unchanged') + \
+    get_all_translations('Leave the languages unchanged')
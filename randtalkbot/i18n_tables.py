@@ -0,0 +1,773 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Lookup tables of `randtalkbot.i18n`. Generated by `setup.py i18n_tables`, don't edit."""
+
+# pylint: skip-file
+
+LOCALES = ('de', 'en', 'es', 'it', 'ru')
+LANGUAGES_CODES_TO_NAMES = {'aa': 'Afar',
+ 'ab': 'Abkhazian',
+ 'ae': 'Avestan',
+ 'af': 'Afrikaans',
+ 'ak': 'Akan',
+ 'am': 'Amharic',
+ 'an': 'Aragonese',
+ 'ar': 'Arabic',
+ 'as': 'Assamese',
+ 'av': 'Avaric',
+ 'ay': 'Aymara',
+ 'az': 'Azerbaijani',
+ 'ba': 'Bashkir',
+ 'be': 'Belarusian',
+ 'bg': 'Bulgarian',
+ 'bi': 'Bislama',
+ 'bm': 'Bambara',
+ 'bn': 'Bengali',
+ 'bo': 'Tibetan',
+ 'br': 'Breton',
+ 'bs': 'Bosnian',
+ 'ca': 'Catalan',
+ 'ce': 'Chechen',
+ 'ch': 'Chamorro',
+ 'co': 'Corsican',
+ 'cr': 'Cree',
+ 'cs': 'Czech',
+ 'cu': 'Slavic, Church',
+ 'cv': 'Chuvash',
+ 'cy': 'Welsh',
+ 'da': 'Danish',
+ 'de': 'Deutsch',
+ 'dv': 'Dhivehi',
+ 'dz': 'Dzongkha',
+ 'ee': 'Ewe',
+ 'el': 'Greek, Modern (1453-)',
+ 'en': 'English',
+ 'eo': 'Esperanto',
+ 'es': 'Español',
+ 'et': 'Estonian',
+ 'eu': 'Basque',
+ 'fa': 'فارسی',
+ 'ff': 'Fulah',
+ 'fi': 'Finnish',
+ 'fj': 'Fijian',
+ 'fo': 'Faroese',
+ 'fr': 'French',
+ 'fy': 'Frisian, Western',
+ 'ga': 'Irish',
+ 'gd': 'Gaelic, Scottish',
+ 'gl': 'Galician',
+ 'gn': 'Guarani',
+ 'gu': 'Gujarati',
+ 'gv': 'Manx',
+ 'ha': 'Hausa',
+ 'he': 'Hebrew',
+ 'hi': 'Hindi',
+ 'ho': 'Hiri Motu',
+ 'hr': 'Croatian',
+ 'ht': 'Haitian',
+ 'hu': 'Hungarian',
+ 'hy': 'Armenian',
+ 'hz': 'Herero',
+ 'ia': 'Interlingua (International Auxiliary Language Association)',
+ 'id': 'Indonesian',
+ 'ie': 'Interlingue',
+ 'ig': 'Igbo',
+ 'ii': 'Yi, Sichuan',
+ 'ik': 'Inupiaq',
+ 'io': 'Ido',
+ 'is': 'Icelandic',
+ 'it': 'Italiano',
+ 'iu': 'Inuktitut',
+ 'ja': 'Japanese',
+ 'jv': 'Javanese',
+ 'ka': 'Georgian',
+ 'kg': 'Kongo',
+ 'ki': 'Kikuyu',
+ 'kj': 'Kuanyama',
+ 'kk': 'Kazakh',
+ 'kl': 'Kalaallisut',
+ 'km': 'Khmer, Central',
+ 'kn': 'Kannada',
+ 'ko': 'Korean',
+ 'kr': 'Kanuri',
+ 'ks': 'Kashmiri',
+ 'ku': 'Kurdish',
+ 'kv': 'Komi',
+ 'kw': 'Cornish',
+ 'ky': 'Kirghiz',
+ 'la': 'Latin',
+ 'lb': 'Luxembourgish',
+ 'lg': 'Ganda',
+ 'li': 'Limburgan',
+ 'ln': 'Lingala',
+ 'lo': 'Lao',
+ 'lt': 'Lithuanian',
+ 'lu': 'Luba-Katanga',
+ 'lv': 'Latvian',
+ 'mg': 'Malagasy',
+ 'mh': 'Marshallese',
+ 'mi': 'Maori',
+ 'mk': 'Macedonian',
+ 'ml': 'Malayalam',
+ 'mn': 'Mongolian',
+ 'mr': 'Marathi',
+ 'ms': 'Malay (macrolanguage)',
+ 'mt': 'Maltese',
+ 'my': 'Burmese',
+ 'na': 'Nauru',
+ 'nb': 'Norwegian Bokmål',
+ 'nd': 'Ndebele, North',
+ 'ne': 'Nepali (macrolanguage)',
+ 'ng': 'Ndonga',
+ 'nl': 'Dutch',
+ 'nn': 'Norwegian Nynorsk',
+ 'no': 'Norwegian',
+ 'nr': 'Ndebele, South',
+ 'nv': 'Navajo',
+ 'ny': 'Nyanja',
+ 'oc': 'Occitan (post 1500)',
+ 'oj': 'Ojibwa',
+ 'om': 'Oromo',
+ 'or': 'Oriya (macrolanguage)',
+ 'os': 'Ossetian',
+ 'pa': 'Panjabi',
+ 'pi': 'Pali',
+ 'pl': 'Polish',
+ 'ps': 'Pushto',
+ 'pt': 'Português',
+ 'qu': 'Quechua',
+ 'rm': 'Romansh',
+ 'rn': 'Rundi',
+ 'ro': 'Romanian',
+ 'ru': 'Русский',
+ 'rw': 'Kinyarwanda',
+ 'sa': 'Sanskrit',
+ 'sc': 'Sardinian',
+ 'sd': 'Sindhi',
+ 'se': 'Sami, Northern',
+ 'sg': 'Sango',
+ 'sh': 'Serbo-Croatian',
+ 'si': 'Sinhala',
+ 'sk': 'Slovak',
+ 'sl': 'Slovenian',
+ 'sm': 'Samoan',
+ 'sn': 'Shona',
+ 'so': 'Somali',
+ 'sq': 'Albanian',
+ 'sr': 'Serbian',
+ 'ss': 'Swati',
+ 'st': 'Sotho, Southern',
+ 'su': 'Sundanese',
+ 'sv': 'Swedish',
+ 'sw': 'Swahili (macrolanguage)',
+ 'ta': 'Tamil',
+ 'te': 'Telugu',
+ 'tg': 'Tajik',
+ 'th': 'Thai',
+ 'ti': 'Tigrinya',
+ 'tk': 'Turkmen',
+ 'tl': 'Tagalog',
+ 'tn': 'Tswana',
+ 'to': 'Tonga (Tonga Islands)',
+ 'tr': 'Turkish',
+ 'ts': 'Tsonga',
+ 'tt': 'Tatar',
+ 'tw': 'Twi',
+ 'ty': 'Tahitian',
+ 'ug': 'Uighur',
+ 'uk': 'Ukrainian',
+ 'ur': 'Urdu',
+ 'uz': 'Uzbek',
+ 've': 'Venda',
+ 'vi': 'Vietnamese',
+ 'vo': 'Volapük',
+ 'wa': 'Walloon',
+ 'wo': 'Wolof',
+ 'xh': 'Xhosa',
+ 'yi': 'Yiddish',
+ 'yo': 'Yoruba',
+ 'za': 'Zhuang',
+ 'zh': 'Chinese',
+ 'zu': 'Zulu'}
+LANGUAGES_NAMES_TO_CODES = {'aa': 'aa',
+ 'aar': 'aa',
+ 'ab': 'ab',
+ 'abk': 'ab',
+ 'abkhazian': 'ab',
+ 'ae': 'ae',
+ 'af': 'af',
+ 'afar': 'aa',
+ 'afr': 'af',
+ 'afrikaans': 'af',
+ 'ak': 'ak',
+ 'aka': 'ak',
+ 'akan': 'ak',
+ 'albanian': 'sq',
+ 'am': 'am',
+ 'amh': 'am',
+ 'amharic': 'am',
+ 'an': 'an',
+ 'ar': 'ar',
+ 'ara': 'ar',
+ 'arabic': 'ar',
+ 'aragonese': 'an',
+ 'arg': 'an',
+ 'armenian': 'hy',
+ 'as': 'as',
+ 'asm': 'as',
+ 'assamese': 'as',
+ 'av': 'av',
+ 'ava': 'av',
+ 'avaric': 'av',
+ 'ave': 'ae',
+ 'avestan': 'ae',
+ 'ay': 'ay',
+ 'aym': 'ay',
+ 'aymara': 'ay',
+ 'az': 'az',
+ 'aze': 'az',
+ 'azerbaijani': 'az',
+ 'ba': 'ba',
+ 'bak': 'ba',
+ 'bam': 'bm',
+ 'bambara': 'bm',
+ 'bashkir': 'ba',
+ 'basque': 'eu',
+ 'be': 'be',
+ 'bel': 'be',
+ 'belarusian': 'be',
+ 'ben': 'bn',
+ 'bengali': 'bn',
+ 'bg': 'bg',
+ 'bi': 'bi',
+ 'bis': 'bi',
+ 'bislama': 'bi',
+ 'bm': 'bm',
+ 'bn': 'bn',
+ 'bo': 'bo',
+ 'bod': 'bo',
+ 'bos': 'bs',
+ 'bosnian': 'bs',
+ 'br': 'br',
+ 'bre': 'br',
+ 'breton': 'br',
+ 'bs': 'bs',
+ 'bul': 'bg',
+ 'bulgarian': 'bg',
+ 'burmese': 'my',
+ 'ca': 'ca',
+ 'cat': 'ca',
+ 'catalan': 'ca',
+ 'ce': 'ce',
+ 'ces': 'cs',
+ 'ch': 'ch',
+ 'cha': 'ch',
+ 'chamorro': 'ch',
+ 'che': 'ce',
+ 'chechen': 'ce',
+ 'chinese': 'zh',
+ 'chu': 'cu',
+ 'chuvash': 'cv',
+ 'chv': 'cv',
+ 'co': 'co',
+ 'cor': 'kw',
+ 'cornish': 'kw',
+ 'corsican': 'co',
+ 'cos': 'co',
+ 'cr': 'cr',
+ 'cre': 'cr',
+ 'cree': 'cr',
+ 'croatian': 'hr',
+ 'cs': 'cs',
+ 'cu': 'cu',
+ 'cv': 'cv',
+ 'cy': 'cy',
+ 'cym': 'cy',
+ 'czech': 'cs',
+ 'da': 'da',
+ 'dan': 'da',
+ 'danish': 'da',
+ 'de': 'de',
+ 'deu': 'de',
+ 'deutsch': 'de',
+ 'dhivehi': 'dv',
+ 'div': 'dv',
+ 'dutch': 'nl',
+ 'dv': 'dv',
+ 'dz': 'dz',
+ 'dzo': 'dz',
+ 'dzongkha': 'dz',
+ 'ee': 'ee',
+ 'el': 'el',
+ 'ell': 'el',
+ 'en': 'en',
+ 'eng': 'en',
+ 'english': 'en',
+ 'eo': 'eo',
+ 'epo': 'eo',
+ 'es': 'es',
+ 'español': 'es',
+ 'esperanto': 'eo',
+ 'est': 'et',
+ 'estonian': 'et',
+ 'et': 'et',
+ 'eu': 'eu',
+ 'eus': 'eu',
+ 'ewe': 'ee',
+ 'fa': 'fa',
+ 'fao': 'fo',
+ 'faroese': 'fo',
+ 'fas': 'fa',
+ 'ff': 'ff',
+ 'fi': 'fi',
+ 'fij': 'fj',
+ 'fijian': 'fj',
+ 'fin': 'fi',
+ 'finnish': 'fi',
+ 'fj': 'fj',
+ 'fo': 'fo',
+ 'fr': 'fr',
+ 'fra': 'fr',
+ 'french': 'fr',
+ 'frisian, western': 'fy',
+ 'fry': 'fy',
+ 'ful': 'ff',
+ 'fulah': 'ff',
+ 'fy': 'fy',
+ 'ga': 'ga',
+ 'gaelic, scottish': 'gd',
+ 'galician': 'gl',
+ 'ganda': 'lg',
+ 'gd': 'gd',
+ 'georgian': 'ka',
+ 'german': 'de',
+ 'gl': 'gl',
+ 'gla': 'gd',
+ 'gle': 'ga',
+ 'glg': 'gl',
+ 'glv': 'gv',
+ 'gn': 'gn',
+ 'greek, modern (1453-)': 'el',
+ 'grn': 'gn',
+ 'gu': 'gu',
+ 'guarani': 'gn',
+ 'guj': 'gu',
+ 'gujarati': 'gu',
+ 'gv': 'gv',
+ 'ha': 'ha',
+ 'haitian': 'ht',
+ 'hat': 'ht',
+ 'hau': 'ha',
+ 'hausa': 'ha',
+ 'he': 'he',
+ 'heb': 'he',
+ 'hebrew': 'he',
+ 'her': 'hz',
+ 'herero': 'hz',
+ 'hi': 'hi',
+ 'hin': 'hi',
+ 'hindi': 'hi',
+ 'hiri motu': 'ho',
+ 'hmo': 'ho',
+ 'ho': 'ho',
+ 'hr': 'hr',
+ 'hrv': 'hr',
+ 'ht': 'ht',
+ 'hu': 'hu',
+ 'hun': 'hu',
+ 'hungarian': 'hu',
+ 'hy': 'hy',
+ 'hye': 'hy',
+ 'hz': 'hz',
+ 'ia': 'ia',
+ 'ibo': 'ig',
+ 'icelandic': 'is',
+ 'id': 'id',
+ 'ido': 'io',
+ 'ie': 'ie',
+ 'ig': 'ig',
+ 'igbo': 'ig',
+ 'ii': 'ii',
+ 'iii': 'ii',
+ 'ik': 'ik',
+ 'iku': 'iu',
+ 'ile': 'ie',
+ 'ina': 'ia',
+ 'ind': 'id',
+ 'indonesian': 'id',
+ 'interlingua (international auxiliary language association)': 'ia',
+ 'interlingue': 'ie',
+ 'inuktitut': 'iu',
+ 'inupiaq': 'ik',
+ 'io': 'io',
+ 'ipk': 'ik',
+ 'irish': 'ga',
+ 'is': 'is',
+ 'isl': 'is',
+ 'it': 'it',
+ 'ita': 'it',
+ 'italian': 'it',
+ 'italiano': 'it',
+ 'iu': 'iu',
+ 'ja': 'ja',
+ 'japanese': 'ja',
+ 'jav': 'jv',
+ 'javanese': 'jv',
+ 'jpn': 'ja',
+ 'jv': 'jv',
+ 'ka': 'ka',
+ 'kal': 'kl',
+ 'kalaallisut': 'kl',
+ 'kan': 'kn',
+ 'kannada': 'kn',
+ 'kanuri': 'kr',
+ 'kas': 'ks',
+ 'kashmiri': 'ks',
+ 'kat': 'ka',
+ 'kau': 'kr',
+ 'kaz': 'kk',
+ 'kazakh': 'kk',
+ 'kg': 'kg',
+ 'khm': 'km',
+ 'khmer, central': 'km',
+ 'ki': 'ki',
+ 'kik': 'ki',
+ 'kikuyu': 'ki',
+ 'kin': 'rw',
+ 'kinyarwanda': 'rw',
+ 'kir': 'ky',
+ 'kirghiz': 'ky',
+ 'kj': 'kj',
+ 'kk': 'kk',
+ 'kl': 'kl',
+ 'km': 'km',
+ 'kn': 'kn',
+ 'ko': 'ko',
+ 'kom': 'kv',
+ 'komi': 'kv',
+ 'kon': 'kg',
+ 'kongo': 'kg',
+ 'kor': 'ko',
+ 'korean': 'ko',
+ 'kr': 'kr',
+ 'ks': 'ks',
+ 'ku': 'ku',
+ 'kua': 'kj',
+ 'kuanyama': 'kj',
+ 'kur': 'ku',
+ 'kurdish': 'ku',
+ 'kv': 'kv',
+ 'kw': 'kw',
+ 'ky': 'ky',
+ 'la': 'la',
+ 'lao': 'lo',
+ 'lat': 'la',
+ 'latin': 'la',
+ 'latvian': 'lv',
+ 'lav': 'lv',
+ 'lb': 'lb',
+ 'lg': 'lg',
+ 'li': 'li',
+ 'lim': 'li',
+ 'limburgan': 'li',
+ 'lin': 'ln',
+ 'lingala': 'ln',
+ 'lit': 'lt',
+ 'lithuanian': 'lt',
+ 'ln': 'ln',
+ 'lo': 'lo',
+ 'lt': 'lt',
+ 'ltz': 'lb',
+ 'lu': 'lu',
+ 'lub': 'lu',
+ 'luba-katanga': 'lu',
+ 'lug': 'lg',
+ 'luxembourgish': 'lb',
+ 'lv': 'lv',
+ 'macedonian': 'mk',
+ 'mah': 'mh',
+ 'mal': 'ml',
+ 'malagasy': 'mg',
+ 'malay (macrolanguage)': 'ms',
+ 'malayalam': 'ml',
+ 'maltese': 'mt',
+ 'manx': 'gv',
+ 'maori': 'mi',
+ 'mar': 'mr',
+ 'marathi': 'mr',
+ 'marshallese': 'mh',
+ 'mg': 'mg',
+ 'mh': 'mh',
+ 'mi': 'mi',
+ 'mk': 'mk',
+ 'mkd': 'mk',
+ 'ml': 'ml',
+ 'mlg': 'mg',
+ 'mlt': 'mt',
+ 'mn': 'mn',
+ 'mon': 'mn',
+ 'mongolian': 'mn',
+ 'mr': 'mr',
+ 'mri': 'mi',
+ 'ms': 'ms',
+ 'msa': 'ms',
+ 'mt': 'mt',
+ 'my': 'my',
+ 'mya': 'my',
+ 'na': 'na',
+ 'nau': 'na',
+ 'nauru': 'na',
+ 'nav': 'nv',
+ 'navajo': 'nv',
+ 'nb': 'nb',
+ 'nbl': 'nr',
+ 'nd': 'nd',
+ 'nde': 'nd',
+ 'ndebele, north': 'nd',
+ 'ndebele, south': 'nr',
+ 'ndo': 'ng',
+ 'ndonga': 'ng',
+ 'ne': 'ne',
+ 'nep': 'ne',
+ 'nepali (macrolanguage)': 'ne',
+ 'ng': 'ng',
+ 'nl': 'nl',
+ 'nld': 'nl',
+ 'nn': 'nn',
+ 'nno': 'nn',
+ 'no': 'no',
+ 'nob': 'nb',
+ 'nor': 'no',
+ 'norwegian': 'no',
+ 'norwegian bokmål': 'nb',
+ 'norwegian nynorsk': 'nn',
+ 'nr': 'nr',
+ 'nv': 'nv',
+ 'ny': 'ny',
+ 'nya': 'ny',
+ 'nyanja': 'ny',
+ 'oc': 'oc',
+ 'occitan (post 1500)': 'oc',
+ 'oci': 'oc',
+ 'oj': 'oj',
+ 'oji': 'oj',
+ 'ojibwa': 'oj',
+ 'om': 'om',
+ 'or': 'or',
+ 'ori': 'or',
+ 'oriya (macrolanguage)': 'or',
+ 'orm': 'om',
+ 'oromo': 'om',
+ 'os': 'os',
+ 'oss': 'os',
+ 'ossetian': 'os',
+ 'pa': 'pa',
+ 'pali': 'pi',
+ 'pan': 'pa',
+ 'panjabi': 'pa',
+ 'persian': 'fa',
+ 'pi': 'pi',
+ 'pl': 'pl',
+ 'pli': 'pi',
+ 'pol': 'pl',
+ 'polish': 'pl',
+ 'por': 'pt',
+ 'portuguese': 'pt',
+ 'português': 'pt',
+ 'ps': 'ps',
+ 'pt': 'pt',
+ 'pus': 'ps',
+ 'pushto': 'ps',
+ 'qu': 'qu',
+ 'que': 'qu',
+ 'quechua': 'qu',
+ 'rm': 'rm',
+ 'rn': 'rn',
+ 'ro': 'ro',
+ 'roh': 'rm',
+ 'romanian': 'ro',
+ 'romansh': 'rm',
+ 'ron': 'ro',
+ 'ru': 'ru',
+ 'run': 'rn',
+ 'rundi': 'rn',
+ 'rus': 'ru',
+ 'russian': 'ru',
+ 'rw': 'rw',
+ 'sa': 'sa',
+ 'sag': 'sg',
+ 'sami, northern': 'se',
+ 'samoan': 'sm',
+ 'san': 'sa',
+ 'sango': 'sg',
+ 'sanskrit': 'sa',
+ 'sardinian': 'sc',
+ 'sc': 'sc',
+ 'sd': 'sd',
+ 'se': 'se',
+ 'serbian': 'sr',
+ 'serbo-croatian': 'sh',
+ 'sg': 'sg',
+ 'sh': 'sh',
+ 'shona': 'sn',
+ 'si': 'si',
+ 'sin': 'si',
+ 'sindhi': 'sd',
+ 'sinhala': 'si',
+ 'sk': 'sk',
+ 'sl': 'sl',
+ 'slavic, church': 'cu',
+ 'slk': 'sk',
+ 'slovak': 'sk',
+ 'slovenian': 'sl',
+ 'slv': 'sl',
+ 'sm': 'sm',
+ 'sme': 'se',
+ 'smo': 'sm',
+ 'sn': 'sn',
+ 'sna': 'sn',
+ 'snd': 'sd',
+ 'so': 'so',
+ 'som': 'so',
+ 'somali': 'so',
+ 'sot': 'st',
+ 'sotho, southern': 'st',
+ 'spa': 'es',
+ 'spanish': 'es',
+ 'sq': 'sq',
+ 'sqi': 'sq',
+ 'sr': 'sr',
+ 'srd': 'sc',
+ 'srp': 'sr',
+ 'ss': 'ss',
+ 'ssw': 'ss',
+ 'st': 'st',
+ 'su': 'su',
+ 'sun': 'su',
+ 'sundanese': 'su',
+ 'sv': 'sv',
+ 'sw': 'sw',
+ 'swa': 'sw',
+ 'swahili (macrolanguage)': 'sw',
+ 'swati': 'ss',
+ 'swe': 'sv',
+ 'swedish': 'sv',
+ 'ta': 'ta',
+ 'tagalog': 'tl',
+ 'tah': 'ty',
+ 'tahitian': 'ty',
+ 'tajik': 'tg',
+ 'tam': 'ta',
+ 'tamil': 'ta',
+ 'tat': 'tt',
+ 'tatar': 'tt',
+ 'te': 'te',
+ 'tel': 'te',
+ 'telugu': 'te',
+ 'tg': 'tg',
+ 'tgk': 'tg',
+ 'tgl': 'tl',
+ 'th': 'th',
+ 'tha': 'th',
+ 'thai': 'th',
+ 'ti': 'ti',
+ 'tibetan': 'bo',
+ 'tigrinya': 'ti',
+ 'tir': 'ti',
+ 'tk': 'tk',
+ 'tl': 'tl',
+ 'tn': 'tn',
+ 'to': 'to',
+ 'ton': 'to',
+ 'tonga (tonga islands)': 'to',
+ 'tr': 'tr',
+ 'ts': 'ts',
+ 'tsn': 'tn',
+ 'tso': 'ts',
+ 'tsonga': 'ts',
+ 'tswana': 'tn',
+ 'tt': 'tt',
+ 'tuk': 'tk',
+ 'tur': 'tr',
+ 'turkish': 'tr',
+ 'turkmen': 'tk',
+ 'tw': 'tw',
+ 'twi': 'tw',
+ 'ty': 'ty',
+ 'ug': 'ug',
+ 'uig': 'ug',
+ 'uighur': 'ug',
+ 'uk': 'uk',
+ 'ukr': 'uk',
+ 'ukrainian': 'uk',
+ 'ur': 'ur',
+ 'urd': 'ur',
+ 'urdu': 'ur',
+ 'uz': 'uz',
+ 'uzb': 'uz',
+ 'uzbek': 'uz',
+ 've': 've',
+ 'ven': 've',
+ 'venda': 've',
+ 'vi': 'vi',
+ 'vie': 'vi',
+ 'vietnamese': 'vi',
+ 'vo': 'vo',
+ 'vol': 'vo',
+ 'volapük': 'vo',
+ 'wa': 'wa',
+ 'walloon': 'wa',
+ 'welsh': 'cy',
+ 'wln': 'wa',
+ 'wo': 'wo',
+ 'wol': 'wo',
+ 'wolof': 'wo',
+ 'xh': 'xh',
+ 'xho': 'xh',
+ 'xhosa': 'xh',
+ 'yi': 'yi',
+ 'yi, sichuan': 'ii',
+ 'yid': 'yi',
+ 'yiddish': 'yi',
+ 'yo': 'yo',
+ 'yor': 'yo',
+ 'yoruba': 'yo',
+ 'za': 'za',
+ 'zh': 'zh',
+ 'zha': 'za',
+ 'zho': 'zh',
+ 'zhuang': 'za',
+ 'zu': 'zu',
+ 'zul': 'zu',
+ 'zulu': 'zu',
+ 'русский': 'ru',
+ 'فارسی': 'fa'}
+TRANSLATIONS = {'Female': ('female', 'femenino', 'femmina', 'weiblich', 'женский'),
+ 'Leave the language unchanged': ('leave the language unchanged',
+                                  'non cambiare la lingua',
+                                  'non modificare la lingua',
+                                  'sprachen nicht ändern',
+                                  'не менять язык'),
+ 'Leave the languages unchanged': ('leave the languages unchanged',
+                                   'no cambie las lenguas',
+                                   'non cambiare le lingue',
+                                   'sprachen nicht ändern',
+                                   'не менять языки'),
+ 'Male': ('male', 'maschio', 'masculino', 'männlich', 'мужской'),
+ 'Not specified': ('nicht angegeben',
+                   'no especificado',
+                   'non specificato',
+                   'not specified',
+                   'не указано'),
+ 'boy': ('boy', 'chico', 'junge', 'ragazzo', 'мальчик'),
+ 'f': ('f',),
+ 'girl': ('chica', 'girl', 'mädchen', 'ragazza', 'девочка'),
+ 'm': ('m',),
+ 'man': ('hombre', 'man', 'mann', 'uomo', 'мужчина'),
+ 'men': ('men',),
+ 'woman': ('donna', 'frau', 'mujer', 'woman', 'женщина'),
+ 'women': ('women',)}
@@ -15,15 +15,24 @@ LOGGER = logging.getLogger('randtalkbot.message')
 
 class Message:
     COMMAND_RE_PATTERN = re.compile(r'^/([a-z_]+)\b\s*(.*)$')
+    # Content types which can be sent with `sendMediaGroup`.
+    MEDIA_GROUP_TYPES = ('photo', 'video')
 
     def __init__(self, message_json):
         try:
-            content_type, unused_chat_type, unused_chat_id = telepot.glance(message_json)
+            content_type, unused_chat_type, chat_id = telepot.glance(message_json)
         except KeyError:
             raise UnsupportedContentError()
         if 'forward_from' in message_json:
             raise UnsupportedContentError()
         self.is_reply = 'reply_to_message' in message_json
+        # Are used to copy the message instead of sending its content.
+        self.chat_id = chat_id
+        self.message_id = message_json.get('message_id')
+        self.media_group_id = message_json.get('media_group_id') \
+            if content_type in type(self).MEDIA_GROUP_TYPES else None
+        # Is used to relay the message through another shard.
+        self.message_json = message_json
         self.text = message_json.get('text')
         self.type = content_type
         self.command = None
@@ -52,6 +61,20 @@ class Message:
             raise UnsupportedContentError('Can\'t decode JSON') from err
         return command_args
 
+    def get_input_media(self):
+        """Returns:
+            dict: InputMedia object describing the message in `sendMediaGroup` call.
+        """
+        input_media = {
+            'type': self.type,
+            'media': self.sending_kwargs[self.type],
+            }
+
+        if self.sending_kwargs.get('caption') is not None:
+            input_media['caption'] = self.sending_kwargs['caption']
+
+        return input_media
+
     def _init_audio(self, message_json):
         try:
             audio = message_json['audio']
@@ -60,6 +83,7 @@ class Message:
                 }
         except (KeyError, TypeError):
             raise UnsupportedContentError()
+        self.sending_kwargs['caption'] = message_json.get('caption')
         self.sending_kwargs['duration'] = audio.get('duration')
         self.sending_kwargs['performer'] = audio.get('performer')
         self.sending_kwargs['title'] = audio.get('title')
@@ -71,6 +95,7 @@ class Message:
                 }
         except (KeyError, TypeError):
             raise UnsupportedContentError()
+        self.sending_kwargs['caption'] = message_json.get('caption')
 
     def _init_location(self, message_json):
         try:
@@ -84,8 +109,10 @@ class Message:
 
     def _init_photo(self, message_json):
         try:
+            # Photo sizes are sorted ascending. Sending the largest one by its file_id costs the
+            # same as sending the thumbnail.
             self.sending_kwargs = {
-                'photo': message_json['photo'][0]['file_id'],
+                'photo': message_json['photo'][-1]['file_id'],
                 }
         except (IndexError, KeyError, TypeError):
             raise UnsupportedContentError()
@@ -127,4 +154,5 @@ class Message:
                 }
         except (KeyError, TypeError):
             raise UnsupportedContentError()
+        self.sending_kwargs['caption'] = message_json.get('caption')
         self.sending_kwargs['duration'] = voice.get('duration')
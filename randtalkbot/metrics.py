@@ -0,0 +1,251 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Prometheus-style metrics registry.
+
+Metrics are recorded only while `REGISTRY.enabled` is set, so instrumented code costs one
+attribute lookup per call when metrics are disabled.
+
+@see https://prometheus.io/docs/instrumenting/exposition_formats/
+"""
+
+from collections import OrderedDict
+import logging
+import time
+
+LOGGER = logging.getLogger('randtalkbot.metrics')
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+
+    if extra is not None:
+        pairs.append(extra)
+
+    if not pairs:
+        return ''
+
+    labels = ','.join(
+        '{0}="{1}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+        for name, value in pairs
+        )
+    return '{' + labels + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+
+    return repr(float(value))
+
+
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused_exc_info):
+        return False
+
+
+NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self._histogram = histogram
+        self._labels = labels
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *unused_exc_info):
+        self._histogram.observe(time.perf_counter() - self._start, *self._labels)
+        return False
+
+
+class Metric:
+    TYPE = None
+
+    def __init__(self, registry, name, documentation, labels_names=()):
+        self._registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labels_names = tuple(labels_names)
+        self._values = {}
+
+    def clear(self):
+        self._values.clear()
+
+    def get(self, *labels):
+        return self._values.get(labels, 0)
+
+    def _render_samples(self):
+        for labels, value in sorted(self._values.items()):
+            yield self.name + _format_labels(self.labels_names, labels), value
+
+    def render(self):
+        lines = [
+            '# HELP {0} {1}'.format(self.name, self.documentation),
+            '# TYPE {0} {1}'.format(self.name, self.TYPE),
+            ]
+
+        for sample_name, value in self._render_samples():
+            lines.append('{0} {1}'.format(sample_name, _format_value(value)))
+
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    TYPE = 'counter'
+
+    def inc(self, *labels, amount=1):
+        if not self._registry.enabled:
+            return
+
+        try:
+            self._values[labels] += amount
+        except KeyError:
+            self._values[labels] = amount
+
+
+class Gauge(Metric):
+    TYPE = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super(Gauge, self).__init__(*args, **kwargs)
+        self._function = None
+
+    def set(self, value, *labels):
+        if not self._registry.enabled:
+            return
+
+        self._values[labels] = value
+
+    def set_function(self, function):
+        """Makes the gauge to be evaluated during rendering.
+
+        Args:
+            function (callable): Returns the value for unlabelled gauge or dict mapping labels
+                tuples to values.
+        """
+        self._function = function
+
+    def _render_samples(self):
+        if self._function is not None:
+            value = self._function()
+            self._values = value if isinstance(value, dict) else {(): value}
+
+        return super(Gauge, self)._render_samples()
+
+
+class Histogram(Metric):
+    TYPE = 'histogram'
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super(Histogram, self).__init__(*args, **kwargs)
+        self.buckets = tuple(buckets) + (float('inf'), )
+
+    def get(self, *labels):
+        """Returns:
+            tuple: Observations count and sum.
+        """
+        try:
+            unused_buckets_counts, count, total = self._values[labels]
+        except KeyError:
+            return 0, 0
+        else:
+            return count, total
+
+    def observe(self, value, *labels):
+        if not self._registry.enabled:
+            return
+
+        try:
+            buckets_counts, count, total = self._values[labels]
+        except KeyError:
+            buckets_counts, count, total = [0] * len(self.buckets), 0, 0
+
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                buckets_counts[index] += 1
+                break
+
+        self._values[labels] = buckets_counts, count + 1, total + value
+
+    def _render_samples(self):
+        for labels, (buckets_counts, count, total) in sorted(self._values.items()):
+            cumulative_count = 0
+
+            for bound, bucket_count in zip(self.buckets, buckets_counts):
+                cumulative_count += bucket_count
+                labels_repr = _format_labels(
+                    self.labels_names,
+                    labels,
+                    extra=('le', _format_value(bound)),
+                    )
+                yield self.name + '_bucket' + labels_repr, cumulative_count
+
+            labels_repr = _format_labels(self.labels_names, labels)
+            yield self.name + '_sum' + labels_repr, total
+            yield self.name + '_count' + labels_repr, count
+
+    def time(self, *labels):
+        """Returns:
+            Context manager observing the time spent inside of it.
+        """
+        if not self._registry.enabled:
+            return NULL_TIMER
+
+        return _Timer(self, labels)
+
+
+class Registry:
+    def __init__(self):
+        self.enabled = False
+        self._metrics = OrderedDict()
+
+    def _register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError('Metric {0} was registered already'.format(metric.name))
+
+        self._metrics[metric.name] = metric
+        return metric
+
+    def clear(self):
+        for metric in self._metrics.values():
+            metric.clear()
+
+    def counter(self, name, documentation, labels_names=()):
+        return self._register(Counter(self, name, documentation, labels_names))
+
+    def gauge(self, name, documentation, labels_names=()):
+        return self._register(Gauge(self, name, documentation, labels_names))
+
+    def histogram(self, name, documentation, labels_names=(), buckets=DEFAULT_BUCKETS):
+        return self._register(
+            Histogram(self, name, documentation, labels_names, buckets=buckets),
+            )
+
+    def render(self):
+        # Rendering gauges may import modules registering new metrics.
+        metrics = list(self._metrics.values())
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+CACHE_REQUESTS_COUNTER = REGISTRY.counter(
+    'randtalkbot_cache_requests_total',
+    'In-memory caches lookups.',
+    ('cache', 'result'),
+    )
+CACHE_SIZE_GAUGE = REGISTRY.gauge(
+    'randtalkbot_cache_size',
+    'Count of items in in-memory caches.',
+    ('cache', ),
+    )
@@ -0,0 +1,128 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+from .dispatcher import BUSY_WORKERS_GAUGE, DISPATCHER, MAX_USER_QUEUE_DEPTH_GAUGE, \
+    PENDING_UPDATES_GAUGE
+from .metrics import CACHE_SIZE_GAUGE, REGISTRY
+from .waiting_pool import WaitingPool
+
+LOGGER = logging.getLogger('randtalkbot.metrics_service')
+EVENT_LOOP_LAG_GAUGE = REGISTRY.gauge(
+    'randtalkbot_event_loop_lag_seconds',
+    'Delay of the last event loop lag probe.',
+    )
+EVENT_LOOP_LAG_HISTOGRAM = REGISTRY.histogram(
+    'randtalkbot_event_loop_lag_probe_seconds',
+    'Delays of event loop lag probes.',
+    )
+WAITING_STRANGERS_BY_LANGUAGE_GAUGE = REGISTRY.gauge(
+    'randtalkbot_waiting_strangers_by_language',
+    'Strangers looking for partner speaking the language.',
+    ('language', ),
+    )
+WAITING_STRANGERS_BY_SEX_GAUGE = REGISTRY.gauge(
+    'randtalkbot_waiting_strangers_by_sex',
+    'Strangers looking for partner of the sex.',
+    ('sex', ),
+    )
+WAITING_STRANGERS_GAUGE = REGISTRY.gauge(
+    'randtalkbot_waiting_strangers',
+    'Strangers looking for partner.',
+    )
+
+
+def _get_caches_sizes():
+    from .route_table import ROUTE_TABLE
+    from .stranger_sender_service import StrangerSenderService
+    from .stranger_service import StrangerService
+    # pylint: disable=protected-access
+    stranger_sender_service = StrangerSenderService._instance
+    return {
+        ('routes', ): len(ROUTE_TABLE),
+        ('strangers', ): StrangerService.get_instance().get_cache_size(),
+        ('stranger_senders', ): 0 if stranger_sender_service is None else \
+            stranger_sender_service.get_cache_size(),
+        }
+
+
+def _get_labelled(dictionary):
+    return {(key, ): value for key, value in dictionary.items()}
+
+
+class MetricsService:
+    """Serves metrics registry over HTTP at `/metrics` and measures event loop lag."""
+
+    LAG_PROBE_INTERVAL = 1
+
+    def __init__(self, host, port):
+        self._host = host
+        self._port = port
+        self._server = None
+        REGISTRY.enabled = True
+        BUSY_WORKERS_GAUGE.set_function(DISPATCHER.get_busy_workers_count)
+        CACHE_SIZE_GAUGE.set_function(_get_caches_sizes)
+        MAX_USER_QUEUE_DEPTH_GAUGE.set_function(DISPATCHER.get_max_user_queue_depth)
+        PENDING_UPDATES_GAUGE.set_function(DISPATCHER.get_pending_count)
+        WAITING_STRANGERS_GAUGE.set_function(lambda: WaitingPool.get_instance().get_count())
+        WAITING_STRANGERS_BY_LANGUAGE_GAUGE.set_function(
+            lambda: _get_labelled(WaitingPool.get_instance().get_counts_by_language()),
+            )
+        WAITING_STRANGERS_BY_SEX_GAUGE.set_function(
+            lambda: _get_labelled(WaitingPool.get_instance().get_counts_by_sex()),
+            )
+
+    async def _handle_request(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+
+            # Skip request headers.
+            while True:
+                line = await reader.readline()
+
+                if line in (b'\r\n', b'\n', b''):
+                    break
+
+            try:
+                method, path = request_line.decode('latin-1').split()[:2]
+            except ValueError:
+                method, path = None, None
+
+            if method == 'GET' and path.split('?')[0] == '/metrics':
+                status = '200 OK'
+                body = REGISTRY.render().encode('utf-8')
+            else:
+                status = '404 Not Found'
+                body = b'Not Found\n'
+
+            writer.write(
+                'HTTP/1.0 {0}\r\n'
+                'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                'Content-Length: {1}\r\n'
+                '\r\n'.format(status, len(body)).encode('latin-1'),
+                )
+            writer.write(body)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as err:
+            LOGGER.debug('Metrics request was interrupted. %s', err)
+        finally:
+            writer.close()
+
+    async def _measure_event_loop_lag(self):
+        loop = asyncio.get_event_loop()
+
+        while True:
+            expected_time = loop.time() + type(self).LAG_PROBE_INTERVAL
+            await asyncio.sleep(type(self).LAG_PROBE_INTERVAL)
+            lag = max(loop.time() - expected_time, 0)
+            EVENT_LOOP_LAG_GAUGE.set(lag)
+            EVENT_LOOP_LAG_HISTOGRAM.observe(lag)
+
+    async def run(self):
+        self._server = await asyncio.start_server(self._handle_request, self._host, self._port)
+        LOGGER.info('Serving metrics on %s:%d', self._host, self._port)
+        await self._measure_event_loop_lag()
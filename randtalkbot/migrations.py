@@ -0,0 +1,189 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Versioned schema migrations: `randtalkbot migrate CONFIGURATION`.
+
+`randtalkbot install` creates the tables of the latest schema and records its version. Migrations
+bring DBs installed by older versions up to date. Every applied migration is recorded in
+`schema_migration` table. Indexes are built online on MariaDB/MySQL (`ALGORITHM=INPLACE,
+LOCK=NONE`), so the bot keeps working during the migration. Indexes existing already are skipped,
+so migrations are safe to apply to DBs where the indexes were created manually.
+"""
+
+from collections import namedtuple
+import datetime
+import logging
+from peewee import CharField, DateTimeField, IntegerField, Model, MySQLDatabase, Proxy
+from .bonus_ledger import BonusLedgerEntry
+
+LOGGER = logging.getLogger('randtalkbot.migrations')
+DATABASE_PROXY = Proxy()
+
+
+class SchemaMigration(Model):
+    version = IntegerField(primary_key=True)
+    description = CharField(max_length=255)
+    applied = DateTimeField(default=datetime.datetime.utcnow)
+
+    class Meta:
+        database = DATABASE_PROXY
+        db_table = 'schema_migration'
+
+
+class AddIndex(namedtuple('AddIndex', ('table', 'columns', 'unique'))):
+    def __new__(cls, table, columns, unique=False):
+        return super(AddIndex, cls).__new__(cls, table, tuple(columns), unique)
+
+    @property
+    def name(self):
+        """Index name matching the one peewee gives to the models' indexes."""
+        return '_'.join((self.table, ) + self.columns)
+
+    def get_sql(self, database):
+        """Returns:
+            str: SQL statement creating the index in the database.
+        """
+        quote_char = database.quote_char
+
+        def quote(name):
+            return f'{quote_char}{name}{quote_char}'
+
+        columns = ', '.join(quote(column) for column in self.columns)
+        unique = 'UNIQUE ' if self.unique else ''
+
+        if isinstance(database, MySQLDatabase):
+            return (
+                f'ALTER TABLE {quote(self.table)} ADD {unique}INDEX {quote(self.name)} ({columns}),'
+                ' ALGORITHM=INPLACE, LOCK=NONE'
+                )
+
+        return (
+            f'CREATE {unique}INDEX IF NOT EXISTS {quote(self.name)} ON {quote(self.table)}'
+            f' ({columns})'
+            )
+
+    def is_applied(self, database):
+        # The table may be created by the same migration.
+        return self.table in database.get_tables() and \
+            any(index.name == self.name for index in database.get_indexes(self.table))
+
+
+class CreateTable(namedtuple('CreateTable', ('model', ))):
+    """Creates the model's table without indexes: they're added by `AddIndex` operations."""
+
+    @property
+    def table(self):
+        # pylint: disable=protected-access
+        return self.model._meta.db_table
+
+    def get_sql(self, database):
+        sql, unused_params = database.compiler().create_table(self.model, safe=True)
+        return sql
+
+    def is_applied(self, database):
+        return self.table in database.get_tables()
+
+
+Migration = namedtuple('Migration', ('version', 'description', 'operations'))
+
+MIGRATIONS = (
+    Migration(1, 'Index talks by partners', (
+        AddIndex('talk', ('partner1_id', )),
+        AddIndex('talk', ('partner2_id', )),
+        )),
+    Migration(2, 'Index talks by end', (
+        AddIndex('talk', ('end', )),
+        )),
+    Migration(3, 'Index strangers looking for partner', (
+        AddIndex('stranger', ('looking_for_partner_from', )),
+        AddIndex('stranger', ('partner_sex', 'bonus_count', 'looking_for_partner_from')),
+        AddIndex(
+            'stranger',
+            ('sex', 'partner_sex', 'bonus_count', 'looking_for_partner_from'),
+            ),
+        )),
+    Migration(4, 'Index stats by creation time', (
+        AddIndex('stats', ('created', )),
+        )),
+    Migration(5, 'Create bonus ledger', (
+        CreateTable(BonusLedgerEntry),
+        AddIndex('bonus_ledger', ('stranger_id', )),
+        )),
+    )
+
+
+class Migrator:
+    def __init__(self, database, migrations=MIGRATIONS):
+        self._database = database
+        self._migrations = migrations
+
+    @classmethod
+    def get_version(cls):
+        """Returns:
+            int: Version of the last applied migration. `0` if no migrations were recorded.
+        """
+        if not SchemaMigration.table_exists():
+            return 0
+
+        last_migration = SchemaMigration.select().order_by(SchemaMigration.version.desc()).first()
+        return 0 if last_migration is None else last_migration.version
+
+    def get_pending_migrations(self):
+        version = self.get_version()
+        return [migration for migration in self._migrations if migration.version > version]
+
+    def get_statements(self, migration):
+        """Returns:
+            list: SQL statements applying the migration. Existing indexes are skipped.
+        """
+        return [
+            operation.get_sql(self._database)
+            for operation in migration.operations
+            if not operation.is_applied(self._database)
+            ]
+
+    def migrate(self, dry_run=False):
+        """Applies pending migrations one by one recording every applied one.
+
+        Args:
+            dry_run (bool): Don't change the DB, just report what would be done.
+
+        Returns:
+            list: Pairs of applied migration and its SQL statements.
+
+        Raises:
+            peewee.DatabaseError
+        """
+        applied = []
+
+        if not dry_run:
+            self._database.create_table(SchemaMigration, safe=True)
+
+        for migration in self.get_pending_migrations():
+            statements = self.get_statements(migration)
+            applied.append((migration, statements))
+
+            if dry_run:
+                continue
+
+            LOGGER.info('Applying migration #%d: %s', migration.version, migration.description)
+
+            # MariaDB commits DDL statements implicitly, so every migration is recorded right
+            # after it's applied.
+            for statement in statements:
+                LOGGER.debug('Executing %s', statement)
+                self._database.execute_sql(statement)
+
+            SchemaMigration.create(version=migration.version, description=migration.description)
+
+        return applied
+
+    def stamp(self):
+        """Records the latest version for the DB created with the latest schema."""
+        self._database.create_table(SchemaMigration, safe=True)
+
+        for migration in self.get_pending_migrations():
+            SchemaMigration.create(version=migration.version, description=migration.description)
@@ -0,0 +1,190 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Counting of DB queries issued per update or per coroutine.
+
+`InstrumentedDatabaseMixin` reports every executed query to `record_query()`, which passes it to
+the counters active for the current task and to the counters counting queries everywhere.
+"""
+
+from collections import Counter
+from contextlib import contextmanager
+import logging
+from .task_local import TaskLocal
+
+LOGGER = logging.getLogger('randtalkbot.query_counter')
+READ_OPERATIONS = frozenset(('SELECT', ))
+WRITE_OPERATIONS = frozenset(('DELETE', 'INSERT', 'REPLACE', 'UPDATE'))
+_GLOBAL_COUNTERS = []
+_TASK_COUNTER = TaskLocal()
+
+
+class QueryCounter:
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.reads = 0
+        self.writes = 0
+        self.others = 0
+        self.duration = 0
+        self.statements = Counter()
+
+    @property
+    def count(self):
+        return self.reads + self.writes + self.others
+
+    def get_repeated_statements(self, threshold=2):
+        """Helps to detect N+1 queries: peewee parametrizes queries, so the same SQL executed
+        several times usually means a query issued in a loop.
+
+        Returns:
+            list: `(sql, count)` tuples for statements executed at least `threshold` times, most
+                repeated first.
+        """
+        return [
+            (sql, count)
+            for sql, count in self.statements.most_common() if count >= threshold
+            ]
+
+    def record(self, sql, operation, duration):
+        if operation in READ_OPERATIONS:
+            self.reads += 1
+        elif operation in WRITE_OPERATIONS:
+            self.writes += 1
+        else:
+            self.others += 1
+
+        self.duration += duration
+        self.statements[sql] += 1
+
+
+def _pop_task_counter(counter):
+    _TASK_COUNTER.set(counter.parent)
+
+
+def _push_task_counter():
+    counter = QueryCounter(_TASK_COUNTER.get())
+    _TASK_COUNTER.set(counter)
+    return counter
+
+
+@contextmanager
+def count_queries(everywhere=False):
+    """Counts queries executed inside of the block.
+
+    Args:
+        everywhere (bool): Count queries of all tasks, not only of the current one. Is useful in
+            tests and benchmarks where updates are handled by separate tasks.
+
+    Yields:
+        QueryCounter: Counter of the block's queries.
+    """
+    if everywhere:
+        counter = QueryCounter()
+        _GLOBAL_COUNTERS.append(counter)
+
+        try:
+            yield counter
+        finally:
+            _GLOBAL_COUNTERS.remove(counter)
+    else:
+        counter = _push_task_counter()
+
+        try:
+            yield counter
+        finally:
+            _pop_task_counter(counter)
+
+
+def is_counting():
+    return bool(_GLOBAL_COUNTERS) or _TASK_COUNTER.get() is not None
+
+
+def record_query(sql, operation, duration):
+    counter = _TASK_COUNTER.get()
+
+    # Nested counters include queries of the inner ones.
+    while counter is not None:
+        counter.record(sql, operation, duration)
+        counter = counter.parent
+
+    for counter in _GLOBAL_COUNTERS:
+        counter.record(sql, operation, duration)
+
+
+class _NullWatch:
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *unused_exc_info):
+        return False
+
+
+NULL_WATCH = _NullWatch()
+
+
+class _Watch:
+    def __init__(self, budget, handler, stranger_id):
+        self._budget = budget
+        self._handler = handler
+        self._stranger_id = stranger_id
+        self._counter = None
+
+    def __enter__(self):
+        self._counter = _push_task_counter()
+        return self._counter
+
+    def __exit__(self, *unused_exc_info):
+        _pop_task_counter(self._counter)
+        self._budget.check(self._counter, self._handler, self._stranger_id)
+        return False
+
+
+class QueryBudget:
+    """Logs warnings about updates issuing more queries than expected."""
+
+    def __init__(self):
+        self.enabled = False
+        self.reads = None
+        self.writes = None
+
+    def check(self, counter, handler, stranger_id):
+        """Returns:
+            bool: `True` if the counter fits the budget.
+        """
+        if (self.reads is None or counter.reads <= self.reads) and \
+                (self.writes is None or counter.writes <= self.writes):
+            return True
+
+        repeated_statements = counter.get_repeated_statements()
+        LOGGER.warning(
+            '%s for stranger %s has exceeded queries budget: %d reads, %d writes, %.3f s.'
+            ' Most repeated statement: %s',
+            handler,
+            stranger_id,
+            counter.reads,
+            counter.writes,
+            counter.duration,
+            repeated_statements[0] if repeated_statements else None,
+            )
+        return False
+
+    def configure(self, reads=None, writes=None):
+        self.enabled = True
+        self.reads = reads
+        self.writes = writes
+
+    def watch(self, handler, stranger_id):
+        """Returns:
+            Context manager counting queries of the current task and checking them against the
+            budget.
+        """
+        if not self.enabled:
+            return NULL_WATCH
+
+        return _Watch(self, handler, stranger_id)
+
+
+QUERY_BUDGET = QueryBudget()
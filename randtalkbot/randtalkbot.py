@@ -11,42 +11,76 @@ import logging
 import logging.config
 import os
 import sys
+import time
 from docopt import docopt
+from . import IMPORT_TIME
+from .bonus_ledger import BONUS_LEDGER
 from .bot import Bot
 from .configuration import Configuration, ConfigurationObtainingError
 from .db import DB
-from .errors import DBError
+from .dispatcher import DISPATCHER
+from .errors import DBError, DBUnavailableError, StateStoreError
+from .metrics_service import MetricsService
+from .query_counter import QUERY_BUDGET
+from .sharding import SHARDING
+from .state_backend import InProcessStateBackend, StoreStateBackend
+from .state_store import get_state_store
+from .startup_profiler import StartupProfiler
 from .stats_service import StatsService
+from .stranger import Stranger
+from .stranger_sender import StrangerSender
+from .talk import Talk
+from .tracing import TRACER
 from .utils import __version__
+from .waiting_pool import WaitingPool
+from .watchdog import Watchdog
 
 DOC = '''RandTalkBot
 
 Usage:
-  randtalkbot CONFIGURATION
+  randtalkbot [--shard=N] [--profile-startup [--profile-output=PATH]] CONFIGURATION
   randtalkbot install CONFIGURATION
+  randtalkbot migrate [--dry-run] CONFIGURATION
   randtalkbot -h | --help | --version
 
 Arguments:
   CONFIGURATION  Path to configuration.json file.
+
+Options:
+  --shard=N              Number of this process' shard if `sharding` is configured [default: 0].
+  --profile-startup      Log how long every startup phase took.
+  --profile-output=PATH  Dump cProfile stats of the startup to the file.
+  --dry-run              Print SQL statements of pending migrations without executing them.
 '''
 LOGGER = logging.getLogger('randtalkbot')
 
 def main():
     arguments = docopt(DOC, version=__version__)
+    profiler = StartupProfiler(
+        enabled=arguments['--profile-startup'],
+        path=arguments['--profile-output'],
+        )
+    profiler.add('import', time.perf_counter() - IMPORT_TIME)
+    profiler.start()
     logging.basicConfig(level=logging.DEBUG)
 
-    try:
-        configuration = Configuration(arguments['CONFIGURATION'])
-    except ConfigurationObtainingError as err:
-        sys.exit(f'Can\'t obtain configuration. {err}')
+    with profiler.phase('configuration'):
+        try:
+            configuration = Configuration(arguments['CONFIGURATION'])
+        except ConfigurationObtainingError as err:
+            sys.exit(f'Can\'t obtain configuration. {err}')
 
-    logging.config.dictConfig(configuration.logging)
+        logging.config.dictConfig(configuration.logging)
 
-    try:
-        db = DB(configuration)
-    except DBError as err:
-        LOGGER.exception('Can\'t construct DB')
-        sys.exit(getattr(os, 'EX_CONFIG', 78))
+    with profiler.phase('db'):
+        try:
+            db = DB(configuration)
+        except DBUnavailableError as err:
+            LOGGER.exception('Can\'t construct DB')
+            sys.exit(getattr(os, 'EX_UNAVAILABLE', 69))
+        except DBError as err:
+            LOGGER.exception('Can\'t construct DB')
+            sys.exit(getattr(os, 'EX_CONFIG', 78))
 
     if arguments['install']:
         LOGGER.info('Installing RandTalkBot')
@@ -55,17 +89,124 @@ def main():
             db.install()
         except DBError as err:
             sys.exit(f'Can\'t install databases. {err}')
+
+        profiler.finish()
+    elif arguments['migrate']:
+        LOGGER.info('Migrating RandTalkBot DB')
+
+        try:
+            applied = db.migrate(dry_run=arguments['--dry-run'])
+        except DBError as err:
+            sys.exit(f'Can\'t migrate DB. {err}')
+
+        if not applied:
+            print('DB schema is up to date')
+
+        for migration, statements in applied:
+            print(f'-- #{migration.version}: {migration.description}')
+
+            for statement in statements:
+                print(f'{statement};')
     else:
         LOGGER.info('Executing RandTalkBot')
         loop = asyncio.get_event_loop()
 
-        stats_service = StatsService()
-        loop.create_task(stats_service.run())
+        with profiler.phase('sharding'):
+            try:
+                shard = int(arguments['--shard'])
+                store = get_state_store(configuration.sharding_store)
+            except (StateStoreError, ValueError) as err:
+                sys.exit(f'Can\'t configure sharding. {err}')
+
+            if not 0 <= shard < configuration.sharding_shards_count:
+                sys.exit(f'Shard should be in [0, {configuration.sharding_shards_count}) range')
+
+            SHARDING.configure(
+                shard=shard,
+                shards_count=configuration.sharding_shards_count,
+                store=store,
+                )
+
+        with profiler.phase('services'):
+            DISPATCHER.configure(
+                workers_count=configuration.dispatcher_workers_count,
+                queue_size=configuration.dispatcher_queue_size,
+                user_queue_size=configuration.dispatcher_user_queue_size,
+                flood_policy=configuration.dispatcher_flood_policy,
+                )
+
+            if configuration.metrics_port is not None:
+                metrics_service = MetricsService(
+                    configuration.metrics_host,
+                    configuration.metrics_port,
+                    )
+                loop.create_task(metrics_service.run())
+
+            if configuration.query_budget_enabled:
+                QUERY_BUDGET.configure(
+                    reads=configuration.query_budget_reads,
+                    writes=configuration.query_budget_writes,
+                    )
+
+            Stranger.configure_invitations(configuration.token)
+            StrangerSender.configure(
+                copy_messages=configuration.relay_copy_messages,
+                chat_interval=configuration.relay_chat_interval,
+                coalesce_texts=configuration.relay_coalesce_texts,
+                )
+
+            if configuration.tracing_enabled:
+                TRACER.configure(
+                    buffer_size=configuration.tracing_buffer_size,
+                    path=configuration.tracing_path,
+                    )
+
+                if configuration.tracing_path is not None:
+                    loop.create_task(TRACER.run())
+
+            if configuration.watchdog_threshold is not None:
+                watchdog = Watchdog(
+                    configuration.watchdog_threshold,
+                    report_interval=configuration.watchdog_report_interval,
+                    )
+                loop.create_task(watchdog.run())
+
+        with profiler.phase('state_backend'):
+            if configuration.state_backend == 'in_process':
+                InProcessStateBackend().load()
+            elif configuration.state_backend == 'store':
+                StoreStateBackend(store).load()
+
+        with profiler.phase('waiting_pool'):
+            waiting_pool = WaitingPool()
+
+        with profiler.phase('stats_service'):
+            stats_service = StatsService()
+
+        with profiler.phase('bot'):
+            bot = Bot(configuration)
+
+        if SHARDING.enabled:
+            loop.create_task(SHARDING.run(bot))
+            loop.create_task(waiting_pool.run())
+
+        # Shard 0 does the work which shouldn't be duplicated.
+        if SHARDING.is_polling():
+            loop.create_task(bot.run())
+            # Stats are computed in background, so the bot starts to answer first.
+            loop.create_task(stats_service.run())
+        else:
+            loop.create_task(stats_service.run_reloading())
 
-        bot = Bot(configuration)
-        loop.create_task(bot.run())
+        loop.create_task(BONUS_LEDGER.run())
+        loop.create_task(Talk.run_saving())
+        profiler.finish()
 
         try:
             loop.run_forever()
         except KeyboardInterrupt:
             LOGGER.info('Execution was finished by keyboard interrupt')
+        finally:
+            Talk.save_unsaved()
+            BONUS_LEDGER.flush()
+            TRACER.close()
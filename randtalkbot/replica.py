@@ -0,0 +1,132 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Routing of read-only analytic queries to the DB replica.
+
+Heavy queries computing the stats scan whole tables. They're passed to the replica explicitly
+with `REPLICA.route()`, so they don't compete with the latency-critical matching and relaying on
+the primary. All the other queries, including every write, use the primary. If the replica lags
+behind the primary for more than `max_lag` seconds or its lag can't be obtained, the analytic
+queries fall back to the primary until the next lag check.
+"""
+
+import logging
+import time
+from peewee import DatabaseError, MySQLDatabase
+from .metrics import REGISTRY
+
+LOGGER = logging.getLogger('randtalkbot.replica')
+REPLICA_LAG_GAUGE = REGISTRY.gauge(
+    'randtalkbot_replica_lag_seconds',
+    'Replication lag obtained during the latest check.',
+    )
+ROUTED_QUERIES_COUNTER = REGISTRY.counter(
+    'randtalkbot_replica_routed_queries_total',
+    'Analytic queries by the database they were routed to.',
+    ('database', ),
+    )
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self._database = None
+        self.max_lag = None
+        self.lag_check_interval = None
+        self._is_fresh = False
+        # Monotonic time of the latest lag check.
+        self._checked_at = None
+        self.configure()
+
+    @property
+    def enabled(self):
+        return self._database is not None
+
+    def configure(self, database=None, max_lag=60, lag_check_interval=30):
+        """Args:
+            database (peewee.Database): Replica. `None` means analytic queries use the primary.
+            max_lag (float): Max lag in seconds the analytic queries can tolerate.
+            lag_check_interval (float): How often to check the lag in seconds.
+        """
+        self._database = database
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self._is_fresh = False
+        self._checked_at = None
+
+    def get_lag(self):
+        """Returns:
+            float: Seconds the replica lags behind the primary. `None` if the DB isn't replicating
+                or the replication is broken. Databases which can't replicate (e.g. SQLite) don't
+                lag.
+
+        Raises:
+            peewee.DatabaseError: If the replica is unavailable or the user lacks `REPLICATION
+                CLIENT` privilege.
+        """
+        if not isinstance(self._database, MySQLDatabase):
+            return 0
+
+        cursor = self._database.execute_sql('SHOW SLAVE STATUS')
+        row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        columns = [description[0] for description in cursor.description]
+        lag = dict(zip(columns, row)).get('Seconds_Behind_Master')
+        return None if lag is None else float(lag)
+
+    def is_fresh(self):
+        """Checks the lag not more often than once per `lag_check_interval` seconds.
+
+        Returns:
+            bool: Whether the replica can serve the analytic queries.
+        """
+        if not self.enabled:
+            return False
+
+        now = time.monotonic()
+
+        if self._checked_at is not None and now - self._checked_at < self.lag_check_interval:
+            return self._is_fresh
+
+        self._checked_at = now
+
+        try:
+            lag = self.get_lag()
+        except DatabaseError as err:
+            LOGGER.warning('Can\'t obtain replica\'s lag. Using primary DB. %s', err)
+            self._is_fresh = False
+            return False
+
+        if lag is None:
+            LOGGER.warning('Replica isn\'t replicating. Using primary DB')
+            self._is_fresh = False
+        else:
+            REPLICA_LAG_GAUGE.set(lag)
+            self._is_fresh = lag <= self.max_lag
+
+            if not self._is_fresh:
+                LOGGER.warning('Replica lags for %.0f sec. Using primary DB', lag)
+
+        return self._is_fresh
+
+    def route(self, query):
+        """Makes read-only analytic query use the replica if it's fresh enough.
+
+        Returns:
+            peewee.SelectQuery: The same query.
+        """
+        if self.is_fresh():
+            query.database = self._database
+            ROUTED_QUERIES_COUNTER.inc('replica')
+        else:
+            ROUTED_QUERIES_COUNTER.inc('primary')
+
+        return query
+
+
+REPLICA = ReplicaRouter()
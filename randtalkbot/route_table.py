@@ -0,0 +1,77 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Hot routes of relayed messages.
+
+Every chatting stranger's message is passed to the partner. The route table keeps everything
+`Stranger.send_to_partner()` needs for that, so relaying a message takes one dict lookup and no
+DB queries. A route is built on the first relayed message and is dropped when the talk ends:
+on `Stranger.set_partner()`, `Stranger.kick()` or when another shard has changed the stranger.
+"""
+
+from collections import namedtuple
+import logging
+from .metrics import CACHE_REQUESTS_COUNTER
+from .sharding import SHARDING
+
+LOGGER = logging.getLogger('randtalkbot.route_table')
+
+# `sender` is partner's sender or `None` if the partner is owned by another shard and messages
+# are relayed through it.
+Route = namedtuple('Route', ('partner_telegram_id', 'talk', 'partner', 'sender'))
+
+
+class RouteTable:
+    def __init__(self):
+        # Stranger's Telegram ID -> `Route` to their partner.
+        self._routes = {}
+
+    def __len__(self):
+        return len(self._routes)
+
+    def clear(self):
+        self._routes.clear()
+
+    def discard(self, stranger):
+        self._routes.pop(stranger.telegram_id, None)
+
+    def get(self, stranger):
+        """Returns:
+            Route: `None` if the stranger isn't talking.
+        """
+        try:
+            route = self._routes[stranger.telegram_id]
+        except KeyError:
+            CACHE_REQUESTS_COUNTER.inc('routes', 'miss')
+        else:
+            CACHE_REQUESTS_COUNTER.inc('routes', 'hit')
+            return route
+
+        partner = stranger.get_partner()
+
+        if partner is None:
+            return None
+
+        talk = stranger.get_talk()
+        partner_route = self._routes.get(partner.telegram_id)
+
+        # Both partners should count sent messages in one instance of the talk.
+        if partner_route is not None and partner_route.talk.id == talk.id:
+            talk = partner_route.talk
+            # pylint: disable=protected-access
+            stranger._talk = talk
+
+        if SHARDING.owns(partner.telegram_id):
+            sender = partner.get_sender()
+        else:
+            sender = None
+
+        route = Route(partner.telegram_id, talk, partner, sender)
+        self._routes[stranger.telegram_id] = route
+        return route
+
+
+ROUTE_TABLE = RouteTable()
@@ -0,0 +1,271 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Sharded deployment: several bot's processes sharing the load.
+
+Every shard owns a hash range of users' Telegram IDs and keeps in memory only the state of its
+own strangers. Shards talk through the state store:
+
+* Only shard 0 fetches updates from Telegram. It routes every update to its owner's queue.
+* Messages sent to the partner owned by another shard are relayed through the owner, so the
+  owner's rate limiting of the partner's chat holds.
+* A shard changing a stranger owned by another shard (e.g. matching it) asks the owner to reload
+  the stranger from the DB.
+* Partners being matched are locked in the store, so two shards can't match the same partner.
+* Every shard publishes the gauges of its own strangers, e.g. the waiting strangers counts, so
+  the other shards can sum them.
+"""
+
+import asyncio
+import json
+import logging
+import zlib
+from telepot.exception import TelegramError
+from .errors import StateStoreError, StrangerError
+from .metrics import REGISTRY
+from .state_store import InMemoryStateStore
+
+LOGGER = logging.getLogger('randtalkbot.sharding')
+EVENTS_COUNTER = REGISTRY.counter(
+    'randtalkbot_shard_events_total',
+    'Events passed between the shards.',
+    ('direction', 'type'),
+    )
+
+
+def get_shard(telegram_id, shards_count):
+    """Returns:
+        int: Number of the shard owning the user. Users are spread evenly by ranges of their IDs'
+            hashes.
+    """
+    return zlib.crc32(str(telegram_id).encode()) * shards_count >> 32
+
+def get_events_key(shard):
+    return f'randtalkbot:shard:{shard}:events'
+
+def get_value_key(shard, name):
+    return f'randtalkbot:shard:{shard}:values:{name}'
+
+
+class Sharding:
+    EVENTS_POP_TIMEOUT = 5
+    # Lock expires if the shard has died during matching.
+    LOCK_TTL = 60
+    STORE_RETRY_INTERVAL = 1
+
+    def __init__(self):
+        self.shard = None
+        self.shards_count = None
+        self._store = None
+        # Telegram ID -> the task relaying the latest messages to the user.
+        self._relayings = {}
+        self.configure()
+
+    def configure(self, shard=0, shards_count=1, store=None):
+        """Args:
+            shard (int): Number of this process' shard.
+            shards_count (int): `1` disables sharding.
+            store (InMemoryStateStore): Store shared by the shards, e.g. `RedisStateStore`.
+        """
+        self.shard = shard
+        self.shards_count = shards_count
+        self._store = InMemoryStateStore() if store is None else store
+
+    @property
+    def enabled(self):
+        return self.shards_count > 1
+
+    def is_polling(self):
+        """Returns:
+            bool: `True` if this shard should fetch updates from Telegram.
+        """
+        return self.shard == 0
+
+    def owns(self, telegram_id):
+        return not self.enabled or get_shard(telegram_id, self.shards_count) == self.shard
+
+    async def lock(self, stranger_id):
+        """Returns:
+            bool: `False` if another shard is matching the stranger.
+        """
+        if not self.enabled:
+            return True
+
+        return await self._store.set_if_not_exists(
+            f'randtalkbot:lock:{stranger_id}',
+            self.shard,
+            type(self).LOCK_TTL,
+            )
+
+    async def unlock(self, stranger_id):
+        if self.enabled:
+            await self._store.delete(f'randtalkbot:lock:{stranger_id}')
+
+    async def publish_value(self, name, value):
+        """Publishes this shard's value for the other shards.
+
+        Raises:
+            StateStoreError: If the store is unavailable.
+        """
+        await self._store.set(get_value_key(self.shard, name), json.dumps(value))
+
+    async def get_other_shards_values(self, name):
+        """Raises:
+            StateStoreError: If the store is unavailable.
+
+        Returns:
+            list: Values published by the other shards. Shards which haven't published the value
+                yet are skipped.
+        """
+        values = []
+
+        for shard in range(self.shards_count):
+            if shard == self.shard:
+                continue
+
+            value = await self._store.get(get_value_key(shard, name))
+
+            if value is not None:
+                values.append(json.loads(value))
+
+        return values
+
+    async def _publish(self, telegram_id, event):
+        """Raises:
+            StateStoreError: If the store is unavailable.
+        """
+        await self._store.push(
+            get_events_key(get_shard(telegram_id, self.shards_count)),
+            json.dumps(event),
+            )
+        EVENTS_COUNTER.inc('sent', event['type'])
+
+    async def _publish_safely(self, telegram_id, event):
+        from .state_backend import StateBackend
+
+        try:
+            # The state should be written before the owner reloads it.
+            await StateBackend.get_instance().flush()
+            await self._publish(telegram_id, event)
+        except StateStoreError as err:
+            LOGGER.warning('Can\'t publish %s event for %d. %s', event['type'], telegram_id, err)
+
+    def invalidate(self, stranger):
+        """Asks the shard owning the stranger to reload them. Is called after changing a stranger
+        owned by another shard.
+        """
+        if not self.owns(stranger.telegram_id):
+            asyncio.get_event_loop().create_task(self._publish_safely(
+                stranger.telegram_id,
+                {'type': 'invalidate', 'stranger_id': stranger.id},
+                ))
+
+    async def relay(self, telegram_id, messages):
+        """Passes messages to the shard owning the recipient.
+
+        Raises:
+            StateStoreError: If the store is unavailable.
+        """
+        await self._publish(telegram_id, {
+            'type': 'relay',
+            'telegram_id': telegram_id,
+            'messages': [message.message_json for message in messages],
+            })
+
+    async def route_update(self, telegram_id, update):
+        """Raises:
+            StateStoreError: If the store is unavailable.
+        """
+        await self._publish(telegram_id, {'type': 'update', 'update': update})
+
+    async def _relay(self, event, previous_relaying):
+        from .message import Message
+        from .stranger_service import StrangerService
+
+        # Messages to the same user are sent in the order of arrival.
+        if previous_relaying is not None:
+            await asyncio.wait([previous_relaying])
+
+        messages = [Message(message_json) for message_json in event['messages']]
+        stranger = StrangerService.get_instance().get_stranger(event['telegram_id'])
+
+        async def end_talk(error):
+            LOGGER.info('Can\'t relay messages to %d. Ending the talk. %s', stranger.id, error)
+            await stranger.end_talk()
+
+        try:
+            if len(messages) == 1:
+                await stranger.send(messages[0], on_deferred_error=end_talk)
+            else:
+                await stranger.send_media_group(messages)
+        except StrangerError as err:
+            LOGGER.warning('Can\'t relay messages to %d. %s', stranger.id, err)
+        except TelegramError as err:
+            await end_talk(err)
+
+    async def _relay_safely(self, event, previous_relaying):
+        try:
+            await self._relay(event, previous_relaying)
+        except asyncio.CancelledError:
+            raise
+        except Exception: # pylint: disable=broad-except
+            LOGGER.exception('Can\'t relay messages to %d', event['telegram_id'])
+
+    def _start_relaying(self, event):
+        telegram_id = event['telegram_id']
+        relaying = asyncio.get_event_loop().create_task(
+            self._relay_safely(event, self._relayings.get(telegram_id)),
+            )
+        self._relayings[telegram_id] = relaying
+
+        def forget(unused_relaying):
+            if self._relayings.get(telegram_id) is relaying:
+                del self._relayings[telegram_id]
+
+        relaying.add_done_callback(forget)
+
+    async def _handle_event(self, bot, event):
+        from .state_backend import StateBackend
+        from .stranger_service import StrangerService
+
+        EVENTS_COUNTER.inc('received', event['type'])
+
+        if event['type'] == 'update':
+            await bot.handle_update(event['update'])
+        elif event['type'] == 'relay':
+            # Relaying waits for Telegram, so it doesn't block the next events.
+            self._start_relaying(event)
+        elif event['type'] == 'invalidate':
+            await StateBackend.get_instance().reload(event['stranger_id'])
+            StrangerService.get_instance().refresh_stranger(event['stranger_id'])
+        else:
+            LOGGER.warning('Unknown event: %s', event['type'])
+
+    async def run(self, bot):
+        """Handles events passed to this shard by the other ones."""
+        key = get_events_key(self.shard)
+        LOGGER.info('Shard %d of %d is listening', self.shard, self.shards_count)
+
+        while True:
+            try:
+                event = await self._store.pop(key, type(self).EVENTS_POP_TIMEOUT)
+            except StateStoreError as err:
+                LOGGER.warning('Can\'t get events. %s', err)
+                await asyncio.sleep(type(self).STORE_RETRY_INTERVAL)
+                continue
+
+            if event is None:
+                continue
+
+            try:
+                await self._handle_event(bot, json.loads(event))
+            except asyncio.CancelledError:
+                raise
+            except Exception: # pylint: disable=broad-except
+                LOGGER.exception('Can\'t handle event: %s', event)
+
+
+SHARDING = Sharding()
@@ -0,0 +1,77 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+from collections import OrderedDict
+from contextlib import contextmanager
+import cProfile
+import logging
+import time
+
+LOGGER = logging.getLogger('randtalkbot.startup_profiler')
+
+
+class StartupProfiler:
+    """Measures phases of `randtalkbot` startup: `randtalkbot --profile-startup`.
+
+    Disabled profiler just runs the phases. Optionally the whole startup is profiled with
+    `cProfile` and its stats are dumped to `path` to be inspected with `pstats` or SnakeViz.
+    """
+
+    def __init__(self, enabled=False, path=None):
+        self.enabled = enabled
+        self._path = path
+        self._profile = None
+        # Phase name -> seconds.
+        self._durations = OrderedDict()
+
+    def add(self, name, duration):
+        if self.enabled:
+            self._durations[name] = self._durations.get(name, 0) + duration
+
+    def get_report(self):
+        """Returns:
+            str: Table of phases durations with their share of the total time.
+        """
+        total = sum(self._durations.values())
+        lines = ['Startup phases:']
+
+        for name, duration in self._durations.items():
+            share = duration / total * 100 if total else 0
+            lines.append(f'  {name:<20} {duration * 1000:>10.1f} ms {share:>5.1f}%')
+
+        lines.append(f'  {"total":<20} {total * 1000:>10.1f} ms')
+        return '\n'.join(lines)
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+
+        start_time = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start_time)
+
+    def start(self):
+        if self.enabled and self._path is not None:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+
+    def finish(self):
+        """Logs the report and dumps profile stats."""
+        if not self.enabled:
+            return
+
+        if self._profile is not None:
+            self._profile.disable()
+            self._profile.dump_stats(self._path)
+            LOGGER.info('Startup profile was dumped to %s', self._path)
+            self._profile = None
+
+        LOGGER.info('%s', self.get_report())
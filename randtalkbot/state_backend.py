@@ -0,0 +1,276 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""State of the matching: who is looking for partner and who is talking with whom.
+
+`Stranger` and `StrangerService` obtain the state through `StateBackend.get_instance()`:
+
+* `DatabaseStateBackend` queries the DB. It's used by default.
+* `InProcessStateBackend` loads the state from the DB once and keeps it in memory, so looking up
+  the partner or the talk or checking if somebody is waiting doesn't touch the DB. It's suitable
+  for single-process deployments only.
+* `StoreStateBackend` additionally mirrors the state to the key-value store shared by the
+  shards. The shard changing a stranger owned by another shard makes the owner reload the
+  stranger's state from the store.
+"""
+
+import asyncio
+from collections import deque
+import logging
+from .errors import StateStoreError
+
+LOGGER = logging.getLogger('randtalkbot.state_backend')
+
+
+class StateBackend:
+    def __init__(self):
+        StateBackend._instance = self
+
+    @classmethod
+    def get_instance(cls):
+        try:
+            return StateBackend._instance
+        except AttributeError:
+            return DatabaseStateBackend()
+
+    def begin_talk(self, talk):
+        raise NotImplementedError()
+
+    def end_talk(self, talk):
+        raise NotImplementedError()
+
+    async def flush(self):
+        """Waits until the changes are visible to the other shards."""
+        pass
+
+    def get_partner(self, stranger):
+        """Obtains stranger's partner `Stranger` or `None` if the stranger isn't talking."""
+        raise NotImplementedError()
+
+    def get_talk(self, stranger):
+        """Obtains stranger's current `Talk` or `None` if the stranger isn't talking."""
+        raise NotImplementedError()
+
+    def get_waiting_ids(self):
+        """Obtains collection of IDs of the strangers looking for partner. Is valid only if
+        `knows_waiting_ids()`.
+        """
+        raise NotImplementedError()
+
+    def knows_waiting_ids(self):
+        """Tells whether `get_waiting_ids()` contains all the strangers looking for partner."""
+        raise NotImplementedError()
+
+    async def reload(self, stranger_id):
+        """Obtains stranger's state changed by another shard."""
+        pass
+
+    def update_waiting(self, stranger):
+        """Synchronizes the backend with stranger's `looking_for_partner_from` field."""
+        raise NotImplementedError()
+
+
+class DatabaseStateBackend(StateBackend):
+    def begin_talk(self, talk):
+        pass
+
+    def end_talk(self, talk):
+        pass
+
+    def get_partner(self, stranger):
+        talk = stranger.get_talk()
+        return None if talk is None else talk.get_partner(stranger)
+
+    def get_talk(self, stranger):
+        from .talk import Talk
+        return Talk.get_talk(stranger)
+
+    def get_waiting_ids(self):
+        return frozenset()
+
+    def knows_waiting_ids(self):
+        return False
+
+    def update_waiting(self, stranger):
+        pass
+
+
+class InProcessStateBackend(StateBackend):
+    def __init__(self):
+        super(InProcessStateBackend, self).__init__()
+        # Stranger ID -> (talk ID, partner ID).
+        self._talks = {}
+        # Talk ID -> not ended `Talk` shared by both partners.
+        self._talks_by_id = {}
+        self._waiting_ids = set()
+
+    def load(self):
+        from .stranger import Stranger
+        from .talk import Talk
+
+        for talk in Talk.get_not_ended_talks():
+            InProcessStateBackend.begin_talk(self, talk)
+
+        # pylint: disable=singleton-comparison
+        waiting_strangers = Stranger.select(Stranger.id) \
+            .where(Stranger.looking_for_partner_from != None)
+        self._waiting_ids = {stranger.id for stranger in waiting_strangers}
+        LOGGER.debug(
+            '%d talks and %d waiting strangers were loaded',
+            len(self._talks) // 2,
+            len(self._waiting_ids),
+            )
+
+    def begin_talk(self, talk):
+        self._talks[talk.partner1_id] = talk.id, talk.partner2_id
+        self._talks[talk.partner2_id] = talk.id, talk.partner1_id
+        self._talks_by_id[talk.id] = talk
+
+    def end_talk(self, talk):
+        self._talks_by_id.pop(talk.id, None)
+
+        for stranger_id in (talk.partner1_id, talk.partner2_id):
+            # The stranger could have begun another talk already.
+            if self._talks.get(stranger_id, (None, ))[0] == talk.id:
+                del self._talks[stranger_id]
+
+    def get_partner(self, stranger):
+        from .stranger_service import StrangerService
+
+        try:
+            unused_talk_id, partner_id = self._talks[stranger.id]
+        except KeyError:
+            return None
+
+        return StrangerService.get_instance().get_cached_stranger_by_id(partner_id)
+
+    def get_talk(self, stranger):
+        from .talk import Talk
+
+        try:
+            talk_id, unused_partner_id = self._talks[stranger.id]
+        except KeyError:
+            return None
+
+        try:
+            return self._talks_by_id[talk_id]
+        except KeyError:
+            # The talk was begun by another shard.
+            talk = Talk.get_talk_by_id(talk_id)
+            self._talks_by_id[talk_id] = talk
+            return talk
+
+    def get_waiting_ids(self):
+        return self._waiting_ids
+
+    def knows_waiting_ids(self):
+        return True
+
+    def update_waiting(self, stranger):
+        if stranger.looking_for_partner_from is None:
+            self._waiting_ids.discard(stranger.id)
+        else:
+            self._waiting_ids.add(stranger.id)
+
+
+class StoreStateBackend(InProcessStateBackend):
+    """Is `InProcessStateBackend` writing through to the state store. Other shards' waiting
+    strangers aren't known, so `knows_waiting_ids()` is `False`.
+    """
+
+    def __init__(self, store):
+        super(StoreStateBackend, self).__init__()
+        self._store = store
+        # Commands to the store are sent in the order of changes.
+        self._pending_writes = deque()
+        self._writing = None
+
+    @classmethod
+    def get_talk_key(cls, stranger_id):
+        return f'randtalkbot:talk:{stranger_id}'
+
+    @classmethod
+    def get_waiting_key(cls, stranger_id):
+        return f'randtalkbot:waiting:{stranger_id}'
+
+    async def _write(self):
+        while self._pending_writes:
+            method_name, args = self._pending_writes.popleft()
+
+            try:
+                await getattr(self._store, method_name)(*args)
+            except StateStoreError as err:
+                LOGGER.warning('Can\'t write %s to the store. %s', args[0], err)
+
+    def _write_later(self, method_name, *args):
+        self._pending_writes.append((method_name, args))
+
+        if self._writing is None or self._writing.done():
+            self._writing = asyncio.get_event_loop().create_task(self._write())
+
+    def begin_talk(self, talk):
+        super(StoreStateBackend, self).begin_talk(talk)
+        self._write_later(
+            'set',
+            type(self).get_talk_key(talk.partner1_id),
+            f'{talk.id}:{talk.partner2_id}',
+            )
+        self._write_later(
+            'set',
+            type(self).get_talk_key(talk.partner2_id),
+            f'{talk.id}:{talk.partner1_id}',
+            )
+
+    def end_talk(self, talk):
+        super(StoreStateBackend, self).end_talk(talk)
+
+        for stranger_id in (talk.partner1_id, talk.partner2_id):
+            if stranger_id not in self._talks:
+                self._write_later('delete', type(self).get_talk_key(stranger_id))
+
+    async def flush(self):
+        while self._writing is not None and not self._writing.done():
+            await asyncio.wait([self._writing])
+
+    def knows_waiting_ids(self):
+        return False
+
+    async def reload(self, stranger_id):
+        """Raises:
+            StateStoreError: If the store is unavailable.
+        """
+        talk = await self._store.get(type(self).get_talk_key(stranger_id))
+        old_talk_id = self._talks.get(stranger_id, (None, ))[0]
+
+        if talk is None:
+            self._talks.pop(stranger_id, None)
+        else:
+            talk_id, partner_id = talk.split(':')
+            self._talks[stranger_id] = int(talk_id), int(partner_id)
+
+        # The talk was ended by another shard.
+        if old_talk_id is not None and self._talks.get(stranger_id, (None, ))[0] != old_talk_id:
+            old_talk = self._talks_by_id.pop(old_talk_id, None)
+
+            # Only the counters of this shard's stranger are changed, so the other shard's
+            # changes aren't overwritten.
+            if old_talk is not None:
+                old_talk.save()
+
+        if await self._store.get(type(self).get_waiting_key(stranger_id)) is None:
+            self._waiting_ids.discard(stranger_id)
+        else:
+            self._waiting_ids.add(stranger_id)
+
+    def update_waiting(self, stranger):
+        was_waiting = stranger.id in self._waiting_ids
+        super(StoreStateBackend, self).update_waiting(stranger)
+        is_waiting = stranger.id in self._waiting_ids
+
+        if is_waiting and not was_waiting:
+            self._write_later('set', type(self).get_waiting_key(stranger.id), 1)
+        elif was_waiting and not is_waiting:
+            self._write_later('delete', type(self).get_waiting_key(stranger.id))
@@ -0,0 +1,235 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Key-value state shared by the bot's processes.
+
+Only the few Redis commands the bot needs are supported: expiring values set if they don't
+exist (locks) and lists with blocking pop (queues). `RedisStateStore` speaks Redis protocol over
+asyncio streams so no extra dependency is needed. `InMemoryStateStore` is its fake for tests and
+for single-process deployments.
+"""
+
+import asyncio
+from collections import deque
+import logging
+import math
+import time
+from urllib.parse import urlsplit
+from .errors import StateStoreError
+
+LOGGER = logging.getLogger('randtalkbot.state_store')
+REDIS_DEFAULT_PORT = 6379
+
+
+def get_state_store(url):
+    """Args:
+        url (str): `memory://` or `redis://HOST[:PORT][/DB]`.
+
+    Raises:
+        StateStoreError: If URL is wrong.
+
+    Returns:
+        InMemoryStateStore: Or `RedisStateStore`.
+    """
+    parts = urlsplit(url)
+
+    if parts.scheme == 'memory':
+        return InMemoryStateStore()
+    elif parts.scheme == 'redis':
+        try:
+            database = int(parts.path.lstrip('/') or 0)
+            port = parts.port or REDIS_DEFAULT_PORT
+        except ValueError as err:
+            raise StateStoreError(f'Wrong Redis URL: \"{url}\"') from err
+
+        return RedisStateStore(parts.hostname or '127.0.0.1', port, database)
+    else:
+        raise StateStoreError(f'Unknown state store: \"{url}\"')
+
+
+class InMemoryStateStore:
+    def __init__(self):
+        # Key -> (value, monotonic expiration time).
+        self._values = {}
+        self._lists = {}
+        # Key -> `asyncio.Event` set on every push to the list.
+        self._pushed = {}
+
+    async def set_if_not_exists(self, key, value, ttl):
+        """Returns:
+            bool: `False` if the key exists already.
+        """
+        now = time.monotonic()
+
+        try:
+            unused_value, expiration = self._values[key]
+        except KeyError:
+            pass
+        else:
+            if expiration > now:
+                return False
+
+        self._values[key] = value, now + ttl
+        return True
+
+    async def delete(self, key):
+        self._values.pop(key, None)
+
+    async def get(self, key):
+        """Returns:
+            str: `None` if there's no such key.
+        """
+        try:
+            value, expiration = self._values[key]
+        except KeyError:
+            return None
+
+        return None if expiration <= time.monotonic() else str(value)
+
+    async def set(self, key, value):
+        self._values[key] = value, math.inf
+
+    async def push(self, key, value):
+        self._lists.setdefault(key, deque()).append(value)
+        pushed = self._pushed.get(key)
+
+        if pushed is not None:
+            pushed.set()
+
+    async def pop(self, key, timeout):
+        """Returns:
+            str: The oldest value of the list or `None` if the list was empty during `timeout`
+                seconds.
+        """
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+
+        while True:
+            values = self._lists.get(key)
+
+            if values:
+                return values.popleft()
+
+            pushed = self._pushed.setdefault(key, asyncio.Event())
+            pushed.clear()
+
+            try:
+                await asyncio.wait_for(pushed.wait(), max(0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                return None
+
+
+class _RedisConnection:
+    def __init__(self, host, port, database):
+        self._host = host
+        self._port = port
+        self._database = database
+        self._reader = None
+        self._writer = None
+        # Replies come in the order of requests, so requests are serialized.
+        self._lock = None
+
+    @classmethod
+    def encode(cls, *args):
+        chunks = [f'*{len(args)}\r\n'.encode()]
+
+        for arg in args:
+            arg = str(arg).encode()
+            chunks.append(f'${len(arg)}\r\n'.encode())
+            chunks.append(arg + b'\r\n')
+
+        return b''.join(chunks)
+
+    @classmethod
+    async def read_reply(cls, reader):
+        """Raises:
+            StateStoreError: If Redis has replied with an error.
+
+        Returns:
+            object: `str`, `int`, `list` of replies or `None`.
+        """
+        line = await reader.readuntil(b'\r\n')
+        prefix, payload = line[:1], line[1:-2]
+
+        if prefix == b'+':
+            return payload.decode()
+        elif prefix == b'-':
+            raise StateStoreError(payload.decode())
+        elif prefix == b':':
+            return int(payload)
+        elif prefix == b'$':
+            length = int(payload)
+            return None if length < 0 else (await reader.readexactly(length + 2))[:-2].decode()
+        elif prefix == b'*':
+            count = int(payload)
+            return None if count < 0 else [await cls.read_reply(reader) for _ in range(count)]
+        else:
+            raise StateStoreError(f'Unexpected reply: {line!r}')
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+        self._reader = None
+        self._writer = None
+
+    async def execute(self, *args):
+        """Raises:
+            StateStoreError: If Redis is unavailable or has replied with an error.
+
+        Returns:
+            object: Redis reply, see `read_reply()`.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    self._reader, self._writer = \
+                        await asyncio.open_connection(self._host, self._port)
+
+                    if self._database:
+                        self._writer.write(type(self).encode('SELECT', self._database))
+                        await type(self).read_reply(self._reader)
+
+                self._writer.write(type(self).encode(*args))
+                return await type(self).read_reply(self._reader)
+            except (OSError, asyncio.IncompleteReadError) as err:
+                self.close()
+                raise StateStoreError(f'Redis is unavailable: {err}') from err
+
+
+class RedisStateStore:
+    def __init__(self, host='127.0.0.1', port=REDIS_DEFAULT_PORT, database=0):
+        self._connection = _RedisConnection(host, port, database)
+        # `BLPOP` blocks the connection, so it gets its own one.
+        self._blocking_connection = _RedisConnection(host, port, database)
+
+    def close(self):
+        self._connection.close()
+        self._blocking_connection.close()
+
+    async def set_if_not_exists(self, key, value, ttl):
+        reply = await self._connection.execute('SET', key, value, 'NX', 'PX', int(ttl * 1000))
+        return reply == 'OK'
+
+    async def delete(self, key):
+        await self._connection.execute('DEL', key)
+
+    async def get(self, key):
+        return await self._connection.execute('GET', key)
+
+    async def set(self, key, value):
+        await self._connection.execute('SET', key, value)
+
+    async def push(self, key, value):
+        await self._connection.execute('RPUSH', key, value)
+
+    async def pop(self, key, timeout):
+        # `BLPOP` accepts whole seconds and treats `0` as infinity.
+        reply = await self._blocking_connection.execute('BLPOP', key, max(1, math.ceil(timeout)))
+        return None if reply is None else reply[1]
@@ -7,8 +7,9 @@
 import asyncio
 import datetime
 import logging
-from peewee import DoesNotExist
+from peewee import DatabaseError, DoesNotExist
 from .errors import StrangerSenderServiceError
+from .replica import REPLICA
 from .stats import Stats
 
 COUNT_INTERVALS = (4, 16, 64, 256)
@@ -59,14 +60,24 @@ def second(iterable):
 
 class StatsService:
     INTERVAL = datetime.timedelta(hours=4)
+    # How often the shards which don't compute the stats reload them.
+    RELOAD_INTERVAL = datetime.timedelta(minutes=1)
+    # Stats computing yields to the event loop after every chunk of strangers.
+    STRANGERS_CHUNK_SIZE = 1000
 
     def __init__(self):
+        """Doesn't compute stats if there're no stats in the DB: `run()` computes them in
+        background.
+        """
         type(self)._instance = self
+        self._stats = type(self)._get_latest_stats()
+
+    @classmethod
+    def _get_latest_stats(cls):
         try:
-            self._stats = Stats.select().order_by(Stats.created.desc()).get()
+            return Stats.select().order_by(Stats.created.desc()).get()
         except DoesNotExist:
-            self._stats = None
-            self._update_stats()
+            return None
 
     @classmethod
     def get_instance(cls):
@@ -76,25 +87,49 @@ class StatsService:
             raise RuntimeError('StatsService was not initialized')
 
     def get_stats(self):
-        return self._stats
+        """Returns:
+            Stats: Empty stats if the first stats weren't computed yet.
+        """
+        return Stats(data_json='{}') if self._stats is None else self._stats
 
     async def run(self):
         while True:
-            next_stats_time = self._stats.created + type(self).INTERVAL
-            now = datetime.datetime.utcnow()
+            if self._stats is not None:
+                next_stats_time = self._stats.created + type(self).INTERVAL
+                now = datetime.datetime.utcnow()
+
+                if next_stats_time > now:
+                    await asyncio.sleep((next_stats_time - now).total_seconds())
+
+            await self._update_stats()
+
+    async def run_reloading(self):
+        """Is run instead of `run()` by the shards which don't compute the stats: reloads the
+        stats computed by the polling shard.
+        """
+        while True:
+            await asyncio.sleep(type(self).RELOAD_INTERVAL.total_seconds())
+            self.reload_stats()
 
-            if next_stats_time > now:
-                await asyncio.sleep((next_stats_time - now).total_seconds())
+    def reload_stats(self):
+        try:
+            stats = type(self)._get_latest_stats()
+        except DatabaseError as err:
+            LOGGER.warning('Can\'t reload stats. %s', err)
+            return
 
-            self._update_stats()
+        if stats is not None:
+            self._stats = stats
 
-    def _update_stats(self):
+    async def _update_stats(self):
         from .stranger_service import StrangerService
         from .stranger_sender_service import StrangerSenderService
         from .talk import Talk
+        from .waiting_pool import WaitingPool
         stats = Stats()
         stranger_service = StrangerService.get_instance()
 
+        bonus_count_distribution = {}
         sex_distribution = {}
         partner_sex_distribution = {}
         languages_count_distribution = {}
@@ -103,6 +138,11 @@ class StatsService:
 
         for stranger in stranger_service.get_full_strangers():
             total_count += 1
+
+            if not total_count % type(self).STRANGERS_CHUNK_SIZE:
+                await asyncio.sleep(0)
+
+            increment(bonus_count_distribution, stranger.bonus_count)
             increment(sex_distribution, stranger.sex)
             increment(partner_sex_distribution, stranger.partner_sex)
             increment(languages_count_distribution, len(stranger.get_languages()))
@@ -124,7 +164,10 @@ class StatsService:
             for language, popularity in languages_popularity_items
             }
 
-        for stranger in stranger_service.get_full_strangers():
+        for index, stranger in enumerate(stranger_service.get_full_strangers(), 1):
+            if not index % type(self).STRANGERS_CHUNK_SIZE:
+                await asyncio.sleep(0)
+
             orientation = '{} {}'.format(stranger.sex, stranger.partner_sex)
 
             for language in stranger.get_languages():
@@ -140,15 +183,18 @@ class StatsService:
             for language, popularity in languages_popularity_items
             ]
 
+        # Heavy queries computing the stats are passed to the replica.
         talks_waiting = get_talks_stats(
-            Talk.get_not_ended_talks(after=None if self._stats is None else self._stats.created),
+            REPLICA.route(Talk.get_not_ended_talks(
+                after=None if self._stats is None else self._stats.created,
+                )),
             lambda talk: (talk.begin - talk.searched_since).total_seconds(),
             (10, 60, 60 * 5, 60 * 30, 60 * 60 * 3, ),
             )
 
-        ended_talks = Talk.get_ended_talks(
+        ended_talks = REPLICA.route(Talk.get_ended_talks(
             after=None if self._stats is None else self._stats.created,
-            )
+            ))
         talks_duration = get_talks_stats(
             ended_talks,
             lambda talk: (talk.end - talk.begin).total_seconds(),
@@ -164,6 +210,7 @@ class StatsService:
             Talk.delete_old(before=self._stats.created)
 
         stats_json = {
+            'bonus_count_distribution': bonus_count_distribution,
             'languages_count_distribution': langs_count_distribution_items,
             'languages_popularity': languages_popularity_items,
             'languages_to_orientation': languages_to_orientation_items,
@@ -183,6 +230,12 @@ class StatsService:
             StrangerService.get_instance().get_cache_size(),
             )
 
+        LOGGER.debug(
+            'WaitingPool size: %d. By sex: %s',
+            WaitingPool.get_instance().get_count(),
+            WaitingPool.get_instance().get_counts_by_sex(),
+            )
+
         try:
             LOGGER.debug(
                 'StrangerSenderService cache size: %d',
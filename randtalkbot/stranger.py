@@ -7,20 +7,29 @@
 import asyncio
 import base64
 import datetime
+import hashlib
 import json
 import logging
-import random
+import secrets
 import string
 from peewee import CharField, DateTimeField, ForeignKeyField, IntegerField, Model, Proxy
 from telepot.exception import TelegramError
-from .errors import EmptyLanguagesError, MissingPartnerError, SexError, StrangerError, \
-    StrangerSenderError
-from .i18n import get_languages_names, get_translations
+from .errors import EmptyLanguagesError, MissingPartnerError, SexError, StateStoreError, \
+    StrangerError, StrangerSenderError
+from .i18n import get_all_translations, get_languages_names
+from .route_table import ROUTE_TABLE
+from .sharding import SHARDING
+from .state_backend import StateBackend
 from .stats_service import StatsService
+from .stranger_sender import StrangerSender
 from .stranger_sender_service import StrangerSenderService
+from .tracing import TRACER
+from .waiting_pool import WaitingPool
 
 INVITATION_CHARS = string.ascii_letters + string.digits + string.punctuation
+# Invitation encodes 64-bit number: `len(INVITATION_CHARS) ** INVITATION_LENGTH > 2 ** 64`.
 INVITATION_LENGTH = 10
+INVITATION_ROUNDS = 4
 LANGUAGES_MAX_LENGTH = 40
 LOGGER = logging.getLogger('randtalkbot.stranger')
 
@@ -31,12 +40,13 @@ def _(string_instance):
 def get_sex_names_to_codes():
     sex_names_to_codes = {}
 
-    for translation in get_translations():
-        for sex, name in SEX_CHOICES:
-            sex_names_to_codes[translation(name).lower()] = sex
+    for sex, name in SEX_CHOICES:
+        for translation in get_all_translations(name):
+            sex_names_to_codes[translation] = sex
 
-        for name, sex in ADDITIONAL_SEX_NAMES_TO_CODES.items():
-            sex_names_to_codes[translation(name).lower()] = sex
+    for name, sex in ADDITIONAL_SEX_NAMES_TO_CODES.items():
+        for translation in get_all_translations(name):
+            sex_names_to_codes[translation] = sex
 
     return sex_names_to_codes
 
@@ -71,7 +81,7 @@ class Stranger(Model):
     invitation = CharField(max_length=INVITATION_LENGTH, unique=True)
     invited_by = ForeignKeyField('self', null=True, related_name='invited')
     languages = CharField(max_length=LANGUAGES_MAX_LENGTH, null=True)
-    looking_for_partner_from = DateTimeField(null=True)
+    looking_for_partner_from = DateTimeField(index=True, null=True)
     partner_sex = CharField(choices=SEX_CHOICES, max_length=SEX_MAX_LENGTH, null=True)
     sex = CharField(choices=SEX_CHOICES, max_length=SEX_MAX_LENGTH, null=True)
     telegram_id = IntegerField(unique=True)
@@ -82,20 +92,77 @@ class Stranger(Model):
     ADVERTISING_DELAY = 30
     HOUR_TIMEDELTA = datetime.timedelta(hours=1)
     LONG_WAITING_TIMEDELTA = datetime.timedelta(minutes=5)
+    # Telegram delivers album's items as separate updates almost simultaneously.
+    MEDIA_GROUP_DELAY = 1
     REWARD_BIG = 3
     REWARD_SMALL = 1
     UNMUTE_BONUSES_NOTIFICATIONS_DELAY = 60 * 60
+    # Is derived from the bot's token by `configure_invitations()`.
+    invitation_key = None
 
     class Meta:
         database = DATABASE_PROXY
+        # `save()` writes the changed fields only and is skipped if nothing was changed.
+        only_save_dirty = True
         indexes = (
             (('partner_sex', 'bonus_count', 'looking_for_partner_from'), False),
             (('sex', 'partner_sex', 'bonus_count', 'looking_for_partner_from'), False),
             )
 
     @classmethod
-    def get_invitation(cls):
-        return ''.join([random.choice(INVITATION_CHARS) for i in range(INVITATION_LENGTH)])
+    def configure_invitations(cls, secret):
+        """Args:
+            secret (str): Stable secret, e.g. the bot's token. Invitations of other strangers can
+                be predicted by anyone knowing it.
+        """
+        # pylint: disable=no-member
+        cls.invitation_key = hashlib.blake2b(
+            secret.encode('utf-8'),
+            digest_size=16,
+            person=b'invitation',
+            ).digest()
+
+    @classmethod
+    def get_invitation(cls, telegram_id):
+        """Derives the invitation from Telegram ID with a keyed permutation (Feistel network over
+        64 bits), so different strangers never get the same invitation and obtaining it needs
+        neither random nor DB lookups.
+
+        Raises:
+            StrangerError: If `configure_invitations()` wasn't called.
+
+        Returns:
+            str: Invitation of `INVITATION_LENGTH` chars.
+        """
+        if cls.invitation_key is None:
+            raise StrangerError('Invitations aren\'t configured')
+
+        # Telegram IDs are positive and fit in 52 bits, so the mask doesn't merge different IDs.
+        left, right = divmod(telegram_id & 0xFFFFFFFFFFFFFFFF, 1 << 32)
+
+        for round_index in range(INVITATION_ROUNDS):
+            # pylint: disable=no-member
+            digest = hashlib.blake2b(
+                bytes((round_index, )) + right.to_bytes(4, 'big'),
+                digest_size=4,
+                key=cls.invitation_key,
+                ).digest()
+            left, right = right, left ^ int.from_bytes(digest, 'big')
+
+        value = (left << 32) | right
+        chars = []
+
+        for unused_index in range(INVITATION_LENGTH):
+            value, char_index = divmod(value, len(INVITATION_CHARS))
+            chars.append(INVITATION_CHARS[char_index])
+
+        return ''.join(chars)
+
+    @classmethod
+    def get_random_invitation(cls):
+        """Is used if the derived invitation is taken by a stranger with legacy random one."""
+        chars = [secrets.choice(INVITATION_CHARS) for unused_index in range(INVITATION_LENGTH)]
+        return ''.join(chars)
 
     @classmethod
     def _get_sex_code(cls, sex_name):
@@ -106,20 +173,51 @@ class Stranger(Model):
             raise SexError(sex_name)
 
     async def _add_bonuses(self, bonuses_delta):
-        self.bonus_count += bonuses_delta
-        self.save()
+        from .bonus_ledger import BONUS_LEDGER
+
+        if not self._change_bonus_count(bonuses_delta):
+            LOGGER.warning('Add bonuses. Stranger %d wasn\'t found', self.id)
+            return
+
+        BONUS_LEDGER.record(self, bonuses_delta, 'invitation')
+        self._on_saved()
         bonuses_notifications_muted = getattr(self, '_bonuses_notifications_muted', False)
 
         if not bonuses_notifications_muted:
             await self._notify_about_bonuses(bonuses_delta)
 
+    def _change_bonus_count(self, delta, spend=False):
+        """Changes bonuses count with atomic `UPDATE`, so concurrent changes of the same stranger
+        aren't lost. Neither records the change to the bonus ledger nor propagates it (see
+        `_on_saved()`).
+
+        Args:
+            delta (int): Bonuses to add. Negative to spend.
+            spend (bool): Don't let bonuses count become negative.
+
+        Returns:
+            bool: `False` if the stranger lacks bonuses to spend or wasn't found.
+        """
+        query = Stranger \
+            .update(bonus_count=Stranger.bonus_count + delta) \
+            .where(Stranger.id == self.id)
+
+        if spend:
+            query = query.where(Stranger.bonus_count + delta >= 0)
+
+        if not query.execute():
+            return False
+
+        # The other instances of the stranger can't be changed here, so the value may be stale
+        # until the stranger is reloaded.
+        self._data['bonus_count'] = self.bonus_count + delta
+        return True
+
     async def _advertise(self):
         await asyncio.sleep(type(self).ADVERTISING_DELAY)
         # pylint: disable=attribute-defined-outside-init
         self._deferred_advertising = None
-        searching_for_partner_count = Stranger.select() \
-            .where(Stranger.looking_for_partner_from != None) \
-            .count()
+        searching_for_partner_count = WaitingPool.get_instance().get_count()
 
         if searching_for_partner_count <= 1:
             # Let's not advertise if there's nobody to talk with.
@@ -212,9 +310,8 @@ class Stranger(Model):
         try:
             return self._partner
         except AttributeError:
-            talk = self.get_talk()
             # pylint: disable=attribute-defined-outside-init
-            self._partner = None if talk is None else talk.get_partner(self)
+            self._partner = StateBackend.get_instance().get_partner(self)
             return self._partner
 
     def get_sender(self):
@@ -232,9 +329,8 @@ class Stranger(Model):
         try:
             return self._talk
         except AttributeError:
-            from .talk import Talk
             # pylint: disable=attribute-defined-outside-init
-            self._talk = Talk.get_talk(self)
+            self._talk = StateBackend.get_instance().get_talk(self)
             return self._talk
 
     def is_novice(self):
@@ -248,15 +344,21 @@ class Stranger(Model):
             self.partner_sex is not None
 
     async def kick(self):
+        """Notifies the stranger that the partner has left and forgets the talk. The talk is ended
+        and paid for by partner's `set_partner()`.
+        """
+        await self._flush_media_group()
+
         try:
             await self._notify_talk_ended(by_self=False)
         except StrangerError as err:
             LOGGER.warning('Kick. Can\'t notify stranger %d: %s', self.id, err)
-        self._pay_for_talk()
         # pylint: disable=attribute-defined-outside-init
         self._talk = None
         # pylint: disable=attribute-defined-outside-init
         self._partner = None
+        ROUTE_TABLE.discard(self)
+        SHARDING.invalidate(self)
 
     def mute_bonuses_notifications(self):
         # pylint: disable=attribute-defined-outside-init
@@ -329,6 +431,13 @@ class Stranger(Model):
             raise StrangerError() from err
 
     async def notify_partner_found(self, partner):
+        """Raises:
+            StrangerError: If stranger we're changing has blocked the bot.
+        """
+        with TRACER.span('Stranger.notify_partner_found', stranger_id=self.id):
+            await self._notify_partner_found(partner)
+
+    async def _notify_partner_found(self, partner):
         """Raises:
             StrangerError: If stranger we're changing has blocked the bot.
         """
@@ -400,8 +509,14 @@ class Stranger(Model):
             sender.update_translation()
 
     async def pay(self, delta, gratitude):
-        self.bonus_count += delta
-        self.save()
+        from .bonus_ledger import BONUS_LEDGER
+
+        if not self._change_bonus_count(delta):
+            LOGGER.warning('Pay. Stranger %d wasn\'t found', self.id)
+            return
+
+        BONUS_LEDGER.record(self, delta, 'payment')
+        self._on_saved()
         sender = self.get_sender()
         try:
             await sender.send_notification(
@@ -413,12 +528,18 @@ class Stranger(Model):
         except TelegramError as err:
             LOGGER.info('Pay. Can\'t notify stranger %d: %s', self.id, err)
 
-    def _pay_for_talk(self):
-        talk = self.get_talk()
+    def _pay_for_talk(self, talk):
+        """Spends a bonus for the successful talk the stranger has initiated. Doesn't propagate
+        the change.
+
+        Returns:
+            bool: Whether the bonus was spent.
+        """
         if talk is not None and talk.is_successful() and self == talk.partner1 and \
                 self.bonus_count >= 1:
-            self.bonus_count -= 1
-            self.save()
+            return self._change_bonus_count(-1, spend=True)
+
+        return False
 
     def prevent_advertising(self):
         try:
@@ -430,15 +551,17 @@ class Stranger(Model):
         # pylint: disable=attribute-defined-outside-init
         self._deferred_advertising = None
 
-    async def _reward_inviter(self):
+    async def _reward_inviter(self, sent_count=1):
+        """Rewards the inviter if the talk has become successful after the stranger had sent
+        `sent_count` messages: both partners have sent something and the stranger had sent
+        nothing before.
+        """
         if self.was_invited_as is not None or self.invited_by_id is None:
             return
 
         talk = self.get_talk()
-        threshold_messages_count = 1
 
-        if talk is None or talk.partner1_sent != threshold_messages_count or \
-                talk.partner2_sent != threshold_messages_count:
+        if talk is None or not talk.is_successful() or talk.get_sent(self) != sent_count:
             return
 
         LOGGER.debug('Rewarding inviter of %d', self.id)
@@ -454,36 +577,224 @@ class Stranger(Model):
         # pylint: disable=no-member,protected-access
         await self.invited_by._add_bonuses(reward)
 
-    async def send(self, message):
-        """Raises:
+    async def _relay(self, messages):
+        """Passes messages to the shard owning the stranger.
+
+        Raises:
+            StrangerError: If can't relay messages.
+        """
+        try:
+            for message in messages:
+                StrangerSender.check_message(message)
+
+            await SHARDING.relay(self.telegram_id, messages)
+        except (StateStoreError, StrangerSenderError) as err:
+            raise StrangerError('Can\'t relay content') from err
+
+    async def send(self, message, on_deferred_error=None):
+        """Args:
+            message (Message): Message to send.
+            on_deferred_error (callable): Coroutine function called with `TelegramError` if the
+                text was coalesced and sent later, see `StrangerSender.send()`.
+
+        Raises:
             StrangerError: If can't send message because of unknown content type.
             TelegramError: If stranger has blocked the bot.
         """
+        if not SHARDING.owns(self.telegram_id):
+            await self._relay([message])
+            return
+
         sender = self.get_sender()
 
         try:
-            await sender.send(message)
+            await sender.send(message, on_deferred_error=on_deferred_error)
         except StrangerSenderError as err:
             raise StrangerError('Can\'t send content') from err
 
-    async def send_to_partner(self, message):
+    async def send_media_group(self, messages):
         """Raises:
+            StrangerError: If can't send messages.
+            TelegramError: If stranger has blocked the bot.
+        """
+        if not SHARDING.owns(self.telegram_id):
+            await self._relay(messages)
+            return
+
+        sender = self.get_sender()
+
+        try:
+            await sender.send_media_group(messages)
+        except StrangerSenderError as err:
+            raise StrangerError('Can\'t send media group') from err
+
+    async def _send_media_group_later(self):
+        await asyncio.sleep(type(self).MEDIA_GROUP_DELAY)
+
+        try:
+            await self._send_media_group_to_partner(is_deferred=True)
+        except StrangerError as err:
+            LOGGER.warning('Can\'t send media group from %d to partner. %s', self.id, err)
+        except TelegramError as err:
+            await self._on_deferred_sending_error(err)
+
+    async def _on_deferred_sending_error(self, error):
+        """Is called when the partner has blocked the bot while stranger's messages were waiting
+        to be sent.
+        """
+        LOGGER.warning('Can\'t send deferred messages from %d to partner. %s', self.id, error)
+
+        try:
+            await self.get_sender().send_notification(
+                _('Your partner has blocked me! How did you do that?!'),
+                )
+        except TelegramError as err:
+            LOGGER.warning('Can\'t notify stranger %d. %s', self.id, err)
+
+        await self.end_talk()
+
+    async def _flush_media_group(self):
+        """Sends the buffered album before the talk's end: its items were sent during the talk."""
+        try:
+            await self._send_media_group_to_partner()
+        except (StrangerError, TelegramError) as err:
+            LOGGER.warning('Can\'t flush media group from %d to partner. %s', self.id, err)
+
+    async def _send_media_group_to_partner(self, is_deferred=False):
+        """Sends buffered album's items to the partner in one call.
+
+        Raises:
+            StrangerError: If can't send content.
+            TelegramError: If the partner has blocked the bot.
+        """
+        try:
+            unused_media_group_id, route, messages, deferred_sending = self._media_group
+        except AttributeError:
+            return
+
+        del self._media_group
+
+        if not is_deferred:
+            deferred_sending.cancel()
+
+        if route is not ROUTE_TABLE.get(self):
+            LOGGER.debug('Media group from %d was dropped: the talk has ended', self.id)
+            return
+
+        await type(self)._send_by_route(route, messages)
+
+        with TRACER.span('Talk.increment_sent'):
+            route.talk.increment_sent(self, len(messages))
+
+        await self._reward_inviter(len(messages))
+
+    async def send_to_partner(self, message):
+        """Album's items are buffered during `MEDIA_GROUP_DELAY` and are sent together.
+
+        Raises:
             MissingPartnerError: If there's no partner for this stranger.
             StrangerError: If can't send content.
             TelegramError: If the partner has blocked the bot.
         """
-        partner = self.get_partner()
+        route = ROUTE_TABLE.get(self)
 
-        if partner is None:
+        if route is None:
             raise MissingPartnerError()
 
+        media_group = getattr(self, '_media_group', None)
+
+        if message.media_group_id is not None:
+            if media_group is None or media_group[0] != message.media_group_id:
+                # Another album has started.
+                await self._send_media_group_to_partner()
+                # pylint: disable=attribute-defined-outside-init
+                self._media_group = (
+                    message.media_group_id,
+                    route,
+                    [message],
+                    asyncio.get_event_loop().create_task(self._send_media_group_later()),
+                    )
+            else:
+                media_group[2].append(message)
+
+            return
+
+        # Keep the order of messages.
+        if media_group is not None:
+            await self._send_media_group_to_partner()
+
+        await self._send_by_route(
+            route,
+            [message],
+            on_deferred_error=self._on_deferred_sending_error,
+            )
+
+        with TRACER.span('Talk.increment_sent'):
+            route.talk.increment_sent(self)
+
+        await self._reward_inviter()
+
+    @classmethod
+    async def _send_by_route(cls, route, messages, on_deferred_error=None):
+        """Args:
+            route (Route): Route to the partner.
+            messages (list): Messages to send.
+            on_deferred_error (callable): See `StrangerSender.send()`.
+
+        Raises:
+            StrangerError: If can't send content.
+            TelegramError: If the partner has blocked the bot.
+        """
+        if route.sender is None:
+            # The partner is owned by another shard.
+            if len(messages) == 1:
+                await route.partner.send(messages[0])
+            else:
+                await route.partner.send_media_group(messages)
+
+            return
+
         try:
-            await partner.send(message)
-        except:
-            raise
-        else:
-            self.get_talk().increment_sent(self)
-            await self._reward_inviter()
+            if len(messages) == 1:
+                await route.sender.send(messages[0], on_deferred_error=on_deferred_error)
+            else:
+                await route.sender.send_media_group(messages)
+        except StrangerSenderError as err:
+            raise StrangerError('Can\'t send content') from err
+
+    def refresh(self, stranger):
+        """Takes the fields of fresher instance of the stranger and forgets the talk. Is used
+        when the stranger could be changed by another shard.
+        """
+        # pylint: disable=protected-access
+        self._data.update(stranger._data)
+        self._dirty.clear()
+        self.__dict__.pop('_talk', None)
+        self.__dict__.pop('_partner', None)
+        ROUTE_TABLE.discard(self)
+        WaitingPool.get_instance().update(self)
+
+    def save(self, *args, **kwargs):
+        result = self._save_dirty(*args, **kwargs)
+
+        if result is not False:
+            self._on_saved()
+
+        return result
+
+    def _save_dirty(self, *args, **kwargs):
+        """Writes the changed fields without propagating them.
+
+        Returns:
+            `False` if nothing was changed and the stranger wasn't saved.
+        """
+        return super(Stranger, self).save(*args, **kwargs)
+
+    def _on_saved(self):
+        """Propagates stranger's changes saved to the DB to in-memory state and other shards."""
+        WaitingPool.get_instance().update(self)
+        StateBackend.get_instance().update_waiting(self)
+        SHARDING.invalidate(self)
 
     def set_languages(self, languages):
         """Raises:
@@ -523,21 +834,72 @@ class Stranger(Model):
         await self.set_partner(None)
 
     async def set_partner(self, partner):
+        with TRACER.span('Stranger.set_partner'):
+            await self._set_partner(partner)
+
+    async def _set_partner(self, partner):
+        """Ends the current talk and begins the new one with the partner in one transaction:
+        not more than 4 statements (bonus spending, ending of the old talk, creation of the new
+        talk and clearing of both partners' `looking_for_partner_from`) plus the stranger's
+        unsaved changes if any. Spent bonuses are recorded to the ledger after the commit.
+        """
+        from .bonus_ledger import BONUS_LEDGER
+        from .talk import Talk
+
         if self.get_partner() == partner:
             self.save()
             return
 
-        if self._partner is not None:
-            if self._partner.get_partner() == self:
-                # If partner isn't talking with the stranger because of some
-                # error, we shouldn't kick him.
-                await self._partner.kick()
+        await self._flush_media_group()
+        ROUTE_TABLE.discard(self)
+        old_partner = self._partner
+        old_talk = None if old_partner is None else self.get_talk()
+        payers = [self]
+
+        # If partner isn't talking with the stranger because of some error, we shouldn't kick him.
+        if old_partner is not None and old_partner.get_partner() == self:
+            await old_partner.kick()
+            payers.append(old_partner)
+
+        # All the tasks share one DB connection, so there should be no awaits in the transaction.
+        with DATABASE_PROXY.atomic():
+            if old_talk is not None:
+                # pylint: disable=protected-access
+                paid_payers = [payer for payer in payers if payer._pay_for_talk(old_talk)]
+
+                old_talk.end = datetime.datetime.utcnow()
+                # Sent messages counters are saved at the talk's end too.
+                old_talk.save()
+
+            if partner is not None:
+                talk = Talk.create(
+                    partner1=self,
+                    partner2=partner,
+                    searched_since=partner.looking_for_partner_from,
+                    )
+                Stranger \
+                    .update(looking_for_partner_from=None) \
+                    .where(Stranger.id << [self.id, partner.id]) \
+                    .execute()
+
+                for stranger in (self, partner):
+                    # pylint: disable=protected-access
+                    stranger._data['looking_for_partner_from'] = None
+                    stranger._dirty.discard('looking_for_partner_from')
+
+            for payer in payers:
+                # pylint: disable=protected-access
+                payer._save_dirty()
+
+        if old_talk is not None:
+            StateBackend.get_instance().end_talk(old_talk)
 
-            self._pay_for_talk()
+            for payer in paid_payers:
+                BONUS_LEDGER.record(payer, -1, 'talk')
 
-            if self._talk is not None:
-                self._talk.end = datetime.datetime.utcnow()
-                self._talk.save()
+            for payer in payers:
+                # pylint: disable=protected-access
+                payer._on_saved()
 
         if partner is None:
             # pylint: disable=attribute-defined-outside-init
@@ -545,26 +907,20 @@ class Stranger(Model):
             # pylint: disable=attribute-defined-outside-init
             self._partner = None
         else:
-            from .talk import Talk
+            StateBackend.get_instance().begin_talk(talk)
             # pylint: disable=attribute-defined-outside-init
-            self._talk = Talk.create(
-                partner1=self,
-                partner2=partner,
-                searched_since=partner.looking_for_partner_from,
-                )
+            self._talk = talk
             # pylint: disable=attribute-defined-outside-init
             self._partner = partner
-
-            if self.looking_for_partner_from is not None:
-                self.looking_for_partner_from = None
-                self.save()
-
+            ROUTE_TABLE.discard(partner)
             # pylint: disable=protected-access
-            partner._talk = self._talk
+            partner._talk = talk
             # pylint: disable=protected-access
             partner._partner = self
-            partner.looking_for_partner_from = None
-            partner.save()
+
+            for stranger in (self, partner):
+                # pylint: disable=protected-access
+                stranger._on_saved()
 
     def set_sex(self, sex_name):
         """Raises:
@@ -10,15 +10,29 @@ import sys
 import telepot
 import telepot.aio
 from telepot.exception import TelegramError
+from .dispatcher import DISPATCHER
 from .errors import MissingPartnerError, PartnerObtainingError, \
     StrangerError, StrangerServiceError, UnknownCommandError, UnsupportedContentError
 from .message import Message
+from .metrics import REGISTRY
+from .query_counter import QUERY_BUDGET
 from .stranger_sender_service import StrangerSenderService
 from .stranger_service import StrangerService
 from .stranger_setup_wizard import StrangerSetupWizard
+from .tracing import TRACER
 from .utils import __version__
+from .watchdog import set_processing_context
 
 LOGGER = logging.getLogger('randtalkbot.stranger_handler')
+CHAT_MESSAGE_HISTOGRAM = REGISTRY.histogram(
+    'randtalkbot_chat_message_handling_seconds',
+    'Latency of `StrangerHandler.on_chat_message`.',
+    )
+UPDATES_COUNTER = REGISTRY.counter(
+    'randtalkbot_updates_total',
+    'Updates received from Telegram.',
+    ('flavor', ),
+    )
 
 
 def _(string_instance):
@@ -171,32 +185,64 @@ class StrangerHandler(telepot.aio.helper.UserHandler):
                 LOGGER.warning('Handle /start command. Can\'t notify stranger. %s', err)
 
     # pylint: disable=method-hidden
-    async def on_close(self, error):
-        pass
+    async def on_close(self, unused_error):
+        DISPATCHER.forget(self._from_id)
+
+    async def on_message(self, message):
+        # Events like idle timeout aren't put to the dispatcher.
+        if telepot.is_event(message):
+            await super(StrangerHandler, self).on_message(message)
+        else:
+            await DISPATCHER.process(
+                self._from_id,
+                super(StrangerHandler, self).on_message(message),
+                )
 
     async def on_chat_message(self, message_json):
+        UPDATES_COUNTER.inc('chat')
+        set_processing_context(type(self).__name__ + '.on_chat_message', self._stranger.id)
+
+        trace = TRACER.start_trace(
+            'StrangerHandler.on_chat_message',
+            stranger_id=self._stranger.id,
+            )
+
+        queries_watch = QUERY_BUDGET.watch('StrangerHandler.on_chat_message', self._stranger.id)
+
+        with trace, CHAT_MESSAGE_HISTOGRAM.time(), queries_watch:
+            await self._handle_chat_message(message_json)
+
+    async def _handle_chat_message(self, message_json):
         unused_content_type, chat_type, unused_chat_id = telepot.glance(message_json)
 
         if chat_type != 'private':
             return
 
         try:
-            message = Message(message_json)
+            with TRACER.span('Message'):
+                message = Message(message_json)
         except UnsupportedContentError:
             await self._sender.send_notification(_('Messages of this type aren\'t supported.'))
             return
 
         if message.command:
-            if await self._stranger_setup_wizard.handle_command(message):
-                return
+            with TRACER.span('StrangerSetupWizard.handle_command'):
+                if await self._stranger_setup_wizard.handle_command(message):
+                    return
 
             try:
-                await self.handle_command(message)
+                with TRACER.span('StrangerHandler.handle_command', command=message.command):
+                    await self.handle_command(message)
             except UnknownCommandError:
                 await self._sender.send_notification(
                     _('Unknown command. Look /help for the full list of commands.'),
                     )
-        elif not await self._stranger_setup_wizard.handle(message):
+            return
+
+        with TRACER.span('StrangerSetupWizard.handle'):
+            handled_by_wizard = await self._stranger_setup_wizard.handle(message)
+
+        if not handled_by_wizard:
             try:
                 await self._stranger.send_to_partner(message)
             except MissingPartnerError:
@@ -215,12 +261,15 @@ class StrangerHandler(telepot.aio.helper.UserHandler):
                 await self._stranger.end_talk()
 
     async def on_edited_chat_message(self, unused_message_json):
+        UPDATES_COUNTER.inc('edited_chat')
         LOGGER.info('User tried to edit their message.')
         await self._sender.send_notification(
             _('Messages editing isn\'t supported'),
             )
 
     async def on_inline_query(self, query):
+        UPDATES_COUNTER.inc('inline_query')
+        set_processing_context(type(self).__name__ + '.on_inline_query', self._stranger.id)
         query_id, unused_from_id, query_string = telepot.glance(query, flavor='inline_query')
         LOGGER.debug('Inline query from %d: \"%s\"', self._stranger.id, query_string)
         response = [{
@@ -4,13 +4,32 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import logging
 import re
 import telepot
+from telepot.exception import TelegramError
 from .errors import StrangerSenderError
 from .i18n import get_translation
+from .metrics import REGISTRY
+from .tracing import TRACER
 
 LOGGER = logging.getLogger('randtalkbot.stranger_sender')
+COALESCED_TEXTS_COUNTER = REGISTRY.counter(
+    'randtalkbot_send_coalesced_texts_total',
+    'Texts appended to the pending text because of the chat\'s rate limiting.',
+    )
+SEND_HISTOGRAM = REGISTRY.histogram(
+    'randtalkbot_send_seconds',
+    'Latency of Bot API calls sending messages to strangers.',
+    ('method', ),
+    )
+TOO_MANY_REQUESTS_COUNTER = REGISTRY.counter(
+    'randtalkbot_send_too_many_requests_total',
+    'Bot API calls rejected with HTTP 429 Too Many Requests.',
+    ('method', ),
+    )
+TOO_MANY_REQUESTS_ERROR_CODE = 429
 
 class StrangerSender(telepot.helper.Sender):
     MESSAGE_TYPE_TO_METHOD_NAME = {
@@ -24,13 +43,53 @@ class StrangerSender(telepot.helper.Sender):
         'voice': 'sendVoice',
         }
     MARKDOWN_RE = re.compile(r'([\[\*_`])')
+    # Bot API limit of the text's length.
+    COALESCED_TEXT_MAX_LENGTH = 4096
+    COALESCED_TEXTS_SEPARATOR = '\n'
+    copy_messages = False
+    chat_interval = 0
+    coalesce_texts = False
 
     def __init__(self, bot, stranger):
         super(StrangerSender, self).__init__(bot, stranger.telegram_id)
         self._bot = bot
         self._stranger = stranger
+        # Event loop's time when the next message can be sent to the chat.
+        self._next_sending_time = 0
+        # Texts waiting to be sent as one message and the callbacks of their senders.
+        self._coalesced_texts = None
+        # Task sending the latest coalesced texts.
+        self._coalesced_texts_sending = None
         self.update_translation()
 
+    @classmethod
+    def configure(cls, copy_messages=False, chat_interval=0, coalesce_texts=False):
+        """Args:
+            copy_messages (bool): Relay partners' messages with `copyMessage` instead of sending
+                their content. Copies keep captions' and texts' formatting and don't refer to
+                the original message.
+            chat_interval (float): Minimal interval in seconds between messages sent to the same
+                chat. `0` disables the rate limiting.
+            coalesce_texts (bool): While the chat is throttled, partner's texts are merged into
+                one message instead of waiting for their turn one by one.
+        """
+        cls.copy_messages = copy_messages
+        cls.chat_interval = chat_interval
+        cls.coalesce_texts = coalesce_texts
+
+    # pylint: disable=invalid-name
+    async def copyMessage(self, from_chat_id, message_id):
+        """telepot doesn't provide this Bot API method yet."""
+        # pylint: disable=protected-access
+        await self._bot._api_request(
+            'copyMessage',
+            {
+                'chat_id': self._stranger.telegram_id,
+                'from_chat_id': from_chat_id,
+                'message_id': message_id,
+                },
+            )
+
     @classmethod
     def _escape_markdown(cls, string_instance):
         """Escapes string to prevent injecting Markdown into notifications.
@@ -42,6 +101,48 @@ class StrangerSender(telepot.helper.Sender):
         string_instance = cls.MARKDOWN_RE.sub(r'\\\1', string_instance)
         return string_instance
 
+    def _is_throttled(self):
+        return self._next_sending_time > asyncio.get_event_loop().time()
+
+    async def _wait_for_turn(self):
+        """Waits until the next message can be sent to the chat without exceeding the rate
+        limit. The turn is reserved before waiting, so concurrent callers are queued.
+        """
+        chat_interval = type(self).chat_interval
+
+        if not chat_interval:
+            return
+
+        now = asyncio.get_event_loop().time()
+        sending_time = max(now, self._next_sending_time)
+        self._next_sending_time = sending_time + chat_interval
+
+        if sending_time > now:
+            with TRACER.span('StrangerSender._wait_for_turn'):
+                await asyncio.sleep(sending_time - now)
+
+    async def _call(self, method_name, *args, **kwargs):
+        """Calls Bot API sending method measuring its latency.
+
+        Raises:
+            TelegramError: If stranger has blocked the bot.
+        """
+        await self._wait_for_turn()
+        await self._request(method_name, *args, **kwargs)
+
+    async def _request(self, method_name, *args, **kwargs):
+        """Raises:
+            TelegramError: If stranger has blocked the bot.
+        """
+        try:
+            with TRACER.span('StrangerSender.' + method_name), SEND_HISTOGRAM.time(method_name):
+                await getattr(self, method_name)(*args, **kwargs)
+        except TelegramError as err:
+            if err.error_code == TOO_MANY_REQUESTS_ERROR_CODE:
+                TOO_MANY_REQUESTS_COUNTER.inc(method_name)
+
+            raise
+
     async def answer_inline_query(self, query_id, answers):
         def translate(item):
             return self._(item) if isinstance(item, str) else self._(item[0]).format(*item[1:])
@@ -53,20 +154,126 @@ class StrangerSender(telepot.helper.Sender):
                 answer['message_text'] = translate(answer['message_text'])
         await self._bot.answerInlineQuery(query_id, answers, is_personal=True)
 
-    async def send(self, message):
+    async def _coalesce_text(self, text, on_deferred_error):
+        """Appends the text to the pending one. Waits if the pending text is too long already."""
+        if self._coalesced_texts is not None:
+            texts, callbacks = self._coalesced_texts
+            coalesced_text = type(self).COALESCED_TEXTS_SEPARATOR.join(texts + [text])
+
+            if len(coalesced_text) <= type(self).COALESCED_TEXT_MAX_LENGTH:
+                texts.append(text)
+
+                if on_deferred_error is not None and on_deferred_error not in callbacks:
+                    callbacks.append(on_deferred_error)
+
+                COALESCED_TEXTS_COUNTER.inc()
+                return
+
+            await self._wait_for_coalesced_texts()
+            await self._coalesce_text(text, on_deferred_error)
+            return
+
+        self._coalesced_texts = [text], [] if on_deferred_error is None else [on_deferred_error]
+        self._coalesced_texts_sending = \
+            asyncio.get_event_loop().create_task(self._send_coalesced_texts())
+
+    async def _send_coalesced_texts(self):
+        await self._wait_for_turn()
+        texts, callbacks = self._coalesced_texts
+        # Texts coming during the request will be sent in the next turn.
+        self._coalesced_texts = None
+
+        try:
+            await self._request(
+                'sendMessage',
+                type(self).COALESCED_TEXTS_SEPARATOR.join(texts),
+                )
+        except TelegramError as err:
+            LOGGER.warning(
+                'Can\'t send %d coalesced texts to %d. %s',
+                len(texts),
+                self._stranger.telegram_id,
+                err,
+                )
+
+            # The callbacks may send notifications waiting for this task, so they run apart.
+            for callback in callbacks:
+                asyncio.get_event_loop().create_task(callback(err))
+
+    async def _wait_for_coalesced_texts(self):
+        """Keeps the order of messages: pending texts are sent before the next message. Their
+        errors are reported to their senders' callbacks.
+        """
+        if self._coalesced_texts_sending is not None:
+            await asyncio.shield(self._coalesced_texts_sending)
+
+    @classmethod
+    def check_message(cls, message):
         """Raises:
-            StrangerSenderError: If message's content type is not supported.
-            TelegramError: If stranger has blocked the bot.
+            StrangerSenderError: If the message can't be sent.
+
+        Returns:
+            str: Name of Bot API method sending the message.
         """
         if message.is_reply:
             raise StrangerSenderError('Reply can\'t be sent.')
 
         try:
-            method_name = StrangerSender.MESSAGE_TYPE_TO_METHOD_NAME[message.type]
+            return cls.MESSAGE_TYPE_TO_METHOD_NAME[message.type]
         except KeyError:
             raise StrangerSenderError('Unsupported content_type: {}'.format(message.type))
+
+    async def send(self, message, on_deferred_error=None):
+        """When texts coalescing is enabled and the chat is throttled, the text is sent later
+        together with the following ones.
+
+        Args:
+            message (Message): Message to send.
+            on_deferred_error (callable): Coroutine function called with `TelegramError` if the
+                text was sent later and the stranger had blocked the bot.
+
+        Raises:
+            StrangerSenderError: If message's content type is not supported.
+            TelegramError: If stranger has blocked the bot.
+        """
+        method_name = type(self).check_message(message)
+
+        if type(self).coalesce_texts and message.type == 'text' and \
+                (self._coalesced_texts is not None or self._is_throttled()):
+            await self._coalesce_text(message.text, on_deferred_error)
+            return
+
+        await self._wait_for_coalesced_texts()
+        await self._send_content(message, method_name)
+
+    async def _send_content(self, message, method_name):
+        """Raises:
+            TelegramError: If stranger has blocked the bot.
+        """
+        if type(self).copy_messages and message.message_id is not None:
+            await self._call('copyMessage', message.chat_id, message.message_id)
+        else:
+            await self._call(method_name, **message.sending_kwargs)
+
+    async def send_media_group(self, messages):
+        """Sends the messages one by one if telepot doesn't provide `sendMediaGroup`.
+
+        Raises:
+            StrangerSenderError: If some message is a reply or its content type is not supported.
+            TelegramError: If stranger has blocked the bot.
+        """
+        if any(message.is_reply for message in messages):
+            raise StrangerSenderError('Reply can\'t be sent.')
+
+        await self._wait_for_coalesced_texts()
+
+        if hasattr(self, 'sendMediaGroup'):
+            await self._call('sendMediaGroup', [message.get_input_media() for message in messages])
         else:
-            await getattr(self, method_name)(**message.sending_kwargs)
+            methods_names = [type(self).check_message(message) for message in messages]
+
+            for message, method_name in zip(messages, methods_names):
+                await self._send_content(message, method_name)
 
     async def send_notification(
             self,
@@ -91,8 +298,10 @@ class StrangerSender(telepot.helper.Sender):
                 'one_time_keyboard': True,
                 }
 
-        # pylint: disable=no-member
-        await self.sendMessage(
+        # E.g. partner's last texts arrive before the notification about partner's leaving.
+        await self._wait_for_coalesced_texts()
+        await self._call(
+            'sendMessage',
             '*Rand Talk:* {}'.format(message),
             disable_notification=disable_notification,
             disable_web_page_preview=disable_web_page_preview,
@@ -6,6 +6,7 @@
 
 import logging
 from .errors import StrangerSenderServiceError
+from .metrics import CACHE_REQUESTS_COUNTER
 from .stranger_sender import StrangerSender
 
 LOGGER = logging.getLogger('randtalkbot.stranger_sender_service')
@@ -35,8 +36,12 @@ class StrangerSenderService:
 
     def get_or_create_stranger_sender(self, stranger):
         try:
-            return self._stranger_senders[stranger.telegram_id]
+            stranger_sender = self._stranger_senders[stranger.telegram_id]
         except KeyError:
+            CACHE_REQUESTS_COUNTER.inc('stranger_senders', 'miss')
             stranger_sender = StrangerSender(self._bot, stranger)
             self._stranger_senders[stranger.telegram_id] = stranger_sender
             return stranger_sender
+        else:
+            CACHE_REQUESTS_COUNTER.inc('stranger_senders', 'hit')
+            return stranger_sender
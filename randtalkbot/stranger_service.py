@@ -5,11 +5,26 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 import logging
-from peewee import DatabaseError, DoesNotExist
-from .errors import PartnerObtainingError, StrangerError, StrangerServiceError
+from peewee import DatabaseError, DoesNotExist, IntegrityError
+from .errors import PartnerObtainingError, StateStoreError, StrangerError, \
+    StrangerServiceError
+from .metrics import CACHE_REQUESTS_COUNTER, REGISTRY
+from .replica import REPLICA
+from .sharding import SHARDING
+from .state_backend import StateBackend
 from .stranger import INVITATION_LENGTH, Stranger
+from .tracing import TRACER
 
 LOGGER = logging.getLogger('randtalkbot.stranger_service')
+MATCH_CANDIDATES_HISTOGRAM = REGISTRY.histogram(
+    'randtalkbot_match_candidates_scanned',
+    'Possible partners scanned during one `_match_partner` call.',
+    buckets=(0, 1, 10, 100, 1000, 10000, 100000),
+    )
+MATCH_HISTOGRAM = REGISTRY.histogram(
+    'randtalkbot_match_seconds',
+    'Latency of `_match_partner`.',
+    )
 
 
 class StrangerService:
@@ -18,6 +33,10 @@ class StrangerService:
         # second conversation with single partner.
         self._locked_strangers_ids = set()
         self._strangers_cache = {}
+        # Invitation -> stranger's ID. Invitations never change, so the cache isn't invalidated.
+        self._invitations_cache = {}
+        # Telegram ID -> stranger's ID. Telegram IDs never change too.
+        self._telegram_ids_cache = {}
         type(self)._instance = self
 
     @classmethod
@@ -30,15 +49,49 @@ class StrangerService:
 
     @classmethod
     def get_full_strangers(cls):
-        for stranger in Stranger.select():
+        """Is used for stats only, so the replica is queried if it's configured."""
+        for stranger in REPLICA.route(Stranger.select()):
             if stranger.is_full():
                 yield stranger
 
+    @classmethod
+    def get_possible_partners(cls, stranger):
+        """Returns:
+            SelectQuery: Strangers suitable for the stranger by sex, most prioritized first. Its
+                predicates should be served by `Stranger.Meta.indexes`: see `python -m queryplans`.
+        """
+        # pylint: disable=singleton-comparison
+        possible_partners = Stranger.select().where(
+            Stranger.id != stranger.id,
+            Stranger.looking_for_partner_from != None,
+            )
+
+        if stranger.sex == 'not_specified':
+            possible_partners = possible_partners.where(Stranger.partner_sex == 'not_specified')
+        else:
+            possible_partners = possible_partners.where(
+                (Stranger.partner_sex == stranger.sex) | (Stranger.partner_sex == 'not_specified'),
+                )
+
+        # If stranger wants to filter partners by sex, let's do that.
+        if stranger.partner_sex == 'male' or stranger.partner_sex == 'female':
+            possible_partners = possible_partners.where(
+                Stranger.sex == stranger.partner_sex,
+                )
+
+        return possible_partners.order_by(
+            Stranger.bonus_count.desc(),
+            Stranger.looking_for_partner_from,
+            )
+
     def get_cached_stranger(self, stranger):
         try:
-            return self._strangers_cache[stranger.id]
+            cached_stranger = self._strangers_cache[stranger.id]
         except KeyError:
+            CACHE_REQUESTS_COUNTER.inc('strangers', 'miss')
             self._strangers_cache[stranger.id] = stranger
+            self._invitations_cache[stranger.invitation] = stranger.id
+            self._telegram_ids_cache[stranger.telegram_id] = stranger.id
 
             if stranger.invited_by is not None:
                 if stranger.invited_by.invited_by_id == stranger.id:
@@ -51,6 +104,24 @@ class StrangerService:
                     stranger.invited_by = self.get_cached_stranger(stranger.invited_by)
 
             return stranger
+        else:
+            CACHE_REQUESTS_COUNTER.inc('strangers', 'hit')
+
+            # Another shard could change the stranger it owns, so obtained instance is fresher.
+            if SHARDING.enabled and cached_stranger is not stranger and \
+                    not SHARDING.owns(stranger.telegram_id):
+                cached_stranger.refresh(stranger)
+
+            return cached_stranger
+
+    def get_cached_stranger_by_id(self, stranger_id):
+        try:
+            cached_stranger = self._strangers_cache[stranger_id]
+        except KeyError:
+            return self.get_cached_stranger(Stranger.get(Stranger.id == stranger_id))
+        else:
+            CACHE_REQUESTS_COUNTER.inc('strangers', 'hit')
+            return cached_stranger
 
     def get_cache_size(self):
         return len(self._strangers_cache)
@@ -60,16 +131,59 @@ class StrangerService:
             try:
                 stranger = Stranger.get(Stranger.telegram_id == telegram_id)
             except DoesNotExist:
-                stranger = Stranger.create(
-                    invitation=Stranger.get_invitation(),
-                    telegram_id=telegram_id,
-                    )
+                stranger = type(self)._create_stranger(telegram_id)
         except DatabaseError as err:
             raise StrangerServiceError('Database problems during `get_or_create_stranger`') from err
 
         return self.get_cached_stranger(stranger)
 
+    @classmethod
+    def _create_stranger(cls, telegram_id):
+        """Raises:
+            DatabaseError: If the stranger can't be created.
+
+        Returns:
+            Stranger: Created stranger.
+        """
+        try:
+            return Stranger.create(
+                invitation=Stranger.get_invitation(telegram_id),
+                telegram_id=telegram_id,
+                )
+        except IntegrityError as err:
+            LOGGER.info('Can\'t create stranger %d with derived invitation. %s', telegram_id, err)
+
+        # The stranger could be created concurrently.
+        try:
+            return Stranger.get(Stranger.telegram_id == telegram_id)
+        except DoesNotExist:
+            pass
+
+        # Derived invitation is taken by a stranger with legacy random invitation.
+        return Stranger.create(
+            invitation=Stranger.get_random_invitation(),
+            telegram_id=telegram_id,
+            )
+
     def get_stranger(self, telegram_id):
+        """Cached stranger owned by this shard is returned without querying the DB: only this
+        shard changes them.
+
+        Raises:
+            StrangerServiceError: If there were DB problems.
+
+        Returns:
+            Stranger: Cached stranger.
+        """
+        if SHARDING.owns(telegram_id):
+            try:
+                cached_stranger = self._strangers_cache[self._telegram_ids_cache[telegram_id]]
+            except KeyError:
+                pass
+            else:
+                CACHE_REQUESTS_COUNTER.inc('strangers', 'hit')
+                return cached_stranger
+
         try:
             stranger = Stranger.get(Stranger.telegram_id == telegram_id)
         except (DatabaseError, DoesNotExist) as err:
@@ -83,6 +197,20 @@ class StrangerService:
                 'Invitation length is wrong: \"{0}\"'.format(invitation),
                 )
 
+        try:
+            stranger_id = self._invitations_cache[invitation]
+        except KeyError:
+            CACHE_REQUESTS_COUNTER.inc('invitations', 'miss')
+        else:
+            CACHE_REQUESTS_COUNTER.inc('invitations', 'hit')
+
+            try:
+                return self.get_cached_stranger_by_id(stranger_id)
+            except (DatabaseError, DoesNotExist) as err:
+                raise StrangerServiceError(
+                    'Database problems during `get_stranger_by_invitation`',
+                    ) from err
+
         try:
             stranger = Stranger.get(Stranger.invitation == invitation)
         except (DatabaseError, DoesNotExist) as err:
@@ -91,6 +219,24 @@ class StrangerService:
 
         return self.get_cached_stranger(stranger)
 
+    def refresh_stranger(self, stranger_id):
+        """Reloads cached stranger after they were changed by another shard.
+
+        Raises:
+            StrangerServiceError: If there were DB problems.
+        """
+        try:
+            cached_stranger = self._strangers_cache[stranger_id]
+        except KeyError:
+            return
+
+        try:
+            stranger = Stranger.get(Stranger.id == stranger_id)
+        except (DatabaseError, DoesNotExist) as err:
+            raise StrangerServiceError('Database problems during `refresh_stranger`') from err
+
+        cached_stranger.refresh(stranger)
+
     def _match_partner(self, stranger):
         """Tries to find a partner for obtained stranger.
 
@@ -100,36 +246,39 @@ class StrangerService:
         Returns:
             Stranger
         """
-        from .talk import Talk
+        with TRACER.span('StrangerService._match_partner'), MATCH_HISTOGRAM.time():
+            partner = self._select_partner(stranger)
 
-        possible_partners = Stranger.select().where(
-            Stranger.id != stranger.id,
-            Stranger.looking_for_partner_from != None,
-            )
+        self._locked_strangers_ids.add(partner.id)
+        return self.get_cached_stranger(partner)
 
-        if stranger.sex == 'not_specified':
-            possible_partners = possible_partners.where(Stranger.partner_sex == 'not_specified')
-        else:
-            possible_partners = possible_partners.where(
-                (Stranger.partner_sex == stranger.sex) | (Stranger.partner_sex == 'not_specified'),
-                )
+    def _select_partner(self, stranger):
+        """Raises:
+            PartnerObtainingError: If there's no proper partner.
 
-        # If stranger wants to filter partners by sex, let's do that.
-        if stranger.partner_sex == 'male' or stranger.partner_sex == 'female':
-            possible_partners = possible_partners.where(
-                Stranger.sex == stranger.partner_sex,
-                )
+        Returns:
+            Stranger: Not cached instance of the partner.
+        """
+        from .talk import Talk
 
-        possible_partners = possible_partners.order_by(
-            Stranger.bonus_count.desc(),
-            Stranger.looking_for_partner_from,
-            )
+        state_backend = StateBackend.get_instance()
+
+        if state_backend.knows_waiting_ids():
+            waiting_ids = state_backend.get_waiting_ids()
 
+            # Nobody else is looking for partner.
+            if len(waiting_ids) <= (stranger.id in waiting_ids):
+                MATCH_CANDIDATES_HISTOGRAM.observe(0)
+                raise PartnerObtainingError()
+
+        possible_partners = type(self).get_possible_partners(stranger)
         last_partners_ids = frozenset(Talk.get_last_partners_ids(stranger))
 
         partner = None
         partner_language_priority = 1000
+        candidates_count = 0
         for possible_partner in possible_partners:
+            candidates_count += 1
             if possible_partner.id in last_partners_ids or \
                     possible_partner.id in self._locked_strangers_ids:
                 continue
@@ -144,41 +293,75 @@ class StrangerService:
             else:
                 continue
             break
+        MATCH_CANDIDATES_HISTOGRAM.observe(candidates_count)
         if partner is None:
             raise PartnerObtainingError()
 
-        self._locked_strangers_ids.add(partner.id)
-        return self.get_cached_stranger(partner)
+        return partner
+
+    async def _lock(self, partner):
+        """Raises:
+            StrangerServiceError: If the state store is unavailable. The partner is unlocked
+                locally then.
+
+        Returns:
+            bool: `False` if another shard is matching the partner.
+        """
+        try:
+            return await SHARDING.lock(partner.id)
+        except StateStoreError as err:
+            self._locked_strangers_ids.discard(partner.id)
+            raise StrangerServiceError('Can\'t lock the partner') from err
+
+    async def _unlock(self, partner):
+        self._locked_strangers_ids.discard(partner.id)
+
+        try:
+            await SHARDING.unlock(partner.id)
+        except StateStoreError as err:
+            LOGGER.warning('Can\'t unlock %d. The lock will expire. %s', partner.id, err)
 
     async def match_partner(self, stranger):
         """Finds partner for the stranger. Does handling of strangers who have blocked the bot.
 
         Raises:
             PartnerObtainingError: If there's no proper partners.
-            StrangerServiceError: If the stranger has blocked the bot.
+            StrangerServiceError: If the stranger has blocked the bot or the partner can't be
+                locked.
         """
-        while True:
-            partner = self._match_partner(stranger)
+        # Partners locked by other shards stay locked locally until the end of the matching so
+        # `_match_partner()` skips them.
+        busy_partners_ids = []
 
-            try:
-                await partner.notify_partner_found(stranger)
-            except StrangerError as err:
-                # Potential partner has blocked the bot. Let's look for next
-                # potential partner.
-                LOGGER.info('Bad potential partner for %d. %s', stranger.id, err)
-                await partner.end_talk()
-                self._locked_strangers_ids.discard(partner.id)
-                continue
-
-            break
+        try:
+            while True:
+                partner = self._match_partner(stranger)
+
+                if not await self._lock(partner):
+                    busy_partners_ids.append(partner.id)
+                    continue
+
+                try:
+                    await partner.notify_partner_found(stranger)
+                except StrangerError as err:
+                    # Potential partner has blocked the bot. Let's look for next
+                    # potential partner.
+                    LOGGER.info('Bad potential partner for %d. %s', stranger.id, err)
+                    await partner.end_talk()
+                    await self._unlock(partner)
+                    continue
+
+                break
+        finally:
+            self._locked_strangers_ids.difference_update(busy_partners_ids)
 
         try:
             await stranger.notify_partner_found(partner)
         except StrangerError as err:
-            self._locked_strangers_ids.discard(partner.id)
+            await self._unlock(partner)
             # Stranger has blocked the bot.
             raise StrangerServiceError('Can\'t notify seeking for partner stranger') from err
 
         await stranger.set_partner(partner)
-        self._locked_strangers_ids.discard(partner.id)
+        await self._unlock(partner)
         LOGGER.debug('Found partner: %d -> %d.', stranger.id, partner.id)
@@ -4,9 +4,11 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import datetime
 import logging
-from peewee import DateTimeField, DoesNotExist, ForeignKeyField, IntegerField, Model, Proxy
+from peewee import DatabaseError, DateTimeField, DoesNotExist, ForeignKeyField, IntegerField, \
+    Model, Proxy
 from .errors import WrongStrangerError
 from .stranger import Stranger
 from .stranger_service import StrangerService
@@ -20,6 +22,11 @@ def _(string_instance):
 
 
 class Talk(Model):
+    # Not more than this count of stranger's messages is lost if the process crashes.
+    SENT_SAVE_INTERVAL = 100
+    # Counters of running talks are saved every this count of seconds and on shutdown.
+    SAVING_INTERVAL = 10
+    _unsaved_talks = {}
     partner1 = ForeignKeyField(Stranger, related_name='talks_as_partner1')
     partner1_sent = IntegerField(default=0)
     partner2 = ForeignKeyField(Stranger, related_name='talks_as_partner2')
@@ -30,6 +37,9 @@ class Talk(Model):
 
     class Meta:
         database = DATABASE_PROXY
+        # `save()` writes the changed fields only, e.g. the end of the talk and sent messages
+        # counters.
+        only_save_dirty = True
 
     @classmethod
     def delete_old(cls, before):
@@ -46,8 +56,7 @@ class Talk(Model):
 
     @classmethod
     def get_last_partners_ids(cls, stranger):
-        talks = cls.select().where((cls.partner1 == stranger) | (cls.partner2 == stranger))
-        for talk in talks:
+        for talk in cls.get_stranger_talks(stranger):
             yield talk.get_partner_id(stranger)
 
     @classmethod
@@ -58,20 +67,47 @@ class Talk(Model):
             talks = talks.where(Talk.begin >= after)
         return talks
 
+    @classmethod
+    def get_stranger_talks(cls, stranger):
+        return cls.select().where((cls.partner1 == stranger) | (cls.partner2 == stranger))
+
     @classmethod
     def get_talk(cls, stranger):
         try:
             # pylint: disable=singleton-comparison
-            talk = cls.get(
-                ((cls.partner1 == stranger) | (cls.partner2 == stranger)) & (cls.end == None),
-                )
+            talk = cls.get_stranger_talks(stranger).where(cls.end == None).get()
         except DoesNotExist:
             return None
         else:
-            stranger_service = StrangerService.get_instance()
-            talk.partner1 = stranger_service.get_cached_stranger(talk.partner1)
-            talk.partner2 = stranger_service.get_cached_stranger(talk.partner2)
-            return talk
+            return cls._use_cached_partners(talk)
+
+    @classmethod
+    def get_talk_by_id(cls, talk_id):
+        return cls._use_cached_partners(cls.get(cls.id == talk_id))
+
+    @classmethod
+    async def run_saving(cls):
+        while True:
+            await asyncio.sleep(cls.SAVING_INTERVAL)
+            cls.save_unsaved()
+
+    @classmethod
+    def save_unsaved(cls):
+        """Saves talks having sent messages counters changed since their last saving. Talks failed
+        to be saved are kept for the next saving.
+        """
+        for talk in list(cls._unsaved_talks.values()):
+            try:
+                talk.save()
+            except DatabaseError as err:
+                LOGGER.warning('Can\'t save sent messages counters of talk %d. %s', talk.id, err)
+
+    @classmethod
+    def _use_cached_partners(cls, talk):
+        stranger_service = StrangerService.get_instance()
+        talk.partner1 = stranger_service.get_cached_stranger(talk.partner1)
+        talk.partner2 = stranger_service.get_cached_stranger(talk.partner2)
+        return talk
 
     def get_partner(self, stranger):
         """Raises:
@@ -98,14 +134,34 @@ class Talk(Model):
         else:
             raise WrongStrangerError()
 
-    def increment_sent(self, stranger):
+    def increment_sent(self, stranger, count=1):
+        """Saves the talk on the first stranger's message (it can make the talk successful), on
+        the first message after the talk was loaded from the DB and on every `SENT_SAVE_INTERVAL`
+        messages. The rest of the counters are saved by `save_unsaved()` or when the talk ends.
+        """
         if stranger == self.partner1:
-            self.partner1_sent += 1
+            self.partner1_sent += count
+            sent = self.partner1_sent
         elif stranger == self.partner2:
-            self.partner2_sent += 1
+            self.partner2_sent += count
+            sent = self.partner2_sent
         else:
             raise WrongStrangerError()
-        self.save()
+
+        interval = type(self).SENT_SAVE_INTERVAL
+
+        if not getattr(self, '_is_saved', False) or sent == count or \
+                sent // interval != (sent - count) // interval:
+            self.save()
+        else:
+            type(self)._unsaved_talks[self.id] = self
 
     def is_successful(self):
         return self.partner1_sent and self.partner2_sent
+
+    def save(self, *args, **kwargs):
+        result = super().save(*args, **kwargs)
+        # Counters of the talk in the DB are up to date since this moment.
+        self._is_saved = True  # pylint: disable=attribute-defined-outside-init
+        type(self)._unsaved_talks.pop(self.id, None)
+        return result
@@ -0,0 +1,42 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import weakref
+
+
+class TaskLocal:
+    """Storage of values bound to the current asyncio task.
+
+    Python 3.6 lacks `contextvars`, so values are kept in a weak dictionary keyed by the task.
+    Values aren't inherited by the tasks created from the current one.
+    """
+
+    def __init__(self):
+        self._values = weakref.WeakKeyDictionary()
+
+    def get(self, default=None, task=None):
+        """Args:
+            default (object): Value to return if the task has no value or there's no current task.
+            task (asyncio.Task): Task to obtain the value for. Current task by default. Is useful
+                to inspect the task running in other thread's event loop.
+
+        Returns:
+            object: Value bound to the task.
+        """
+        if task is None:
+            task = asyncio.Task.current_task()
+
+        if task is None:
+            return default
+
+        return self._values.get(task, default)
+
+    def set(self, value):
+        task = asyncio.Task.current_task()
+
+        if task is not None:
+            self._values[task] = value
@@ -0,0 +1,35 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Test support: SQLite database reporting its queries like the production one."""
+
+from peewee import SqliteDatabase
+from randtalkbot import bonus_ledger, migrations, stats, stranger, talk
+from randtalkbot.bonus_ledger import BonusLedgerEntry
+from randtalkbot.db import InstrumentedDatabaseMixin
+from randtalkbot.stats import Stats
+from randtalkbot.stranger import Stranger
+from randtalkbot.talk import Talk
+
+
+class InstrumentedSqliteDatabase(InstrumentedDatabaseMixin, SqliteDatabase):
+    """Is used by tests and development tools."""
+    pass
+
+def initialize_sqlite_database(path=':memory:'):
+    """Makes the models use SQLite database creating the tables if necessary.
+
+    Returns:
+        InstrumentedSqliteDatabase
+    """
+    database = InstrumentedSqliteDatabase(path)
+    bonus_ledger.DATABASE_PROXY.initialize(database)
+    migrations.DATABASE_PROXY.initialize(database)
+    stats.DATABASE_PROXY.initialize(database)
+    stranger.DATABASE_PROXY.initialize(database)
+    talk.DATABASE_PROXY.initialize(database)
+    database.create_tables([Stats, Stranger, Talk, BonusLedgerEntry], safe=True)
+    return database
@@ -0,0 +1,213 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Lightweight per-update tracing.
+
+A trace is started for every handled update and spans are nested into it through the current
+asyncio task. Finished traces are kept in a ring buffer and optionally appended to JSON-lines
+file. The file is written by `run()` in the default executor, so exporting doesn't block the event
+loop. Spans cost one attribute lookup while tracing is disabled.
+"""
+
+import asyncio
+from collections import deque
+import itertools
+import json
+import logging
+import time
+from .task_local import TaskLocal
+
+LOGGER = logging.getLogger('randtalkbot.tracing')
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *unused_exc_info):
+        return False
+
+    def set_tag(self, key, value):
+        pass
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Span:
+    def __init__(self, tracer, name, parent, tags):
+        self._tracer = tracer
+        self.name = name
+        self.span_id = next(tracer.ids)
+        # Root span's ID identifies the whole trace.
+        self.trace_id = self.span_id if parent is None else parent.trace_id
+        self.parent = parent
+        self.tags = tags
+        self.children = []
+        self.start = None
+        self.duration = None
+        self._start_counter = None
+
+    def __enter__(self):
+        self.start = time.time()
+        self._start_counter = time.perf_counter()
+        # pylint: disable=protected-access
+        self._tracer._current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, unused_exc_value, unused_traceback):
+        self.duration = time.perf_counter() - self._start_counter
+
+        if exc_type is not None:
+            self.tags['error'] = exc_type.__name__
+
+        # pylint: disable=protected-access
+        self._tracer._current_span.set(self.parent)
+
+        if self.parent is None:
+            self._tracer._finish(self)
+        else:
+            self.parent.children.append(self)
+
+        return False
+
+    def set_tag(self, key, value):
+        self.tags[key] = value
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': None if self.parent is None else self.parent.span_id,
+            'start': self.start,
+            'duration': self.duration,
+            'tags': self.tags,
+            'children': [child.to_dict() for child in self.children],
+            }
+
+
+class Tracer:
+    BUFFER_SIZE = 1000
+    EXPORT_INTERVAL = 1
+
+    def __init__(self):
+        self.enabled = False
+        self.ids = itertools.count(1)
+        self._current_span = TaskLocal()
+        self._file = None
+        self._path = None
+        # Finished traces which weren't exported yet. The oldest ones are dropped if the export
+        # can't keep up.
+        self._pending_traces = deque(maxlen=type(self).BUFFER_SIZE)
+        self._traces = deque(maxlen=type(self).BUFFER_SIZE)
+
+    def configure(self, buffer_size=BUFFER_SIZE, path=None):
+        """Enables tracing.
+
+        Args:
+            buffer_size (int): How many recent traces to keep in memory.
+            path (str): Path to JSON-lines file to append finished traces to.
+        """
+        self.enabled = True
+        self._path = path
+        self._pending_traces = deque(self._pending_traces, maxlen=buffer_size)
+        self._traces = deque(self._traces, maxlen=buffer_size)
+
+    def clear(self):
+        self._traces.clear()
+
+    def close(self):
+        """Exports the pending traces and closes the file. Is called on shutdown."""
+        self._export(self._pop_pending_traces())
+
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _export(self, root_spans):
+        if not root_spans:
+            return
+
+        try:
+            if self._file is None:
+                self._file = open(self._path, 'a')
+
+            self._file.writelines(json.dumps(span.to_dict()) + '\n' for span in root_spans)
+            self._file.flush()
+        except OSError as err:
+            LOGGER.warning('Can\'t export %d traces to %s: %s', len(root_spans), self._path, err)
+
+    def _finish(self, root_span):
+        self._traces.append(root_span)
+
+        if self._path is not None:
+            self._pending_traces.append(root_span)
+
+    async def flush(self):
+        """Exports the pending traces in the default executor."""
+        root_spans = self._pop_pending_traces()
+
+        if root_spans:
+            await asyncio.get_event_loop().run_in_executor(None, self._export, root_spans)
+
+    def get_current_span(self):
+        return self._current_span.get()
+
+    def get_slowest_traces(self, count):
+        return sorted(self._traces, key=lambda span: span.duration, reverse=True)[:count]
+
+    def _pop_pending_traces(self):
+        root_spans = list(self._pending_traces)
+        self._pending_traces.clear()
+        return root_spans
+
+    async def run(self):
+        """Exports finished traces to the file periodically."""
+        while True:
+            await asyncio.sleep(type(self).EXPORT_INTERVAL)
+            await self.flush()
+
+    def span(self, name, **tags):
+        """Returns:
+            Context manager of the span nested into the current one. Does nothing if there's no
+            current trace.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+
+        parent = self._current_span.get()
+
+        if parent is None:
+            return NULL_SPAN
+
+        return Span(self, name, parent, tags)
+
+    def start_trace(self, name, **tags):
+        """Returns:
+            Context manager of the root span.
+        """
+        if not self.enabled:
+            return NULL_SPAN
+
+        return Span(self, name, None, tags)
+
+
+def format_trace(span, indent=0):
+    lines = ['{0}{1} {2:.1f} ms{3}'.format(
+        '  ' * indent,
+        span.name,
+        span.duration * 1000,
+        ''.join(' {0}={1}'.format(key, value) for key, value in sorted(span.tags.items())),
+        )]
+
+    for child in span.children:
+        lines.append(format_trace(child, indent + 1))
+
+    return '\n'.join(lines)
+
+
+TRACER = Tracer()
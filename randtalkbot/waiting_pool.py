@@ -0,0 +1,147 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+from .errors import StateStoreError
+from .sharding import SHARDING
+
+LOGGER = logging.getLogger('randtalkbot.waiting_pool')
+
+def _decrement(dictionary, key):
+    dictionary[key] -= 1
+
+    if not dictionary[key]:
+        del dictionary[key]
+
+def _increment(dictionary, key):
+    try:
+        dictionary[key] += 1
+    except KeyError:
+        dictionary[key] = 1
+
+def _sum(*dictionaries):
+    total = {}
+
+    for dictionary in dictionaries:
+        for key, value in dictionary.items():
+            total[key] = total.get(key, 0) + value
+
+    return total
+
+class WaitingPool:
+    """Live gauge of strangers who are looking for partner.
+
+    The pool is maintained on every `Stranger.save()` so reading it doesn't touch the DB. When
+    sharding is enabled, every shard keeps the entries of its own strangers only and `run()`
+    exchanges the counts with the other shards through the state store.
+    """
+    SYNCHRONIZATION_INTERVAL = 10
+
+    def __init__(self):
+        # Stranger ID -> (sex, languages) of the stranger when it has entered the pool.
+        self._entries = {}
+        self._sex_counts = {}
+        self._language_counts = {}
+        # Sums of the counts published by the other shards.
+        self._other_shards_count = 0
+        self._other_shards_sex_counts = {}
+        self._other_shards_language_counts = {}
+        type(self)._instance = self
+        self._load()
+
+    @classmethod
+    def get_instance(cls):
+        try:
+            return cls._instance
+        except AttributeError:
+            cls._instance = cls()
+            return cls._instance
+
+    def _add(self, stranger):
+        entry = stranger.sex, tuple(stranger.get_languages())
+        self._entries[stranger.id] = entry
+        _increment(self._sex_counts, entry[0])
+
+        for language in entry[1]:
+            _increment(self._language_counts, language)
+
+    def _discard(self, stranger_id):
+        try:
+            sex, languages = self._entries.pop(stranger_id)
+        except KeyError:
+            return
+
+        _decrement(self._sex_counts, sex)
+
+        for language in languages:
+            _decrement(self._language_counts, language)
+
+    def _load(self):
+        from .stranger import Stranger
+        # pylint: disable=singleton-comparison
+        waiting_strangers = Stranger.select() \
+            .where(Stranger.looking_for_partner_from != None)
+
+        for stranger in waiting_strangers:
+            if SHARDING.owns(stranger.telegram_id):
+                self._add(stranger)
+
+        LOGGER.debug('%d waiting strangers were loaded', len(self._entries))
+
+    def get_count(self):
+        return len(self._entries) + self._other_shards_count
+
+    def get_count_by_language(self, language):
+        return self._language_counts.get(language, 0) + \
+            self._other_shards_language_counts.get(language, 0)
+
+    def get_count_by_sex(self, sex):
+        return self._sex_counts.get(sex, 0) + self._other_shards_sex_counts.get(sex, 0)
+
+    def get_counts_by_language(self):
+        return _sum(self._language_counts, self._other_shards_language_counts)
+
+    def get_counts_by_sex(self):
+        return _sum(self._sex_counts, self._other_shards_sex_counts)
+
+    async def run(self):
+        while True:
+            try:
+                await self.synchronize()
+            except StateStoreError as err:
+                LOGGER.warning('Can\'t synchronize waiting pool with other shards. %s', err)
+
+            await asyncio.sleep(type(self).SYNCHRONIZATION_INTERVAL)
+
+    async def synchronize(self):
+        """Publishes the counts of this shard's strangers and obtains the other shards' ones.
+
+        Raises:
+            StateStoreError: If the store is unavailable.
+        """
+        await SHARDING.publish_value('waiting_pool', {
+            'count': len(self._entries),
+            'sex_counts': self._sex_counts,
+            'language_counts': self._language_counts,
+            })
+        values = await SHARDING.get_other_shards_values('waiting_pool')
+        self._other_shards_count = sum(value['count'] for value in values)
+        self._other_shards_sex_counts = _sum(*(value['sex_counts'] for value in values))
+        self._other_shards_language_counts = \
+            _sum(*(value['language_counts'] for value in values))
+
+    def update(self, stranger):
+        """Synchronizes the pool with stranger's `looking_for_partner_from` field. Strangers
+        owned by other shards are counted by their owners.
+        """
+        if not SHARDING.owns(stranger.telegram_id):
+            return
+
+        self._discard(stranger.id)
+
+        if stranger.looking_for_partner_from is not None:
+            self._add(stranger)
@@ -0,0 +1,104 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from .task_local import TaskLocal
+
+LOGGER = logging.getLogger('randtalkbot.watchdog')
+PROCESSING_CONTEXT = TaskLocal()
+
+
+def set_processing_context(handler, stranger_id):
+    """Remembers what the current task is busy with to report it if the task blocks the loop."""
+    PROCESSING_CONTEXT.set((handler, stranger_id))
+
+
+class Watchdog:
+    """Measures event loop lag and logs the stack of the frame blocking the loop.
+
+    The loop updates a heartbeat timestamp periodically while a daemon thread checks it. When the
+    heartbeat is late for more than `threshold` seconds, the thread captures the loop thread's
+    stack. Reports are logged not more often than once per `report_interval` seconds.
+    """
+
+    def __init__(self, threshold, interval=.1, report_interval=60):
+        self._threshold = threshold
+        self._interval = interval
+        self._report_interval = report_interval
+        self._heartbeat = None
+        self._loop = None
+        self._loop_thread_id = None
+        self._reported_heartbeat = None
+        self._last_report_time = None
+        self._suppressed_reports_count = 0
+        self._thread = None
+
+    def get_lag(self):
+        """Returns:
+            float: Seconds the loop is late to update the heartbeat for.
+        """
+        return max(time.monotonic() - self._heartbeat - self._interval, 0)
+
+    def _check(self):
+        lag = self.get_lag()
+
+        if lag < self._threshold or self._reported_heartbeat == self._heartbeat:
+            return
+
+        # Report every stall only once.
+        self._reported_heartbeat = self._heartbeat
+        now = time.monotonic()
+
+        if self._last_report_time is not None and \
+                now - self._last_report_time < self._report_interval:
+            self._suppressed_reports_count += 1
+            return
+
+        self._last_report_time = now
+        # pylint: disable=protected-access
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = '' if frame is None else ''.join(traceback.format_stack(frame))
+        task = asyncio.Task.current_task(loop=self._loop)
+        handler, stranger_id = PROCESSING_CONTEXT.get((None, None), task=task)
+        LOGGER.warning(
+            'Event loop is blocked for %.3f s by %s processing stranger %s.'
+            ' %d similar reports were suppressed. Blocking stack:\n%s',
+            lag,
+            handler,
+            stranger_id,
+            self._suppressed_reports_count,
+            stack,
+            )
+        self._suppressed_reports_count = 0
+
+    async def run(self):
+        self._loop = asyncio.get_event_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._thread = threading.Thread(
+            target=self._watch,
+            name='randtalkbot.watchdog',
+            daemon=True,
+            )
+        self._thread.start()
+        LOGGER.info('Watching for event loop lags longer than %f s', self._threshold)
+
+        try:
+            while True:
+                self._heartbeat = time.monotonic()
+                await asyncio.sleep(self._interval)
+        finally:
+            self._loop = None
+
+    def _watch(self):
+        while self._loop is not None:
+            self._check()
+            time.sleep(self._interval / 2)
@@ -4,6 +4,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import distutils.log
 import os
 import sys
 from setuptools import setup, Command
@@ -29,6 +30,28 @@ class CoverageCommand(Command):
         from coveralls import cli
         cli.main(self.coveralls_args)
 
+class I18nTablesCommand(Command):
+    description = 'generate lookup tables of languages and translations'
+    user_options = []
+
+    def initialize_options(self):
+        pass
+
+    def finalize_options(self):
+        pass
+
+    def run(self):
+        # Messages translated to every language are collected on modules import.
+        # pylint: disable=unused-variable
+        import randtalkbot.randtalkbot
+        from randtalkbot.i18n import get_tables_source
+        path = os.path.join('randtalkbot', 'i18n_tables.py')
+
+        with open(path, 'w', encoding='utf-8') as tables_file:
+            tables_file.write(get_tables_source())
+
+        self.announce(f'{path} was generated', level=distutils.log.INFO)
+
 def lint(*options):
     from pylint.lint import Run
     run = Run(options, exit=False)
@@ -49,8 +72,12 @@ class LintCommand(Command):
     def run(self):
         self.distribution.fetch_build_eggs(self.distribution.tests_require)
         lint(
+            'benchmarks',
+            'loadtest',
+            'queryplans',
             'randtalkbot',
             'setup',
+            'simulator',
             'telepot_testing',
             )
         lint(
@@ -116,6 +143,7 @@ setup(
         ],
     cmdclass={
         'coverage': CoverageCommand,
+        'i18n_tables': I18nTablesCommand,
         'lint': LintCommand,
         'test': TestCommand,
         },
@@ -0,0 +1,416 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""simulator.simulator: discrete-event simulation of strangers looking for partners.
+
+Strangers arrive as Poisson process with sexes, languages and bonuses drawn from `Stats` data.
+Every arrived stranger is matched immediately through `Matcher` or waits for somebody suitable
+during exponentially distributed patience time. Simulated time is only used to order events and
+to set `looking_for_partner_from`, so hours of traffic take seconds.
+"""
+
+from collections import OrderedDict
+import datetime
+import heapq
+import itertools
+import json
+import logging
+import sys
+import time
+from docopt import docopt
+from peewee import DoesNotExist
+from loadtest.loadtest import get_percentile
+from randtalkbot.configuration import Configuration, ConfigurationObtainingError
+from randtalkbot.db import DB
+from randtalkbot.errors import DBError, PartnerObtainingError
+from randtalkbot.stats import Stats
+from randtalkbot.stranger import Stranger
+from randtalkbot.stranger_service import StrangerService
+from randtalkbot.testing import initialize_sqlite_database
+
+DOC = '''RandTalkBot matching simulator
+
+Usage:
+  simulator [options]
+  simulator -h | --help
+
+Options:
+  --arrival-rate=RATE            Strangers starting the search per minute [default: 10].
+  --patience=MINUTES             Mean time a stranger waits before leaving [default: 10].
+  --duration=MINUTES             Simulated period of arrivals [default: 600].
+  --stats=PATH                   JSON file with `Stats` data to draw strangers from.
+  --configuration=CONFIGURATION  Draw strangers from the latest `Stats` in the bot's DB.
+  --seed=SEED                    Random seed.
+  --json                         Print the report as JSON.
+'''
+ARRIVAL = 'arrival'
+BONUS_BUCKETS = ((0, '0'), (3, '1-3'), (None, '4+'))
+# Is used when no real stats were provided.
+DEFAULT_STATS_DATA = {
+    'bonus_count_distribution': {'0': 850, '1': 80, '3': 50, '10': 20},
+    'languages_count_distribution': [[1, 800], [2, 200]],
+    'languages_popularity': [['en', 600], ['ru', 300], ['it', 80], ['de', 60], ['pt', 40]],
+    'partner_sex_distribution': {'female': 500, 'male': 200, 'not_specified': 300},
+    'sex_distribution': {'female': 300, 'male': 600, 'not_specified': 100},
+    }
+DEPARTURE = 'departure'
+LOGGER = logging.getLogger('simulator')
+START_TIME = datetime.datetime(2000, 1, 1)
+
+def get_bonus_bucket(bonus_count):
+    for limit, name in BONUS_BUCKETS[:-1]:
+        if bonus_count <= limit:
+            return name
+
+    return BONUS_BUCKETS[-1][1]
+
+def get_fairness_index(values):
+    """Jain's fairness index: 1 if all the values are equal, 1/n in the worst case.
+
+    Returns:
+        float: `None` if there're no values.
+    """
+    squares_sum = sum(value ** 2 for value in values)
+
+    if not squares_sum:
+        return None
+
+    return sum(values) ** 2 / (len(values) * squares_sum)
+
+class StrangersDistribution:
+    """Draws strangers' parameters from `Stats` data."""
+
+    def __init__(self, data):
+        self._languages_count_distribution = \
+            self._get_weights(data.get('languages_count_distribution', ()), [[1, 1]])
+        self._languages_popularity = \
+            self._get_weights(data.get('languages_popularity', ()), [['en', 1]])
+        self._languages_to_orientation = {
+            language: self._get_weights(orientation_distribution.items(), ())
+            for language, orientation_distribution in data.get('languages_to_orientation', ())
+            }
+        self._sex_distribution = \
+            self._get_weights(data.get('sex_distribution', {}).items(), [['not_specified', 1]])
+        self._partner_sex_distribution = self._get_weights(
+            data.get('partner_sex_distribution', {}).items(),
+            [['not_specified', 1]],
+            )
+        self._bonus_count_distribution = self._get_weights(
+            [
+                [int(bonus_count), count]
+                for bonus_count, count in data.get('bonus_count_distribution', {}).items()
+                ],
+            [[0, 1]],
+            )
+
+    @staticmethod
+    def _choose(rand, weights):
+        values, values_weights = weights
+        return rand.choices(values, values_weights)[0]
+
+    def draw(self, rand):
+        """Returns:
+            dict: Fields of the stranger.
+        """
+        languages_count = self._choose(rand, self._languages_count_distribution)
+        languages = []
+        popularity = list(zip(*self._languages_popularity))
+
+        # Draw without replacement.
+        while popularity and len(languages) < languages_count:
+            language = rand.choices(*zip(*popularity))[0]
+            languages.append(language)
+            popularity = [item for item in popularity if item[0] != language]
+
+        orientation_distribution = self._languages_to_orientation.get(languages[0])
+
+        if orientation_distribution and orientation_distribution[0]:
+            sex, partner_sex = self._choose(rand, orientation_distribution).split()
+        else:
+            sex = self._choose(rand, self._sex_distribution)
+            partner_sex = self._choose(rand, self._partner_sex_distribution)
+
+        if sex == 'not_specified':
+            partner_sex = 'not_specified'
+
+        return {
+            'bonus_count': self._choose(rand, self._bonus_count_distribution),
+            'languages': json.dumps(languages),
+            'partner_sex': partner_sex,
+            'sex': sex,
+            }
+
+    @staticmethod
+    def _get_weights(items, default):
+        items = [item for item in items if item[1] > 0] or default
+        return tuple(zip(*items))
+
+class Matcher:
+    """Matching engine used by the bot. Subclass it to evaluate other engines: they're notified
+    about strangers who start and stop waiting.
+    """
+
+    def __init__(self):
+        self._stranger_service = StrangerService()
+
+    def add(self, stranger):
+        pass
+
+    def discard(self, stranger):
+        pass
+
+    def match(self, stranger):
+        """Raises:
+            PartnerObtainingError: If there's no proper partner.
+
+        Returns:
+            Stranger: Partner waiting for a talk.
+        """
+        # pylint: disable=protected-access
+        partner = self._stranger_service._match_partner(stranger)
+        self._stranger_service._locked_strangers_ids.discard(partner.id)
+        return partner
+
+class _Bucket:
+    def __init__(self):
+        self.arrivals_count = 0
+        self.waiting_times = []
+
+    def to_dict(self):
+        return {
+            'arrivals': self.arrivals_count,
+            'match_rate': len(self.waiting_times) / self.arrivals_count,
+            'waiting_time_p50': get_percentile(self.waiting_times, 50),
+            }
+
+class Simulator:
+    # pylint: disable=too-many-instance-attributes,too-many-arguments
+    def __init__(
+            self,
+            distribution,
+            rand,
+            arrival_rate=10,
+            patience=10,
+            duration=600,
+            matcher=None,
+        ):
+        """Args:
+            distribution (StrangersDistribution): Source of the arriving strangers' attributes.
+            rand (random.Random): Source of the simulation's randomness.
+            arrival_rate (float): Strangers arriving per minute.
+            patience (float): Mean minutes before the waiting stranger leaves.
+            duration (float): Minutes during which strangers arrive.
+            matcher (Matcher): Matching engine to evaluate.
+        """
+        self._distribution = distribution
+        self._random = rand
+        self._arrival_rate = arrival_rate
+        self._patience = patience
+        self._duration = duration
+        self._matcher = Matcher() if matcher is None else matcher
+        self._events = []
+        self._events_ids = itertools.count()
+        self._strangers_ids = itertools.count(1)
+        # Stranger's id -> (stranger, arrival time, buckets).
+        self._waiting = {}
+        self._buckets = OrderedDict()
+        self._waiting_times = []
+        self._arrivals_count = 0
+        self._departures_count = 0
+        self._matches_count = 0
+        self._match_calls_count = 0
+        self._match_cpu_time = 0
+
+    def _arrive(self, now):
+        self._schedule(now + self._random.expovariate(self._arrival_rate), ARRIVAL)
+        stranger_id = next(self._strangers_ids)
+        stranger = Stranger.create(
+            invitation=f'{stranger_id:010d}',
+            telegram_id=stranger_id,
+            **self._distribution.draw(self._random)
+            )
+        self._arrivals_count += 1
+        buckets = self._get_buckets(stranger)
+
+        for bucket in buckets:
+            bucket.arrivals_count += 1
+
+        start_time = time.process_time()
+
+        try:
+            partner = self._matcher.match(stranger)
+        except PartnerObtainingError:
+            partner = None
+
+        self._match_cpu_time += time.process_time() - start_time
+        self._match_calls_count += 1
+
+        if partner is None:
+            stranger.looking_for_partner_from = START_TIME + datetime.timedelta(minutes=now)
+            stranger.save()
+            self._matcher.add(stranger)
+            self._waiting[stranger.id] = (stranger, now, buckets)
+            patience = self._random.expovariate(1 / self._patience)
+            self._schedule(now + patience, DEPARTURE, stranger.id)
+        else:
+            self._matches_count += 1
+            self._record_waiting_time(buckets, 0)
+            partner, arrival_time, partner_buckets = self._waiting.pop(partner.id)
+            self._record_waiting_time(partner_buckets, now - arrival_time)
+            self._stop_waiting(partner)
+
+    def _depart(self, stranger_id):
+        try:
+            stranger, unused_arrival_time, unused_buckets = self._waiting.pop(stranger_id)
+        except KeyError: # The stranger has found a partner already.
+            return
+
+        self._departures_count += 1
+        self._stop_waiting(stranger)
+
+    def _get_buckets(self, stranger):
+        names = (
+            f'orientation: {stranger.sex} {stranger.partner_sex}',
+            f'language: {stranger.get_languages()[0]}',
+            f'bonus: {get_bonus_bucket(stranger.bonus_count)}',
+            )
+        return [self._buckets.setdefault(name, _Bucket()) for name in names]
+
+    def _record_waiting_time(self, buckets, waiting_time):
+        self._waiting_times.append(waiting_time)
+
+        for bucket in buckets:
+            bucket.waiting_times.append(waiting_time)
+
+    def run(self):
+        """Strangers should be stored in an empty DB.
+
+        Returns:
+            dict: Report.
+        """
+        self._schedule(self._random.expovariate(self._arrival_rate), ARRIVAL)
+
+        while self._events:
+            now, unused_event_id, kind, stranger_id = heapq.heappop(self._events)
+
+            if kind == ARRIVAL:
+                if now <= self._duration:
+                    self._arrive(now)
+            else:
+                self._depart(stranger_id)
+
+        buckets = OrderedDict(
+            (name, bucket.to_dict())
+            for name, bucket in sorted(self._buckets.items())
+            )
+        return {
+            'arrivals': self._arrivals_count,
+            'matches': self._matches_count,
+            'departures': self._departures_count,
+            'match_rate': len(self._waiting_times) / self._arrivals_count
+                          if self._arrivals_count else None,
+            'waiting_time': {
+                'p50': get_percentile(self._waiting_times, 50),
+                'p90': get_percentile(self._waiting_times, 90),
+                'p99': get_percentile(self._waiting_times, 99),
+                },
+            'cpu_per_match': self._match_cpu_time / self._matches_count
+                             if self._matches_count else None,
+            'cpu_per_match_call': self._match_cpu_time / self._match_calls_count
+                                  if self._match_calls_count else None,
+            'fairness_index': get_fairness_index(
+                [bucket['match_rate'] for bucket in buckets.values()],
+                ),
+            'buckets': buckets,
+            }
+
+    def _schedule(self, event_time, kind, stranger_id=None):
+        heapq.heappush(self._events, (event_time, next(self._events_ids), kind, stranger_id))
+
+    def _stop_waiting(self, stranger):
+        stranger.looking_for_partner_from = None
+        stranger.save()
+        self._matcher.discard(stranger)
+
+def format_report(report):
+    def format_minutes(minutes):
+        return 'n/a' if minutes is None else f'{minutes:.1f} min'
+
+    def format_cpu_time(seconds):
+        return 'n/a' if seconds is None else f'{seconds * 1000:.2f} ms'
+
+    def format_ratio(ratio):
+        return 'n/a' if ratio is None else f'{ratio:.1%}'
+
+    waiting_time = report['waiting_time']
+    fairness_index = report['fairness_index']
+    lines = [
+        f'Arrivals: {report["arrivals"]}. Matches: {report["matches"]}.'
+        f' Left without partner: {report["departures"]}.',
+        f'Match rate: {format_ratio(report["match_rate"])}.',
+        f'Waiting time: p50 {format_minutes(waiting_time["p50"])},'
+        f' p90 {format_minutes(waiting_time["p90"])}, p99 {format_minutes(waiting_time["p99"])}.',
+        f'CPU per match: {format_cpu_time(report["cpu_per_match"])}'
+        f' ({format_cpu_time(report["cpu_per_match_call"])} per matching attempt).',
+        'Fairness index of match rates: '
+        f'{"n/a" if fairness_index is None else f"{fairness_index:.3f}"}.',
+        '',
+        f'{"Bucket":<40} {"Arrivals":>8} {"Match rate":>10} {"Waiting p50":>12}',
+        ]
+
+    for name, bucket in report['buckets'].items():
+        lines.append(
+            f'{name:<40} {bucket["arrivals"]:>8} {format_ratio(bucket["match_rate"]):>10}'
+            f' {format_minutes(bucket["waiting_time_p50"]):>12}',
+            )
+
+    return '\n'.join(lines)
+
+def get_stats_data(arguments):
+    if arguments['--stats'] is not None:
+        try:
+            with open(arguments['--stats']) as file_descriptor:
+                return json.load(file_descriptor)
+        except (OSError, ValueError) as err:
+            sys.exit(f'Can\'t read stats. {err}')
+
+    if arguments['--configuration'] is not None:
+        try:
+            configuration = Configuration(arguments['--configuration'])
+        except ConfigurationObtainingError as err:
+            sys.exit(f'Can\'t obtain configuration. {err}')
+
+        try:
+            DB(configuration)
+            return Stats.select().order_by(Stats.created.desc()).get().get_data()
+        except DBError as err:
+            sys.exit(f'Can\'t construct DB. {err}')
+        except DoesNotExist:
+            sys.exit('There\'re no stats in the DB yet.')
+
+    return DEFAULT_STATS_DATA
+
+def main():
+    import random
+    arguments = docopt(DOC)
+    logging.basicConfig(level=logging.WARNING)
+    distribution = StrangersDistribution(get_stats_data(arguments))
+    # Simulation never touches the bot's DB.
+    initialize_sqlite_database()
+    seed = arguments['--seed']
+    simulator = Simulator(
+        distribution,
+        random.Random(None if seed is None else int(seed)),
+        arrival_rate=float(arguments['--arrival-rate']),
+        patience=float(arguments['--patience']),
+        duration=float(arguments['--duration']),
+        )
+    report = simulator.run()
+
+    if arguments['--json']:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
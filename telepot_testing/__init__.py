@@ -5,4 +5,5 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 from .aio import create_open, DelegatorBot
-from .helpers import assert_sent_message, finalize, receive_message, UPDATES_TIMEOUT
+from .helpers import add_sent_updates_listener, assert_sent_message, finalize, receive_message, \
+    remove_sent_updates_listener, UPDATES_TIMEOUT
@@ -6,13 +6,22 @@
 
 import asyncio
 from asyncio import Queue
+import itertools
 import logging
 from unittest.mock import Mock
 from asynctest.mock import CoroutineMock
-from telepot_testing.helpers import get_update, send_update, UPDATES_TIMEOUT
+from telepot import filtering, flavor
 from telepot.helper import Microphone
+from telepot_testing import helpers
+from telepot_testing.helpers import get_update, send_update
 
 LOGGER = logging.getLogger('telepot_testing.aio')
+UPDATES_KEYS = {
+    'callback_query': 'callback_query',
+    'chat': 'message',
+    'chosen_inline_result': 'chosen_inline_result',
+    'inline_query': 'inline_query',
+    }
 
 def create_open(cls, *args, **kwargs):
     def get_future(seed_tuple):
@@ -44,15 +53,33 @@ def create_open(cls, *args, **kwargs):
 
 class Listener:
     def __init__(self, microphone, queue):
-        self.capture = Mock()
         self._microphone = microphone
         self._queue = queue
+        self._patterns = []
+
+    def __del__(self):
+        self._microphone.remove(self._queue)
+
+    def capture(self, pattern):
+        self._patterns.append(pattern)
+
+    async def _get_captured_update(self):
+        # Like telepot's listener, skip updates addressed to other handlers.
+        while True:
+            update = await self._queue.get()
+
+            if not self._patterns or \
+                    any(filtering.match_all(update, pattern) for pattern in self._patterns):
+                return update
 
     async def wait(self):
         LOGGER.debug('Waiting for received update')
 
         try:
-            update = await asyncio.wait_for(self._queue.get(), timeout=UPDATES_TIMEOUT)
+            update = await asyncio.wait_for(
+                self._get_captured_update(),
+                timeout=helpers.UPDATES_TIMEOUT,
+                )
         except asyncio.TimeoutError:
             LOGGER.debug('No received update was awaited in listener')
             return None
@@ -83,6 +110,7 @@ class DelegatorBot:
         self._microphone = Microphone()
         self.scheduler = Mock()
         self._loop = asyncio.get_event_loop()
+        self._updates_ids = itertools.count(1)
 
         for method in self.coroutines:
             setattr(self, method, CoroutineMock())
@@ -93,7 +121,20 @@ class DelegatorBot:
         listener = Listener(self._microphone, queue)
         return listener
 
-    async def handle(self, update):
+    # pylint: disable=invalid-name,unused-argument
+    async def getUpdates(self, offset=None, limit=None, timeout=None, allowed_updates=None):
+        """Returns received updates one by one wrapping them like Telegram does."""
+        update = await get_update()
+
+        if update is None:
+            return []
+
+        return [{
+            'update_id': next(self._updates_ids),
+            UPDATES_KEYS[flavor(update)]: update,
+            }]
+
+    def handle(self, update):
         LOGGER.debug('Sending to the microphone %s', update)
         self._microphone.send(update)
 
@@ -104,14 +145,14 @@ class DelegatorBot:
                 continue
 
             if seed not in cache or cache[seed].done():
-                future = get_future((self, update, seed))
-                cache[seed] = future
-                self._loop.create_task(future)
+                cache[seed] = self._loop.create_task(get_future((self, update, seed)))
 
     async def message_loop(self):
         while True:
             update = await get_update()
-            await self.handle(update)
+
+            if update is not None:
+                self.handle(update)
 
     # pylint: disable=invalid-name,too-many-arguments,unused-argument
     async def sendMessage(
@@ -12,9 +12,16 @@ LOGGER = logging.getLogger('telepot_testing')
 # pylint: disable=invalid-name
 message_id_counter = 0
 SENT_FUTURES = []
+SENT_UPDATES_LISTENERS = []
 UPDATES_FUTURES = []
 UPDATES_TIMEOUT = 1
 
+def add_sent_updates_listener(listener):
+    """Makes sent updates be passed to the callable instead of being awaited by
+    `assert_sent_update()`. Is useful to consume lots of sent updates, e.g. during load testing.
+    """
+    SENT_UPDATES_LISTENERS.append(listener)
+
 async def assert_sent_message(chat_id, text, disable_notification=None, reply_markup=None):
     expected_update = {
         'chat': {
@@ -140,7 +147,16 @@ def receive_message(chat_id, text):
         'text': text,
         })
 
+def remove_sent_updates_listener(listener):
+    SENT_UPDATES_LISTENERS.remove(listener)
+
 def send_update(update):
+    if SENT_UPDATES_LISTENERS:
+        for listener in SENT_UPDATES_LISTENERS:
+            listener(update)
+
+        return
+
     LOGGER.debug(
         'Futures count: %d. Sending update to some (probably new) future: %s',
         len(SENT_FUTURES),
@@ -9,14 +9,18 @@ import datetime
 from functools import wraps
 import logging
 from asynctest.mock import patch, Mock
-from peewee import SqliteDatabase
-from randtalkbot import stats, stranger, talk
+from randtalkbot import bonus_ledger, stats, stranger, talk
+from randtalkbot.bonus_ledger import BONUS_LEDGER, BonusLedgerEntry
 from randtalkbot.bot import Bot
+from randtalkbot.dispatcher import DISPATCHER
+from randtalkbot.route_table import ROUTE_TABLE
 from randtalkbot.stats import Stats
 from randtalkbot.stranger import Stranger
 from randtalkbot.stranger_service import StrangerService
 from randtalkbot.talk import Talk
 from randtalkbot.stats_service import StatsService
+from randtalkbot.testing import InstrumentedSqliteDatabase
+from randtalkbot.waiting_pool import WaitingPool
 import telepot_testing
 from telepot_testing import finalize as finalize_telepot
 
@@ -71,20 +75,33 @@ def run(ctx):
             level=logging.DEBUG,
             )
 
+    BONUS_LEDGER.clear()
+    DISPATCHER.clear()
+    ROUTE_TABLE.clear()
+    Talk._unsaved_talks.clear()
+    Stranger.configure_invitations('foo_token')
     bot = Bot(get_configuration_mock())
     loop = asyncio.get_event_loop()
     ctx.task = loop.create_task(bot.run())
 
-    ctx.database = SqliteDatabase(':memory:')
+    ctx.database = InstrumentedSqliteDatabase(':memory:')
+    bonus_ledger.DATABASE_PROXY.initialize(ctx.database)
     stats.DATABASE_PROXY.initialize(ctx.database)
     stranger.DATABASE_PROXY.initialize(ctx.database)
     talk.DATABASE_PROXY.initialize(ctx.database)
-    ctx.database.create_tables([Stats, Stranger, Talk])
+    ctx.database.create_tables([Stats, Stranger, Talk, BonusLedgerEntry])
+    WaitingPool()
 
     StatsService()
     StrangerService.get_instance() \
         ._strangers_cache \
         .clear()
+    StrangerService.get_instance() \
+        ._invitations_cache \
+        .clear()
+    StrangerService.get_instance() \
+        ._telegram_ids_cache \
+        .clear()
 
 def finalize(ctx):
     ctx.database.drop_tables([Stranger, Talk])
@@ -9,6 +9,7 @@ import asynctest
 from asynctest.mock import call, patch, Mock, CoroutineMock
 from randtalkbot.admin_handler import AdminHandler
 from randtalkbot.admin_handler import StrangerServiceError
+from randtalkbot.stranger_sender import StrangerSender
 from randtalkbot.stranger_setup_wizard import StrangerSetupWizard
 
 
@@ -147,3 +148,53 @@ class TestAdminHandler(asynctest.TestCase):
         message.command_args = 'foo_args'
         await self.admin_handler.handle_command(message)
         handle_command.assert_called_once_with(message)
+
+    @patch('randtalkbot.admin_handler.TRACER')
+    async def test_handle_command_traces(self, tracer_mock):
+        trace = Mock()
+        trace.name = 'foo'
+        trace.duration = .5
+        trace.tags = {'stranger_id': 1}
+        trace.children = []
+        tracer_mock.get_slowest_traces.return_value = [trace]
+        message = Mock()
+        message.command_args = '3'
+        await self.admin_handler._handle_command_traces(message)
+        tracer_mock.get_slowest_traces.assert_called_once_with(3)
+        self.sender.send_notification.assert_called_once_with(
+            'Slowest traces:\n{0}',
+            'foo 500.0 ms stranger_id=1',
+            )
+
+    @patch('randtalkbot.admin_handler.TRACER')
+    async def test_handle_command_traces__too_many(self, tracer_mock):
+        trace = Mock()
+        trace.name = 'StrangerHandler._handle_command_begin'
+        trace.duration = .5
+        trace.tags = {'stranger_id': 1}
+        child = Mock(children=[], duration=.1, tags={})
+        child.name = 'Stranger.set_partner'
+        trace.children = [child] * 100
+        tracer_mock.get_slowest_traces.return_value = [trace] * 20
+        message = Mock()
+        message.command_args = '100'
+        await self.admin_handler._handle_command_traces(message)
+        tracer_mock.get_slowest_traces.assert_called_once_with(20)
+        text = self.sender.send_notification.call_args[0][1]
+        self.assertLessEqual(len(StrangerSender._escape_markdown(text)), 4000)
+        self.assertTrue(text.endswith('\n...'))
+
+    @patch('randtalkbot.admin_handler.TRACER')
+    async def test_handle_command_traces__default_count(self, tracer_mock):
+        tracer_mock.get_slowest_traces.return_value = []
+        message = Mock()
+        message.command_args = ''
+        await self.admin_handler._handle_command_traces(message)
+        tracer_mock.get_slowest_traces.assert_called_once_with(5)
+        self.sender.send_notification.assert_called_once_with('No traces were collected yet.')
+
+    @patch('randtalkbot.admin_handler.TRACER')
+    async def test_handle_command_traces__disabled(self, tracer_mock):
+        tracer_mock.enabled = False
+        await self.admin_handler._handle_command_traces(Mock())
+        self.sender.send_notification.assert_called_once_with('Tracing is disabled.')
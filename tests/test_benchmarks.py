@@ -0,0 +1,72 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from benchmarks import hot_paths, startup # pylint: disable=unused-import
+from benchmarks.runner import BENCHMARKS, compare, format_counters, format_duration, measure
+
+
+class TestRunner(unittest.TestCase):
+    def test_compare(self):
+        baseline = {
+            'results': {
+                'foo': {'min': 1},
+                'bar': {'min': 2},
+                'removed': {'min': 3},
+                },
+            }
+        results = {
+            'results': {
+                'foo': {'min': 1.5},
+                'bar': {'min': 1},
+                'added': {'min': 3},
+                },
+            }
+        self.assertEqual(
+            compare(baseline, results),
+            [('foo', 1, 1.5, 50), ('bar', 2, 1, -50)],
+            )
+
+    def test_format_counters(self):
+        self.assertEqual(
+            format_counters({'bytes': 58, 'calls': 1, 'methods': ['foo']}),
+            ' calls=1 bytes=58',
+            )
+        self.assertEqual(format_counters({}), '')
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(1.5), '1.500 s')
+        self.assertEqual(format_duration(.0025), '2.500 ms')
+        self.assertEqual(format_duration(.000001), '1.000 us')
+        self.assertEqual(format_duration(.0000005), '500.0 ns')
+
+    def test_measure(self):
+        result = measure(lambda: None, repeat=2)
+        self.assertEqual(result['repeat'], 2)
+        self.assertGreater(result['number'], 1)
+        self.assertLessEqual(result['min'], result['median'])
+
+
+class TestHotPaths(unittest.TestCase):
+    def test_benchmarks_run(self):
+        for name, setup in BENCHMARKS.items():
+            if name.startswith('StrangerService._match_partner') and \
+                    not name.endswith(f'[{hot_paths.POOLS_SIZES[0]}]'):
+                continue
+
+            with self.subTest(name=name), setup() as run:
+                run()
+
+    def test_send_counters(self):
+        for name, method_name in (
+                ('StrangerSender.send[text]', 'sendMessage'),
+                ('StrangerSender.send[text, copyMessage]', 'copyMessage'),
+            ):
+            with self.subTest(name=name), BENCHMARKS[name]() as run:
+                counters = run.get_counters()
+                self.assertEqual(counters['calls'], 1)
+                self.assertEqual(counters['methods'], [method_name])
+                self.assertGreater(counters['bytes'], 0)
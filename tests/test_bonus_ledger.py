@@ -0,0 +1,104 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from unittest.mock import patch, Mock
+from peewee import DatabaseError
+from randtalkbot.bonus_ledger import BonusLedger, BonusLedgerEntry, LEDGER_ENTRIES_COUNTER
+from randtalkbot.metrics import REGISTRY
+from randtalkbot.query_counter import count_queries
+from randtalkbot.stranger import Stranger
+from randtalkbot.testing import initialize_sqlite_database
+
+def get_entries():
+    return [
+        (entry.stranger_id, entry.delta, entry.reason)
+        for entry in BonusLedgerEntry.select().order_by(BonusLedgerEntry.id)
+        ]
+
+
+class TestBonusLedger(unittest.TestCase):
+    def setUp(self):
+        self.database = initialize_sqlite_database()
+        self.stranger = Stranger.create(invitation='foo', telegram_id=31416)
+        self.ledger = BonusLedger(batch_size=3)
+        REGISTRY.enabled = True
+        REGISTRY.clear()
+
+    def tearDown(self):
+        self.database.close()
+        REGISTRY.enabled = False
+        REGISTRY.clear()
+
+    def test_record(self):
+        self.ledger.record(self.stranger, 3, 'invitation')
+        self.ledger.record(self.stranger, -1, 'talk')
+        self.assertEqual(len(self.ledger), 2)
+        self.assertEqual(get_entries(), [])
+
+    def test_record__batch_is_full(self):
+        with count_queries(everywhere=True) as counter:
+            for unused_index in range(4):
+                self.ledger.record(self.stranger, 1, 'invitation')
+
+        self.assertEqual(counter.writes, 1)
+        self.assertEqual(len(get_entries()), 3)
+        self.assertEqual(len(self.ledger), 1)
+
+    def test_record__buffer_is_full(self):
+        self.ledger = BonusLedger(batch_size=3, max_size=4)
+
+        with patch.object(BonusLedgerEntry, 'insert_many', side_effect=DatabaseError()):
+            for delta in range(1, 7):
+                self.ledger.record(self.stranger, delta, 'payment')
+
+        self.assertEqual(len(self.ledger), 4)
+        self.assertEqual(LEDGER_ENTRIES_COUNTER.get('dropped'), 2)
+        self.assertEqual(self.ledger.flush(), 4)
+        self.assertEqual(
+            get_entries(),
+            [(self.stranger.id, delta, 'payment') for delta in range(1, 5)],
+            )
+
+    def test_flush(self):
+        for delta in range(1, 8):
+            self.ledger.record(self.stranger, delta, 'payment')
+
+        with count_queries(everywhere=True) as counter:
+            self.assertEqual(self.ledger.flush(), 1)
+
+        self.assertEqual(counter.writes, 1)
+        self.assertEqual(
+            get_entries(),
+            [(self.stranger.id, delta, 'payment') for delta in range(1, 8)],
+            )
+        self.assertEqual(len(self.ledger), 0)
+
+    def test_flush__database_error(self):
+        self.ledger.record(self.stranger, 1, 'invitation')
+
+        with patch.object(BonusLedgerEntry, 'insert_many', side_effect=DatabaseError()):
+            self.assertEqual(self.ledger.flush(), 0)
+
+        self.assertEqual(len(self.ledger), 1)
+        self.assertEqual(self.ledger.flush(), 1)
+        self.assertEqual(get_entries(), [(self.stranger.id, 1, 'invitation')])
+
+    @patch('randtalkbot.bonus_ledger.time.monotonic', Mock(return_value=1000))
+    def test_flush__database_error__backoff(self):
+        with patch.object(BonusLedgerEntry, 'insert_many', side_effect=DatabaseError()) \
+                as insert_many_mock:
+            for unused_index in range(5):
+                self.ledger.record(self.stranger, 1, 'invitation')
+
+            self.assertEqual(insert_many_mock.call_count, 1)
+            self.assertEqual(self.ledger._retry_at, 1010)
+            self.assertEqual(self.ledger.flush(), 0)
+            self.assertEqual(self.ledger._retry_at, 1020)
+
+        self.assertEqual(len(self.ledger), 5)
+        self.assertEqual(self.ledger.flush(), 5)
+        self.assertIsNone(self.ledger._retry_at)
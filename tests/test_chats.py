@@ -4,8 +4,12 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import datetime
 import asynctest
+from randtalkbot.query_counter import count_queries
+from randtalkbot.talk import Talk
+from randtalkbot.tracing import TRACER
 from telepot_testing import assert_sent_message, receive_message
 from .helpers import assert_db, finalize, run, patch_telepot, setup_db
 
@@ -73,3 +77,80 @@ class TestChats(asynctest.TestCase):
                     },
                 ],
             })
+
+    async def test_message_relaying_is_traced(self):
+        setup_db({
+            'strangers': [STRANGER1_1, STRANGER1_2],
+            'talks': [TALK1],
+            })
+        TRACER.configure()
+
+        try:
+            receive_message(STRANGER1_1['telegram_id'], 'Hello')
+            await assert_sent_message(STRANGER1_2['telegram_id'], 'Hello')
+            await asyncio.sleep(0)
+            trace, = TRACER.get_slowest_traces(1)
+        finally:
+            TRACER.enabled = False
+            TRACER.clear()
+
+        self.assertEqual(trace.name, 'StrangerHandler.on_chat_message')
+        self.assertEqual(trace.tags, {'stranger_id': STRANGER1_1['id']})
+        self.assertEqual(
+            [span.name for span in trace.children],
+            ['Message', 'StrangerSetupWizard.handle', 'StrangerSender.sendMessage',
+             'Talk.increment_sent'],
+            )
+
+    async def test_message_relaying_queries_budget(self):
+        setup_db({
+            'strangers': [STRANGER1_1, STRANGER1_2],
+            'talks': [TALK1],
+            })
+
+        with count_queries(everywhere=True) as counter:
+            receive_message(STRANGER1_1['telegram_id'], 'Hello')
+            await assert_sent_message(STRANGER1_2['telegram_id'], 'Hello')
+            await asyncio.sleep(0)
+
+        # The first message loads the stranger and the talk. Partners are loaded one by one.
+        self.assertLessEqual(counter.writes, 1)
+        self.assertLessEqual(counter.reads, 5)
+
+        with count_queries(everywhere=True) as counter:
+            receive_message(STRANGER1_1['telegram_id'], 'How are you?')
+            await assert_sent_message(STRANGER1_2['telegram_id'], 'How are you?')
+            await asyncio.sleep(0)
+
+        # The route to the partner is cached, so the message is relayed without queries.
+        self.assertEqual(counter.writes, 0)
+        self.assertEqual(counter.reads, 0)
+
+    async def test_messages_counters_are_saved_during_talk(self):
+        setup_db({
+            'strangers': [STRANGER1_1, STRANGER1_2],
+            'talks': [TALK1],
+            })
+
+        for text in ('Hello', 'How are you?', 'What\'s new?'):
+            receive_message(STRANGER1_1['telegram_id'], text)
+            await assert_sent_message(STRANGER1_2['telegram_id'], text)
+
+        assert_db({
+            'talks': [
+                {
+                    'id': TALK1['id'],
+                    'partner1_sent': TALK1['partner1_sent'] + 1,
+                    },
+                ],
+            })
+        Talk.save_unsaved()
+        assert_db({
+            'talks': [
+                {
+                    'id': TALK1['id'],
+                    'end': None,
+                    'partner1_sent': TALK1['partner1_sent'] + 3,
+                    },
+                ],
+            })
@@ -6,20 +6,36 @@
 
 import unittest
 from unittest.mock import create_autospec, patch, Mock
-from peewee import DatabaseError
-from randtalkbot.db import DB, RetryingDB
-from randtalkbot.errors import DBError
+import asynctest
+from peewee import DatabaseError, OperationalError
+from randtalkbot.bonus_ledger import BonusLedgerEntry
+from randtalkbot.db import DB, RetryingDB, get_error_code
+from randtalkbot.errors import DBError, DBUnavailableError
 from randtalkbot.stats import Stats
 from randtalkbot.stranger import Stranger
 from randtalkbot.talk import Talk
 
 class TestDB(unittest.TestCase):
-    @patch('randtalkbot.db.RetryingDB', create_autospec(RetryingDB))
-    @patch('randtalkbot.db.stats')
-    @patch('randtalkbot.db.stranger')
-    @patch('randtalkbot.db.talk')
-    def setUp(self, stats_module_mock, stranger_module_mock, talk_module_mock):
+    def setUp(self):
+        patchers = (
+            patch('randtalkbot.db.RetryingDB', create_autospec(RetryingDB)),
+            patch('randtalkbot.db.bonus_ledger'),
+            patch('randtalkbot.db.migrations'),
+            patch('randtalkbot.db.stats'),
+            patch('randtalkbot.db.stranger'),
+            patch('randtalkbot.db.talk'),
+            )
+
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
         from randtalkbot.db import RetryingDB as retrying_db_cls_mock
+        from randtalkbot.db import bonus_ledger as bonus_ledger_module_mock
+        from randtalkbot.db import stats as stats_module_mock
+        from randtalkbot.db import stranger as stranger_module_mock
+        from randtalkbot.db import talk as talk_module_mock
+        self.bonus_ledger_module_mock = bonus_ledger_module_mock
         self.stats_module_mock = stats_module_mock
         self.stranger_module_mock = stranger_module_mock
         self.talk_module_mock = talk_module_mock
@@ -31,8 +47,11 @@ class TestDB(unittest.TestCase):
         self.configuration.database_name = 'foo_name'
         self.configuration.database_user = 'foo_user'
         self.configuration.database_password = 'foo_password'
+        self.configuration.database_connect_timeout = 20
+        self.configuration.database_replica_host = None
         self.retrying_db_cls_mock.reset_mock()
         self.db = DB(self.configuration)
+        self.database.reset_mock()
 
     def test_init__ok(self):
         self.retrying_db_cls_mock.assert_called_once_with(
@@ -41,20 +60,147 @@ class TestDB(unittest.TestCase):
             user='foo_user',
             password='foo_password',
             )
+        self.bonus_ledger_module_mock.DATABASE_PROXY.initialize.assert_called_once_with(
+            self.database,
+            )
         self.stats_module_mock.DATABASE_PROXY.initialize.assert_called_once_with(self.database)
         self.stranger_module_mock.DATABASE_PROXY.initialize.assert_called_once_with(self.database)
         self.talk_module_mock.DATABASE_PROXY.initialize.assert_called_once_with(self.database)
 
-    def test_init__database_troubles(self):
-        self.retrying_db_cls_mock.return_value.connect.side_effect = DatabaseError()
+    @patch('randtalkbot.db.time.sleep')
+    def test_init__database_isnt_ready(self, sleep_mock):
+        self.database.connect.side_effect = [
+            OperationalError(2003, 'Can\'t connect to MySQL server'),
+            OperationalError(2003, 'Can\'t connect to MySQL server'),
+            None,
+            ]
+        DB(self.configuration)
+        self.assertEqual(self.database.connect.call_count, 3)
+        self.assertEqual(sleep_mock.call_count, 2)
+        self.database.close.assert_called_once_with()
+
+        for (delay, ), unused_kwargs in sleep_mock.call_args_list:
+            self.assertTrue(0 <= delay <= 2)
+
+    @patch('randtalkbot.db.time.sleep')
+    def test_init__database_troubles(self, sleep_mock):
+        self.database.connect.side_effect = DatabaseError()
+        self.configuration.database_connect_timeout = 0
+        with self.assertRaises(DBUnavailableError):
+            DB(self.configuration)
+        sleep_mock.assert_not_called()
+
+    @patch('randtalkbot.db.time.sleep')
+    def test_init__access_denied(self, sleep_mock):
+        self.database.connect.side_effect = OperationalError(1045, 'Access denied for user')
+        with self.assertRaises(DBError) as context_manager:
+            DB(self.configuration)
+        self.assertNotIsInstance(context_manager.exception, DBUnavailableError)
+        self.database.connect.assert_called_once_with()
+        sleep_mock.assert_not_called()
+
+    @patch('randtalkbot.db.time.sleep')
+    def test_init__unknown_database(self, sleep_mock):
+        self.database.connect.side_effect = OperationalError(1049, 'Unknown database \'foo\'')
         with self.assertRaises(DBError):
             DB(self.configuration)
+        sleep_mock.assert_not_called()
+
+    @patch('randtalkbot.db.time.sleep')
+    @patch('randtalkbot.db.time.monotonic')
+    def test_init__deadline(self, monotonic_mock, sleep_mock):
+        monotonic_mock.side_effect = [0, 1, 19.5, 20]
+        self.database.connect.side_effect = OperationalError(2003, 'Can\'t connect')
+        with self.assertRaises(DBUnavailableError):
+            DB(self.configuration)
+        self.assertEqual(self.database.connect.call_count, 3)
+        # The last delay doesn't exceed the deadline.
+        (delay, ), unused_kwargs = sleep_mock.call_args
+        self.assertLessEqual(delay, .5)
+
+    @patch('randtalkbot.db.REPLICA')
+    def test_init__replica(self, replica_mock):
+        self.configuration.database_replica_host = 'replica_host'
+        self.configuration.database_replica_name = 'foo_name'
+        self.configuration.database_replica_user = 'replica_user'
+        self.configuration.database_replica_password = 'replica_password'
+        self.configuration.database_replica_max_lag = 30
+        replica = Mock()
+        self.retrying_db_cls_mock.side_effect = [self.database, replica]
+        DB(self.configuration)
+        self.retrying_db_cls_mock.assert_called_with(
+            'foo_name',
+            host='replica_host',
+            user='replica_user',
+            password='replica_password',
+            )
+        replica_mock.configure.assert_called_once_with(replica, max_lag=30)
+        replica.connect.assert_not_called()
+
+    def test_init__without_connection_check(self):
+        DB(self.configuration, check_connection=False)
+        self.database.connect.assert_not_called()
 
-    def test_install__ok(self):
+    def test_get_error_code(self):
+        self.assertEqual(get_error_code(OperationalError(1045, 'Access denied')), 1045)
+        self.assertIsNone(get_error_code(DatabaseError()))
+        self.assertIsNone(get_error_code(DatabaseError('foo')))
+
+    @patch('randtalkbot.db.Migrator')
+    def test_install__ok(self, migrator_cls_mock):
         self.db.install()
-        self.database.create_tables.assert_called_once_with([Stats, Stranger, Talk])
+        self.database.create_tables.assert_called_once_with(
+            [Stats, Stranger, Talk, BonusLedgerEntry],
+            )
+        migrator_cls_mock.assert_called_once_with(self.database)
+        migrator_cls_mock.return_value.stamp.assert_called_once_with()
 
     def test_install__database_error(self):
         self.database.create_tables.side_effect = DatabaseError()
         with self.assertRaises(DBError):
             self.db.install()
+
+    @patch('randtalkbot.db.Migrator')
+    def test_migrate__ok(self, migrator_cls_mock):
+        self.assertEqual(
+            self.db.migrate(dry_run=True),
+            migrator_cls_mock.return_value.migrate.return_value,
+            )
+        migrator_cls_mock.assert_called_once_with(self.database)
+        migrator_cls_mock.return_value.migrate.assert_called_once_with(dry_run=True)
+
+    @patch('randtalkbot.db.Migrator')
+    def test_migrate__database_error(self, migrator_cls_mock):
+        migrator_cls_mock.return_value.migrate.side_effect = DatabaseError()
+        with self.assertRaises(DBError):
+            self.db.migrate()
+
+
+class TestDBAsync(asynctest.TestCase):
+    @patch('randtalkbot.db.RetryingDB')
+    @patch('randtalkbot.db.bonus_ledger', Mock())
+    @patch('randtalkbot.db.migrations', Mock())
+    @patch('randtalkbot.db.stats', Mock())
+    @patch('randtalkbot.db.stranger', Mock())
+    @patch('randtalkbot.db.talk', Mock())
+    def setUp(self, retrying_db_cls_mock):
+        self.database = retrying_db_cls_mock.return_value
+        self.configuration = Mock()
+        self.configuration.database_connect_timeout = 20
+        self.configuration.database_replica_host = None
+        self.db = DB(self.configuration, check_connection=False)
+
+    async def test_assert_configuration_ok_async(self):
+        self.database.connect.side_effect = [OperationalError(2003, 'Can\'t connect'), None]
+
+        with patch('randtalkbot.db.asyncio.sleep', asynctest.CoroutineMock()) as sleep_mock:
+            await self.db.assert_configuration_ok_async()
+
+        self.assertEqual(sleep_mock.call_count, 1)
+        self.database.close.assert_called_once_with()
+
+    async def test_assert_configuration_ok_async__access_denied(self):
+        self.database.connect.side_effect = OperationalError(1045, 'Access denied for user')
+
+        with self.assertRaises(DBError):
+            await self.db.assert_configuration_ok_async()
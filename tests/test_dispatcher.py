@@ -0,0 +1,118 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import asynctest
+from randtalkbot.dispatcher import Dispatcher, FLOOD_UPDATES_COUNTER, get_merge_key
+from randtalkbot.metrics import REGISTRY
+
+
+class TestDispatcher(asynctest.TestCase):
+    def setUp(self):
+        self.dispatcher = Dispatcher()
+        self.dispatcher.configure(workers_count=2, queue_size=4, user_queue_size=2)
+        REGISTRY.enabled = True
+        REGISTRY.clear()
+
+    def tearDown(self):
+        REGISTRY.enabled = False
+        REGISTRY.clear()
+
+    @asynctest.ignore_loop
+    def test_configure__unknown_flood_policy(self):
+        with self.assertRaises(ValueError):
+            self.dispatcher.configure(flood_policy='foo')
+
+    @asynctest.ignore_loop
+    def test_get_merge_key(self):
+        self.assertEqual(get_merge_key({'text': '/begin'}), ('text', '/begin'))
+        self.assertEqual(
+            get_merge_key({'id': '1', 'query': 'foo', 'offset': ''}),
+            ('inline_query', ),
+            )
+        self.assertIsNone(get_merge_key({'photo': []}))
+
+    async def test_put__drop(self):
+        self.dispatcher.configure(
+            workers_count=2,
+            queue_size=4,
+            user_queue_size=2,
+            flood_policy='drop',
+            )
+        self.assertTrue(await self.dispatcher.put(31416, {'text': 'foo'}))
+        self.assertTrue(await self.dispatcher.put(31416, {'text': 'bar'}))
+        self.assertFalse(await self.dispatcher.put(31416, {'text': 'baz'}))
+        self.assertTrue(await self.dispatcher.put(27183, {'text': 'baz'}))
+        self.assertEqual(self.dispatcher.get_pending_count(), 3)
+        self.assertEqual(self.dispatcher.get_max_user_queue_depth(), 2)
+        self.assertEqual(FLOOD_UPDATES_COUNTER.get('dropped'), 1)
+
+    async def test_put__merge(self):
+        self.assertTrue(await self.dispatcher.put(31416, {'text': '/begin'}))
+        self.assertTrue(await self.dispatcher.put(31416, {'photo': []}))
+        self.assertFalse(await self.dispatcher.put(31416, {'text': '/begin'}))
+        # There's nothing to merge with.
+        self.assertTrue(await self.dispatcher.put(31416, {'text': '/end'}))
+        self.assertEqual(self.dispatcher.get_pending_count(), 3)
+        self.assertEqual(FLOOD_UPDATES_COUNTER.get('merged'), 1)
+
+    async def test_put__waits_for_room(self):
+        for index in range(4):
+            await self.dispatcher.put(index, {'text': 'foo'})
+
+        put_task = self.loop.create_task(self.dispatcher.put(31416, {'text': 'foo'}))
+        await asyncio.sleep(.01)
+        self.assertFalse(put_task.done())
+        await self.dispatcher.process(0, asyncio.sleep(0))
+        self.assertTrue(await put_task)
+        self.assertEqual(self.dispatcher.get_pending_count(), 4)
+
+    async def test_process__limits_workers(self):
+        max_busy_workers_count = 0
+        processed = []
+
+        async def handle(user_id, index):
+            nonlocal max_busy_workers_count
+            max_busy_workers_count = max(
+                max_busy_workers_count,
+                self.dispatcher.get_busy_workers_count(),
+                )
+            await asyncio.sleep(.01)
+            processed.append((user_id, index))
+
+        for user_id in range(3):
+            await self.dispatcher.put(user_id, {'text': 'foo'})
+
+        await asyncio.gather(*[
+            self.dispatcher.process(user_id, handle(user_id, 0))
+            for user_id in range(3)
+            ])
+        self.assertEqual(max_busy_workers_count, 2)
+        self.assertEqual(len(processed), 3)
+        self.assertEqual(self.dispatcher.get_pending_count(), 0)
+        self.assertEqual(self.dispatcher.get_busy_workers_count(), 0)
+
+    async def test_process__error(self):
+        await self.dispatcher.put(31416, {'text': 'foo'})
+
+        async def fail():
+            raise ValueError()
+
+        with self.assertRaises(ValueError):
+            await self.dispatcher.process(31416, fail())
+
+        self.assertEqual(self.dispatcher.get_pending_count(), 0)
+
+    async def test_forget(self):
+        await self.dispatcher.put(31416, {'text': 'foo'})
+        await self.dispatcher.put(31416, {'text': 'bar'})
+        await self.dispatcher.put(27183, {'text': 'foo'})
+        self.dispatcher.forget(31416)
+        self.dispatcher.forget(31416)
+        self.assertEqual(self.dispatcher.get_pending_count(), 1)
+        # Processing of the forgotten update doesn't break counting.
+        await self.dispatcher.process(31416, asyncio.sleep(0))
+        self.assertEqual(self.dispatcher.get_pending_count(), 1)
@@ -6,8 +6,9 @@
 
 import unittest
 from unittest.mock import call, patch
-from randtalkbot.i18n import get_languages_names, get_languages_codes, get_translation, \
-    LanguageNotFoundError
+from randtalkbot import i18n_tables
+from randtalkbot.i18n import get_all_translations, get_languages_names, get_languages_codes, \
+    get_tables_source, get_translation, LanguageNotFoundError, _load_tables
 
 class TestI18n(unittest.TestCase):
     def test_get_languages_names__supported(self):
@@ -87,3 +88,29 @@ class TestI18n(unittest.TestCase):
                     ),
                 ],
             )
+
+    @patch('randtalkbot.i18n.TRANSLATED_MESSAGES', set())
+    def test_get_all_translations(self):
+        from randtalkbot.i18n import TRANSLATED_MESSAGES
+        self.assertIn('женский', get_all_translations('Female'))
+        self.assertEqual(get_all_translations('Foo'), ('foo', ))
+        self.assertEqual(TRANSLATED_MESSAGES, {'Female', 'Foo'})
+
+    def test_load_tables(self):
+        self.assertIs(_load_tables(), i18n_tables)
+
+    @patch('randtalkbot.i18n._get_locales', lambda: ['en', 'xx'])
+    def test_load_tables__outdated(self):
+        self.assertIsNone(_load_tables())
+
+    def test_tables_are_up_to_date(self):
+        # Collects all messages translated to every language.
+        # pylint: disable=unused-variable
+        import randtalkbot.randtalkbot
+
+        with open(i18n_tables.__file__, encoding='utf-8') as file_descriptor:
+            self.assertEqual(
+                file_descriptor.read(),
+                get_tables_source(),
+                'Run `python setup.py i18n_tables` to update the tables',
+                )
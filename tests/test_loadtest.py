@@ -0,0 +1,55 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asynctest
+from loadtest.loadtest import format_report, get_percentile, LoadTest
+from randtalkbot.dispatcher import DISPATCHER
+from randtalkbot.stranger import Stranger
+from randtalkbot.stranger_service import StrangerService
+from randtalkbot.testing import initialize_sqlite_database
+from .helpers import finalize
+
+
+class TestLoadTest(asynctest.TestCase):
+    def setUp(self):
+        self.database = initialize_sqlite_database()
+        DISPATCHER.clear()
+        Stranger.configure_invitations('foo_token')
+        StrangerService.get_instance() \
+            ._strangers_cache \
+            .clear()
+        StrangerService.get_instance() \
+            ._invitations_cache \
+            .clear()
+        StrangerService.get_instance() \
+            ._telegram_ids_cache \
+            .clear()
+
+    def tearDown(self):
+        finalize(self)
+
+    async def test_run(self):
+        load_test = LoadTest(4, cycles_count=2, messages_count=2, think_time=0, timeout=5, seed=1)
+        report = await load_test.run()
+        self.assertEqual(report['users'], 4)
+        self.assertEqual(report['timeouts'], 0)
+        self.assertEqual(report['match_time']['count'], 8)
+        self.assertGreaterEqual(report['updates'], 4 * (3 + 2 * 2))
+        self.assertGreater(report['latency']['count'], 0)
+        self.assertGreater(report['queries']['reads'], 0)
+        self.assertGreater(report['queries']['writes'], 0)
+        self.assertIn('Update-to-send latency: p50', format_report(report))
+
+
+class TestGetPercentile(asynctest.TestCase):
+    @asynctest.ignore_loop
+    def test_get_percentile(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(get_percentile(values, 50), 50)
+        self.assertEqual(get_percentile(values, 99), 99)
+        self.assertEqual(get_percentile(values, 100), 100)
+        self.assertEqual(get_percentile([7], 99), 7)
+        self.assertIsNone(get_percentile([], 50))
@@ -87,6 +87,7 @@ class TestMessage(unittest.TestCase):
             message.sending_kwargs,
             {
                 'audio': 'foo',
+                'caption': None,
                 'duration': None,
                 'performer': None,
                 'title': None,
@@ -100,11 +101,13 @@ class TestMessage(unittest.TestCase):
             'performer': 'Pink Floyd',
             'title': 'Another Brick In The Wall Part 3',
             }
+        self.message_json['caption'] = 'The Wall'
         message = Message(self.message_json)
         self.assertEqual(
             message.sending_kwargs,
             {
                 'audio': 'foo',
+                'caption': 'The Wall',
                 'duration': 85,
                 'performer': 'Pink Floyd',
                 'title': 'Another Brick In The Wall Part 3',
@@ -149,6 +152,7 @@ class TestMessage(unittest.TestCase):
         self.assertEqual(
             message.sending_kwargs,
             {
+                'caption': None,
                 'document': 'foo',
                 },
             )
@@ -192,7 +196,7 @@ class TestMessage(unittest.TestCase):
             message.sending_kwargs,
             {
                 'caption': None,
-                'photo': 'foo',
+                'photo': 'bar',
                 },
             )
         self.assertEqual(message.text, None)
@@ -208,10 +212,43 @@ class TestMessage(unittest.TestCase):
             message.sending_kwargs,
             {
                 'caption': 'baz',
-                'photo': 'foo',
+                'photo': 'bar',
                 },
             )
 
+    def test_init__photo_from_media_group(self):
+        self.message_json['photo'] = [
+            {'file_id': 'foo'},
+            {'file_id': 'bar'},
+            ]
+        self.message_json['caption'] = 'baz'
+        self.message_json['media_group_id'] = 'boo'
+        message = Message(self.message_json)
+        self.assertEqual(message.media_group_id, 'boo')
+        self.assertEqual(
+            message.get_input_media(),
+            {
+                'type': 'photo',
+                'media': 'bar',
+                'caption': 'baz',
+                },
+            )
+
+    def test_init__video_from_media_group(self):
+        self.message_json['video'] = {
+            'file_id': 'foo',
+            }
+        self.message_json['media_group_id'] = 'boo'
+        message = Message(self.message_json)
+        self.assertEqual(message.media_group_id, 'boo')
+        self.assertEqual(message.get_input_media(), {'type': 'video', 'media': 'foo'})
+
+    def test_init__text_has_no_media_group(self):
+        self.message_json['text'] = 'foo'
+        self.message_json['media_group_id'] = 'boo'
+        message = Message(self.message_json)
+        self.assertIsNone(message.media_group_id)
+
     @patch('randtalkbot.message.telepot')
     def test_init__invalid_photo(self, telepot):
         telepot.glance.return_value = 'photo', 'private', 31416
@@ -240,6 +277,8 @@ class TestMessage(unittest.TestCase):
             {'text': 'foo'},
             )
         self.assertEqual(message.text, 'foo')
+        self.assertEqual(message.chat_id, 31416)
+        self.assertEqual(message.message_id, 27183)
 
     @patch('randtalkbot.message.telepot')
     def test_init__text_without_command_has_empty_comand_field(self, telepot):
@@ -294,6 +333,7 @@ class TestMessage(unittest.TestCase):
             message.sending_kwargs,
             {
                 'voice': 'foo',
+                'caption': None,
                 'duration': None,
                 },
             )
@@ -303,11 +343,13 @@ class TestMessage(unittest.TestCase):
             'duration': 85,
             'file_id': 'foo',
             }
+        self.message_json['caption'] = 'Hello'
         message = Message(self.message_json)
         self.assertEqual(
             message.sending_kwargs,
             {
                 'voice': 'foo',
+                'caption': 'Hello',
                 'duration': 85,
                 },
             )
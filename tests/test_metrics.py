@@ -0,0 +1,84 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from randtalkbot.metrics import NULL_TIMER, Registry
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+        self.registry.enabled = True
+
+    def test_counter(self):
+        counter = self.registry.counter('foo_total', 'Foo.', ('bar', ))
+        counter.inc('baz')
+        counter.inc('baz', amount=2)
+        self.assertEqual(counter.get('baz'), 3)
+        self.assertEqual(
+            self.registry.render(),
+            '# HELP foo_total Foo.\n'
+            '# TYPE foo_total counter\n'
+            'foo_total{bar="baz"} 3.0\n',
+            )
+
+    def test_counter__disabled(self):
+        counter = self.registry.counter('foo_total', 'Foo.')
+        self.registry.enabled = False
+        counter.inc()
+        self.assertEqual(counter.get(), 0)
+
+    def test_gauge__function(self):
+        gauge = self.registry.gauge('foo', 'Foo.', ('bar', ))
+        gauge.set_function(lambda: {('baz', ): 1, ('bim', ): 2})
+        self.assertEqual(
+            self.registry.render(),
+            '# HELP foo Foo.\n'
+            '# TYPE foo gauge\n'
+            'foo{bar="baz"} 1.0\n'
+            'foo{bar="bim"} 2.0\n',
+            )
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('foo_seconds', 'Foo.', buckets=(1, 10))
+        histogram.observe(.5)
+        histogram.observe(5)
+        histogram.observe(50)
+        self.assertEqual(histogram.get(), (3, 55.5))
+        self.assertEqual(
+            self.registry.render(),
+            '# HELP foo_seconds Foo.\n'
+            '# TYPE foo_seconds histogram\n'
+            'foo_seconds_bucket{le="1.0"} 1.0\n'
+            'foo_seconds_bucket{le="10.0"} 2.0\n'
+            'foo_seconds_bucket{le="+Inf"} 3.0\n'
+            'foo_seconds_sum 55.5\n'
+            'foo_seconds_count 3.0\n',
+            )
+
+    def test_histogram_time(self):
+        histogram = self.registry.histogram('foo_seconds', 'Foo.', ('bar', ))
+
+        with histogram.time('baz'):
+            pass
+
+        self.assertEqual(histogram.get('baz')[0], 1)
+
+    def test_histogram_time__disabled(self):
+        histogram = self.registry.histogram('foo_seconds', 'Foo.')
+        self.registry.enabled = False
+        self.assertIs(histogram.time(), NULL_TIMER)
+
+    def test_register__duplicate(self):
+        self.registry.counter('foo_total', 'Foo.')
+
+        with self.assertRaises(ValueError):
+            self.registry.gauge('foo_total', 'Foo.')
+
+    def test_render__escapes_labels(self):
+        counter = self.registry.counter('foo_total', 'Foo.', ('bar', ))
+        counter.inc('"baz"\\')
+        self.assertIn('foo_total{bar="\\"baz\\"\\\\"} 1.0', self.registry.render())
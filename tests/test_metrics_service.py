@@ -0,0 +1,57 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import asynctest
+from asynctest.mock import patch, Mock
+from randtalkbot.metrics import REGISTRY
+from randtalkbot.metrics_service import MetricsService
+
+
+class TestMetricsService(asynctest.TestCase):
+    def setUp(self):
+        self.waiting_pool = Mock()
+        self.waiting_pool.get_count.return_value = 2
+        self.waiting_pool.get_counts_by_language.return_value = {'en': 2}
+        self.waiting_pool.get_counts_by_sex.return_value = {'female': 1, 'male': 1}
+        self.metrics_service = MetricsService('127.0.0.1', 0)
+
+    def tearDown(self):
+        REGISTRY.enabled = False
+        REGISTRY.clear()
+
+    async def request(self, request_line):
+        reader = asyncio.StreamReader()
+        reader.feed_data(request_line + b'Host: localhost\r\n\r\n')
+        reader.feed_eof()
+        writer = Mock()
+        writer.drain = asynctest.CoroutineMock()
+
+        with patch('randtalkbot.metrics_service.WaitingPool') as waiting_pool_cls_mock:
+            waiting_pool_cls_mock.get_instance.return_value = self.waiting_pool
+            await self.metrics_service._handle_request(reader, writer)
+
+        writer.close.assert_called_once_with()
+        return b''.join(call[0][0] for call in writer.write.call_args_list).decode('utf-8')
+
+    @asynctest.ignore_loop
+    def test_init__enables_registry(self):
+        self.assertTrue(REGISTRY.enabled)
+
+    async def test_handle_request__metrics(self):
+        response = await self.request(b'GET /metrics HTTP/1.1\r\n')
+        self.assertTrue(response.startswith('HTTP/1.0 200 OK\r\n'))
+        self.assertIn('randtalkbot_waiting_strangers 2.0\n', response)
+        self.assertIn('randtalkbot_waiting_strangers_by_sex{sex="female"} 1.0\n', response)
+        self.assertIn('randtalkbot_waiting_strangers_by_language{language="en"} 2.0\n', response)
+
+    async def test_handle_request__not_found(self):
+        response = await self.request(b'GET /foo HTTP/1.1\r\n')
+        self.assertTrue(response.startswith('HTTP/1.0 404 Not Found\r\n'))
+
+    async def test_handle_request__malformed(self):
+        response = await self.request(b'\r\n')
+        self.assertTrue(response.startswith('HTTP/1.0 404 Not Found\r\n'))
@@ -0,0 +1,98 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import unittest
+from peewee import MySQLDatabase
+from randtalkbot.migrations import AddIndex, MIGRATIONS, Migrator, SchemaMigration
+from randtalkbot.testing import initialize_sqlite_database
+
+
+class TestAddIndex(unittest.TestCase):
+    def test_get_sql__mysql(self):
+        operation = AddIndex('talk', ('partner1_id', 'end'))
+        self.assertEqual(
+            operation.get_sql(MySQLDatabase('randtalkbot')),
+            'ALTER TABLE `talk` ADD INDEX `talk_partner1_id_end` (`partner1_id`, `end`),'
+            ' ALGORITHM=INPLACE, LOCK=NONE',
+            )
+
+    def test_get_sql__sqlite(self):
+        operation = AddIndex('stranger', ('telegram_id', ), unique=True)
+        self.assertEqual(
+            operation.get_sql(initialize_sqlite_database()),
+            'CREATE UNIQUE INDEX IF NOT EXISTS "stranger_telegram_id" ON "stranger"'
+            ' ("telegram_id")',
+            )
+
+
+class TestMigrator(unittest.TestCase):
+    def setUp(self):
+        self.database = initialize_sqlite_database()
+        # DB installed before the indexes were introduced.
+        for index_name in ('talk_partner1_id', 'talk_end', 'stranger_looking_for_partner_from'):
+            self.database.execute_sql(f'DROP INDEX "{index_name}"')
+        self.database.execute_sql('DROP TABLE "bonus_ledger"')
+        self.migrator = Migrator(self.database)
+
+    def tearDown(self):
+        self.database.close()
+
+    def get_indexes_names(self, table):
+        return {index.name for index in self.database.get_indexes(table)}
+
+    def test_migrate(self):
+        applied = self.migrator.migrate()
+        self.assertEqual([migration for migration, unused_statements in applied], list(MIGRATIONS))
+        self.assertEqual(
+            [statements for unused_migration, statements in applied],
+            [
+                ['CREATE INDEX IF NOT EXISTS "talk_partner1_id" ON "talk" ("partner1_id")'],
+                ['CREATE INDEX IF NOT EXISTS "talk_end" ON "talk" ("end")'],
+                [
+                    'CREATE INDEX IF NOT EXISTS "stranger_looking_for_partner_from" ON "stranger"'
+                    ' ("looking_for_partner_from")',
+                    ],
+                [],
+                [
+                    'CREATE TABLE IF NOT EXISTS "bonus_ledger" ("id" INTEGER NOT NULL PRIMARY KEY,'
+                    ' "stranger_id" INTEGER NOT NULL, "delta" INTEGER NOT NULL, "reason"'
+                    ' VARCHAR(20) NOT NULL, "created" DATETIME NOT NULL, FOREIGN KEY'
+                    ' ("stranger_id") REFERENCES "stranger" ("id"))',
+                    'CREATE INDEX IF NOT EXISTS "bonus_ledger_stranger_id" ON "bonus_ledger"'
+                    ' ("stranger_id")',
+                    ],
+                ],
+            )
+        self.assertIn('talk_partner1_id', self.get_indexes_names('talk'))
+        self.assertIn('talk_end', self.get_indexes_names('talk'))
+        self.assertIn('stranger_looking_for_partner_from', self.get_indexes_names('stranger'))
+        self.assertIn('bonus_ledger_stranger_id', self.get_indexes_names('bonus_ledger'))
+        self.assertEqual(self.migrator.get_version(), MIGRATIONS[-1].version)
+        self.assertEqual(SchemaMigration.select().count(), len(MIGRATIONS))
+        self.assertEqual(self.migrator.migrate(), [])
+
+    def test_migrate__dry_run(self):
+        applied = self.migrator.migrate(dry_run=True)
+        self.assertEqual(len(applied), len(MIGRATIONS))
+        self.assertNotIn('talk_partner1_id', self.get_indexes_names('talk'))
+        self.assertFalse(SchemaMigration.table_exists())
+        self.assertNotIn('bonus_ledger', self.database.get_tables())
+        self.assertEqual(self.migrator.get_version(), 0)
+
+    def test_migrate__partially_migrated(self):
+        self.database.create_table(SchemaMigration)
+        SchemaMigration.create(version=1, description='Index talks by partners')
+        applied = self.migrator.migrate()
+        self.assertEqual(
+            [migration.version for migration, unused_statements in applied],
+            [2, 3, 4, 5],
+            )
+        self.assertNotIn('talk_partner1_id', self.get_indexes_names('talk'))
+
+    def test_stamp(self):
+        self.migrator.stamp()
+        self.assertEqual(self.migrator.get_version(), MIGRATIONS[-1].version)
+        self.assertEqual(self.migrator.get_pending_migrations(), [])
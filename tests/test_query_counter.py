@@ -0,0 +1,118 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import asynctest
+from asynctest.mock import patch, Mock
+from peewee import SqliteDatabase
+from randtalkbot import stranger
+from randtalkbot.db import InstrumentedDatabaseMixin
+from randtalkbot.query_counter import count_queries, is_counting, QueryBudget, QueryCounter, \
+    record_query
+from randtalkbot.stranger import Stranger
+
+
+class InstrumentedSqliteDatabase(InstrumentedDatabaseMixin, SqliteDatabase):
+    pass
+
+
+class TestQueryCounter(asynctest.TestCase):
+    def setUp(self):
+        self.database = InstrumentedSqliteDatabase(':memory:')
+        stranger.DATABASE_PROXY.initialize(self.database)
+        self.database.create_tables([Stranger])
+
+    def tearDown(self):
+        self.database.drop_tables([Stranger])
+
+    async def test_count_queries__task(self):
+        self.assertFalse(is_counting())
+
+        with count_queries() as counter:
+            self.assertTrue(is_counting())
+            stranger_instance = Stranger.create(invitation='foo', telegram_id=31416)
+            Stranger.get(Stranger.telegram_id == 31416)
+            Stranger.get(Stranger.telegram_id == 31416)
+            stranger_instance.bonus_count = 1
+            stranger_instance.save()
+
+        self.assertFalse(is_counting())
+        self.assertEqual(counter.reads, 2)
+        # `Stranger.create()` and `save()`.
+        self.assertEqual(counter.writes, 2)
+        self.assertEqual(len(counter.get_repeated_statements()), 1)
+        self.assertEqual(counter.get_repeated_statements()[0][1], 2)
+
+    async def test_count_queries__nested(self):
+        with count_queries() as outer_counter:
+            Stranger.create(invitation='foo', telegram_id=31416)
+
+            with count_queries() as inner_counter:
+                Stranger.get(Stranger.telegram_id == 31416)
+
+        self.assertEqual((outer_counter.reads, outer_counter.writes), (1, 1))
+        self.assertEqual((inner_counter.reads, inner_counter.writes), (1, 0))
+
+    async def test_count_queries__other_task_is_not_counted(self):
+        async def query():
+            Stranger.create(invitation='foo', telegram_id=31416)
+
+        with count_queries() as counter:
+            await self.loop.create_task(query())
+
+        self.assertEqual(counter.count, 0)
+
+    async def test_count_queries__everywhere(self):
+        async def query():
+            Stranger.create(invitation='foo', telegram_id=31416)
+
+        with count_queries(everywhere=True) as counter:
+            await asyncio.gather(query(), self.loop.create_task(query()), return_exceptions=True)
+
+        self.assertEqual(counter.writes, 2)
+
+
+class TestQueryBudget(asynctest.TestCase):
+    def setUp(self):
+        self.budget = QueryBudget()
+        self.counter = QueryCounter()
+        self.counter.record('SELECT foo', 'SELECT', .1)
+        self.counter.record('SELECT foo', 'SELECT', .1)
+        self.counter.record('UPDATE foo', 'UPDATE', .1)
+
+    @patch('randtalkbot.query_counter.LOGGER', Mock())
+    @asynctest.ignore_loop
+    def test_check__fits(self):
+        from randtalkbot.query_counter import LOGGER
+        self.budget.configure(reads=2, writes=1)
+        self.assertTrue(self.budget.check(self.counter, 'foo_handler', 31416))
+        LOGGER.warning.assert_not_called()
+
+    @patch('randtalkbot.query_counter.LOGGER', Mock())
+    @asynctest.ignore_loop
+    def test_check__exceeded(self):
+        from randtalkbot.query_counter import LOGGER
+        self.budget.configure(writes=0)
+        self.assertFalse(self.budget.check(self.counter, 'foo_handler', 31416))
+        self.assertEqual(LOGGER.warning.call_args[0][1:5], ('foo_handler', 31416, 2, 1))
+        self.assertEqual(LOGGER.warning.call_args[0][6], ('SELECT foo', 2))
+
+    @patch('randtalkbot.query_counter.LOGGER', Mock())
+    async def test_watch(self):
+        from randtalkbot.query_counter import LOGGER
+        self.budget.configure(reads=0)
+
+        with self.budget.watch('foo_handler', 31416) as counter:
+            record_query('SELECT foo', 'SELECT', .1)
+
+        self.assertEqual(counter.reads, 1)
+        self.assertTrue(LOGGER.warning.called)
+        self.assertFalse(is_counting())
+
+    @asynctest.ignore_loop
+    def test_watch__disabled(self):
+        with self.budget.watch('foo_handler', 31416) as counter:
+            self.assertIsNone(counter)
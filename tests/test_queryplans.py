@@ -0,0 +1,99 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+from unittest.mock import Mock
+from peewee import MySQLDatabase
+from queryplans.queryplans import check, explain, format_report, HOT_QUERIES, HotQuery, \
+    PlanStep, run, seed
+from randtalkbot.stranger import Stranger
+from randtalkbot.talk import Talk
+from randtalkbot.testing import initialize_sqlite_database
+
+
+class TestQueryPlans(unittest.TestCase):
+    def setUp(self):
+        self.database = initialize_sqlite_database()
+        self.query = HotQuery('foo', None, frozenset(('foo_index', 'bar_index')), False)
+
+    def tearDown(self):
+        self.database.close()
+
+    def test_run(self):
+        seed(self.database, 300, 1000, random.Random(0))
+        self.assertEqual(Stranger.select().count(), 300)
+        self.assertEqual(Talk.select().count(), 1000)
+        results = run(self.database)
+        self.assertEqual(
+            [name for name, unused_steps, unused_problems in results],
+            list(HOT_QUERIES),
+            )
+
+        for name, unused_steps, problems in results:
+            self.assertEqual(problems, [], name)
+
+        self.assertNotIn('FAIL', format_report(results))
+
+    def test_run__filter(self):
+        seed(self.database, 10, 10, random.Random(0))
+        results = run(self.database, substring='match_partner')
+        self.assertEqual(len(results), 3)
+
+    def test_explain__sqlite(self):
+        steps = explain(self.database, Talk.select().where(Talk.partner1_sent == 1))
+        self.assertEqual(len(steps), 1)
+        self.assertTrue(steps[0].full_scan)
+        self.assertIsNone(steps[0].index)
+        steps = explain(self.database, Stranger.select().where(Stranger.telegram_id == 31416))
+        self.assertEqual(steps[0].index, 'stranger_telegram_id')
+        self.assertFalse(steps[0].full_scan)
+        steps = explain(self.database, Stranger.select().order_by(Stranger.languages))
+        self.assertTrue(any(step.filesort for step in steps))
+
+    def test_explain__mysql(self):
+        database = Mock(spec=MySQLDatabase)
+        cursor = database.execute_sql.return_value
+        cursor.description = [
+            (column, ) for column in
+            ('id', 'select_type', 'table', 'type', 'possible_keys', 'key', 'rows', 'Extra')
+            ]
+        cursor.fetchall.return_value = [
+            (1, 'SIMPLE', 't1', 'ALL', None, None, 1000, 'Using where; Using filesort'),
+            (1, 'SIMPLE', 't2', 'ref', 'foo_index', 'foo_index', 1, None),
+            ]
+        steps = explain(database, Stranger.select().where(Stranger.telegram_id == 31416))
+        sql, params = database.execute_sql.call_args[0]
+        self.assertTrue(sql.startswith('EXPLAIN SELECT'))
+        self.assertEqual(params, [31416])
+        self.assertEqual(steps[0].table, 't1')
+        self.assertTrue(steps[0].full_scan)
+        self.assertTrue(steps[0].filesort)
+        self.assertEqual(steps[1].index, 'foo_index')
+        self.assertFalse(steps[1].full_scan)
+        self.assertFalse(steps[1].filesort)
+
+    def test_check__ok(self):
+        steps = [PlanStep('t1', 'foo_index,baz_index', False, False, 'index_merge')]
+        self.assertEqual(check(self.query, steps), [])
+
+    def test_check__problems(self):
+        steps = [
+            PlanStep('t1', None, True, False, 'SCAN t1'),
+            PlanStep(None, None, False, True, 'USE TEMP B-TREE FOR ORDER BY'),
+            ]
+        self.assertEqual(
+            check(self.query, steps),
+            [
+                'Full scan of t1',
+                'Rows are sorted without an index',
+                'None of the indexes is used: bar_index, foo_index',
+                ],
+            )
+        self.assertEqual(
+            check(self.query._replace(filesort_allowed=True, indexes=frozenset()), steps),
+            ['Full scan of t1'],
+            )
@@ -0,0 +1,118 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import unittest
+from unittest.mock import patch, Mock
+from peewee import DatabaseError, MySQLDatabase
+from randtalkbot.replica import REPLICA
+from randtalkbot.stranger import Stranger
+from randtalkbot.stranger_service import StrangerService
+from randtalkbot.talk import Talk
+from randtalkbot.testing import initialize_sqlite_database
+
+def get_ended_talks_partners():
+    return [talk.partner1_sent for talk in REPLICA.route(Talk.get_ended_talks())]
+
+
+class TestReplicaRouter(unittest.TestCase):
+    def setUp(self):
+        # Replica and primary stand-ins with distinguishable data.
+        self.replica = initialize_sqlite_database()
+        self.create_talk(31416, end=datetime.datetime(1970, 1, 2))
+        self.primary = initialize_sqlite_database()
+        self.create_talk(27183, end=datetime.datetime(1970, 1, 2))
+        self.create_talk(23571)
+
+    def tearDown(self):
+        REPLICA.configure()
+        self.replica.close()
+        self.primary.close()
+
+    @classmethod
+    def create_talk(cls, telegram_id, end=None):
+        partner1 = Stranger.create(invitation=f'{telegram_id}_1', telegram_id=telegram_id)
+        partner2 = Stranger.create(invitation=f'{telegram_id}_2', telegram_id=telegram_id + 1)
+        return Talk.create(
+            partner1=partner1,
+            partner2=partner2,
+            # Related strangers are fetched from the primary, so the talks are told apart by the
+            # counter.
+            partner1_sent=telegram_id,
+            searched_since=datetime.datetime(1970, 1, 1),
+            end=end,
+            )
+
+    def test_route__disabled(self):
+        self.assertFalse(REPLICA.enabled)
+        self.assertEqual(get_ended_talks_partners(), [27183])
+
+    def test_route__replica(self):
+        REPLICA.configure(self.replica)
+        self.assertEqual(get_ended_talks_partners(), [31416])
+        # Queries which aren't routed use the primary.
+        self.assertEqual(
+            [talk.partner1_sent for talk in Talk.get_ended_talks()],
+            [27183],
+            )
+
+    def test_route__get_full_strangers(self):
+        REPLICA.configure(self.replica)
+
+        with patch.object(Stranger, 'is_full', return_value=True):
+            strangers = list(StrangerService.get_full_strangers())
+
+        self.assertEqual([stranger.telegram_id for stranger in strangers], [31416, 31417])
+
+    def test_route__lagging_replica(self):
+        REPLICA.configure(self.replica, max_lag=10)
+
+        with patch.object(REPLICA, 'get_lag', return_value=11):
+            self.assertEqual(get_ended_talks_partners(), [27183])
+
+    def test_route__broken_replication(self):
+        REPLICA.configure(self.replica)
+
+        with patch.object(REPLICA, 'get_lag', return_value=None):
+            self.assertEqual(get_ended_talks_partners(), [27183])
+
+    def test_route__unavailable_replica(self):
+        REPLICA.configure(self.replica)
+
+        with patch.object(REPLICA, 'get_lag', side_effect=DatabaseError()):
+            self.assertEqual(get_ended_talks_partners(), [27183])
+
+    @patch('randtalkbot.replica.time.monotonic')
+    def test_is_fresh__lag_check_interval(self, monotonic_mock):
+        REPLICA.configure(self.replica, max_lag=10, lag_check_interval=30)
+        monotonic_mock.return_value = 100
+
+        with patch.object(REPLICA, 'get_lag', return_value=20) as get_lag_mock:
+            self.assertFalse(REPLICA.is_fresh())
+            get_lag_mock.return_value = 0
+            monotonic_mock.return_value = 129
+            self.assertFalse(REPLICA.is_fresh())
+            monotonic_mock.return_value = 130
+            self.assertTrue(REPLICA.is_fresh())
+
+        self.assertEqual(get_lag_mock.call_count, 2)
+
+    def test_get_lag__mysql(self):
+        database = Mock(spec=MySQLDatabase)
+        REPLICA.configure(database)
+        cursor = database.execute_sql.return_value
+        cursor.description = [('Slave_IO_Running', ), ('Seconds_Behind_Master', )]
+        cursor.fetchone.return_value = ('Yes', 3)
+        self.assertEqual(REPLICA.get_lag(), 3)
+        database.execute_sql.assert_called_once_with('SHOW SLAVE STATUS')
+        cursor.fetchone.return_value = ('No', None)
+        self.assertIsNone(REPLICA.get_lag())
+        cursor.fetchone.return_value = None
+        self.assertIsNone(REPLICA.get_lag())
+
+    def test_get_lag__sqlite(self):
+        REPLICA.configure(self.replica)
+        self.assertEqual(REPLICA.get_lag(), 0)
@@ -0,0 +1,134 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import asynctest
+from asynctest.mock import patch, Mock, CoroutineMock
+from telepot.exception import TelegramError
+from randtalkbot.sharding import Sharding, get_shard
+from randtalkbot.state_store import InMemoryStateStore
+
+
+def get_telegram_id(shard, shards_count=2):
+    return next(
+        telegram_id
+        for telegram_id in range(1000)
+        if get_shard(telegram_id, shards_count) == shard
+        )
+
+
+def get_message_json(text):
+    return {
+        'chat': {'id': 31416, 'type': 'private'},
+        'date': 0,
+        'from': {'id': 31416},
+        'message_id': 1,
+        'text': text,
+        }
+
+
+class TestGetShard(asynctest.TestCase):
+    @asynctest.ignore_loop
+    def test_get_shard(self):
+        counts = [0] * 4
+
+        for telegram_id in range(10000):
+            counts[get_shard(telegram_id, 4)] += 1
+
+        for count in counts:
+            self.assertAlmostEqual(count, 2500, delta=250)
+
+        self.assertEqual(get_shard(31416, 1), 0)
+
+
+class TestSharding(asynctest.TestCase):
+    def setUp(self):
+        self.store = InMemoryStateStore()
+        self.sharding_0 = Sharding()
+        self.sharding_0.configure(shard=0, shards_count=2, store=self.store)
+        self.sharding_1 = Sharding()
+        self.sharding_1.configure(shard=1, shards_count=2, store=self.store)
+        self.bot = Mock()
+        self.bot.handle_update = CoroutineMock()
+        self.running = self.loop.create_task(self.sharding_1.run(self.bot))
+
+    async def tearDown(self):
+        self.running.cancel()
+        await asyncio.wait([self.running])
+
+    @asynctest.ignore_loop
+    def test_disabled(self):
+        sharding = Sharding()
+        self.assertFalse(sharding.enabled)
+        self.assertTrue(sharding.owns(31416))
+        self.assertTrue(sharding.is_polling())
+
+    async def test_owns(self):
+        self.assertTrue(self.sharding_1.owns(get_telegram_id(1)))
+        self.assertFalse(self.sharding_1.owns(get_telegram_id(0)))
+        self.assertFalse(self.sharding_1.is_polling())
+
+    async def test_lock(self):
+        self.assertTrue(await self.sharding_0.lock(42))
+        self.assertFalse(await self.sharding_1.lock(42))
+        await self.sharding_0.unlock(42)
+        self.assertTrue(await self.sharding_1.lock(42))
+
+    async def test_publish_value(self):
+        self.assertEqual(await self.sharding_0.get_other_shards_values('foo'), [])
+        await self.sharding_1.publish_value('foo', {'bar': 1})
+        self.assertEqual(await self.sharding_0.get_other_shards_values('foo'), [{'bar': 1}])
+        # Own value isn't returned.
+        self.assertEqual(await self.sharding_1.get_other_shards_values('foo'), [])
+
+    async def test_route_update(self):
+        update = {'update_id': 1, 'message': get_message_json('foo')}
+        await self.sharding_0.route_update(get_telegram_id(1), update)
+        await asyncio.sleep(.01)
+        self.bot.handle_update.assert_called_once_with(update)
+
+    async def test_invalidate(self):
+        with patch('randtalkbot.stranger_service.StrangerService') as stranger_service_cls_mock:
+            stranger_service_mock = stranger_service_cls_mock.get_instance.return_value
+            self.sharding_0.invalidate(Mock(id=42, telegram_id=get_telegram_id(1)))
+            # The stranger is owned by this shard.
+            self.sharding_0.invalidate(Mock(id=27, telegram_id=get_telegram_id(0)))
+            await asyncio.sleep(.01)
+
+        stranger_service_mock.refresh_stranger.assert_called_once_with(42)
+
+    async def test_relay(self):
+        telegram_id = get_telegram_id(1)
+        stranger_mock = Mock()
+        stranger_mock.send = CoroutineMock()
+        stranger_mock.send_media_group = CoroutineMock()
+        message = Mock(message_json=get_message_json('foo'))
+
+        with patch('randtalkbot.stranger_service.StrangerService') as stranger_service_cls_mock:
+            stranger_service_cls_mock.get_instance.return_value.get_stranger.return_value = \
+                stranger_mock
+            await self.sharding_0.relay(telegram_id, [message])
+            await self.sharding_0.relay(telegram_id, [message, message])
+            await asyncio.sleep(.01)
+
+        stranger_service_cls_mock.get_instance.return_value.get_stranger \
+            .assert_called_with(telegram_id)
+        self.assertEqual(stranger_mock.send.call_args[0][0].text, 'foo')
+        self.assertEqual(len(stranger_mock.send_media_group.call_args[0][0]), 2)
+
+    async def test_relay__blocked(self):
+        stranger_mock = Mock()
+        stranger_mock.send = CoroutineMock(side_effect=TelegramError('foo', 403, {}))
+        stranger_mock.end_talk = CoroutineMock()
+        message = Mock(message_json=get_message_json('foo'))
+
+        with patch('randtalkbot.stranger_service.StrangerService') as stranger_service_cls_mock:
+            stranger_service_cls_mock.get_instance.return_value.get_stranger.return_value = \
+                stranger_mock
+            await self.sharding_0.relay(get_telegram_id(1), [message])
+            await asyncio.sleep(.01)
+
+        stranger_mock.end_talk.assert_called_once_with()
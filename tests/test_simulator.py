@@ -0,0 +1,81 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import random
+import unittest
+from randtalkbot.stranger import Stranger
+from randtalkbot.testing import initialize_sqlite_database
+from simulator import Matcher, Simulator, StrangersDistribution
+from simulator.simulator import DEFAULT_STATS_DATA, format_report, get_bonus_bucket, \
+    get_fairness_index
+
+
+class TestStrangersDistribution(unittest.TestCase):
+    def test_draw(self):
+        distribution = StrangersDistribution({
+            'bonus_count_distribution': {'5': 1},
+            'languages_count_distribution': [[2, 1]],
+            'languages_popularity': [['en', 100], ['ru', 1]],
+            'languages_to_orientation': [['en', {'male female': 1}]],
+            'partner_sex_distribution': {'male': 1},
+            'sex_distribution': {'female': 1},
+            })
+        stranger = distribution.draw(random.Random(1))
+        self.assertEqual(stranger['bonus_count'], 5)
+        self.assertEqual(json.loads(stranger['languages']), ['en', 'ru'])
+        # Orientation is drawn for the first language.
+        self.assertEqual(stranger['sex'], 'male')
+        self.assertEqual(stranger['partner_sex'], 'female')
+
+    def test_draw__not_specified_sex(self):
+        distribution = StrangersDistribution({'sex_distribution': {'not_specified': 1}})
+        stranger = distribution.draw(random.Random(1))
+        self.assertEqual(stranger['sex'], 'not_specified')
+        self.assertEqual(stranger['partner_sex'], 'not_specified')
+        self.assertEqual(stranger['languages'], '["en"]')
+        self.assertEqual(stranger['bonus_count'], 0)
+
+
+class TestSimulator(unittest.TestCase):
+    def setUp(self):
+        self.database = initialize_sqlite_database()
+
+    def tearDown(self):
+        self.database.close()
+
+    def test_run(self):
+        matcher = Matcher()
+        simulator = Simulator(
+            StrangersDistribution(DEFAULT_STATS_DATA),
+            random.Random(1),
+            duration=60,
+            matcher=matcher,
+            )
+        report = simulator.run()
+        self.assertGreater(report['arrivals'], 0)
+        self.assertEqual(report['arrivals'], 2 * report['matches'] + report['departures'])
+        self.assertAlmostEqual(report['match_rate'], 2 * report['matches'] / report['arrivals'])
+        self.assertIsNotNone(report['cpu_per_match'])
+        self.assertLessEqual(report['fairness_index'], 1)
+        self.assertIn('bonus: 0', report['buckets'])
+        # Nobody is waiting after the simulation.
+        self.assertFalse(
+            Stranger.select().where(Stranger.looking_for_partner_from.is_null(False)).exists(),
+            )
+        self.assertIn('Match rate:', format_report(report))
+
+
+class TestHelpers(unittest.TestCase):
+    def test_get_bonus_bucket(self):
+        self.assertEqual(get_bonus_bucket(0), '0')
+        self.assertEqual(get_bonus_bucket(3), '1-3')
+        self.assertEqual(get_bonus_bucket(4), '4+')
+
+    def test_get_fairness_index(self):
+        self.assertEqual(get_fairness_index([.5, .5, .5]), 1)
+        self.assertAlmostEqual(get_fairness_index([1, 0, 0, 0]), .25)
+        self.assertIsNone(get_fairness_index([0, 0]))
@@ -0,0 +1,61 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import pstats
+import tempfile
+import unittest
+from unittest.mock import patch
+from randtalkbot.startup_profiler import StartupProfiler
+
+
+class TestStartupProfiler(unittest.TestCase):
+    @patch('randtalkbot.startup_profiler.time.perf_counter')
+    def test_phase(self, perf_counter_mock):
+        perf_counter_mock.side_effect = [10, 10.5, 11, 11.5]
+        profiler = StartupProfiler(enabled=True)
+        profiler.add('import', 1)
+
+        with profiler.phase('db'):
+            pass
+
+        with profiler.phase('db'):
+            pass
+
+        self.assertEqual(
+            profiler.get_report(),
+            'Startup phases:\n'
+            '  import                   1000.0 ms  50.0%\n'
+            '  db                       1000.0 ms  50.0%\n'
+            '  total                    2000.0 ms',
+            )
+
+    def test_phase__disabled(self):
+        profiler = StartupProfiler()
+        profiler.add('import', 1)
+
+        with profiler.phase('db'):
+            pass
+
+        self.assertEqual(
+            profiler.get_report(),
+            'Startup phases:\n  total                       0.0 ms',
+            )
+
+    @patch('randtalkbot.startup_profiler.LOGGER')
+    def test_finish(self, logger_mock):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'startup.prof')
+            profiler = StartupProfiler(enabled=True, path=path)
+            profiler.start()
+
+            with profiler.phase('bot'):
+                sorted(range(100))
+
+            profiler.finish()
+            self.assertIn('sorted', str(pstats.Stats(path).stats))
+
+        logger_mock.info.assert_called_with('%s', profiler.get_report())
@@ -0,0 +1,244 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import asynctest
+from asynctest.mock import patch, CoroutineMock, Mock
+from peewee import DatabaseError
+from randtalkbot.query_counter import count_queries
+from randtalkbot.route_table import ROUTE_TABLE
+from randtalkbot.state_backend import DatabaseStateBackend, InProcessStateBackend, StateBackend, \
+    StoreStateBackend
+from randtalkbot.state_store import InMemoryStateStore
+from randtalkbot.stranger import Stranger
+from randtalkbot.stranger_service import StrangerService
+from randtalkbot.talk import Talk
+from randtalkbot.testing import initialize_sqlite_database
+from randtalkbot.waiting_pool import WaitingPool
+
+
+class StateBackendTestCase(asynctest.TestCase):
+    def setUp(self):
+        self.database = initialize_sqlite_database()
+        StrangerService()
+        WaitingPool()
+        self.stranger_0, self.stranger_1, self.stranger_2 = [
+            Stranger.create(invitation=invitation, telegram_id=telegram_id)
+            for invitation, telegram_id in (('foo', 31416), ('bar', 27183), ('baz', 23571))
+            ]
+        self.stranger_2.looking_for_partner_from = datetime.datetime(1970, 1, 1)
+        self.stranger_2.save()
+        self.talk = Talk.create(
+            partner1=self.stranger_0,
+            partner2=self.stranger_1,
+            searched_since=datetime.datetime(1970, 1, 1),
+            )
+        Talk.create(
+            partner1=self.stranger_0,
+            partner2=self.stranger_2,
+            searched_since=datetime.datetime(1970, 1, 1),
+            end=datetime.datetime(1970, 1, 2),
+            )
+
+    def tearDown(self):
+        DatabaseStateBackend()
+        self.database.close()
+
+
+class TestDatabaseStateBackend(StateBackendTestCase):
+    @asynctest.ignore_loop
+    def test_get_instance(self):
+        self.assertIsInstance(StateBackend.get_instance(), DatabaseStateBackend)
+
+    @asynctest.ignore_loop
+    def test_get_partner(self):
+        self.assertEqual(self.stranger_0.get_partner(), self.stranger_1)
+        self.assertEqual(self.stranger_0.get_talk(), self.talk)
+        self.assertIsNone(self.stranger_2.get_partner())
+        self.assertFalse(StateBackend.get_instance().knows_waiting_ids())
+
+    def make_talk_successful(self):
+        self.talk.partner1_sent = 1
+        self.talk.partner2_sent = 1
+        self.talk.save()
+        self.stranger_0.bonus_count = 1
+        self.stranger_0.save()
+
+    @patch('randtalkbot.bonus_ledger.BONUS_LEDGER')
+    @patch.object(Stranger, 'kick', CoroutineMock())
+    async def test_set_partner__queries(self, bonus_ledger_mock):
+        self.make_talk_successful()
+
+        with count_queries() as counter:
+            await self.stranger_0.set_partner(self.stranger_2)
+
+        # Bonus spending, ending of the old talk, creation of the new one and update of both
+        # partners.
+        self.assertEqual(counter.writes, 4)
+        # Only the changed columns are updated.
+        self.assertFalse(any(
+            '"telegram_id"' in sql for sql in counter.statements if sql.startswith('UPDATE')
+            ))
+        self.assertIsNotNone(Talk.get(Talk.id == self.talk.id).end)
+        self.assertEqual(Stranger.get(Stranger.id == self.stranger_0.id).bonus_count, 0)
+        bonus_ledger_mock.record.assert_called_once_with(self.stranger_0, -1, 'talk')
+        self.assertIsNone(Stranger.get(Stranger.id == self.stranger_2.id).looking_for_partner_from)
+        self.assertEqual(Talk.get_talk(self.stranger_2), self.stranger_0.get_talk())
+
+    @patch.object(Stranger, 'kick', CoroutineMock())
+    async def test_set_partner__looking_for_partner(self):
+        self.stranger_0.looking_for_partner_from = datetime.datetime(1970, 1, 3)
+
+        with count_queries() as counter:
+            await self.stranger_0.set_partner(None)
+
+        # Ending of the old talk and the stranger's changed field.
+        self.assertEqual(counter.writes, 2)
+        self.assertEqual(
+            Stranger.get(Stranger.id == self.stranger_0.id).looking_for_partner_from,
+            datetime.datetime(1970, 1, 3),
+            )
+
+    @asynctest.ignore_loop
+    def test_save__not_changed(self):
+        with count_queries() as counter:
+            self.stranger_0.save()
+            self.talk.save()
+
+        self.assertEqual(counter.count, 0)
+
+    @patch('randtalkbot.bonus_ledger.BONUS_LEDGER')
+    @patch.object(Stranger, 'kick', CoroutineMock())
+    async def test_set_partner__rollback(self, bonus_ledger_mock):
+        self.make_talk_successful()
+
+        with patch.object(Talk, 'create', side_effect=DatabaseError()):
+            with self.assertRaises(DatabaseError):
+                await self.stranger_0.set_partner(self.stranger_2)
+
+        self.assertIsNone(Talk.get(Talk.id == self.talk.id).end)
+        self.assertEqual(Stranger.get(Stranger.id == self.stranger_0.id).bonus_count, 1)
+        bonus_ledger_mock.record.assert_not_called()
+        self.assertIsNotNone(
+            Stranger.get(Stranger.id == self.stranger_2.id).looking_for_partner_from,
+            )
+
+
+class TestInProcessStateBackend(StateBackendTestCase):
+    def setUp(self):
+        super(TestInProcessStateBackend, self).setUp()
+        self.backend = InProcessStateBackend()
+        self.backend.load()
+
+    @asynctest.ignore_loop
+    def test_load(self):
+        self.assertIs(StateBackend.get_instance(), self.backend)
+        self.assertTrue(self.backend.knows_waiting_ids())
+        self.assertEqual(self.backend.get_waiting_ids(), {self.stranger_2.id})
+
+    @asynctest.ignore_loop
+    def test_get_partner(self):
+        stranger_1 = StrangerService.get_instance().get_cached_stranger(self.stranger_1)
+
+        with count_queries() as counter:
+            self.assertIs(self.stranger_0.get_partner(), stranger_1)
+            self.assertIsNone(self.stranger_2.get_partner())
+            self.assertIsNone(self.stranger_2.get_talk())
+
+        self.assertEqual(counter.reads, 0)
+        self.assertEqual(self.stranger_0.get_talk(), self.talk)
+
+    @asynctest.ignore_loop
+    def test_get_talk(self):
+        with count_queries(everywhere=True) as counter:
+            talk = self.backend.get_talk(self.stranger_0)
+            self.assertIs(self.backend.get_talk(self.stranger_1), talk)
+
+        self.assertEqual(counter.count, 0)
+        self.assertEqual(talk, self.talk)
+
+    @patch.object(Stranger, 'get_sender', Mock(return_value=Mock(send=CoroutineMock())))
+    async def test_send_to_partner__queries(self):
+        ROUTE_TABLE.clear()
+        stranger_service = StrangerService.get_instance()
+        stranger_0 = stranger_service.get_cached_stranger(self.stranger_0)
+        stranger_1 = stranger_service.get_cached_stranger(self.stranger_1)
+        message = Mock(media_group_id=None)
+        # The first messages are saved: they make the talk successful.
+        await stranger_0.send_to_partner(message)
+        await stranger_1.send_to_partner(message)
+
+        with count_queries() as counter:
+            for unused_index in range(5):
+                await stranger_0.send_to_partner(message)
+                await stranger_1.send_to_partner(message)
+
+        self.assertEqual(counter.count, 0)
+        self.assertEqual(self.backend.get_talk(stranger_0).partner1_sent, 6)
+
+    @patch.object(Stranger, 'kick', CoroutineMock())
+    async def test_set_partner(self):
+        await self.stranger_1.set_partner(self.stranger_2)
+        self.assertEqual(self.backend.get_waiting_ids(), set())
+        self.assertEqual(self.backend.get_partner(self.stranger_1), self.stranger_2)
+        self.assertEqual(self.backend.get_partner(self.stranger_2), self.stranger_1)
+        # The old talk has ended.
+        self.assertIsNone(self.backend.get_partner(self.stranger_0))
+        await self.stranger_1.set_partner(None)
+        self.assertIsNone(self.backend.get_partner(self.stranger_1))
+        self.assertIsNone(self.backend.get_partner(self.stranger_2))
+
+
+class TestStoreStateBackend(StateBackendTestCase):
+    def setUp(self):
+        super(TestStoreStateBackend, self).setUp()
+        self.store = InMemoryStateStore()
+        self.backend = StoreStateBackend(self.store)
+        self.backend.load()
+
+    @patch.object(Stranger, 'kick', CoroutineMock())
+    async def test_reload(self):
+        self.assertFalse(self.backend.knows_waiting_ids())
+        await self.stranger_1.set_partner(self.stranger_2)
+        await self.backend.flush()
+        self.assertEqual(
+            await self.store.get(StoreStateBackend.get_talk_key(self.stranger_2.id)),
+            f'{self.stranger_2.get_talk().id}:{self.stranger_1.id}',
+            )
+        self.assertIsNone(
+            await self.store.get(StoreStateBackend.get_talk_key(self.stranger_0.id)),
+            )
+        # Backend of another shard.
+        another_backend = StoreStateBackend(self.store)
+
+        for stranger in (self.stranger_0, self.stranger_1, self.stranger_2):
+            await another_backend.reload(stranger.id)
+
+        self.assertIsNone(another_backend.get_partner(self.stranger_0))
+        self.assertEqual(another_backend.get_partner(self.stranger_2), self.stranger_1)
+        self.stranger_0.looking_for_partner_from = datetime.datetime(1970, 1, 1)
+        self.stranger_0.save()
+        await another_backend.flush()
+        await self.backend.reload(self.stranger_0.id)
+        self.assertIn(self.stranger_0.id, self.backend._waiting_ids)
+
+    async def test_reload__talk_ended_by_another_shard(self):
+        talk = self.backend.get_talk(self.stranger_0)
+
+        for unused_index in range(3):
+            talk.increment_sent(self.stranger_0)
+
+        # Another shard's instance of the talk.
+        another_talk = Talk.get(Talk.id == self.talk.id)
+        another_talk.increment_sent(self.stranger_1)
+        another_talk.end = datetime.datetime(1970, 1, 2)
+        another_talk.save()
+        await self.backend.reload(self.stranger_0.id)
+        self.assertIsNone(self.backend.get_talk(self.stranger_0))
+        talk = Talk.get(Talk.id == self.talk.id)
+        self.assertEqual(talk.partner1_sent, 3)
+        self.assertEqual(talk.partner2_sent, 1)
+        self.assertEqual(talk.end, datetime.datetime(1970, 1, 2))
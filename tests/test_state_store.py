@@ -0,0 +1,134 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import asynctest
+from randtalkbot.errors import StateStoreError
+from randtalkbot.state_store import InMemoryStateStore, RedisStateStore, _RedisConnection, \
+    get_state_store
+
+
+class TestGetStateStore(asynctest.TestCase):
+    @asynctest.ignore_loop
+    def test_get_state_store(self):
+        self.assertIsInstance(get_state_store('memory://'), InMemoryStateStore)
+        self.assertIsInstance(get_state_store('redis://foo:1234/2'), RedisStateStore)
+
+        with self.assertRaises(StateStoreError):
+            get_state_store('foo://bar')
+
+        with self.assertRaises(StateStoreError):
+            get_state_store('redis://foo/bar')
+
+
+class TestInMemoryStateStore(asynctest.TestCase):
+    def setUp(self):
+        self.store = InMemoryStateStore()
+
+    async def test_set_if_not_exists(self):
+        self.assertTrue(await self.store.set_if_not_exists('foo', 1, ttl=60))
+        self.assertFalse(await self.store.set_if_not_exists('foo', 2, ttl=60))
+        await self.store.delete('foo')
+        self.assertTrue(await self.store.set_if_not_exists('foo', 3, ttl=.01))
+        await asyncio.sleep(.02)
+        # The value has expired.
+        self.assertTrue(await self.store.set_if_not_exists('foo', 4, ttl=60))
+
+    async def test_pop(self):
+        await self.store.push('foo', 'bar')
+        await self.store.push('foo', 'baz')
+        self.assertEqual(await self.store.pop('foo', timeout=1), 'bar')
+        self.assertEqual(await self.store.pop('foo', timeout=1), 'baz')
+        self.assertIsNone(await self.store.pop('foo', timeout=.01))
+
+    async def test_pop__waits_for_push(self):
+        popping = self.loop.create_task(self.store.pop('foo', timeout=1))
+        await asyncio.sleep(.01)
+        self.assertFalse(popping.done())
+        await self.store.push('foo', 'bar')
+        self.assertEqual(await popping, 'bar')
+
+
+class TestRedisConnection(asynctest.TestCase):
+    @asynctest.ignore_loop
+    def test_encode(self):
+        self.assertEqual(
+            _RedisConnection.encode('SET', 'foo', 42),
+            b'*3\r\n$3\r\nSET\r\n$3\r\nfoo\r\n$2\r\n42\r\n',
+            )
+
+    async def test_read_reply(self):
+        reader = asyncio.StreamReader(loop=self.loop)
+        reader.feed_data(b'+OK\r\n:42\r\n*3\r\n$3\r\nfoo\r\n$-1\r\n$0\r\n\r\n*-1\r\n')
+        self.assertEqual(await _RedisConnection.read_reply(reader), 'OK')
+        self.assertEqual(await _RedisConnection.read_reply(reader), 42)
+        self.assertEqual(await _RedisConnection.read_reply(reader), ['foo', None, ''])
+        self.assertIsNone(await _RedisConnection.read_reply(reader))
+
+    async def test_read_reply__error(self):
+        reader = asyncio.StreamReader(loop=self.loop)
+        reader.feed_data(b'-ERR foo\r\n')
+
+        with self.assertRaises(StateStoreError):
+            await _RedisConnection.read_reply(reader)
+
+
+class TestRedisStateStore(asynctest.TestCase):
+    async def setUp(self):
+        self.requests = []
+
+        async def handle(reader, writer):
+            while True:
+                try:
+                    request = await reader.readuntil(b'\r\n')
+                except asyncio.IncompleteReadError:
+                    break
+
+                # Reads the rest of the command's lines.
+                for unused_index in range(int(request[1:-2]) * 2):
+                    request += await reader.readuntil(b'\r\n')
+
+                self.requests.append(request)
+                writer.write(self.replies.pop(0))
+
+        self.replies = []
+        self.server = await asyncio.start_server(handle, '127.0.0.1', 0, loop=self.loop)
+        port = self.server.sockets[0].getsockname()[1]
+        self.store = RedisStateStore('127.0.0.1', port, database=2)
+
+    async def tearDown(self):
+        self.store.close()
+        # Lets the server's handlers finish.
+        await asyncio.sleep(.01)
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def test_set_if_not_exists(self):
+        self.replies = [b'+OK\r\n', b'+OK\r\n', b'$-1\r\n']
+        self.assertTrue(await self.store.set_if_not_exists('foo', 'bar', ttl=1.5))
+        self.assertFalse(await self.store.set_if_not_exists('foo', 'bar', ttl=1.5))
+        self.assertEqual(
+            self.requests,
+            [
+                _RedisConnection.encode('SELECT', 2),
+                _RedisConnection.encode('SET', 'foo', 'bar', 'NX', 'PX', 1500),
+                _RedisConnection.encode('SET', 'foo', 'bar', 'NX', 'PX', 1500),
+                ],
+            )
+
+    async def test_pop(self):
+        self.replies = [b'+OK\r\n', b'*2\r\n$3\r\nfoo\r\n$3\r\nbar\r\n', b'*-1\r\n']
+        self.assertEqual(await self.store.pop('foo', timeout=.5), 'bar')
+        self.assertIsNone(await self.store.pop('foo', timeout=.5))
+        self.assertEqual(self.requests[1], _RedisConnection.encode('BLPOP', 'foo', 1))
+
+    async def test_unavailable(self):
+        self.server.close()
+        await self.server.wait_closed()
+        store = RedisStateStore('127.0.0.1', 1)
+
+        with self.assertRaises(StateStoreError):
+            await store.push('foo', 'bar')
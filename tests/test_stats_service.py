@@ -9,7 +9,7 @@ import json
 import types
 import asynctest
 from asynctest.mock import patch, Mock, CoroutineMock
-from peewee import SqliteDatabase
+from peewee import DatabaseError, SqliteDatabase
 from randtalkbot import stats
 from randtalkbot.stats_service import StatsService
 from randtalkbot.stats import Stats
@@ -224,9 +224,9 @@ NOT_ENDED_TALKS = (
     {'begin': 315543163, 'end': None, 'partner2_sent': 71, 'searched_since': 315532980, 'partner1_sent': 1},
     )
 STRANGERS = (
-    {'languages': ['en'], 'sex': 'female', 'partner_sex': 'male'},
-    {'languages': ['en'], 'sex': 'male', 'partner_sex': 'male'},
-    {'languages': ['en'], 'sex': 'female', 'partner_sex': 'female'},
+    {'languages': ['en'], 'sex': 'female', 'partner_sex': 'male', 'bonus_count': 3},
+    {'languages': ['en'], 'sex': 'male', 'partner_sex': 'male', 'bonus_count': 1},
+    {'languages': ['en'], 'sex': 'female', 'partner_sex': 'female', 'bonus_count': 3},
     {'languages': ['en'], 'sex': 'not_specified', 'partner_sex': 'male'},
     {'languages': ['ru'], 'sex': 'female', 'partner_sex': 'male'},
     {'languages': ['ru'], 'sex': 'female', 'partner_sex': 'not_specified'},
@@ -330,6 +330,7 @@ STRANGERS = (
 def get_strangers():
     for stranger_json in STRANGERS:
         stranger = Mock()
+        stranger.bonus_count = stranger_json.get('bonus_count', 0)
         stranger.sex = stranger_json['sex']
         stranger.partner_sex = stranger_json['partner_sex']
         stranger.get_languages = Mock(return_value=stranger_json['languages'])
@@ -357,7 +358,7 @@ class TestStatsService(asynctest.TestCase):
         stats.DATABASE_PROXY.initialize(self.database)
         self.database.create_tables([Stats])
         self.update_stats = StatsService._update_stats
-        StatsService._update_stats = Mock()
+        StatsService._update_stats = CoroutineMock()
         self.stats_service = StatsService()
         self.stats = Mock()
         self.stats.created = datetime.datetime(1990, 1, 1)
@@ -369,9 +370,10 @@ class TestStatsService(asynctest.TestCase):
 
     @asynctest.ignore_loop
     def test_init__no_stats_in_db(self):
-        self.stats_service._update_stats.assert_called_once_with()
+        self.stats_service._update_stats.assert_not_called()
         stats_service = StatsService()
         self.assertEqual(stats_service._stats, None)
+        self.assertEqual(stats_service.get_stats().get_sex_ratio(), 1)
 
     @asynctest.ignore_loop
     def test_init__some_stats_in_db_1(self):
@@ -427,11 +429,43 @@ class TestStatsService(asynctest.TestCase):
         asyncio_mock.sleep.assert_not_called()
         self.stats_service._update_stats.assert_called_once_with()
 
+    @patch('randtalkbot.stats_service.asyncio')
+    async def test_run__no_stats(self, asyncio_mock):
+        self.stats_service._stats = None
+        self.stats_service._update_stats.side_effect = RuntimeError
+        with self.assertRaises(RuntimeError):
+            await self.stats_service.run()
+        asyncio_mock.sleep.assert_not_called()
+
+    @patch('randtalkbot.stats_service.asyncio')
+    async def test_run_reloading(self, asyncio_mock):
+        asyncio_mock.sleep = CoroutineMock(side_effect=[None, RuntimeError])
+        stats_instance = Stats.create(data_json='{}', created=datetime.datetime(1990, 1, 2))
+
+        with self.assertRaises(RuntimeError):
+            await self.stats_service.run_reloading()
+
+        asyncio_mock.sleep.assert_called_with(60)
+        self.assertEqual(self.stats_service.get_stats(), stats_instance)
+        self.stats_service._update_stats.assert_not_called()
+
+    @asynctest.ignore_loop
+    def test_reload_stats__no_stats_in_db(self):
+        self.stats_service.reload_stats()
+        self.assertEqual(self.stats_service.get_stats(), self.stats)
+
     @asynctest.ignore_loop
+    def test_reload_stats__database_error(self):
+        with patch.object(StatsService, '_get_latest_stats', Mock(side_effect=DatabaseError())):
+            self.stats_service.reload_stats()
+
+        self.assertEqual(self.stats_service.get_stats(), self.stats)
+
     @patch('randtalkbot.stranger_service.StrangerService', Mock())
     @patch('randtalkbot.stranger_sender_service.StrangerSenderService', Mock())
     @patch('randtalkbot.talk.Talk', Mock())
-    def test_update_stats__no_stats_in_db(self):
+    @patch('randtalkbot.waiting_pool.WaitingPool', Mock())
+    async def test_update_stats__no_stats_in_db(self):
         from randtalkbot.stranger_service import StrangerService
         from randtalkbot.talk import Talk
         stranger_service = StrangerService.get_instance.return_value
@@ -441,13 +475,14 @@ class TestStatsService(asynctest.TestCase):
         self.stats_service._update_stats = types.MethodType(self.update_stats, self.stats_service)
         self.stats_service._stats = None
         # pylint: disable=not-callable
-        self.stats_service._update_stats()
+        await self.stats_service._update_stats()
         Talk.get_not_ended_talks.assert_called_once_with(after=None)
         Talk.get_ended_talks.assert_called_once_with(after=None)
         Talk.delete_old.assert_not_called()
         actual = json.loads(self.stats_service._stats.data_json)
         # pylint: disable=bad-continuation
         expected = {
+            'bonus_count_distribution': {'0': 98, '1': 1, '3': 2},
             'languages_count_distribution': [[1, 88], [2, 13]],
              'languages_popularity': [['en', 67], ['it', 34], ['ru', 12]],
              'languages_to_orientation': [['en',
@@ -497,11 +532,11 @@ class TestStatsService(asynctest.TestCase):
             }
         self.assertEqual(actual, expected)
 
-    @asynctest.ignore_loop
     @patch('randtalkbot.stranger_service.StrangerService', Mock())
     @patch('randtalkbot.stranger_sender_service.StrangerSenderService', Mock())
     @patch('randtalkbot.talk.Talk', Mock())
-    def test_update_stats__some_stats_in_db(self):
+    @patch('randtalkbot.waiting_pool.WaitingPool', Mock())
+    async def test_update_stats__some_stats_in_db(self):
         from randtalkbot.stranger_service import StrangerService
         from randtalkbot.stranger_sender_service import StrangerSenderService
         from randtalkbot.talk import Talk
@@ -513,18 +548,18 @@ class TestStatsService(asynctest.TestCase):
         self.stats_service._update_stats = types.MethodType(self.update_stats, self.stats_service)
         # self.stats_service._stats is not None now.
         # pylint: disable=not-callable
-        self.stats_service._update_stats()
+        await self.stats_service._update_stats()
         Talk.get_not_ended_talks.assert_called_once_with(after=datetime.datetime(1990, 1, 1))
         Talk.get_ended_talks.assert_called_once_with(after=datetime.datetime(1990, 1, 1))
         Talk.delete_old.assert_called_once_with(before=datetime.datetime(1990, 1, 1))
         stranger_service.get_cache_size.assert_called_once_with()
         stranger_sender_service.get_cache_size.assert_called_once_with()
 
-    @asynctest.ignore_loop
     @patch('randtalkbot.stranger_service.StrangerService', Mock())
     @patch('randtalkbot.stranger_sender_service.StrangerSenderService', Mock())
     @patch('randtalkbot.talk.Talk', Mock())
-    def test_update_stats__no_talks(self):
+    @patch('randtalkbot.waiting_pool.WaitingPool', Mock())
+    async def test_update_stats__no_talks(self):
         from randtalkbot.stranger_service import StrangerService
         from randtalkbot.talk import Talk
         stranger_service = StrangerService.get_instance.return_value
@@ -534,10 +569,11 @@ class TestStatsService(asynctest.TestCase):
         self.stats_service._update_stats = types.MethodType(self.update_stats, self.stats_service)
         # self.stats_service._stats is not None now.
         # pylint: disable=not-callable
-        self.stats_service._update_stats()
+        await self.stats_service._update_stats()
         self.assertEqual(
             json.loads(self.stats_service._stats.data_json),
-            {'languages_count_distribution': [],
+            {'bonus_count_distribution': {},
+             'languages_count_distribution': [],
              'languages_popularity': [],
              'languages_to_orientation': [],
              'partner_sex_distribution': {},
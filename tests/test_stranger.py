@@ -4,6 +4,7 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import datetime
 from unittest.mock import create_autospec
 import asynctest
@@ -11,9 +12,11 @@ from asynctest.mock import call, patch, Mock, CoroutineMock
 from peewee import SqliteDatabase
 from randtalkbot import stranger
 from randtalkbot.errors import MissingPartnerError, StrangerError
+from randtalkbot.route_table import ROUTE_TABLE
 from randtalkbot.stranger import Stranger
 from randtalkbot.stranger_sender import StrangerSenderError
 from randtalkbot.stranger_sender_service import StrangerSenderService
+from randtalkbot.waiting_pool import WaitingPool
 from telepot.exception import TelegramError
 
 DATABASE = SqliteDatabase(':memory:')
@@ -23,6 +26,8 @@ stranger.DATABASE_PROXY.initialize(DATABASE)
 class TestStranger(asynctest.TestCase):
     def setUp(self):
         DATABASE.create_tables([Stranger])
+        WaitingPool()
+        ROUTE_TABLE.clear()
         self.stranger = Stranger.create(
             invitation='foo',
             telegram_id=31416,
@@ -48,29 +53,78 @@ class TestStranger(asynctest.TestCase):
         stranger_instance = Stranger.get(Stranger.telegram_id == 31416)
         self.assertEqual(stranger_instance.looking_for_partner_from, None)
 
-    @patch('randtalkbot.stranger.INVITATION_LENGTH', 5)
     @asynctest.ignore_loop
+    @patch.object(Stranger, 'invitation_key', b'foo_key')
     def test_get_invitation(self):
-        invitation = Stranger.get_invitation()
+        invitation = Stranger.get_invitation(31416)
         self.assertIsInstance(invitation, str)
-        self.assertEqual(len(invitation), 5)
+        self.assertEqual(len(invitation), stranger.INVITATION_LENGTH)
+        self.assertTrue(set(invitation) <= set(stranger.INVITATION_CHARS))
+        self.assertEqual(Stranger.get_invitation(31416), invitation)
 
+    @asynctest.ignore_loop
+    def test_get_invitation__not_configured(self):
+        with patch.object(Stranger, 'invitation_key', None):
+            with self.assertRaises(StrangerError):
+                Stranger.get_invitation(31416)
+
+    @patch.object(Stranger, 'invitation_key', b'foo_key')
+    @asynctest.ignore_loop
+    def test_get_invitation__unique(self):
+        telegram_ids = list(range(10000)) + [2 ** 52 - index for index in range(1, 10000)]
+        invitations = {Stranger.get_invitation(telegram_id) for telegram_id in telegram_ids}
+        self.assertEqual(len(invitations), len(telegram_ids))
+
+    @patch.object(Stranger, 'invitation_key', b'foo_key')
+    @asynctest.ignore_loop
+    def test_configure_invitations(self):
+        invitation = Stranger.get_invitation(31416)
+        Stranger.configure_invitations('foo_token')
+        self.assertNotEqual(Stranger.get_invitation(31416), invitation)
+
+    @asynctest.ignore_loop
+    def test_get_random_invitation(self):
+        invitation = Stranger.get_random_invitation()
+        self.assertEqual(len(invitation), stranger.INVITATION_LENGTH)
+        self.assertTrue(set(invitation) <= set(stranger.INVITATION_CHARS))
+
+    @patch('randtalkbot.bonus_ledger.BONUS_LEDGER', Mock())
     async def test_add_bonuses__ok(self):
+        from randtalkbot.bonus_ledger import BONUS_LEDGER
         self.stranger.bonus_count = 1000
+        self.stranger.save()
         self.stranger._notify_about_bonuses = CoroutineMock()
-        self.stranger.save = Mock()
+        self.stranger._on_saved = Mock()
         await self.stranger._add_bonuses(31415)
-        self.stranger.save.assert_called_once_with()
+        self.stranger._on_saved.assert_called_once_with()
         self.assertEqual(self.stranger.bonus_count, 32415)
+        self.assertEqual(Stranger.get(Stranger.id == self.stranger.id).bonus_count, 32415)
+        self.assertFalse(self.stranger.is_dirty())
+        BONUS_LEDGER.record.assert_called_once_with(self.stranger, 31415, 'invitation')
         self.stranger._notify_about_bonuses.assert_called_once_with(31415)
 
+    @patch('randtalkbot.bonus_ledger.BONUS_LEDGER', Mock())
+    async def test_add_bonuses__concurrent(self):
+        self.stranger.bonus_count = 1000
+        self.stranger.save()
+        # Every invitee has their own instance of the inviter.
+        inviters = [Stranger.get(Stranger.id == self.stranger.id) for unused_index in range(2)]
+
+        for inviter in inviters:
+            inviter._notify_about_bonuses = CoroutineMock()
+
+        await asyncio.gather(*(inviter._add_bonuses(3) for inviter in inviters))
+        self.assertEqual(Stranger.get(Stranger.id == self.stranger.id).bonus_count, 1006)
+
+    @patch('randtalkbot.bonus_ledger.BONUS_LEDGER', Mock())
     async def test_add_bonuses__muted(self):
         self.stranger.bonus_count = 1000
+        self.stranger.save()
         self.stranger._notify_about_bonuses = CoroutineMock()
-        self.stranger.save = Mock()
+        self.stranger._on_saved = Mock()
         self.stranger._bonuses_notifications_muted = True
         await self.stranger._add_bonuses(1)
-        self.stranger.save.assert_called_once_with()
+        self.stranger._on_saved.assert_called_once_with()
         self.assertEqual(self.stranger.bonus_count, 1001)
         self.stranger._notify_about_bonuses.assert_not_called()
 
@@ -370,27 +424,25 @@ class TestStranger(asynctest.TestCase):
         self.stranger.partner_sex = None
         self.assertFalse(self.stranger.is_full())
 
-    async def test_kick__ok(self):
+    @patch('randtalkbot.stranger.ROUTE_TABLE')
+    async def test_kick__ok(self, route_table_mock):
         self.stranger._notify_talk_ended = CoroutineMock()
-        self.stranger._pay_for_talk = Mock()
         self.stranger._partner = self.stranger2
         self.stranger._talk = 'foo_talk'
         await self.stranger.kick()
         self.stranger._notify_talk_ended.assert_called_once_with(by_self=False)
-        self.stranger._pay_for_talk.assert_called_once_with()
         self.assertEqual(self.stranger._partner, None)
         self.assertEqual(self.stranger._talk, None)
+        route_table_mock.discard.assert_called_once_with(self.stranger)
 
     @patch('randtalkbot.stranger.LOGGER', Mock())
     async def test_kick__telegram_error(self):
         from randtalkbot.stranger import LOGGER
         error = StrangerError()
         self.stranger._notify_talk_ended = CoroutineMock(side_effect=error)
-        self.stranger._pay_for_talk = Mock()
         self.stranger._partner = self.stranger2
         self.stranger._talk = 'foo_talk'
         await self.stranger.kick()
-        self.stranger._pay_for_talk.assert_called_once_with()
         self.assertEqual(self.stranger._partner, None)
         self.assertEqual(self.stranger._talk, None)
         LOGGER.warning.assert_called_once_with(
@@ -920,14 +972,19 @@ class TestStranger(asynctest.TestCase):
             )
         sender.send_notification.assert_called_once_with('Your partner is here. Have a nice chat!')
 
+    @patch('randtalkbot.bonus_ledger.BONUS_LEDGER', Mock())
     async def test_pay__ok(self):
+        from randtalkbot.bonus_ledger import BONUS_LEDGER
         sender = CoroutineMock()
         self.stranger.get_sender = Mock(return_value=sender)
         self.stranger.bonus_count = 1000
-        self.stranger.save = Mock()
+        self.stranger.save()
+        self.stranger._on_saved = Mock()
         await self.stranger.pay(31416, 'foo_gratitude')
-        self.stranger.save.assert_called_once_with()
+        self.stranger._on_saved.assert_called_once_with()
         self.assertEqual(self.stranger.bonus_count, 32416)
+        self.assertEqual(Stranger.get(Stranger.id == self.stranger.id).bonus_count, 32416)
+        BONUS_LEDGER.record.assert_called_once_with(self.stranger, 31416, 'payment')
         sender.send_notification.assert_called_once_with(
             'You\'ve earned {0} bonuses. Total bonus amount: {1}. {2}',
             31416,
@@ -935,17 +992,31 @@ class TestStranger(asynctest.TestCase):
             'foo_gratitude',
             )
 
+    @patch('randtalkbot.bonus_ledger.BONUS_LEDGER', Mock())
+    async def test_pay__stranger_not_found(self):
+        from randtalkbot.bonus_ledger import BONUS_LEDGER
+        sender = CoroutineMock()
+        self.stranger.get_sender = Mock(return_value=sender)
+        self.stranger._on_saved = Mock()
+        Stranger.delete().where(Stranger.id == self.stranger.id).execute()
+        await self.stranger.pay(31416, 'foo_gratitude')
+        self.stranger._on_saved.assert_not_called()
+        BONUS_LEDGER.record.assert_not_called()
+        sender.send_notification.assert_not_called()
+
+    @patch('randtalkbot.bonus_ledger.BONUS_LEDGER', Mock())
     @patch('randtalkbot.stranger.LOGGER', Mock())
     async def test_pay__telegram_error(self):
         from randtalkbot.stranger import LOGGER
         sender = CoroutineMock()
         self.stranger.get_sender = Mock(return_value=sender)
         self.stranger.bonus_count = 1000
-        self.stranger.save = Mock()
+        self.stranger.save()
+        self.stranger._on_saved = Mock()
         error = TelegramError({}, '', 0)
         sender.send_notification.side_effect = error
         await self.stranger.pay(31416, 'foo_gratitude')
-        self.stranger.save.assert_called_once_with()
+        self.stranger._on_saved.assert_called_once_with()
         self.assertEqual(self.stranger.bonus_count, 32416)
         LOGGER.info.assert_called_once_with('Pay. Can\'t notify stranger %d: %s', 1, error)
 
@@ -954,22 +1025,31 @@ class TestStranger(asynctest.TestCase):
         talk = Mock()
         talk.is_successful.return_value = True
         talk.partner1 = self.stranger
-        self.stranger.get_talk = Mock(return_value=talk)
         self.stranger.bonus_count = 1000
-        self.stranger.save = Mock()
-        self.stranger._pay_for_talk()
+        self.stranger.save()
+        self.assertTrue(self.stranger._pay_for_talk(talk))
         self.assertEqual(self.stranger.bonus_count, 999)
-        self.stranger.save.assert_called_once_with()
+        self.assertEqual(Stranger.get(Stranger.id == self.stranger.id).bonus_count, 999)
+
+    @asynctest.ignore_loop
+    def test_pay_for_talk__spent_concurrently(self):
+        talk = Mock()
+        talk.is_successful.return_value = True
+        talk.partner1 = self.stranger
+        self.stranger.bonus_count = 1
+        self.stranger.save()
+        Stranger.update(bonus_count=0).where(Stranger.id == self.stranger.id).execute()
+        self.assertFalse(self.stranger._pay_for_talk(talk))
+        self.assertEqual(self.stranger.bonus_count, 1)
+        self.assertEqual(Stranger.get(Stranger.id == self.stranger.id).bonus_count, 0)
 
     @asynctest.ignore_loop
     def test_pay_for_talk__not_successful(self):
         talk = Mock()
         talk.is_successful.return_value = False
         talk.partner1 = self.stranger
-        self.stranger.get_talk = Mock(return_value=talk)
         self.stranger.bonus_count = 1000
-        self.stranger.save = Mock()
-        self.stranger._pay_for_talk()
+        self.assertFalse(self.stranger._pay_for_talk(talk))
         self.assertEqual(self.stranger.bonus_count, 1000)
 
     @asynctest.ignore_loop
@@ -977,11 +1057,18 @@ class TestStranger(asynctest.TestCase):
         talk = Mock()
         talk.is_successful.return_value = True
         talk.partner1 = self.stranger
-        self.stranger.get_talk = Mock(return_value=talk)
         self.stranger.bonus_count = 0
-        self.stranger.save = Mock()
-        self.stranger._pay_for_talk()
-        self.stranger.save.assert_not_called()
+        self.assertFalse(self.stranger._pay_for_talk(talk))
+        self.assertEqual(self.stranger.bonus_count, 0)
+
+    @asynctest.ignore_loop
+    def test_pay_for_talk__partner2(self):
+        talk = Mock()
+        talk.is_successful.return_value = True
+        talk.partner1 = self.stranger2
+        self.stranger.bonus_count = 1000
+        self.assertFalse(self.stranger._pay_for_talk(talk))
+        self.assertEqual(self.stranger.bonus_count, 1000)
 
     @asynctest.ignore_loop
     def test_prevent_advertising__ok(self):
@@ -1006,8 +1093,8 @@ class TestStranger(asynctest.TestCase):
     async def test_reward_inviter__chat_lacks_such_user(self):
         from randtalkbot.stranger import StatsService
         talk = Mock()
-        talk.partner1_sent = 1
-        talk.partner2_sent = 1
+        talk.is_successful.return_value = True
+        talk.get_sent.return_value = 1
         self.stranger.get_talk = Mock(return_value=talk)
         StatsService.get_instance \
             .return_value \
@@ -1035,8 +1122,8 @@ class TestStranger(asynctest.TestCase):
         from randtalkbot.stranger import StatsService
         from randtalkbot.stranger import StatsService
         talk = Mock()
-        talk.partner1_sent = 1
-        talk.partner2_sent = 1
+        talk.is_successful.return_value = True
+        talk.get_sent.return_value = 1
         self.stranger.get_talk = Mock(return_value=talk)
         StatsService.get_instance \
             .return_value \
@@ -1053,12 +1140,75 @@ class TestStranger(asynctest.TestCase):
         self.stranger.save.assert_called_once_with()
         self.stranger.invited_by._add_bonuses.assert_called_once_with(1)
 
+    def _get_talk_with_partner(self, partner_sent):
+        from randtalkbot.talk import Talk
+        talk = Talk(partner1=self.stranger, partner2=self.stranger2, partner2_sent=partner_sent)
+        talk.save = Mock()
+        self.stranger.get_talk = Mock(return_value=talk)
+        self.stranger.invited_by = self.stranger2
+        self.stranger2._add_bonuses = CoroutineMock()
+        self.stranger.save = Mock()
+        return talk
+
+    @patch('randtalkbot.stranger.StatsService', Mock())
+    async def test_reward_inviter__album_is_first_message(self):
+        talk = self._get_talk_with_partner(partner_sent=1)
+        talk.increment_sent(self.stranger, 3)
+        await self.stranger._reward_inviter(3)
+        self.stranger2._add_bonuses.assert_called_once_with(1)
+
+    @patch('randtalkbot.stranger.StatsService', Mock())
+    async def test_reward_inviter__talk_was_successful(self):
+        talk = self._get_talk_with_partner(partner_sent=1)
+        talk.increment_sent(self.stranger, 3)
+        talk.increment_sent(self.stranger, 2)
+        await self.stranger._reward_inviter(2)
+        self.stranger2._add_bonuses.assert_not_called()
+
+    @patch('randtalkbot.stranger.StatsService', Mock())
+    async def test_reward_inviter__partner_hasnt_sent(self):
+        talk = self._get_talk_with_partner(partner_sent=0)
+        talk.increment_sent(self.stranger, 3)
+        await self.stranger._reward_inviter(3)
+        self.stranger2._add_bonuses.assert_not_called()
+
+    @asynctest.ignore_loop
+    def test_refresh(self):
+        self.stranger._partner = self.stranger2
+        self.stranger._talk = Mock()
+        fresh_stranger = Stranger.get(Stranger.id == self.stranger.id)
+        fresh_stranger.bonus_count = 42
+        self.stranger.refresh(fresh_stranger)
+        self.assertEqual(self.stranger.bonus_count, 42)
+        self.assertFalse(hasattr(self.stranger, '_partner'))
+        self.assertFalse(hasattr(self.stranger, '_talk'))
+
+    @asynctest.ignore_loop
+    def test_save__changed_fields_only(self):
+        concurrent_stranger = Stranger.get(Stranger.id == self.stranger.id)
+        concurrent_stranger.bonus_count = 42
+        concurrent_stranger.save()
+        self.stranger.sex = 'female'
+        self.stranger._on_saved = Mock()
+        self.stranger.save()
+        self.stranger._on_saved.assert_called_once_with()
+        stranger_instance = Stranger.get(Stranger.id == self.stranger.id)
+        self.assertEqual(stranger_instance.sex, 'female')
+        self.assertEqual(stranger_instance.bonus_count, 42)
+        self.assertFalse(self.stranger.is_dirty())
+
+    @asynctest.ignore_loop
+    def test_save__not_changed(self):
+        self.stranger._on_saved = Mock()
+        self.assertIs(self.stranger.save(), False)
+        self.stranger._on_saved.assert_not_called()
+
     async def test_send__ok(self):
         sender = CoroutineMock()
         self.stranger.get_sender = Mock(return_value=sender)
         message = Mock()
         await self.stranger.send(message)
-        sender.send.assert_called_once_with(message)
+        sender.send.assert_called_once_with(message, on_deferred_error=None)
         sender.send_notification.assert_not_called()
 
     async def test_send__sender_error(self):
@@ -1068,28 +1218,214 @@ class TestStranger(asynctest.TestCase):
         message = Mock()
         with self.assertRaises(StrangerError):
             await self.stranger.send(message)
-        sender.send.assert_called_once_with(message)
+        sender.send.assert_called_once_with(message, on_deferred_error=None)
         sender.send_notification.assert_not_called()
 
-    async def test_send_to_partner__chatting_stranger(self):
+    @patch('randtalkbot.stranger.SHARDING')
+    async def test_send__owned_by_another_shard(self, sharding_mock):
+        sharding_mock.owns.return_value = False
+        sharding_mock.relay = CoroutineMock()
+        self.stranger.get_sender = Mock()
+        message = Mock(is_reply=False, type='text')
+        await self.stranger.send(message)
+        sharding_mock.relay.assert_called_once_with(self.stranger.telegram_id, [message])
+        self.stranger.get_sender.assert_not_called()
+
+    @patch('randtalkbot.stranger.SHARDING')
+    async def test_send__owned_by_another_shard_reply(self, sharding_mock):
+        sharding_mock.owns.return_value = False
+        sharding_mock.relay = CoroutineMock()
+
+        with self.assertRaises(StrangerError):
+            await self.stranger.send(Mock(is_reply=True, type='text'))
+
+        sharding_mock.relay.assert_not_called()
+
+    def _get_partner_sender(self):
+        sender = Mock()
+        sender.send = CoroutineMock()
+        sender.send_media_group = CoroutineMock()
         self.stranger.get_partner = Mock(return_value=self.stranger2)
-        self.stranger2.send = CoroutineMock()
+        self.stranger2.get_sender = Mock(return_value=sender)
+        return sender
+
+    async def test_send_to_partner__chatting_stranger(self):
+        sender = self._get_partner_sender()
         message = Mock()
+        message.media_group_id = None
         talk = Mock()
         self.stranger.get_talk = Mock(return_value=talk)
         await self.stranger.send_to_partner(message)
-        self.stranger2.send.assert_called_once_with(message)
+        sender.send.assert_called_once_with(
+            message,
+            on_deferred_error=self.stranger._on_deferred_sending_error,
+            )
         talk.increment_sent.assert_called_once_with(self.stranger)
 
+    async def test_send_to_partner__route_is_cached(self):
+        sender = self._get_partner_sender()
+        talk = Mock()
+        self.stranger.get_talk = Mock(return_value=talk)
+        message = Mock(media_group_id=None)
+        await self.stranger.send_to_partner(message)
+        await self.stranger.send_to_partner(message)
+        self.stranger.get_partner.assert_called_once_with()
+        self.stranger2.get_sender.assert_called_once_with()
+        self.assertEqual(sender.send.call_count, 2)
+        self.assertEqual(talk.increment_sent.call_count, 2)
+        # The talk has ended.
+        ROUTE_TABLE.discard(self.stranger)
+        self.stranger.get_partner.return_value = None
+
+        with self.assertRaises(MissingPartnerError):
+            await self.stranger.send_to_partner(message)
+
+    async def test_send_to_partner__partner_owned_by_another_shard(self):
+        self.stranger.get_partner = Mock(return_value=self.stranger2)
+        self.stranger.get_talk = Mock()
+        self.stranger2.get_sender = Mock()
+        self.stranger2.send = CoroutineMock()
+        message = Mock(media_group_id=None)
+
+        with patch('randtalkbot.route_table.SHARDING') as sharding_mock:
+            sharding_mock.owns.return_value = False
+            await self.stranger.send_to_partner(message)
+
+        self.stranger2.send.assert_called_once_with(message)
+        self.stranger2.get_sender.assert_not_called()
+
+    async def test_send_to_partner__shares_talk_with_partner(self):
+        talk = Mock(id=42)
+        self.stranger.get_partner = Mock(return_value=self.stranger2)
+        self.stranger.get_talk = Mock(return_value=talk)
+        self.stranger.get_sender = Mock(return_value=Mock(send=CoroutineMock()))
+        self.stranger2.get_partner = Mock(return_value=self.stranger)
+        self.stranger2.get_talk = Mock(return_value=Mock(id=42))
+        self.stranger2.get_sender = Mock(return_value=Mock(send=CoroutineMock()))
+        message = Mock(media_group_id=None)
+        await self.stranger.send_to_partner(message)
+        await self.stranger2.send_to_partner(message)
+        self.assertIs(self.stranger2._talk, talk)
+        self.assertEqual(
+            talk.increment_sent.call_args_list,
+            [call(self.stranger), call(self.stranger2)],
+            )
+
+    async def test_send_to_partner__media_group(self):
+        sender = self._get_partner_sender()
+        self.stranger._reward_inviter = CoroutineMock()
+        messages = [Mock(media_group_id='foo'), Mock(media_group_id='foo')]
+        talk = Mock()
+        self.stranger.get_talk = Mock(return_value=talk)
+
+        with patch('randtalkbot.stranger.Stranger.MEDIA_GROUP_DELAY', .01):
+            for message in messages:
+                await self.stranger.send_to_partner(message)
+
+            sender.send_media_group.assert_not_called()
+            await asyncio.sleep(.05)
+
+        sender.send_media_group.assert_called_once_with(messages)
+        talk.increment_sent.assert_called_once_with(self.stranger, 2)
+        self.stranger._reward_inviter.assert_called_once_with(2)
+
+    async def test_send_to_partner__media_group_partner_has_blocked_the_bot(self):
+        partner_sender = self._get_partner_sender()
+        partner_sender.send_media_group.side_effect = TelegramError('foo', 403, 'bar')
+        sender = CoroutineMock()
+        self.stranger.get_sender = Mock(return_value=sender)
+        self.stranger.get_talk = Mock()
+        self.stranger.end_talk = CoroutineMock()
+        messages = [Mock(media_group_id='foo'), Mock(media_group_id='foo')]
+
+        with patch('randtalkbot.stranger.Stranger.MEDIA_GROUP_DELAY', .01):
+            for message in messages:
+                await self.stranger.send_to_partner(message)
+
+            await asyncio.sleep(.05)
+
+        sender.send_notification.assert_called_once_with(
+            'Your partner has blocked me! How did you do that?!',
+            )
+        self.stranger.end_talk.assert_called_once_with()
+
+    async def test_on_deferred_sending_error(self):
+        sender = CoroutineMock()
+        self.stranger.get_sender = Mock(return_value=sender)
+        self.stranger.end_talk = CoroutineMock()
+        await self.stranger._on_deferred_sending_error(TelegramError('foo', 403, 'bar'))
+        sender.send_notification.assert_called_once_with(
+            'Your partner has blocked me! How did you do that?!',
+            )
+        self.stranger.end_talk.assert_called_once_with()
+
+    async def test_send_to_partner__media_group_is_sent_before_next_message(self):
+        sender = self._get_partner_sender()
+        album_message = Mock(media_group_id='foo')
+        message = Mock(media_group_id=None)
+        talk = Mock()
+        self.stranger.get_talk = Mock(return_value=talk)
+        await self.stranger.send_to_partner(album_message)
+        await self.stranger.send_to_partner(message)
+        # Album with one item is sent as usual message.
+        self.assertEqual(
+            sender.send.call_args_list,
+            [
+                call(album_message, on_deferred_error=None),
+                call(message, on_deferred_error=self.stranger._on_deferred_sending_error),
+                ],
+            )
+        sender.send_media_group.assert_not_called()
+        self.assertEqual(
+            talk.increment_sent.call_args_list,
+            [call(self.stranger, 1), call(self.stranger)],
+            )
+
+    async def test_send_to_partner__another_media_group(self):
+        sender = self._get_partner_sender()
+        self.stranger.get_talk = Mock()
+        messages = [Mock(media_group_id='foo'), Mock(media_group_id='foo')]
+
+        for message in messages:
+            await self.stranger.send_to_partner(message)
+
+        await self.stranger.send_to_partner(Mock(media_group_id='bar'))
+        sender.send_media_group.assert_called_once_with(messages)
+        self.stranger._media_group[3].cancel()
+
+    async def test_send_to_partner__media_group_after_talk_end(self):
+        sender = self._get_partner_sender()
+        talk = Mock()
+        self.stranger.get_talk = Mock(return_value=talk)
+
+        with patch('randtalkbot.stranger.Stranger.MEDIA_GROUP_DELAY', .01):
+            await self.stranger.send_to_partner(Mock(media_group_id='foo'))
+            ROUTE_TABLE.discard(self.stranger)
+            self.stranger.get_partner.return_value = None
+            await asyncio.sleep(.05)
+
+        sender.send.assert_not_called()
+        talk.increment_sent.assert_not_called()
+
     async def test_send_to_partner__not_chatting_stranger(self):
         self.stranger.get_partner = Mock(return_value=None)
         with self.assertRaises(MissingPartnerError):
             await self.stranger.send_to_partner(Mock())
 
+    async def test_send_to_partner__sender_error(self):
+        sender = self._get_partner_sender()
+        sender.send.side_effect = StrangerSenderError()
+        self.stranger.get_talk = Mock()
+
+        with self.assertRaises(StrangerError):
+            await self.stranger.send_to_partner(Mock(media_group_id=None))
+
     async def test_send_to_partner__telegram_error(self):
-        self.stranger.get_partner = Mock(return_value=self.stranger2)
-        self.stranger2.send = CoroutineMock(side_effect=TelegramError({}, '', 0))
+        sender = self._get_partner_sender()
+        sender.send.side_effect = TelegramError({}, '', 0)
+        self.stranger.get_talk = Mock()
         message = Mock()
+        message.media_group_id = None
         with self.assertRaises(TelegramError):
             await self.stranger.send_to_partner(message)
 
@@ -1161,11 +1497,12 @@ class TestStranger(asynctest.TestCase):
 
     @patch('randtalkbot.stranger.datetime', Mock())
     @patch('randtalkbot.talk.Talk', Mock())
-    async def test_set_partner__chatting_stranger(self):
+    @patch('randtalkbot.stranger.ROUTE_TABLE')
+    async def test_set_partner__chatting_stranger(self, route_table_mock):
         from randtalkbot.stranger import datetime as datetime_mock
         from randtalkbot.talk import Talk
-        self.stranger3.looking_for_partner_from = 'foo_searched_since'
-        self.stranger3.save = Mock()
+        self.stranger3.looking_for_partner_from = datetime.datetime(1970, 1, 1)
+        self.stranger3.save()
         self.stranger2.get_partner = Mock(return_value=self.stranger)
         self.stranger2.kick = CoroutineMock()
         self.stranger.get_partner = Mock(return_value=self.stranger2)
@@ -1182,14 +1519,18 @@ class TestStranger(asynctest.TestCase):
         Talk.create.assert_called_once_with(
             partner1=self.stranger,
             partner2=self.stranger3,
-            searched_since='foo_searched_since',
+            searched_since=datetime.datetime(1970, 1, 1),
             )
         self.assertEqual(self.stranger._partner, self.stranger3)
         self.assertEqual(self.stranger._talk, new_talk)
         self.assertEqual(self.stranger3._partner, self.stranger)
         self.assertEqual(self.stranger3._talk, new_talk)
         self.assertEqual(self.stranger3.looking_for_partner_from, None)
-        self.stranger3.save.assert_called_once_with()
+        self.assertIsNone(Stranger.get(Stranger.id == self.stranger3.id).looking_for_partner_from)
+        self.assertEqual(
+            route_table_mock.discard.call_args_list,
+            [call(self.stranger), call(self.stranger3)],
+            )
 
     async def test_set_partner__chatting_stranger_none(self):
         self.stranger2.get_partner = Mock(return_value=self.stranger)
@@ -1202,6 +1543,23 @@ class TestStranger(asynctest.TestCase):
         self.assertEqual(self.stranger._partner, None)
         self.assertEqual(self.stranger._talk, None)
 
+    async def test_set_partner__media_group_is_flushed(self):
+        sender = self._get_partner_sender()
+        self.stranger2.get_partner = Mock(return_value=self.stranger)
+        self.stranger2.kick = CoroutineMock()
+        self.stranger._partner = self.stranger2
+        talk = Mock()
+        self.stranger._talk = talk
+        messages = [Mock(media_group_id='foo'), Mock(media_group_id='foo')]
+
+        for message in messages:
+            await self.stranger.send_to_partner(message)
+
+        await self.stranger.set_partner(None)
+        sender.send_media_group.assert_called_once_with(messages)
+        talk.increment_sent.assert_called_once_with(self.stranger, 2)
+        self.assertFalse(hasattr(self.stranger, '_media_group'))
+
     async def test_set_partner__same(self):
         self.stranger.get_partner = Mock(return_value=self.stranger2)
         self.stranger.save = Mock()
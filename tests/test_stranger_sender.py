@@ -4,8 +4,10 @@
 # You should have received a copy of the GNU Affero General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
 import asynctest
 from asynctest.mock import call, patch, Mock, CoroutineMock
+from telepot.exception import TelegramError
 from randtalkbot.errors import StrangerSenderError
 from randtalkbot.stranger_sender import StrangerSender
 
@@ -170,6 +172,183 @@ class TestStrangerSender(asynctest.TestCase):
         await self.sender.send(message)
         self.sender.sendMessage.assert_called_once_with(**message.sending_kwargs)
 
+    @patch('randtalkbot.stranger_sender.StrangerSender.copy_messages', True)
+    async def test_send__copy(self):
+        self.bot._api_request = CoroutineMock()
+        message = Mock()
+        message.is_reply = False
+        message.type = 'photo'
+        message.chat_id = 27183
+        message.message_id = 42
+        await self.sender.send(message)
+        self.bot._api_request.assert_called_once_with(
+            'copyMessage',
+            {
+                'chat_id': 31416,
+                'from_chat_id': 27183,
+                'message_id': 42,
+                },
+            )
+        self.sender.sendMessage.assert_not_called()
+
+    @patch('randtalkbot.stranger_sender.StrangerSender.copy_messages', True)
+    async def test_send__copy_unknown_content_type(self):
+        self.bot._api_request = CoroutineMock()
+        message = Mock()
+        message.is_reply = False
+        message.type = 'foo_type'
+        with self.assertRaises(StrangerSenderError):
+            await self.sender.send(message)
+        self.bot._api_request.assert_not_called()
+
+    async def test_send__chat_interval(self):
+        messages = [
+            Mock(is_reply=False, type='text', sending_kwargs={'text': text})
+            for text in ('foo', 'bar')
+            ]
+
+        with patch('randtalkbot.stranger_sender.StrangerSender.chat_interval', .05):
+            await self.sender.send(messages[0])
+            sending = self.loop.create_task(self.sender.send(messages[1]))
+            await asyncio.sleep(.01)
+            self.assertFalse(sending.done())
+            self.sender.sendMessage.assert_called_once_with(text='foo')
+            await sending
+
+        self.assertEqual(
+            self.sender.sendMessage.call_args_list,
+            [call(text='foo'), call(text='bar')],
+            )
+
+    async def test_send__coalesce_texts(self):
+        self.sender.sendPhoto = CoroutineMock()
+
+        with patch.multiple(StrangerSender, chat_interval=.05, coalesce_texts=True):
+            for text in ('foo', 'bar', 'baz'):
+                await self.sender.send(
+                    Mock(is_reply=False, type='text', text=text, sending_kwargs={'text': text}),
+                    )
+
+            self.sender.sendMessage.assert_called_once_with(text='foo')
+            # Pending texts are sent before the photo.
+            await self.sender.send(
+                Mock(is_reply=False, type='photo', sending_kwargs={'photo': 'foo_photo'}),
+                )
+
+        self.assertEqual(
+            self.sender.sendMessage.call_args_list,
+            [call(text='foo'), call('bar\nbaz')],
+            )
+        self.sender.sendPhoto.assert_called_once_with(photo='foo_photo')
+
+    async def test_send__coalesce_texts_max_length(self):
+        with patch.multiple(
+            StrangerSender,
+            chat_interval=.05,
+            coalesce_texts=True,
+            COALESCED_TEXT_MAX_LENGTH=7,
+        ):
+            for text in ('foo', 'bar', 'baz', 'boo'):
+                await self.sender.send(
+                    Mock(is_reply=False, type='text', text=text, sending_kwargs={'text': text}),
+                    )
+
+            # The last text has waited for the pending ones to be sent.
+            self.assertEqual(
+                self.sender.sendMessage.call_args_list,
+                [call(text='foo'), call('bar\nbaz')],
+                )
+            await asyncio.sleep(.1)
+
+        self.sender.sendMessage.assert_called_with('boo')
+
+    async def _send_texts(self, texts):
+        for text in texts:
+            await self.sender.send(
+                Mock(is_reply=False, type='text', text=text, sending_kwargs={'text': text}),
+                )
+
+    async def test_send__coalesced_texts_error(self):
+        error = TelegramError('foo', 403, 'bar')
+        on_deferred_error = CoroutineMock()
+        another_on_deferred_error = CoroutineMock()
+
+        with patch.multiple(StrangerSender, chat_interval=.05, coalesce_texts=True):
+            await self._send_texts(['foo'])
+            self.sender.sendMessage.side_effect = error
+            message = Mock(is_reply=False, type='text', text='bar', sending_kwargs={'text': 'bar'})
+            await self.sender.send(message, on_deferred_error=on_deferred_error)
+            await self.sender.send(message, on_deferred_error=on_deferred_error)
+            await asyncio.sleep(.1)
+            self.sender.sendMessage.side_effect = None
+            # The error isn't raised by the next call.
+            await self.sender.send(message, on_deferred_error=another_on_deferred_error)
+            await asyncio.sleep(.1)
+
+        on_deferred_error.assert_called_once_with(error)
+        another_on_deferred_error.assert_not_called()
+        self.assertEqual(self.sender.sendMessage.call_args_list[-1], call(text='bar'))
+
+    async def test_send_notification__after_coalesced_texts(self):
+        calls = []
+        self.sender.sendMessage.side_effect = lambda *args, **kwargs: calls.append(args or kwargs)
+        self.translation.return_value = 'foo_translation'
+
+        with patch.multiple(StrangerSender, chat_interval=.05, coalesce_texts=True):
+            await self._send_texts(['foo', 'bar'])
+            await self.sender.send_notification('foo')
+
+        self.assertEqual(
+            calls,
+            [{'text': 'foo'}, ('bar', ), ('*Rand Talk:* foo_translation', )],
+            )
+
+    async def test_send_media_group__after_coalesced_texts(self):
+        calls = []
+        self.sender.sendMessage.side_effect = lambda *args, **kwargs: calls.append('sendMessage')
+        self.sender.sendMediaGroup = CoroutineMock(
+            side_effect=lambda *args: calls.append('sendMediaGroup'),
+            )
+        messages = [Mock(is_reply=False), Mock(is_reply=False)]
+
+        with patch.multiple(StrangerSender, chat_interval=.05, coalesce_texts=True):
+            await self._send_texts(['foo', 'bar'])
+            await self.sender.send_media_group(messages)
+
+        self.assertEqual(calls, ['sendMessage', 'sendMessage', 'sendMediaGroup'])
+
+    async def test_send_media_group(self):
+        self.sender.sendMediaGroup = CoroutineMock()
+        messages = [Mock(is_reply=False), Mock(is_reply=False)]
+        messages[0].get_input_media.return_value = {'type': 'photo', 'media': 'foo'}
+        messages[1].get_input_media.return_value = {'type': 'video', 'media': 'bar'}
+        await self.sender.send_media_group(messages)
+        self.sender.sendMediaGroup.assert_called_once_with([
+            {'type': 'photo', 'media': 'foo'},
+            {'type': 'video', 'media': 'bar'},
+            ])
+
+    async def test_send_media_group__no_send_media_group(self):
+        # Early telepot 12 releases don't provide `sendMediaGroup`.
+        del self.sender.sendMediaGroup
+        self.sender.sendPhoto = CoroutineMock()
+        self.sender.sendVideo = CoroutineMock()
+        messages = [
+            Mock(is_reply=False, message_id=1, sending_kwargs={'photo': 'foo'}, type='photo'),
+            Mock(is_reply=False, message_id=2, sending_kwargs={'video': 'bar'}, type='video'),
+            ]
+        await self.sender.send_media_group(messages)
+        self.sender.sendPhoto.assert_called_once_with(photo='foo')
+        self.sender.sendVideo.assert_called_once_with(video='bar')
+
+    async def test_send_media_group__reply(self):
+        self.sender.sendMediaGroup = CoroutineMock()
+
+        with self.assertRaises(StrangerSenderError):
+            await self.sender.send_media_group([Mock(is_reply=False), Mock(is_reply=True)])
+
+        self.sender.sendMediaGroup.assert_not_called()
+
     async def test_send__unknown_content_type(self):
         message = Mock()
         message.is_reply = False
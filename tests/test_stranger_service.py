@@ -10,7 +10,7 @@ import asynctest
 from asynctest.mock import call, patch, Mock, CoroutineMock
 from peewee import DatabaseError, DoesNotExist, SqliteDatabase
 from randtalkbot import stranger
-from randtalkbot.errors import StrangerError, StrangerServiceError, \
+from randtalkbot.errors import StateStoreError, StrangerError, StrangerServiceError, \
     PartnerObtainingError
 from randtalkbot.stranger import Stranger
 from randtalkbot.stranger_service import StrangerService
@@ -96,6 +96,30 @@ class TestStrangerService(asynctest.TestCase):
         stranger.id = 31416
         self.assertEqual(self.stranger_service.get_cached_stranger(stranger), cached_stranger)
 
+    @asynctest.ignore_loop
+    def test_get_cached_stranger__owned_by_another_shard(self):
+        cached_stranger = Mock()
+        self.stranger_service._strangers_cache[31416] = cached_stranger
+        stranger_mock = Mock(id=31416, telegram_id=27183)
+
+        with patch('randtalkbot.stranger_service.SHARDING') as sharding_mock:
+            sharding_mock.owns.return_value = False
+            self.assertEqual(
+                self.stranger_service.get_cached_stranger(stranger_mock),
+                cached_stranger,
+                )
+
+        cached_stranger.refresh.assert_called_once_with(stranger_mock)
+
+    @asynctest.ignore_loop
+    def test_refresh_stranger(self):
+        cached_stranger = Mock()
+        self.stranger_service._strangers_cache[self.stranger_0.id] = cached_stranger
+        self.stranger_service.refresh_stranger(self.stranger_0.id)
+        self.stranger_service.refresh_stranger(31416)
+        self.assertEqual(cached_stranger.refresh.call_count, 1)
+        self.assertEqual(cached_stranger.refresh.call_args[0][0].telegram_id, 27183)
+
     @asynctest.ignore_loop
     def test_get_cached_stranger__not_cached(self):
         stranger_mock = Mock()
@@ -103,6 +127,11 @@ class TestStrangerService(asynctest.TestCase):
         stranger_mock.invited_by = None
         self.assertEqual(self.stranger_service.get_cached_stranger(stranger_mock), stranger_mock)
         self.assertEqual(self.stranger_service._strangers_cache[31416], stranger_mock)
+        self.assertEqual(self.stranger_service._invitations_cache[stranger_mock.invitation], 31416)
+        self.assertEqual(
+            self.stranger_service._telegram_ids_cache[stranger_mock.telegram_id],
+            31416,
+            )
 
     @asynctest.ignore_loop
     def test_get_cache_size(self):
@@ -143,8 +172,26 @@ class TestStrangerService(asynctest.TestCase):
             self.stranger_service.get_or_create_stranger(31416),
             'cached_stranger',
             )
+        stranger_cls_mock.get_invitation.assert_called_once_with(31416)
+        stranger_cls_mock.create.assert_called_once_with(
+            invitation=stranger_cls_mock.get_invitation.return_value,
+            telegram_id=31416,
+            )
         self.stranger_service.get_cached_stranger.assert_called_once_with(self.stranger_0)
 
+    @patch.object(Stranger, 'invitation_key', b'foo_key')
+    @asynctest.ignore_loop
+    def test_get_or_create_stranger__invitation_is_taken(self):
+        invitation = Stranger.get_invitation(31415)
+        self.stranger_0.invitation = invitation
+        self.stranger_0.save()
+        self.stranger_service.get_cached_stranger = Mock()
+        self.stranger_service.get_or_create_stranger(31415)
+        created_stranger = self.stranger_service.get_cached_stranger.call_args[0][0]
+        self.assertEqual(created_stranger.telegram_id, 31415)
+        self.assertNotEqual(created_stranger.invitation, invitation)
+        self.assertEqual(len(created_stranger.invitation), stranger.INVITATION_LENGTH)
+
     @patch('randtalkbot.stranger_service.Stranger', create_autospec(Stranger))
     @asynctest.ignore_loop
     def test_get_or_create_stranger__database_error(self):
@@ -167,6 +214,31 @@ class TestStrangerService(asynctest.TestCase):
             self.stranger_1.id,
             )
 
+    @asynctest.ignore_loop
+    def test_get_stranger__cached(self):
+        stranger_instance = self.stranger_service.get_stranger(31416)
+
+        with patch('randtalkbot.stranger_service.Stranger.get', Mock(side_effect=DatabaseError())):
+            self.assertIs(self.stranger_service.get_stranger(31416), stranger_instance)
+
+    @asynctest.ignore_loop
+    def test_get_stranger__cached_stranger_owned_by_another_shard(self):
+        stranger_instance = self.stranger_service.get_stranger(31416)
+
+        with patch('randtalkbot.stranger_service.SHARDING') as sharding_mock:
+            sharding_mock.owns.return_value = False
+
+            with patch(
+                'randtalkbot.stranger_service.Stranger.get',
+                Mock(side_effect=DatabaseError()),
+            ):
+                with self.assertRaises(StrangerServiceError):
+                    self.stranger_service.get_stranger(31416)
+
+            sharding_mock.owns.assert_called_once_with(31416)
+
+        self.assertEqual(stranger_instance.telegram_id, 31416)
+
     @patch('randtalkbot.stranger_service.Stranger.get', Mock(side_effect=DatabaseError()))
     @asynctest.ignore_loop
     def test_get_stranger__database_error(self):
@@ -187,6 +259,29 @@ class TestStrangerService(asynctest.TestCase):
             self.stranger_5.id,
             )
 
+    @patch('randtalkbot.stranger_service.INVITATION_LENGTH', 3)
+    @asynctest.ignore_loop
+    def test_get_stranger_by_invitation__cached(self):
+        stranger_instance = self.stranger_service.get_stranger_by_invitation('zam')
+
+        with patch('randtalkbot.stranger_service.Stranger.get', Mock(side_effect=DatabaseError())):
+            self.assertIs(
+                self.stranger_service.get_stranger_by_invitation('zam'),
+                stranger_instance,
+                )
+
+        self.assertEqual(stranger_instance.id, self.stranger_5.id)
+
+    @patch('randtalkbot.stranger_service.INVITATION_LENGTH', 3)
+    @asynctest.ignore_loop
+    def test_get_stranger_by_invitation__cached_stranger_is_evicted(self):
+        self.stranger_service.get_stranger_by_invitation('zam')
+        self.stranger_service._strangers_cache.clear()
+        self.assertEqual(
+            self.stranger_service.get_stranger_by_invitation('zam').id,
+            self.stranger_5.id,
+            )
+
     @patch('randtalkbot.stranger_service.INVITATION_LENGTH', 3)
     @asynctest.ignore_loop
     def test_get_stranger_by_invitation__wrong_length(self):
@@ -699,6 +794,21 @@ class TestStrangerService(asynctest.TestCase):
             self.stranger_service._match_partner(self.stranger_0)
         self.stranger_service.get_cached_stranger.assert_not_called()
 
+    @asynctest.ignore_loop
+    def test_match_partner__nobody_else_is_waiting(self):
+        self.stranger_1.looking_for_partner_from = datetime.datetime(1990, 1, 1)
+        self.stranger_1.save()
+
+        with patch('randtalkbot.stranger_service.StateBackend') as state_backend_cls_mock, \
+                patch('randtalkbot.stranger_service.Stranger.select') as select_mock:
+            state_backend_cls_mock.get_instance.return_value.get_waiting_ids.return_value = \
+                {self.stranger_0.id}
+
+            with self.assertRaises(PartnerObtainingError):
+                self.stranger_service._match_partner(self.stranger_0)
+
+        select_mock.assert_not_called()
+
     async def test_match_partner__ok(self):
         stranger_mock = CoroutineMock()
         partner = CoroutineMock()
@@ -725,6 +835,51 @@ class TestStrangerService(asynctest.TestCase):
             assert_called_once_with(31416)
         stranger_mock.set_partner.assert_not_called()
 
+    async def test_match_partner__partner_is_locked_by_another_shard(self):
+        stranger_mock = CoroutineMock()
+        partner_0 = CoroutineMock()
+        partner_0.id = 31416
+        partner_1 = CoroutineMock()
+        partner_1.id = 27183
+
+        def match_partner(unused_stranger):
+            partner = partner_1 if partner_0.id in self.stranger_service._locked_strangers_ids \
+                else partner_0
+            self.stranger_service._locked_strangers_ids.add(partner.id)
+            return partner
+
+        self.stranger_service._match_partner = Mock(side_effect=match_partner)
+
+        with patch('randtalkbot.stranger_service.SHARDING') as sharding_mock:
+            sharding_mock.lock = CoroutineMock(side_effect=[False, True])
+            sharding_mock.unlock = CoroutineMock()
+            await self.stranger_service.match_partner(stranger_mock)
+
+        partner_0.notify_partner_found.assert_not_called()
+        stranger_mock.set_partner.assert_called_once_with(partner_1)
+        sharding_mock.unlock.assert_called_once_with(27183)
+        self.assertEqual(self.stranger_service._locked_strangers_ids, set())
+
+    async def test_match_partner__lock_error(self):
+        stranger_mock = CoroutineMock()
+        partner = CoroutineMock()
+        partner.id = 31416
+
+        def match_partner(unused_stranger):
+            self.stranger_service._locked_strangers_ids.add(partner.id)
+            return partner
+
+        self.stranger_service._match_partner = Mock(side_effect=match_partner)
+
+        with patch('randtalkbot.stranger_service.SHARDING') as sharding_mock:
+            sharding_mock.lock = CoroutineMock(side_effect=StateStoreError())
+
+            with self.assertRaises(StrangerServiceError):
+                await self.stranger_service.match_partner(stranger_mock)
+
+        partner.notify_partner_found.assert_not_called()
+        self.assertEqual(self.stranger_service._locked_strangers_ids, set())
+
     async def test_match_partner__first_partner_has_blocked_the_bot(self):
         stranger_mock = CoroutineMock()
         partner = CoroutineMock()
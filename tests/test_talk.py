@@ -7,7 +7,7 @@
 import datetime
 import unittest
 from unittest.mock import patch, Mock
-from peewee import SqliteDatabase
+from peewee import DatabaseError, SqliteDatabase
 from randtalkbot import talk, stranger
 from randtalkbot.errors import WrongStrangerError
 from randtalkbot.talk import Talk
@@ -20,6 +20,7 @@ talk.DATABASE_PROXY.initialize(DATABASE)
 class TestTalk(unittest.TestCase):
     def setUp(self):
         DATABASE.create_tables([Stranger, Talk])
+        Talk._unsaved_talks.clear()
         self.stranger_0 = Stranger.create(
             invitation='foo',
             telegram_id=31416,
@@ -194,16 +195,68 @@ class TestTalk(unittest.TestCase):
         self.talk_0.increment_sent(self.stranger_0)
         self.assertEqual(self.talk_0.partner1_sent, 1001)
         self.assertEqual(self.talk_0.partner2_sent, 2000)
-        self.talk_0.save.assert_called_once_with()
         self.talk_0.increment_sent(self.stranger_1)
         self.assertEqual(self.talk_0.partner1_sent, 1001)
         self.assertEqual(self.talk_0.partner2_sent, 2001)
+        self.talk_0.save.assert_not_called()
         with self.assertRaises(WrongStrangerError):
             self.talk_0.increment_sent(self.stranger_2)
 
+    def test_increment_sent__count(self):
+        self.talk_0.save = Mock()
+        self.talk_0.increment_sent(self.stranger_1, 3)
+        self.assertEqual(self.talk_0.partner2_sent, 2003)
+        self.talk_0.save.assert_not_called()
+
+    def test_increment_sent__first_message(self):
+        self.talk_1.save = Mock()
+        self.talk_1.increment_sent(self.stranger_2, 2)
+        self.assertEqual(self.talk_1.partner1_sent, 2)
+        self.talk_1.save.assert_called_once_with()
+
+    @patch.object(Talk, 'SENT_SAVE_INTERVAL', 10)
+    def test_increment_sent__save_interval(self):
+        self.talk_0.partner1_sent = 8
+        self.talk_0.save = Mock()
+        self.talk_0.increment_sent(self.stranger_0)
+        self.talk_0.save.assert_not_called()
+        self.talk_0.increment_sent(self.stranger_0, 3)
+        self.talk_0.save.assert_called_once_with()
+
+    def test_increment_sent__loaded(self):
+        talk_0 = Talk.get(Talk.id == self.talk_0.id)
+        talk_0.increment_sent(self.stranger_0)
+        self.assertEqual(Talk.get(Talk.id == self.talk_0.id).partner1_sent, 1001)
+        talk_0.increment_sent(self.stranger_0)
+        self.assertEqual(Talk.get(Talk.id == self.talk_0.id).partner1_sent, 1001)
+        self.assertEqual(Talk._unsaved_talks, {self.talk_0.id: talk_0})
+
     def test_is_successful(self):
         self.assertFalse(self.talk_1.is_successful())
         self.talk_1.partner1_sent = 1
         self.assertFalse(self.talk_1.is_successful())
         self.talk_1.partner2_sent = 1
         self.assertTrue(self.talk_1.is_successful())
+
+    def test_save__talk_is_unsaved(self):
+        self.talk_0.increment_sent(self.stranger_0)
+        self.talk_0.end = datetime.datetime(2010, 1, 4)
+        self.talk_0.save()
+        self.assertEqual(Talk.get(Talk.id == self.talk_0.id).partner1_sent, 1001)
+        self.assertEqual(Talk._unsaved_talks, {})
+
+    def test_save_unsaved(self):
+        self.talk_0.increment_sent(self.stranger_0)
+        self.talk_0.increment_sent(self.stranger_1, 2)
+        self.assertEqual(Talk.get(Talk.id == self.talk_0.id).partner1_sent, 1000)
+        Talk.save_unsaved()
+        talk_0 = Talk.get(Talk.id == self.talk_0.id)
+        self.assertEqual(talk_0.partner1_sent, 1001)
+        self.assertEqual(talk_0.partner2_sent, 2002)
+        self.assertEqual(Talk._unsaved_talks, {})
+
+    def test_save_unsaved__database_error(self):
+        self.talk_0.increment_sent(self.stranger_0)
+        self.talk_0.save = Mock(side_effect=DatabaseError('foo_error'))
+        Talk.save_unsaved()
+        self.assertEqual(Talk._unsaved_talks, {self.talk_0.id: self.talk_0})
@@ -0,0 +1,43 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import asynctest
+from randtalkbot.task_local import TaskLocal
+
+
+class TestTaskLocal(asynctest.TestCase):
+    def setUp(self):
+        self.task_local = TaskLocal()
+
+    async def test_get__not_set(self):
+        self.assertEqual(self.task_local.get('foo'), 'foo')
+
+    async def test_set__is_bound_to_the_task(self):
+        async def set_value(value):
+            self.task_local.set(value)
+            await asyncio.sleep(0)
+            return self.task_local.get()
+
+        self.task_local.set('foo')
+        results = await asyncio.gather(set_value('bar'), set_value('baz'))
+        self.assertEqual(results, ['bar', 'baz'])
+        self.assertEqual(self.task_local.get(), 'foo')
+
+    async def test_get__other_task(self):
+        async def set_value():
+            self.task_local.set('bar')
+            await asyncio.sleep(1)
+
+        task = self.loop.create_task(set_value())
+        await asyncio.sleep(0)
+        self.assertEqual(self.task_local.get(task=task), 'bar')
+        task.cancel()
+
+    @asynctest.ignore_loop
+    def test_outside_of_task(self):
+        self.task_local.set('foo')
+        self.assertIsNone(self.task_local.get())
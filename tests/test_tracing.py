@@ -0,0 +1,139 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import os
+import tempfile
+import asynctest
+from randtalkbot.tracing import format_trace, NULL_SPAN, Tracer
+
+
+class TestTracer(asynctest.TestCase):
+    def setUp(self):
+        self.tracer = Tracer()
+        self.tracer.configure(buffer_size=2)
+
+    async def test_span__nested(self):
+        with self.tracer.start_trace('root', stranger_id=1) as root_span:
+            with self.tracer.span('child') as child_span:
+                with self.tracer.span('grandchild', method='foo'):
+                    await asyncio.sleep(0)
+
+        self.assertEqual(root_span.children, [child_span])
+        self.assertEqual(child_span.trace_id, root_span.span_id)
+        self.assertEqual(child_span.parent, root_span)
+        self.assertEqual(child_span.children[0].tags, {'method': 'foo'})
+        self.assertIsNone(self.tracer.get_current_span())
+        self.assertEqual(self.tracer.get_slowest_traces(10), [root_span])
+
+    async def test_span__without_trace(self):
+        self.assertIs(self.tracer.span('foo'), NULL_SPAN)
+
+    async def test_span__disabled(self):
+        self.tracer.enabled = False
+        self.assertIs(self.tracer.start_trace('foo'), NULL_SPAN)
+
+    async def test_span__error(self):
+        with self.assertRaises(ValueError):
+            with self.tracer.start_trace('root') as root_span:
+                raise ValueError()
+
+        self.assertEqual(root_span.tags, {'error': 'ValueError'})
+
+    async def test_span__concurrent_tasks(self):
+        async def handle(name):
+            with self.tracer.start_trace(name) as root_span:
+                await asyncio.sleep(0)
+
+                with self.tracer.span(name + '_child'):
+                    await asyncio.sleep(0)
+
+            return root_span
+
+        root_spans = await asyncio.gather(handle('foo'), handle('bar'))
+        self.assertEqual([span.children[0].name for span in root_spans], ['foo_child', 'bar_child'])
+
+    async def test_get_slowest_traces(self):
+        for duration, name in enumerate(('foo', 'bar', 'baz')):
+            with self.tracer.start_trace(name) as root_span:
+                pass
+
+            root_span.duration = duration
+
+        self.assertEqual(
+            [span.name for span in self.tracer.get_slowest_traces(1)],
+            ['baz'],
+            )
+        self.assertEqual(
+            [span.name for span in self.tracer.get_slowest_traces(5)],
+            ['baz', 'bar'],
+            )
+
+    async def test_export_to_file(self):
+        file_descriptor, path = tempfile.mkstemp()
+        os.close(file_descriptor)
+        self.tracer.configure(path=path)
+
+        try:
+            with self.tracer.start_trace('root'):
+                with self.tracer.span('child'):
+                    pass
+
+            # Finished traces are exported in background.
+            self.assertEqual(os.path.getsize(path), 0)
+            await self.tracer.flush()
+
+            with open(path) as file_descriptor:
+                trace = json.loads(file_descriptor.readline())
+        finally:
+            self.tracer.close()
+            os.remove(path)
+
+        self.assertEqual(trace['name'], 'root')
+        self.assertEqual(trace['children'][0]['name'], 'child')
+        self.assertEqual(trace['children'][0]['parent_id'], trace['span_id'])
+
+    async def test_close(self):
+        file_descriptor, path = tempfile.mkstemp()
+        os.close(file_descriptor)
+        self.tracer.configure(path=path)
+
+        try:
+            for name in ('foo', 'bar'):
+                with self.tracer.start_trace(name):
+                    pass
+
+            self.tracer.close()
+
+            with open(path) as file_descriptor:
+                traces = [json.loads(line) for line in file_descriptor]
+        finally:
+            os.remove(path)
+
+        self.assertEqual([trace['name'] for trace in traces], ['foo', 'bar'])
+
+    async def test_export_to_file__error(self):
+        self.tracer.configure(path=os.path.join(tempfile.gettempdir(), 'missing', 'traces.jsonl'))
+
+        with self.tracer.start_trace('root'):
+            pass
+
+        with self.assertLogs('randtalkbot.tracing', 'WARNING'):
+            await self.tracer.flush()
+
+    async def test_format_trace(self):
+        with self.tracer.start_trace('root', stranger_id=1) as root_span:
+            with self.tracer.span('child') as child_span:
+                pass
+
+        root_span.duration = .01
+        child_span.duration = .002
+        self.assertEqual(
+            format_trace(root_span),
+            'root 10.0 ms stranger_id=1\n'
+            '  child 2.0 ms',
+            )
@@ -0,0 +1,146 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import unittest
+import asynctest
+from asynctest.mock import patch
+from peewee import SqliteDatabase
+from randtalkbot import stranger
+from randtalkbot.sharding import get_shard, Sharding
+from randtalkbot.state_store import InMemoryStateStore
+from randtalkbot.stranger import Stranger
+from randtalkbot.waiting_pool import WaitingPool
+
+DATABASE = SqliteDatabase(':memory:')
+
+
+class TestWaitingPool(unittest.TestCase):
+    def setUp(self):
+        stranger.DATABASE_PROXY.initialize(DATABASE)
+        DATABASE.create_tables([Stranger])
+        self.stranger_0 = Stranger.create(
+            invitation='foo',
+            languages='["en", "ru"]',
+            looking_for_partner_from=datetime.datetime(1970, 1, 1),
+            sex='female',
+            telegram_id=31416,
+            )
+        self.stranger_1 = Stranger.create(
+            invitation='bar',
+            languages='["en"]',
+            sex='male',
+            telegram_id=27183,
+            )
+        self.waiting_pool = WaitingPool()
+
+    def tearDown(self):
+        DATABASE.drop_tables([Stranger])
+
+    def test_init__loads_waiting_strangers(self):
+        self.assertEqual(self.waiting_pool.get_count(), 1)
+        self.assertEqual(self.waiting_pool.get_counts_by_sex(), {'female': 1})
+        self.assertEqual(self.waiting_pool.get_counts_by_language(), {'en': 1, 'ru': 1})
+
+    def test_get_instance(self):
+        self.assertEqual(WaitingPool.get_instance(), self.waiting_pool)
+
+    def test_update__enters_pool(self):
+        self.stranger_1.looking_for_partner_from = datetime.datetime(1970, 1, 1)
+        self.waiting_pool.update(self.stranger_1)
+        self.assertEqual(self.waiting_pool.get_count(), 2)
+        self.assertEqual(self.waiting_pool.get_count_by_sex('male'), 1)
+        self.assertEqual(self.waiting_pool.get_count_by_language('en'), 2)
+
+    def test_update__leaves_pool(self):
+        self.stranger_0.looking_for_partner_from = None
+        self.waiting_pool.update(self.stranger_0)
+        self.assertEqual(self.waiting_pool.get_count(), 0)
+        self.assertEqual(self.waiting_pool.get_count_by_sex('female'), 0)
+        self.assertEqual(self.waiting_pool.get_counts_by_language(), {})
+
+    def test_update__not_waiting_stranger_leaves_pool(self):
+        self.waiting_pool.update(self.stranger_1)
+        self.assertEqual(self.waiting_pool.get_count(), 1)
+
+    def test_update__languages_were_changed(self):
+        self.stranger_0.languages = '["it"]'
+        self.waiting_pool.update(self.stranger_0)
+        self.assertEqual(self.waiting_pool.get_count(), 1)
+        self.assertEqual(self.waiting_pool.get_counts_by_language(), {'it': 1})
+
+    def test_stranger_save__updates_pool(self):
+        self.stranger_1.looking_for_partner_from = datetime.datetime(1970, 1, 1)
+        self.stranger_1.save()
+        self.assertEqual(self.waiting_pool.get_count(), 2)
+        self.stranger_0.looking_for_partner_from = None
+        self.stranger_0.save()
+        self.assertEqual(self.waiting_pool.get_count(), 1)
+        self.assertEqual(self.waiting_pool.get_counts_by_sex(), {'male': 1})
+
+
+class TestWaitingPoolSharding(asynctest.TestCase):
+    def setUp(self):
+        stranger.DATABASE_PROXY.initialize(DATABASE)
+        DATABASE.create_tables([Stranger])
+        store = InMemoryStateStore()
+        self.shardings = []
+
+        for shard in range(2):
+            sharding = Sharding()
+            sharding.configure(shard=shard, shards_count=2, store=store)
+            self.shardings.append(sharding)
+
+        telegram_ids = [
+            next(telegram_id for telegram_id in range(1000) if get_shard(telegram_id, 2) == shard)
+            for shard in range(2)
+            ]
+        self.strangers = [
+            Stranger.create(
+                invitation=f'foo{shard}',
+                languages='["en"]',
+                looking_for_partner_from=datetime.datetime(1970, 1, 1),
+                sex=sex,
+                telegram_id=telegram_ids[shard],
+                )
+            for shard, sex in enumerate(('female', 'male'))
+            ]
+
+    def tearDown(self):
+        DATABASE.drop_tables([Stranger])
+
+    def _create_waiting_pool(self, shard):
+        with patch('randtalkbot.waiting_pool.SHARDING', self.shardings[shard]):
+            return WaitingPool()
+
+    async def _synchronize(self, shard, waiting_pool):
+        with patch('randtalkbot.waiting_pool.SHARDING', self.shardings[shard]):
+            await waiting_pool.synchronize()
+
+    async def test_synchronize(self):
+        waiting_pools = [self._create_waiting_pool(shard) for shard in range(2)]
+        self.assertEqual(waiting_pools[0].get_counts_by_sex(), {'female': 1})
+
+        for shard, waiting_pool in enumerate(waiting_pools):
+            await self._synchronize(shard, waiting_pool)
+
+        await self._synchronize(0, waiting_pools[0])
+
+        for waiting_pool in waiting_pools:
+            self.assertEqual(waiting_pool.get_count(), 2)
+            self.assertEqual(waiting_pool.get_count_by_sex('male'), 1)
+            self.assertEqual(waiting_pool.get_counts_by_sex(), {'female': 1, 'male': 1})
+            self.assertEqual(waiting_pool.get_count_by_language('en'), 2)
+            self.assertEqual(waiting_pool.get_counts_by_language(), {'en': 2})
+
+    @asynctest.ignore_loop
+    def test_update__owned_by_another_shard(self):
+        waiting_pool = self._create_waiting_pool(0)
+
+        with patch('randtalkbot.waiting_pool.SHARDING', self.shardings[0]):
+            waiting_pool.update(self.strangers[1])
+
+        self.assertEqual(waiting_pool.get_count(), 1)
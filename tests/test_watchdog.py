@@ -0,0 +1,81 @@
+# RandTalkBot Bot matching you with a random person on Telegram.
+# Copyright (C) 2016 quasiyoke
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import time
+import asynctest
+from asynctest.mock import patch, Mock
+from randtalkbot.stranger_handler import StrangerHandler
+from randtalkbot.watchdog import set_processing_context, Watchdog
+
+
+def block_loop(seconds):
+    time.sleep(seconds)
+
+
+class TestWatchdog(asynctest.TestCase):
+    @patch('randtalkbot.stranger_handler.StrangerSetupWizard', Mock())
+    @patch('randtalkbot.stranger_sender_service.StrangerSenderService._instance', Mock())
+    @patch('randtalkbot.stranger_handler.StrangerService', Mock())
+    def setUp(self):
+        from randtalkbot.stranger_handler import StrangerService
+        stranger = StrangerService.get_instance.return_value.get_or_create_stranger.return_value
+        stranger.id = 31416
+        self.stranger_handler = StrangerHandler(
+            (Mock(), {'from': {'id': 31416}}, 31416),
+            event_space=None,
+            timeout=1,
+            )
+        self.watchdog = Watchdog(.05, interval=.01, report_interval=60)
+        self.watchdog_task = self.loop.create_task(self.watchdog.run())
+
+    async def tearDown(self):
+        self.watchdog_task.cancel()
+
+        with self.assertRaises(asyncio.CancelledError):
+            await self.watchdog_task
+
+    @patch('randtalkbot.watchdog.LOGGER', Mock())
+    async def test_blocking_handler_is_reported(self):
+        from randtalkbot.watchdog import LOGGER
+
+        async def blocking_handle_chat_message(unused_message_json):
+            block_loop(.3)
+
+        self.stranger_handler._handle_chat_message = blocking_handle_chat_message
+        await asyncio.sleep(.05)
+        await self.stranger_handler.on_chat_message({})
+        await asyncio.sleep(.05)
+        LOGGER.warning.assert_called_once_with(
+            asynctest.mock.ANY,
+            asynctest.mock.ANY,
+            'StrangerHandler.on_chat_message',
+            31416,
+            0,
+            asynctest.mock.ANY,
+            )
+        lag, stack = LOGGER.warning.call_args[0][1], LOGGER.warning.call_args[0][5]
+        self.assertGreaterEqual(lag, .05)
+        self.assertIn('block_loop', stack)
+        self.assertIn('blocking_handle_chat_message', stack)
+
+    @patch('randtalkbot.watchdog.LOGGER', Mock())
+    async def test_reports_are_rate_limited(self):
+        from randtalkbot.watchdog import LOGGER
+        set_processing_context('foo_handler', 27183)
+        await asyncio.sleep(.05)
+        block_loop(.2)
+        await asyncio.sleep(.05)
+        block_loop(.2)
+        await asyncio.sleep(.05)
+        self.assertEqual(LOGGER.warning.call_count, 1)
+        self.assertEqual(self.watchdog._suppressed_reports_count, 1)
+
+    @patch('randtalkbot.watchdog.LOGGER', Mock())
+    async def test_no_lag(self):
+        from randtalkbot.watchdog import LOGGER
+        await asyncio.sleep(.2)
+        LOGGER.warning.assert_not_called()